@@ -2,4 +2,8 @@ from .parse import Parser
 from .repl import Repl
 from .environment import Environment
 from .compile import Compiler
-from .vm import VM        
+from .vm import VM, UnboxedVM
+from .regcompile import RegisterCompiler
+from .regvm import RegisterVM
+from .transpile import Transpiler
+from .jit import TracingVM
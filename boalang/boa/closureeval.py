@@ -0,0 +1,727 @@
+from .token import TOKEN_TYPES
+from .object import (
+    newInteger,
+    newString,
+    newArray,
+    newHash,
+    newReturnValue,
+    newError,
+    newFunction,
+    newMethod,
+    NULL,
+    TRUE,
+    FALSE,
+    BREAK,
+    CONTINUE,
+    OBJECT_TYPES,
+    SharedBoaInteger,
+)
+from .ast import (
+    NODE_TYPE_PROGRAM,
+    NODE_TYPE_STATEMENT,
+    NODE_TYPE_EXPRESSION,
+    STATEMENT_TYPE_EXPRESSION,
+    STATEMENT_TYPE_BLOCK,
+    STATEMENT_TYPE_RETURN,
+    STATEMENT_TYPE_LET,
+    STATEMENT_TYPE_ASSIGN,
+    STATEMENT_TYPE_WHILE,
+    STATEMENT_TYPE_FOR,
+    STATEMENT_TYPE_BREAK,
+    STATEMENT_TYPE_CONTINUE,
+    STATEMENT_TYPE_CLASS,
+    EXPRESSION_TYPE_IDENT,
+    EXPRESSION_TYPE_INSTANCE_REF,
+    EXPRESSION_TYPE_INT_LIT,
+    EXPRESSION_TYPE_FUNC_LIT,
+    EXPRESSION_TYPE_STR_LIT,
+    EXPRESSION_TYPE_ARRAY_LIT,
+    EXPRESSION_TYPE_HASH_LIT,
+    EXPRESSION_TYPE_BOOLEAN,
+    EXPRESSION_TYPE_NULL_LIT,
+    EXPRESSION_TYPE_PREFIX,
+    EXPRESSION_TYPE_INFIX,
+    EXPRESSION_TYPE_INDEX,
+    EXPRESSION_TYPE_GET,
+    EXPRESSION_TYPE_IF,
+    EXPRESSION_TYPE_CALL,
+)
+from .resolve import Resolver, Frame, UNSET
+from .evaluator import (
+    evalClassStatement,
+    evalIndexedAssignment,
+    evalInfixExpression,
+    evalIndexExpression,
+    evalExclamationOperatorExpression,
+    evalMinusOperatorExpression,
+    evalInstanceRef,
+    unwrapReturnValue,
+    getBuiltinFunction,
+    lookupClass,
+    isTruthy,
+)
+
+#converts the AST into nested Python closures, one per node, each taking the
+#environment to run in. The type dispatch boaEval repeats on every visit happens
+#once, when a node is compiled. Values and errors are the evaluator's, so the
+#result of running a closure is what boaEval would return. The tree is resolved
+#first, so below the Environment a program runs in, scopes are Frames and names
+#are found by slot rather than looked up by name, see resolve
+
+INT_TYPE = OBJECT_TYPES.OBJECT_TYPE_INT
+ERROR_TYPE = OBJECT_TYPES.OBJECT_TYPE_ERROR
+RETURN_VALUE_TYPE = OBJECT_TYPES.OBJECT_TYPE_RETURN_VALUE
+BLOCK_EXIT_TYPES = frozenset([
+    OBJECT_TYPES.OBJECT_TYPE_RETURN_VALUE,
+    OBJECT_TYPES.OBJECT_TYPE_ERROR,
+    OBJECT_TYPES.OBJECT_TYPE_CONTINUE,
+    OBJECT_TYPES.OBJECT_TYPE_BREAK,
+])
+LOOP_EXIT_TYPES = frozenset([
+    OBJECT_TYPES.OBJECT_TYPE_RETURN_VALUE,
+    OBJECT_TYPES.OBJECT_TYPE_ERROR,
+    OBJECT_TYPES.OBJECT_TYPE_BREAK,
+])
+LOOP_CONTROL_TYPES = frozenset([OBJECT_TYPES.OBJECT_TYPE_BREAK, OBJECT_TYPES.OBJECT_TYPE_CONTINUE])
+
+#integer operations, by operator, tried before falling back to evalInfixExpression
+INTEGER_OPERATIONS = {
+    TOKEN_TYPES.TOKEN_TYPE_PLUS.value: lambda l, r: newInteger(l + r),
+    TOKEN_TYPES.TOKEN_TYPE_MINUS.value: lambda l, r: newInteger(l - r),
+    TOKEN_TYPES.TOKEN_TYPE_ASTERISK.value: lambda l, r: newInteger(l * r),
+    TOKEN_TYPES.TOKEN_TYPE_SLASH.value: lambda l, r: newInteger(l / r),
+    TOKEN_TYPES.TOKEN_TYPE_GT.value: lambda l, r: TRUE if l > r else FALSE,
+    TOKEN_TYPES.TOKEN_TYPE_LT.value: lambda l, r: TRUE if l < r else FALSE,
+    TOKEN_TYPES.TOKEN_TYPE_GTEQ.value: lambda l, r: TRUE if l >= r else FALSE,
+    TOKEN_TYPES.TOKEN_TYPE_LTEQ.value: lambda l, r: TRUE if l <= r else FALSE,
+    TOKEN_TYPES.TOKEN_TYPE_EQ.value: lambda l, r: TRUE if l == r else FALSE,
+    TOKEN_TYPES.TOKEN_TYPE_NEQ.value: lambda l, r: TRUE if l != r else FALSE,
+}
+
+def closureEval(node, env):
+    return compileNode(node)(env)
+
+def compiledBody(block):
+    #function bodies are compiled the first time they are called and kept on the node,
+    #so every function value made from the same literal shares them
+    compiled = getattr(block, 'compiledClosure', None)
+    if compiled is None:
+        compiled = block.compiledClosure = compileTree(block)
+    return compiled
+
+def compileNode(node):
+    Resolver().resolve(node)
+    return compileTree(node)
+
+def compileTree(node):
+    nodeType = node.nodeType
+    if nodeType == NODE_TYPE_PROGRAM:
+        return compileProgram(node)
+    elif nodeType == NODE_TYPE_STATEMENT:
+        return compileStatement(node)
+    elif nodeType == NODE_TYPE_EXPRESSION:
+        return compileExpression(node)
+    return constant(newError("Could not evaluate: %s" % node))
+
+def constant(val):
+    return lambda env: val
+
+def isErrorValue(obj):
+    return obj is not None and obj.objectType is ERROR_TYPE
+
+def compileProgram(program):
+    statements = [compileTree(statement) for statement in program.statements]
+    def evalProgram(env):
+        result = NULL
+        for statement in statements:
+            result = statement(env)
+            if result is not None:
+                if result.objectType is RETURN_VALUE_TYPE:
+                    return result.value
+                elif result.objectType is ERROR_TYPE:
+                    return result
+        return result
+    return evalProgram
+
+def compileBlock(block):
+    statements = [compileTree(statement) for statement in block.statements]
+    def evalBlock(env):
+        result = NULL
+        for statement in statements:
+            result = statement(env)
+            if result is not None and result.objectType in BLOCK_EXIT_TYPES:
+                return result
+        return result
+    return evalBlock
+
+def compileLoopBlock(block):
+    #the closure returns the block's result and whether the loop goes on
+    statements = [compileTree(statement) for statement in block.statements]
+    def evalLoopBlock(env):
+        result = NULL
+        for statement in statements:
+            result = statement(env)
+            if result is not None:
+                typ = result.objectType
+                if typ in LOOP_EXIT_TYPES:
+                    return result, False
+                elif typ is OBJECT_TYPES.OBJECT_TYPE_CONTINUE:
+                    return result, True
+        return result, True
+    return evalLoopBlock
+
+def compileStatement(node):
+    stmtType = node.statementType
+    if stmtType == STATEMENT_TYPE_EXPRESSION:
+        return compileTree(node.expression)
+    elif stmtType == STATEMENT_TYPE_BLOCK:
+        return compileBlock(node)
+    elif stmtType == STATEMENT_TYPE_BREAK:
+        return constant(BREAK)
+    elif stmtType == STATEMENT_TYPE_CONTINUE:
+        return constant(CONTINUE)
+    elif stmtType == STATEMENT_TYPE_WHILE:
+        return compileWhileStatement(node)
+    elif stmtType == STATEMENT_TYPE_FOR:
+        return compileForStatement(node)
+    elif stmtType == STATEMENT_TYPE_RETURN:
+        return compileReturnStatement(node)
+    elif stmtType == STATEMENT_TYPE_LET:
+        return compileLetStatement(node)
+    elif stmtType == STATEMENT_TYPE_ASSIGN:
+        exprType = node.identifier.expressionType
+        if exprType == EXPRESSION_TYPE_INDEX:
+            return compileIndexedAssignStatement(node)
+        elif exprType == EXPRESSION_TYPE_IDENT:
+            return compileAssignStatement(node)
+        elif exprType == EXPRESSION_TYPE_GET:
+            return compilePropertyAssignStatement(node)
+        return constant(newError("Identifier not valid: %s" % node.identifier))
+    elif stmtType == STATEMENT_TYPE_CLASS:
+        return lambda env: evalClassStatement(node, env)
+    return constant(newError("Could not evaluate: %s" % node))
+
+def compileReturnStatement(node):
+    if node.value is None:
+        return lambda env: newReturnValue(NULL)
+    value = compileTree(node.value)
+    def evalReturn(env):
+        val = value(env)
+        if isErrorValue(val):
+            return val
+        return newReturnValue(val)
+    return evalReturn
+
+def compileLetStatement(node):
+    identifier = node.identifier
+    value = compileTree(node.value)
+    slot = getattr(identifier, 'slot', None)
+    if slot is not None:
+        def evalLocalLet(env):
+            val = value(env)
+            if isErrorValue(val):
+                return val
+            env.slots[slot] = val
+            return NULL
+        return evalLocalLet
+    def evalLet(env):
+        val = value(env)
+        if isErrorValue(val):
+            return val
+        try:
+            env.declareIdentifier(identifier, val)
+            return NULL
+        except Exception as e:
+            return newError(str(e))
+    return evalLet
+
+def compileAssignStatement(node):
+    identifier = node.identifier
+    value = compileTree(node.value)
+    findSlot = compileSlotLookup(identifier)
+    globalDepth = getattr(identifier, 'globalDepth', 0)
+    def evalAssign(env):
+        frame, slot = findSlot(env)
+        if frame is not None:
+            val = value(env)
+            if isErrorValue(val):
+                return val
+            frame.slots[slot] = val
+            return NULL
+        globalEnv = frameAt(env, globalDepth)
+        if not globalEnv.hasIdentifier(identifier):
+            return newError("Identifier not declared: %s" % identifier.value)
+        val = value(env)
+        if isErrorValue(val):
+            return val
+        try:
+            globalEnv.setIdentifier(identifier, val)
+            return NULL
+        except Exception as e:
+            return newError(str(e))
+    return evalAssign
+
+def compileIndexedAssignStatement(node):
+    left = compileTree(node.identifier.left)
+    index = compileTree(node.identifier.index)
+    value = compileTree(node.value)
+    def evalIndexedAssign(env):
+        leftEvaluated = left(env)
+        if isErrorValue(leftEvaluated):
+            return leftEvaluated
+        idxEvaluated = index(env)
+        if isErrorValue(idxEvaluated):
+            return idxEvaluated
+        if not leftEvaluated.objectType.isIterable:
+            return newError("Identifier not subscriptable: %s" % leftEvaluated.inspect())
+        val = value(env)
+        if isErrorValue(val):
+            return val
+        return evalIndexedAssignment(leftEvaluated, idxEvaluated, val, env)
+    return evalIndexedAssign
+
+def compilePropertyAssignStatement(node):
+    obj = compileTree(node.identifier.object)
+    value = compileTree(node.value)
+    setProperty = compileSetProperty(node.identifier.property)
+    def evalPropertyAssign(env):
+        objEvaluated = obj(env)
+        if isErrorValue(objEvaluated):
+            return objEvaluated
+        val = value(env)
+        if isErrorValue(val):
+            return val
+        return setProperty(objEvaluated, val, env)
+    return evalPropertyAssign
+
+def compileSetProperty(property):
+    #returns a closure storing a value at the property path on an object
+    propType = property.expressionType
+    if propType == EXPRESSION_TYPE_IDENT:
+        name = property.value
+        return lambda obj, val, env: evalAttributeAssignment(obj, name, val)
+    elif propType == EXPRESSION_TYPE_INDEX:
+        if property.left.expressionType not in [EXPRESSION_TYPE_IDENT, EXPRESSION_TYPE_INDEX]:
+            return lambda obj, val, env: newError("Attribute index assignment not supported: %s.%s[%s]" % (obj.inspect(), property.left, property.index))
+        getLeft = compileGetProperty(property.left)
+        index = compileTree(property.index)
+        def setIndexProperty(obj, val, env):
+            leftEvaluated = getLeft(obj, env)
+            if isErrorValue(leftEvaluated):
+                return leftEvaluated
+            idxEvaluated = index(env)
+            if isErrorValue(idxEvaluated):
+                return idxEvaluated
+            return evalIndexedAssignment(leftEvaluated, idxEvaluated, val, env)
+        return setIndexProperty
+    elif propType == EXPRESSION_TYPE_GET:
+        getObject = compileGetProperty(property.object)
+        setRest = compileSetProperty(property.property)
+        return lambda obj, val, env: setRest(getObject(obj, env), val, env)
+    return lambda obj, val, env: newError("Assignment not supported: %s" % property)
+
+def evalAttributeAssignment(obj, attrName, val):
+    #functions become methods closing over the environment they were made in, which
+    #resolved names rely on, rather than the one they are assigned in
+    try:
+        if val.objectType == OBJECT_TYPES.OBJECT_TYPE_FUNCTION:
+            obj.setAttribute(attrName, newMethod(obj, val.parameters, val.body, val.env))
+        else:
+            obj.setAttribute(attrName, val)
+        return NULL
+    except Exception as e:
+        return newError("Could not assign value to attribute %s of %s" % (attrName, obj.inspect()))
+
+def compileGetProperty(property):
+    #returns a closure looking the property path up on an object
+    propType = property.expressionType
+    if propType == EXPRESSION_TYPE_IDENT:
+        name = property.value
+        def getIdentProperty(obj, env):
+            if isErrorValue(obj):
+                return obj
+            try:
+                return obj.getAttribute(name)
+            except Exception as e:
+                return newError("Could not get attribute: %s" % str(e))
+        return getIdentProperty
+    elif propType == EXPRESSION_TYPE_INDEX:
+        getLeft = compileGetProperty(property.left)
+        index = compileTree(property.index)
+        def getIndexProperty(obj, env):
+            if isErrorValue(obj):
+                return obj
+            try:
+                leftEvaluated = getLeft(obj, env)
+                if isErrorValue(leftEvaluated):
+                    return leftEvaluated
+                idxEvaluated = index(env)
+                if isErrorValue(idxEvaluated):
+                    return idxEvaluated
+                return evalIndexExpression(leftEvaluated, idxEvaluated)
+            except Exception as e:
+                return newError("Could not get attribute: %s" % str(e))
+        return getIndexProperty
+    elif propType == EXPRESSION_TYPE_CALL:
+        getMethod = compileGetProperty(property.function)
+        arguments = compileExpressions(property.arguments)
+        def getCallProperty(obj, env):
+            if isErrorValue(obj):
+                return obj
+            try:
+                methodEvaluated = getMethod(obj, env)
+                if isErrorValue(methodEvaluated):
+                    return methodEvaluated
+                if methodEvaluated.objectType != OBJECT_TYPES.OBJECT_TYPE_BUILTIN_METHOD:
+                    return newError("Not a method: %s" % property)
+                args = arguments(env)
+                if len(args) == 1 and isErrorValue(args[0]):
+                    return args[0]
+                return applyFunction(methodEvaluated, args)
+            except Exception as e:
+                return newError("Could not get attribute: %s" % str(e))
+        return getCallProperty
+    elif propType == EXPRESSION_TYPE_GET:
+        getObject = compileGetProperty(property.object)
+        getRest = compileGetProperty(property.property)
+        return lambda obj, env: getRest(getObject(obj, env), env)
+    return lambda obj, env: newError("Property not gettable: %s.%s" % (obj, property))
+
+def compileLoopFrames(block, reserved):
+    #returns a closure making the frame for each iteration of a loop. A body nothing can
+    #capture gets one frame per loop, cleared each iteration of anything it declared
+    slotCount = getattr(block, 'slotCount', 0)
+    if slotCount == 0:
+        return lambda env: (lambda: env)
+    elif getattr(block, 'captures', True):
+        return lambda env: (lambda: Frame(env, slotCount))
+    def loopFrames(env):
+        frame = Frame(env, slotCount)
+        if slotCount == reserved:
+            return lambda: frame
+        slots = frame.slots
+        empty = list(slots)
+        def nextFrame():
+            slots[:] = empty
+            return frame
+        return nextFrame
+    return loopFrames
+
+def compileWhileStatement(node):
+    condition = compileTree(node.condition)
+    block = compileLoopBlock(node.blockStatement)
+    loopFrames = compileLoopFrames(node.blockStatement, 0)
+    def evalWhile(env):
+        result = NULL
+        nextFrame = loopFrames(env)
+        while True:
+            conditionEvaluated = condition(env)
+            if isErrorValue(conditionEvaluated):
+                return conditionEvaluated
+            if not isTruthy(conditionEvaluated):
+                break
+            result, continueExecution = block(nextFrame())
+            if not continueExecution:
+                break
+        if result is not None and result.objectType in LOOP_CONTROL_TYPES:
+            return NULL
+        return result
+    return evalWhile
+
+def compileForStatement(node):
+    iterable = compileTree(node.iterable)
+    block = compileLoopBlock(node.blockStatement)
+    loopFrames = compileLoopFrames(node.blockStatement, 1)
+    def evalFor(env):
+        result = NULL
+        iterableEvaluated = iterable(env)
+        if isErrorValue(iterableEvaluated):
+            return iterableEvaluated
+        if not iterableEvaluated.objectType.isIterable:
+            return newError("For expression not iterable: %s" % iterableEvaluated.inspect())
+        nextFrame = loopFrames(env)
+        for obj in iterableEvaluated:
+            frame = nextFrame()
+            frame.slots[0] = obj #the iterator
+            result, continueExecution = block(frame)
+            if not continueExecution:
+                break
+        if result is not None and result.objectType in LOOP_CONTROL_TYPES:
+            return NULL
+        return result
+    return evalFor
+
+def compileExpression(node):
+    exprType = node.expressionType
+    if exprType == EXPRESSION_TYPE_INT_LIT:
+        value = node.value
+        integer = newInteger(value)
+        if isinstance(integer, SharedBoaInteger):
+            return constant(integer) #small ints are shared and refuse attributes
+        return lambda env: newInteger(value)
+    elif exprType == EXPRESSION_TYPE_STR_LIT:
+        value = node.value
+        return lambda env: newString(value)
+    elif exprType == EXPRESSION_TYPE_BOOLEAN:
+        return constant(TRUE if node.value else FALSE)
+    elif exprType == EXPRESSION_TYPE_NULL_LIT:
+        return constant(NULL)
+    elif exprType == EXPRESSION_TYPE_IDENT:
+        return compileIdentifier(node)
+    elif exprType == EXPRESSION_TYPE_INSTANCE_REF:
+        return lambda env: evalInstanceRef(node, env)
+    elif exprType == EXPRESSION_TYPE_ARRAY_LIT:
+        elements = compileExpressions(node.elements)
+        def evalArrayLiteral(env):
+            elementsEvaluated = elements(env)
+            if len(elementsEvaluated) == 1 and isErrorValue(elementsEvaluated[0]):
+                return elementsEvaluated[0]
+            return newArray(elementsEvaluated)
+        return evalArrayLiteral
+    elif exprType == EXPRESSION_TYPE_HASH_LIT:
+        return compileHashLiteral(node)
+    elif exprType == EXPRESSION_TYPE_PREFIX:
+        return compilePrefixExpression(node)
+    elif exprType == EXPRESSION_TYPE_INFIX:
+        return compileInfixExpression(node)
+    elif exprType == EXPRESSION_TYPE_INDEX:
+        left = compileTree(node.left)
+        index = compileTree(node.index)
+        def evalIndex(env):
+            leftEvaluated = left(env)
+            if isErrorValue(leftEvaluated):
+                return leftEvaluated
+            idxEvaluated = index(env)
+            if isErrorValue(idxEvaluated):
+                return idxEvaluated
+            return evalIndexExpression(leftEvaluated, idxEvaluated)
+        return evalIndex
+    elif exprType == EXPRESSION_TYPE_GET:
+        obj = compileTree(node.object)
+        getProperty = compileGetProperty(node.property)
+        return lambda env: getProperty(obj(env), env)
+    elif exprType == EXPRESSION_TYPE_IF:
+        return compileIfExpression(node)
+    elif exprType == EXPRESSION_TYPE_FUNC_LIT:
+        params = node.parameters
+        body = node.body
+        return lambda env: newFunction(params, body, env)
+    elif exprType == EXPRESSION_TYPE_CALL:
+        return compileCallExpression(node)
+    return constant(newError("Could not evaluate: %s" % node))
+
+def compileExpressions(exprs):
+    #the closure returns the values, or a list holding just the first error
+    compiled = [compileTree(expr) for expr in exprs]
+    def evalExpressions(env):
+        result = []
+        for expr in compiled:
+            evaluated = expr(env)
+            if isErrorValue(evaluated):
+                return [evaluated]
+            result.append(evaluated)
+        return result
+    return evalExpressions
+
+def frameAt(env, depth):
+    for _ in range(depth):
+        env = env.outer
+    return env
+
+def compileSlotLookup(node):
+    #returns a closure finding the frame and slot holding a resolved name, (None, None) if it is global
+    candidates = getattr(node, 'candidates', [])
+    if len(candidates) == 1 and candidates[0][0] < 2:
+        depth, slot = candidates[0]
+        def findNearSlot(env):
+            frame = env.outer if depth else env
+            if frame.slots[slot] is UNSET:
+                return None, None
+            return frame, slot
+        return findNearSlot
+    def findSlot(env):
+        for depth, slot in candidates:
+            frame = frameAt(env, depth)
+            if frame.slots[slot] is not UNSET:
+                return frame, slot
+        return None, None
+    return findSlot
+
+def compileIdentifier(node):
+    candidates = getattr(node, 'candidates', [])
+    evalGlobal = compileGlobalIdentifier(node)
+    if not candidates:
+        return evalGlobal
+    elif len(candidates) == 1 and candidates[0][0] == 0:
+        #a name in the closure's own frame, the usual case by far
+        slot = candidates[0][1]
+        def evalLocalIdentifier(env):
+            val = env.slots[slot]
+            if val is UNSET:
+                return evalGlobal(env)
+            return val
+        return evalLocalIdentifier
+    elif len(candidates) == 1 and candidates[0][0] == 1:
+        #a name in the enclosing frame, e.g. a function's local read in a loop body
+        slot = candidates[0][1]
+        def evalOuterIdentifier(env):
+            val = env.outer.slots[slot]
+            if val is UNSET:
+                return evalGlobal(env)
+            return val
+        return evalOuterIdentifier
+    def evalResolvedIdentifier(env):
+        for depth, slot in candidates:
+            val = frameAt(env, depth).slots[slot]
+            if val is not UNSET:
+                return val
+        return evalGlobal(env)
+    return evalResolvedIdentifier
+
+def compileGlobalIdentifier(node):
+    name = node.value
+    builtin = getBuiltinFunction(name)
+    globalDepth = getattr(node, 'globalDepth', 0)
+    def evalIdentifier(env):
+        env = frameAt(env, globalDepth)
+        try:
+            return env.getIdentifier(node)
+        except:
+            if builtin:
+                return builtin
+            clazz = lookupClass(name)
+            if clazz:
+                return clazz
+            return newError("Identifier not found: %s" % name)
+    return evalIdentifier
+
+def compileHashLiteral(node):
+    pairs = [(compileTree(key), compileTree(val)) for key, val in node.elements]
+    def evalHashLiteral(env):
+        pairsEvaluated = []
+        for key, val in pairs:
+            keyEvaluated = key(env)
+            if isErrorValue(keyEvaluated):
+                return keyEvaluated
+            if not keyEvaluated.objectType.isHashable:
+                return newError("Key not hashable: %s" % keyEvaluated.inspect())
+            valueEvaluated = val(env)
+            if isErrorValue(valueEvaluated):
+                return valueEvaluated
+            pairsEvaluated.append((keyEvaluated, valueEvaluated))
+        return newHash(pairsEvaluated)
+    return evalHashLiteral
+
+def compilePrefixExpression(node):
+    operator = node.operator
+    right = compileTree(node.right)
+    if operator in [TOKEN_TYPES.TOKEN_TYPE_EXCLAMATION.value, TOKEN_TYPES.TOKEN_TYPE_NOT.value]:
+        operation = evalExclamationOperatorExpression
+    elif operator == TOKEN_TYPES.TOKEN_TYPE_MINUS.value:
+        operation = evalMinusOperatorExpression
+    else:
+        operation = lambda rightEvaluated, env: newError("Unknown operator: %s%s" % (operator, rightEvaluated.objectType))
+    def evalPrefix(env):
+        rightEvaluated = right(env)
+        if isErrorValue(rightEvaluated):
+            return rightEvaluated
+        return operation(rightEvaluated, env)
+    return evalPrefix
+
+def compileInfixExpression(node):
+    #both operands are evaluated before the operator, and/or included, as in boaEval
+    operator = node.operator
+    left = compileTree(node.left)
+    right = compileTree(node.right)
+    integerOperation = INTEGER_OPERATIONS.get(operator)
+    if integerOperation is None:
+        def evalInfix(env):
+            leftEvaluated = left(env)
+            if isErrorValue(leftEvaluated):
+                return leftEvaluated
+            rightEvaluated = right(env)
+            if isErrorValue(rightEvaluated):
+                return rightEvaluated
+            return evalInfixExpression(operator, leftEvaluated, rightEvaluated, env)
+        return evalInfix
+    def evalIntegerInfix(env):
+        leftEvaluated = left(env)
+        if leftEvaluated is not None and leftEvaluated.objectType is INT_TYPE:
+            rightEvaluated = right(env)
+            if rightEvaluated is not None and rightEvaluated.objectType is INT_TYPE:
+                return integerOperation(leftEvaluated.value, rightEvaluated.value)
+        elif isErrorValue(leftEvaluated):
+            return leftEvaluated
+        else:
+            rightEvaluated = right(env)
+        if isErrorValue(rightEvaluated):
+            return rightEvaluated
+        return evalInfixExpression(operator, leftEvaluated, rightEvaluated, env)
+    return evalIntegerInfix
+
+def compileIfExpression(node):
+    conditionalBlocks = [(compileTree(condition), compileBlockScope(consequence)) for condition, consequence in node.conditionalBlocks]
+    alternative = compileBlockScope(node.alternative) if node.alternative is not None else None
+    def evalIf(env):
+        for condition, consequence in conditionalBlocks:
+            conditionEvaluated = condition(env)
+            if isErrorValue(conditionEvaluated):
+                return conditionEvaluated
+            if isTruthy(conditionEvaluated):
+                return consequence(env)
+        if alternative is not None:
+            return alternative(env)
+        return NULL
+    return evalIf
+
+def compileBlockScope(block):
+    #a block running in a frame of its own, if it declares anything
+    compiled = compileTree(block)
+    slotCount = getattr(block, 'slotCount', 0)
+    if slotCount == 0:
+        return compiled
+    return lambda env: compiled(Frame(env, slotCount))
+
+def compileCallExpression(node):
+    function = compileTree(node.function)
+    arguments = compileExpressions(node.arguments)
+    def evalCall(env):
+        functionEvaluated = function(env)
+        if isErrorValue(functionEvaluated):
+            return functionEvaluated
+        args = arguments(env)
+        if len(args) == 1 and isErrorValue(args[0]):
+            return args[0]
+        return applyFunction(functionEvaluated, args)
+    return evalCall
+
+def applyFunction(function, args):
+    objectType = function.objectType
+    if objectType == OBJECT_TYPES.OBJECT_TYPE_FUNCTION or objectType == OBJECT_TYPES.OBJECT_TYPE_METHOD:
+        frame = functionFrame(function, args)
+        if objectType == OBJECT_TYPES.OBJECT_TYPE_METHOD:
+            frame.instance = function.instance
+        evaluated = compiledBody(function.body)(frame)
+        if isErrorValue(evaluated):
+            return evaluated
+        return unwrapReturnValue(evaluated)
+    elif objectType == OBJECT_TYPES.OBJECT_TYPE_BUILTIN_FUNCTION or objectType == OBJECT_TYPES.OBJECT_TYPE_BUILTIN_METHOD:
+        return function.func(args)
+    elif objectType == OBJECT_TYPES.OBJECT_TYPE_CLASS:
+        instance, constructor = function.createInstance()
+        if constructor:
+            frame = functionFrame(constructor, args)
+            frame.instance = instance
+            evaluated = compiledBody(constructor.body)(frame)
+            if isErrorValue(evaluated):
+                return evaluated
+        return instance
+    return newError("Cannot call: %s" % function.objectType)
+
+def functionFrame(function, args):
+    body = function.body
+    frame = Frame(function.env, body.slotCount)
+    slots = frame.slots
+    for slot, arg in zip(body.paramSlots, args):
+        slots[slot] = arg
+    return frame
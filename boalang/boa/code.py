@@ -57,14 +57,82 @@ OPGETINSTANCE = b'\x30'
 OPDEFCLASS = b'\x31'
 OPGETCLASS = b'\x32'
 
+#superinstructions, emitted only by the fusion pass in boa.optimize
+OPGETLOCALCONSTADD = b'\x33'
+OPGETGLOBALCONSTADD = b'\x34'
+OPGETLOCALCONSTGTJUMP = b'\x35'
+OPCONSTGETLOCALGTJUMP = b'\x36'
+OPGETGLOBALCONSTGTJUMP = b'\x37'
+OPCONSTGETGLOBALGTJUMP = b'\x38'
+OPCONSTGETATTR = b'\x39'
+OPGTJUMP = b'\x3A'
+OPEQJUMP = b'\x3B'
+OPTAILCALL = b'\x3C'
+OPGETNAMEDATTR = b'\x3D' #attribute name as a constant operand, so the VM can cache the lookup
+OPSETNAMEDATTR = b'\x3E'
+OPINVOKE = b'\x3F' #method call on a receiver, with the method name as a constant operand
+OPWIDE = b'\x40' #prefix: the operands of the next instruction are twice as wide
+OPIN = b'\x41'
+OPNOTIN = b'\x42'
+OPTAILINVOKE = b'\x43' #OPINVOKE whose result is returned straight away
+OPBOOLJUMPNOTTRUE = b'\x44' #OPJUMPNOTTRUE for an operand of and/or, which must be a boolean
+
+#register machine opcodes, run by RegisterVM. Operands are registers of the current
+#frame (r), constant (k), global, free, builtin and class indexes, counts and jump
+#targets. Results go to the first operand unless noted
+ROPMOVE = b'\x80' #r = r
+ROPLOADK = b'\x81' #r = constants[k]
+ROPLOADTRUE = b'\x82'
+ROPLOADFALSE = b'\x83'
+ROPLOADNULL = b'\x84'
+ROPGETGLOBAL = b'\x85'
+ROPSETGLOBAL = b'\x86' #globals[g] = r
+ROPGETFREE = b'\x87'
+ROPGETBUILTIN = b'\x88'
+ROPGETCLASS = b'\x89'
+ROPCURRENTCLOSURE = b'\x8A'
+ROPGETINSTANCE = b'\x8B'
+ROPADD = b'\x8C' #r = r + r
+ROPSUB = b'\x8D'
+ROPMUL = b'\x8E'
+ROPDIV = b'\x8F'
+ROPEQ = b'\x90'
+ROPNEQ = b'\x91'
+ROPGT = b'\x92'
+ROPGTEQ = b'\x93'
+ROPIN = b'\x94'
+ROPNOTIN = b'\x95'
+ROPMINUS = b'\x96' #r = -r
+ROPNOT = b'\x97'
+ROPJUMP = b'\x98'
+ROPJUMPNOTTRUE = b'\x99' #jumps if r is not truthy
+ROPEQJUMP = b'\x9A' #jumps unless r == r
+ROPNEQJUMP = b'\x9B'
+ROPGTJUMP = b'\x9C'
+ROPGTEQJUMP = b'\x9D'
+ROPARRAY = b'\x9E' #r = [the n registers from r on]
+ROPHASH = b'\x9F' #r = {the n registers from r on, as key/value pairs}
+ROPINDEX = b'\xA0' #r = r[r]
+ROPSETINDEX = b'\xA1' #r[r] = r
+ROPGETATTR = b'\xA2' #r = r.<name k>
+ROPSETATTR = b'\xA3' #r.<name k> = r
+ROPCLOSURE = b'\xA4' #r = closure of function k over the n registers from r on
+ROPCALL = b'\xA5' #r = r(the n registers from r on)
+ROPRETURN = b'\xA6' #returns r to the caller's result register
+ROPITER = b'\xA7' #r = iterator over r
+ROPITERNEXT = b'\xA8' #r = next from iterator r, or jump when it is exhausted
+ROPDEFCLASS = b'\xA9' #class index, name k, first r, constructors, methods
+ROPBOOLJUMPNOTTRUE = b'\xAA' #jumps if r is false, r must be a boolean
+
 class BoaNoSuchOpcodeError(Exception): pass
 
 class BoaOperandError(Exception): pass
 
 class Definition(object):
-    def __init__(self, name, operandWidths):
+    def __init__(self, name, operandWidths, isJump=False):
         self.name = name
         self.operandWidths = operandWidths
+        self.isJump = isJump #if true, the last operand is a jump target (bytecode offset)
 
 DEFINITIONS = DictLikeStruct({
     OPCONSTANT: Definition("OpConstant", [2]),
@@ -81,8 +149,8 @@ DEFINITIONS = DictLikeStruct({
     OPGTEQ: Definition("OpGtEq", []),
     OPMINUS: Definition("OpMinus", []),
     OPNOT: Definition("OpNot", []),
-    OPJUMPNOTTRUE: Definition("OpJumpNotTrue", [2]),
-    OPJUMP: Definition("OpJump", [2]),
+    OPJUMPNOTTRUE: Definition("OpJumpNotTrue", [2], isJump=True),
+    OPJUMP: Definition("OpJump", [2], isJump=True),
     OPNULL: Definition("OpNull", []),
     OPGETGLOBAL: Definition("OpGetGlobal", [2]),
     OPSETGLOBAL: Definition("OpSetGlobal", [2]),
@@ -114,6 +182,67 @@ DEFINITIONS = DictLikeStruct({
     OPGETINSTANCE: Definition("OpGetInstance", []),
     OPDEFCLASS: Definition("OpDefClass", [2, 2, 2]),
     OPGETCLASS: Definition("OpGetClass", [2]),
+    OPGETLOCALCONSTADD: Definition("OpGetLocalConstAdd", [1, 2]),
+    OPGETGLOBALCONSTADD: Definition("OpGetGlobalConstAdd", [2, 2]),
+    OPGETLOCALCONSTGTJUMP: Definition("OpGetLocalConstGtJump", [1, 2, 2], isJump=True),
+    OPCONSTGETLOCALGTJUMP: Definition("OpConstGetLocalGtJump", [2, 1, 2], isJump=True),
+    OPGETGLOBALCONSTGTJUMP: Definition("OpGetGlobalConstGtJump", [2, 2, 2], isJump=True),
+    OPCONSTGETGLOBALGTJUMP: Definition("OpConstGetGlobalGtJump", [2, 2, 2], isJump=True),
+    OPCONSTGETATTR: Definition("OpConstGetAttr", [2]),
+    OPGTJUMP: Definition("OpGtJump", [2], isJump=True),
+    OPEQJUMP: Definition("OpEqJump", [2], isJump=True),
+    OPTAILCALL: Definition("OpTailCall", [1]),
+    OPGETNAMEDATTR: Definition("OpGetNamedAttr", [2]),
+    OPSETNAMEDATTR: Definition("OpSetNamedAttr", [2]),
+    OPINVOKE: Definition("OpInvoke", [2, 1]),
+    OPWIDE: Definition("OpWide", []),
+    OPIN: Definition("OpIn", []),
+    OPNOTIN: Definition("OpNotIn", []),
+    OPTAILINVOKE: Definition("OpTailInvoke", [2, 1]),
+    OPBOOLJUMPNOTTRUE: Definition("OpBoolJumpNotTrue", [2], isJump=True),
+    ROPMOVE: Definition("ROpMove", [1, 1]),
+    ROPLOADK: Definition("ROpLoadK", [1, 2]),
+    ROPLOADTRUE: Definition("ROpLoadTrue", [1]),
+    ROPLOADFALSE: Definition("ROpLoadFalse", [1]),
+    ROPLOADNULL: Definition("ROpLoadNull", [1]),
+    ROPGETGLOBAL: Definition("ROpGetGlobal", [1, 2]),
+    ROPSETGLOBAL: Definition("ROpSetGlobal", [2, 1]),
+    ROPGETFREE: Definition("ROpGetFree", [1, 1]),
+    ROPGETBUILTIN: Definition("ROpGetBuiltin", [1, 1]),
+    ROPGETCLASS: Definition("ROpGetClass", [1, 2]),
+    ROPCURRENTCLOSURE: Definition("ROpCurrentClosure", [1]),
+    ROPGETINSTANCE: Definition("ROpGetInstance", [1]),
+    ROPADD: Definition("ROpAdd", [1, 1, 1]),
+    ROPSUB: Definition("ROpSub", [1, 1, 1]),
+    ROPMUL: Definition("ROpMul", [1, 1, 1]),
+    ROPDIV: Definition("ROpDiv", [1, 1, 1]),
+    ROPEQ: Definition("ROpEq", [1, 1, 1]),
+    ROPNEQ: Definition("ROpNeq", [1, 1, 1]),
+    ROPGT: Definition("ROpGt", [1, 1, 1]),
+    ROPGTEQ: Definition("ROpGtEq", [1, 1, 1]),
+    ROPIN: Definition("ROpIn", [1, 1, 1]),
+    ROPNOTIN: Definition("ROpNotIn", [1, 1, 1]),
+    ROPMINUS: Definition("ROpMinus", [1, 1]),
+    ROPNOT: Definition("ROpNot", [1, 1]),
+    ROPJUMP: Definition("ROpJump", [2], isJump=True),
+    ROPJUMPNOTTRUE: Definition("ROpJumpNotTrue", [1, 2], isJump=True),
+    ROPEQJUMP: Definition("ROpEqJump", [1, 1, 2], isJump=True),
+    ROPNEQJUMP: Definition("ROpNeqJump", [1, 1, 2], isJump=True),
+    ROPGTJUMP: Definition("ROpGtJump", [1, 1, 2], isJump=True),
+    ROPGTEQJUMP: Definition("ROpGtEqJump", [1, 1, 2], isJump=True),
+    ROPARRAY: Definition("ROpArray", [1, 1, 2]),
+    ROPHASH: Definition("ROpHash", [1, 1, 2]),
+    ROPINDEX: Definition("ROpIndex", [1, 1, 1]),
+    ROPSETINDEX: Definition("ROpSetIndex", [1, 1, 1]),
+    ROPGETATTR: Definition("ROpGetAttr", [1, 1, 2]),
+    ROPSETATTR: Definition("ROpSetAttr", [1, 2, 1]),
+    ROPCLOSURE: Definition("ROpClosure", [1, 2, 1, 1]),
+    ROPCALL: Definition("ROpCall", [1, 1, 1, 1]),
+    ROPRETURN: Definition("ROpReturn", [1]),
+    ROPITER: Definition("ROpIter", [1, 1]),
+    ROPITERNEXT: Definition("ROpIterNext", [1, 1, 2], isJump=True),
+    ROPDEFCLASS: Definition("ROpDefClass", [2, 2, 1, 1, 1]),
+    ROPBOOLJUMPNOTTRUE: Definition("ROpBoolJumpNotTrue", [1, 2], isJump=True),
 })
 
 def lookupOpcode(b):
@@ -121,30 +250,62 @@ def lookupOpcode(b):
         raise BoaNoSuchOpcodeError(b)
     return DEFINITIONS[b]
 
-def makeInstr(opcode, *operands):
+def operandWidths(definition, wide):
+    if wide:
+        return [w*2 for w in definition.operandWidths]
+    return definition.operandWidths
+
+def needsWide(definition, operands):
+    for o, w in zip(operands, definition.operandWidths):
+        if o >= 1 << (8*w):
+            return True
+    return False
+
+def instrSize(definition, wide):
+    if wide:
+        return 2 + 2*sum(definition.operandWidths)
+    return 1 + sum(definition.operandWidths)
+
+def encodeInstr(buffer, opcode, operands):
+    #appends the encoded instruction to a bytearray. Operands too large for their
+    #width get an OPWIDE prefix, which doubles the width of all of them
     definition = lookupOpcode(opcode)
     if len(operands) != len(definition.operandWidths):
         raise BoaOperandError("Operand number mismatch. Got %d, want %d" % (len(operands), len(definition.operandWidths)))
-    instructionLen = 1
-    for w in definition.operandWidths:
-        instructionLen += w
-    offset = 1
-    byteArr = bytearray(opcode)
-    for i, o in enumerate(operands):
-        w = definition.operandWidths[i]
-        oBytes = (o).to_bytes(w, byteorder='big')
-        byteArr += oBytes
-        offset += w
+    wide = needsWide(definition, operands)
+    if wide:
+        buffer += OPWIDE
+    buffer += opcode
+    for o, w in zip(operands, operandWidths(definition, wide)):
+        try:
+            buffer += o.to_bytes(w, byteorder='big')
+        except OverflowError:
+            raise BoaOperandError("Operand too large for %s: %d" % (definition.name, o))
+
+def makeInstr(opcode, *operands):
+    byteArr = bytearray()
+    encodeInstr(byteArr, opcode, operands)
     return bytes(byteArr)
 
+def readInstr(instr, i):
+    #reads the instruction at offset i, including any OPWIDE prefix.
+    #returns its definition, operands and the offset of the next instruction
+    wide = instr[i] == OPWIDE[0]
+    if wide:
+        i += 1
+        if i >= len(instr) or instr[i] == OPWIDE[0]:
+            raise BoaOperandError("OpWide prefix without an instruction")
+    definition = lookupOpcode(bytes(instr[i:i+1]))
+    operands, read = readOperands(definition, instr[i+1:], wide)
+    return definition, operands, i + 1 + read
+
 def formatInstrs(instr):
     i = 0
     formatted = []
     while i < len(instr):
-        definition = lookupOpcode(bytes(instr[i:i+1]))
-        operands, read = readOperands(definition, instr[i+1:])
+        definition, operands, next = readInstr(instr, i)
         formatted.append('%04d %s\n' % (i, formatInstr(definition, operands)))
-        i = i + 1 + read
+        i = next
     return ''.join(formatted)
 
 def formatInstr(definition, operands):
@@ -153,11 +314,64 @@ def formatInstr(definition, operands):
         raise BoaOperandError("Operand number mismatch. Got %d, want %d" % (len(operands), len(definition.operandWidths)))
     return "%s%s%s" % (definition.name, ' ' if operands else '', ' '.join(['%d' % operand for operand in operands]))
 
-def readOperands(definition, instr):
+def readOperands(definition, instr, wide=False):
     operands = []
     offset = 0
-    for i, w in enumerate(definition.operandWidths):
+    for i, w in enumerate(operandWidths(definition, wide)):
         val = readUint(instr[offset:offset+w], w)
         offset += w
         operands.append(val)
     return operands, offset
+
+def decodeInstrs(instr):
+    #decodes raw bytecode into a list of (opcode index, operand tuple) pairs.
+    #jump targets are resolved from byte offsets to indexes in the returned list.
+    #OPWIDE prefixes are folded into the instruction they widen
+    offsets = {}
+    decoded = []
+    i = 0
+    instrLen = len(instr)
+    while i < instrLen:
+        offsets[i] = len(decoded)
+        op = instr[i+1] if instr[i] == OPWIDE[0] else instr[i]
+        definition, operands, i = readInstr(instr, i)
+        decoded.append((op, definition, operands))
+    offsets[i] = len(decoded)
+
+    result = []
+    for op, definition, operands in decoded:
+        if definition.isJump:
+            target = operands[-1]
+            if target not in offsets:
+                raise BoaOperandError("Jump target not at instruction boundary: %d" % target)
+            operands[-1] = offsets[target]
+        result.append((op, tuple(operands)))
+    return result
+
+def assembleInstrs(decoded):
+    #inverse of decodeInstrs. returns a list of encoded instructions, with jump
+    #targets converted back from instruction indexes to byte offsets. Widening a
+    #jump moves the instructions after it, which can make other jumps need widening,
+    #so layout is repeated until no more instructions widen
+    definitions = [lookupOpcode(bytes([op])) for op, operands in decoded]
+    wide = [needsWide(definition, operands) for definition, (op, operands) in zip(definitions, decoded)]
+    while True:
+        offsets = []
+        pos = 0
+        for definition, isWide in zip(definitions, wide):
+            offsets.append(pos)
+            pos += instrSize(definition, isWide)
+        offsets.append(pos)
+
+        resolved = []
+        widened = False
+        for i, (definition, (op, operands)) in enumerate(zip(definitions, decoded)):
+            if definition.isJump:
+                operands = tuple(operands[:-1]) + (offsets[operands[-1]],)
+                if not wide[i] and needsWide(definition, operands):
+                    wide[i] = widened = True
+            resolved.append((op, operands))
+        if not widened:
+            break
+
+    return [makeInstr(bytes([op]), *operands) for op, operands in resolved]
@@ -1,6 +1,9 @@
+import copy
+
 from .util import DictLikeStruct
 
 from .ast import (
+    Node,
     NODE_TYPE_PROGRAM,
     NODE_TYPE_STATEMENT,
     NODE_TYPE_EXPRESSION,
@@ -35,12 +38,20 @@ from .token import (
     TOKEN_TYPES,
 )
 from .object import (
+    OBJECT_TYPES,
     newInteger,
     newString,
     newCompiledFunction,
+    internConstant,
+    SharedBoaInteger,
 )
 from .code import (
-    makeInstr,
+    OPWIDE,
+    encodeInstr,
+    lookupOpcode,
+    operandWidths,
+    decodeInstrs,
+    assembleInstrs,
     OPCONSTANT,
     OPADD,
     OPSUB,
@@ -57,6 +68,7 @@ from .code import (
     OPNOT,
     OPJUMP,
     OPJUMPNOTTRUE,
+    OPBOOLJUMPNOTTRUE,
     OPNULL,
     OPSETGLOBAL,
     OPGETGLOBAL,
@@ -87,6 +99,11 @@ from .code import (
     OPGETINSTANCE,
     OPDEFCLASS,
     OPGETCLASS,
+    OPGETNAMEDATTR,
+    OPSETNAMEDATTR,
+    OPINVOKE,
+    OPIN,
+    OPNOTIN,
 )
 from .symbol import (
     SymbolTable,
@@ -103,17 +120,33 @@ from .builtins import (
     BUILTIN_FUNCTION_LIST,
     BUILTIN_FUNCTIONS,
 )
+from .optimize import (
+    fuseSuperinstructions,
+    markTailCalls,
+    optimizeInstrs,
+    ASTOptimizer,
+    findConstantNames,
+    inlinableBody,
+    freeNames,
+    isBooleanExpression,
+)
 
 class BoaCompilerError(Exception): pass
 
 class Bytecode(object):
-    def __init__(self, instructions, constants):
+    def __init__(self, instructions, constants, numGlobals=None, numClassDefs=None):
         self.instructions = instructions #bytecode instructions
         self.constants = constants #BoaObjects
+        self.numGlobals = numGlobals #None if unknown, e.g. for bytecode read from a file
+        self.numClassDefs = numClassDefs
+
+        self._instr = None
 
     @property
     def instr(self):
-        return b''.join(self.instructions)
+        if self._instr is None:
+            self._instr = b''.join(self.instructions)
+        return self._instr
 
 class EmittedInstruction(object):
     def __init__(self, opcode, position):
@@ -121,17 +154,153 @@ class EmittedInstruction(object):
         self.position = position
 
 class CompilationScope(object):
-    def __init__(self, instructions, lastInstruction, previousInstruction):
-        self.instructions = instructions #bytecode instructions
-        self.lastInstruction = lastInstruction #EmittedInstruction
-        self.previousInstruction = previousInstruction #EmittedInstruction
-
-class Compiler(object):
     def __init__(self):
+        self.buffer = bytearray() #encoded instructions
+        self.positions = [] #byte offset of each instruction in buffer
+        self.lastInstruction = None #EmittedInstruction
+        self.previousInstruction = None #EmittedInstruction
+        self.loops = [] #LoopContexts of the inlined loops being compiled in this scope
+        self.farJumps = {} #instruction index -> jump target too large for the operand it was patched into
+
+    @property
+    def instructions(self):
+        #one bytes object per instruction
+        if self.farJumps:
+            return self.relayout()
+        ends = self.positions[1:] + [len(self.buffer)]
+        return [bytes(self.buffer[start:end]) for start, end in zip(self.positions, ends)]
+
+    @property
+    def instr(self):
+        if self.farJumps:
+            return b''.join(self.relayout())
+        return bytes(self.buffer)
+
+    def relayout(self):
+        #far jumps can't be widened in place, so the buffer is decoded, the jumps
+        #pointed at their real targets and everything assembled again
+        decoded = decodeInstrs(bytes(self.buffer))
+        indexes = dict((pos, i) for i, pos in enumerate(self.positions))
+        indexes[len(self.buffer)] = len(self.positions)
+        for index, target in self.farJumps.items():
+            op, operands = decoded[index]
+            decoded[index] = (op, operands[:-1] + (indexes[target],))
+        return assembleInstrs(decoded)
+
+class LoopContext(object):
+    def __init__(self, continuePos):
+        self.continuePos = continuePos #bytecode position continue jumps to
+        self.breakPositions = [] #positions of the jumps emitted for break, patched after the loop
+
+def hasBranchLoopExit(blockStatement):
+    #True if a break/continue of this loop sits inside an if branch. Such a branch
+    #runs in its own block frame, so the exit can't be compiled as a plain jump
+    def visit(node, inBranch):
+        if isinstance(node, (list, tuple)):
+            return any(visit(n, inBranch) for n in node)
+        if not isinstance(node, Node):
+            return False
+        if node.nodeType == NODE_TYPE_STATEMENT:
+            if node.statementType in [STATEMENT_TYPE_BREAK, STATEMENT_TYPE_CONTINUE]:
+                return inBranch
+            if node.statementType in [STATEMENT_TYPE_WHILE, STATEMENT_TYPE_FOR]:
+                return False
+        elif node.nodeType == NODE_TYPE_EXPRESSION:
+            if node.expressionType == EXPRESSION_TYPE_FUNC_LIT:
+                return False
+            if node.expressionType == EXPRESSION_TYPE_IF:
+                inBranch = True
+        return any(visit(child, inBranch) for child in vars(node).values())
+    return visit(blockStatement.statements, False)
+
+def hasExpressionLoopExit(blockStatement):
+    #True if a break/continue of this loop sits in an if used as a value, e.g. 1 + if (c) { break; }.
+    #Inlined, the exit would jump out with the operands pending around the if left on the stack
+    def visit(node, inExpression):
+        if isinstance(node, (list, tuple)):
+            return any(visit(n, inExpression) for n in node)
+        if not isinstance(node, Node):
+            return False
+        if node.nodeType == NODE_TYPE_STATEMENT:
+            if node.statementType in [STATEMENT_TYPE_BREAK, STATEMENT_TYPE_CONTINUE]:
+                return inExpression
+            if node.statementType in [STATEMENT_TYPE_WHILE, STATEMENT_TYPE_FOR]:
+                return False
+            if node.statementType == STATEMENT_TYPE_EXPRESSION and node.expression.expressionType == EXPRESSION_TYPE_IF:
+                #an if statement's value is only popped, its branches stay in statement position
+                ifExpression = node.expression
+                return any(visit(condition, True) or visit(consequence, inExpression) for condition, consequence in ifExpression.conditionalBlocks) or \
+                        visit(ifExpression.alternative, inExpression)
+        elif node.nodeType == NODE_TYPE_EXPRESSION:
+            if node.expressionType == EXPRESSION_TYPE_FUNC_LIT:
+                return False
+            if node.expressionType == EXPRESSION_TYPE_IF:
+                inExpression = True
+        return any(visit(child, inExpression) for child in vars(node).values())
+    return visit(blockStatement.statements, False)
+
+NAME_CONSTANT = 'NAME' #constantIndexes key type of names added by addName
+
+def constantKey(constant):
+    #constants with the same key are interchangeable. None if the constant can't be shared.
+    #String literals and ints outside the small int cache aren't shared, since Boa code
+    #can set attributes on them
+    if isinstance(constant, SharedBoaInteger):
+        return (constant.objectType, constant.value)
+    if constant.objectType == OBJECT_TYPES.OBJECT_TYPE_COMPILED_FUNCTION:
+        return (constant.objectType, constant.instr, constant.numLocals, constant.numParameters)
+    return None
+
+class InlineCandidate(object):
+    def __init__(self, function, body, symbolTable):
+        self.function = function #FunctionLiteral
+        self.body = body #the expression a call evaluates to
+        #what each free name in the body referred to where the function was defined
+        self.freeSymbols = dict((name, symbolTable.definition(name)) for name in freeNames(function, body))
+
+class ConstantPool(object):
+    #constant handling shared by the compilers. Subclasses set up constants and constantIndexes
+    def addConstant(self, c):
+        #equal small ints and compiled functions share one constant
+        key = constantKey(c)
+        if key is None:
+            self.constants.append(c)
+            return len(self.constants) - 1
+        index = self.constantIndexes.get(key)
+        if index is None:
+            self.constants.append(c)
+            index = self.constantIndexes[key] = len(self.constants) - 1
+        return index
+
+    def addName(self, name):
+        #attribute, method and class names are only read by the VM, never handed to
+        #Boa code, so equal names share one interned string constant
+        key = (NAME_CONSTANT, name)
+        index = self.constantIndexes.get(key)
+        if index is None:
+            self.constants.append(internConstant(newString(name)))
+            index = self.constantIndexes[key] = len(self.constants) - 1
+        return index
+
+class Compiler(ConstantPool):
+    def __init__(self, superinstructions=False, inlineLoops=False, inlineBranches=False, tailCalls=False, attributeCaches=False, invokeMethods=False, optimizationLevel=0, inlineFunctions=False):
         self.constants = [] #BoaObjects
+        self.constantIndexes = {} #constantKey -> index in constants
         self.symbolTable = SymbolTable()
-        self.scopes = [CompilationScope([], None, None)] #CompilationScopes
+        self.scopes = [CompilationScope()] #CompilationScopes
         self.scopeIndex = 0
+        self.superinstructions = superinstructions #run the fusion pass in bytecode()
+        self.fusionCounts = {} #superinstruction name -> times fused, filled in by bytecode()
+        self.inlineLoops = inlineLoops #compile loop bodies into the enclosing frame instead of closures
+        self.inlineBranches = inlineBranches #same for the branches of if expressions
+        self.tailCalls = tailCalls #emit OPTAILCALL/OPTAILINVOKE for calls whose result is returned directly
+        self.attributeCaches = attributeCaches #emit attribute opcodes with the name as an operand, which the VM caches per site
+        self.invokeMethods = invokeMethods #compile obj.method(args) to OPINVOKE instead of an attribute get and a call
+        self.optimizationLevel = optimizationLevel #1: fold constants and drop dead code, 2: also propagate constants and clean up jumps
+        self.inlineFunctions = inlineFunctions #compile calls to small functions bound by a let as their body
+        self.constantNames = set() #names bound once and never reassigned, the only functions considered for inlining
+        self.inlineCandidates = {} #id of a function's symbol -> InlineCandidate
+        self.inlining = [] #InlineCandidates being expanded, so mutually recursive ones stop
 
         for index, fname in enumerate(BUILTIN_FUNCTION_LIST):
             self.symbolTable.defineBuiltin(index, fname)
@@ -141,6 +310,10 @@ class Compiler(object):
         compiler = Compiler()
         compiler.symbolTable = symbolTable
         compiler.constants = constants
+        for index, constant in enumerate(constants):
+            key = constantKey(constant)
+            if key is not None:
+                compiler.constantIndexes.setdefault(key, index)
         return compiler
 
     def loadSymbol(self, s):
@@ -181,17 +354,22 @@ class Compiler(object):
         else:
             numConstructors = 0
 
-        self.emit(OPCONSTANT, self.addConstant(newString(classStatement.name)))
+        self.emit(OPCONSTANT, self.addName(classStatement.name))
 
         self.emit(OPDEFCLASS, classIndex, numConstructors*2, len(classStatement.methodStatements)*2)
 
     def compileMethodStatement(self, methodStatement):
-        self.emit(OPCONSTANT, self.addConstant(newString(methodStatement.name)))
+        self.emit(OPCONSTANT, self.addName(methodStatement.name))
         self.compileFunction(None, methodStatement.parameters, methodStatement.body)
 
     def compile(self, node):
         nodeType = node.nodeType
         if nodeType == NODE_TYPE_PROGRAM:
+            if self.optimizationLevel >= 1:
+                optimizer = ASTOptimizer(propagateConstants=self.optimizationLevel >= 2)
+                node = optimizer.optimizeProgram(copy.deepcopy(node))
+            if self.inlineFunctions:
+                self.constantNames = findConstantNames(node)
             classStatements = [statement for statement in node.statements
                                 if statement.statementType == STATEMENT_TYPE_CLASS]
             otherStatements = [statement for statement in node.statements
@@ -215,6 +393,8 @@ class Compiler(object):
                 symbol = self.symbolTable.define(node.identifier.value)
                 self.compile(node.value)
                 self.assignSymbol(symbol)
+                if self.inlineFunctions:
+                    self.addInlineCandidate(symbol, node)
                 #if symbol.scope == GLOBAL_SCOPE:
                 #    self.emit(OPSETGLOBAL, symbol.index)
                 #else:
@@ -239,17 +419,19 @@ class Compiler(object):
                     #    self.emit(OPSETGLOBAL, symbol.index)
                     #else:
                     #    self.emit(OPSETLOCAL, symbol.index)
+            elif stmtType == STATEMENT_TYPE_FOR and self.canInlineLoop(node):
+                self.compileInlineFor(node)
             elif stmtType == STATEMENT_TYPE_FOR:
                 self.compile(node.iterable)
                 self.emit(OPITER)
-                tmpIteratorSymbol = self.symbolTable.define("__temp__%02d" % self.symbolTable.numDefinitions)
+                tmpIteratorSymbol = self.symbolTable.define("__temp__%02d" % self.symbolTable.slotOwner().numDefinitions)
                 self.assignSymbol(tmpIteratorSymbol)
                 #if tmpIteratorSymbol.scope == GLOBAL_SCOPE:
                 #    self.emit(OPSETGLOBAL, tmpIteratorSymbol.index)
                 #else:
                 #    self.emit(OPSETLOCAL, tmpIteratorSymbol.index)
 
-                startPos = self.getInstrBytecodePos(len(self.currentInstructions()))
+                startPos = self.currentBytecodePos()
 
                 self.loadSymbol(tmpIteratorSymbol)
                 #if tmpIteratorSymbol.scope == GLOBAL_SCOPE:
@@ -266,11 +448,10 @@ class Compiler(object):
 
                 freeSymbols = self.symbolTable.freeSymbols
                 numLocals = self.symbolTable.numDefinitions
-                instructions = self.leaveScope()
+                compiledInstructions = self.optimizedInstructions(self.leaveScope())
                 for freeSymbol in freeSymbols:
                     self.loadSymbol(freeSymbol)
 
-                compiledInstructions = b''.join(instructions)
                 compiledFn = newCompiledFunction(compiledInstructions, numLocals, 1)
                 self.emit(OPCLOSURE, self.addConstant(compiledFn), len(freeSymbols))
 
@@ -284,10 +465,12 @@ class Compiler(object):
                 self.emit(OPLOOPCALL, 1)
                 self.emit(OPJUMP, startPos)
 
-                afterLoopCallPos = self.getInstrBytecodePos(len(self.currentInstructions()))
+                afterLoopCallPos = self.currentBytecodePos()
                 self.changeOperand(jumpNotTruePos, afterLoopCallPos)
+            elif stmtType == STATEMENT_TYPE_WHILE and self.canInlineLoop(node):
+                self.compileInlineWhile(node)
             elif stmtType == STATEMENT_TYPE_WHILE:
-                startPos = self.getInstrBytecodePos(len(self.currentInstructions()))
+                startPos = self.currentBytecodePos()
                 condition = node.condition
                 self.compile(condition)
                 jumpNotTruePos = self.emit(OPJUMPNOTTRUE, 9999)
@@ -298,22 +481,29 @@ class Compiler(object):
 
                 freeSymbols = self.symbolTable.freeSymbols
                 numLocals = self.symbolTable.numDefinitions
-                instructions = self.leaveScope()
+                compiledInstructions = self.optimizedInstructions(self.leaveScope())
                 for freeSymbol in freeSymbols:
                     self.loadSymbol(freeSymbol)
 
-                compiledInstructions = b''.join(instructions)
                 compiledFn = newCompiledFunction(compiledInstructions, numLocals, 0)
                 self.emit(OPCLOSURE, self.addConstant(compiledFn), len(freeSymbols))
                 self.emit(OPLOOPCALL, 0)
                 self.emit(OPJUMP, startPos)
 
-                afterLoopCallPos = self.getInstrBytecodePos(len(self.currentInstructions()))
+                afterLoopCallPos = self.currentBytecodePos()
                 self.changeOperand(jumpNotTruePos, afterLoopCallPos)
             elif stmtType == STATEMENT_TYPE_CONTINUE:
-                self.emit(OPCONTINUE)
+                loops = self.currentScope().loops
+                if loops:
+                    self.emit(OPJUMP, loops[-1].continuePos)
+                else:
+                    self.emit(OPCONTINUE)
             elif stmtType == STATEMENT_TYPE_BREAK:
-                self.emit(OPBREAK)
+                loops = self.currentScope().loops
+                if loops:
+                    loops[-1].breakPositions.append(self.emit(OPJUMP, 9999))
+                else:
+                    self.emit(OPBREAK)
             elif stmtType == STATEMENT_TYPE_RETURN:
                 if node.value:
                     self.compile(node.value)
@@ -356,6 +546,13 @@ class Compiler(object):
                 self.emit(OPNULL)
             elif exprType == EXPRESSION_TYPE_FUNC_LIT:
                 self.compileFunction(node.name, node.parameters, node.body)
+            elif exprType == EXPRESSION_TYPE_CALL and self.isMethodCall(node):
+                self.compile(node.function.object)
+                for arg in node.arguments:
+                    self.compile(arg)
+                self.emit(OPINVOKE, self.addName(node.function.property.value), len(node.arguments))
+            elif exprType == EXPRESSION_TYPE_CALL and self.canInlineCall(node):
+                self.compileInlineCall(node)
             elif exprType == EXPRESSION_TYPE_CALL:
                 self.compile(node.function)
                 for arg in node.arguments:
@@ -387,34 +584,11 @@ class Compiler(object):
                     self.compile(condition)
                     jumpNotTruePos = self.emit(OPJUMPNOTTRUE, 9999)
 
-                    self.enterScope()
-                    #posPreCompilation = len(self.currentInstructions())-1
-                    self.compile(consequence)
-                    if self.lastInstructionIs(OPPOP):
-                        #lastPos = self.currentScope().lastInstruction.position
-                        #self.replaceInstruction(lastPos, makeInstr(OPBLOCKRETURN))
-                        #self.currentScope().lastInstruction.opcode = OPBLOCKRETURN
-                        self.removeLast()
-                        self.emit(OPBLOCKRETURN)
-
-                    if not self.lastInstructionIs(OPBLOCKRETURN):
-                        self.emit(OPNULL)
-                        self.emit(OPBLOCKRETURN)
-
-                    freeSymbols = self.symbolTable.freeSymbols
-                    numLocals = self.symbolTable.numDefinitions
-                    instructions = self.leaveScope()
-                    for freeSymbol in freeSymbols:
-                        self.loadSymbol(freeSymbol)
-
-                    compiledInstructions = b''.join(instructions)
-                    compiledFn = newCompiledFunction(compiledInstructions, numLocals, 0)
-                    self.emit(OPCLOSURE, self.addConstant(compiledFn), len(freeSymbols))
-                    self.emit(OPBLOCKCALL)
+                    self.compileBranch(consequence)
 
                     jumpPos = self.emit(OPJUMP, 9999)
                     jumpPositions.append(jumpPos)
-                    afterConsequencePos = self.getInstrBytecodePos(len(self.currentInstructions()))
+                    afterConsequencePos = self.currentBytecodePos()
                     self.changeOperand(jumpNotTruePos, afterConsequencePos)
 
                 if not node.alternative:
@@ -426,28 +600,10 @@ class Compiler(object):
                     #    self.removeLast()
                     #if len(self.currentInstructions())-1 == posPreCompilation:
                     #    self.emit(OPNULL)
-                    self.enterScope()
-                    self.compile(node.alternative)
-                    if self.lastInstructionIs(OPPOP):
-                        self.removeLast()
-                        self.emit(OPBLOCKRETURN)
-
-                    if not self.lastInstructionIs(OPBLOCKRETURN):
-                        self.emit(OPNULL)
-                        self.emit(OPBLOCKRETURN)
-
-                    freeSymbols = self.symbolTable.freeSymbols
-                    numLocals = self.symbolTable.numDefinitions
-                    instructions = self.leaveScope()
-                    for freeSymbol in freeSymbols:
-                        self.loadSymbol(freeSymbol)
-
-                    compiledInstructions = b''.join(instructions)
-                    compiledFn = newCompiledFunction(compiledInstructions, numLocals, 0)
-                    self.emit(OPCLOSURE, self.addConstant(compiledFn), len(freeSymbols))
-                    self.emit(OPBLOCKCALL)
-
-                afterAlternativePos = self.getInstrBytecodePos(len(self.currentInstructions()))
+                    #an if whose conditions were all folded away always runs its else branch
+                    self.compileBranch(node.alternative, inline=not node.conditionalBlocks)
+
+                afterAlternativePos = self.currentBytecodePos()
                 for jumpPos in jumpPositions:
                     self.changeOperand(jumpPos, afterAlternativePos)
             elif exprType == EXPRESSION_TYPE_PREFIX:
@@ -469,6 +625,9 @@ class Compiler(object):
                     self.compile(node.left)
                     self.emit(OPGTEQ)
                     return
+                elif node.operator in [TOKEN_TYPES.TOKEN_TYPE_AND.value, TOKEN_TYPES.TOKEN_TYPE_OR.value]:
+                    self.compileShortCircuit(node)
+                    return
                 self.compile(node.left)
                 self.compile(node.right)
                 if node.operator == TOKEN_TYPES.TOKEN_TYPE_PLUS.value:
@@ -487,9 +646,183 @@ class Compiler(object):
                     self.emit(OPGT)
                 elif node.operator == TOKEN_TYPES.TOKEN_TYPE_GTEQ.value:
                     self.emit(OPGTEQ)
+                elif node.operator == TOKEN_TYPES.TOKEN_TYPE_IN.value:
+                    self.emit(OPIN)
+                elif node.operator == TOKEN_TYPES.TOKEN_TYPE_NOTIN.value:
+                    self.emit(OPNOTIN)
                 else:
                     raise BoaCompilerError("Unknown infix operator: %s" % node.operator)
 
+    def compileShortCircuit(self, node):
+        #a and b:                     a or b:
+        #   a                            a
+        #   JNT false                    JNT right
+        #   b                            JUMP true
+        #   JNT false                 right:
+        #   TRUE                         b
+        #   JUMP end                     JNT false
+        #false:                       true:
+        #   FALSE                        TRUE
+        #end:                            JUMP end
+        #                             false:
+        #                                FALSE
+        #                             end:
+        #the right operand only runs when the left one doesn't decide the result. Like boaEval,
+        #operands must be booleans: JNT is OPBOOLJUMPNOTTRUE unless the operand can't be anything else
+        self.compile(node.left)
+        leftJumpPos = self.emitLogicalJump(node.left)
+        if node.operator == TOKEN_TYPES.TOKEN_TYPE_OR.value:
+            trueJumpPos = self.emit(OPJUMP, 9999)
+            self.changeOperand(leftJumpPos, self.currentBytecodePos())
+            self.compile(node.right)
+            rightJumpPos = self.emitLogicalJump(node.right)
+            self.changeOperand(trueJumpPos, self.currentBytecodePos())
+            falseJumpPositions = [rightJumpPos]
+        else:
+            self.compile(node.right)
+            rightJumpPos = self.emitLogicalJump(node.right)
+            falseJumpPositions = [leftJumpPos, rightJumpPos]
+        self.emit(OPTRUE)
+        endJumpPos = self.emit(OPJUMP, 9999)
+        for jumpPos in falseJumpPositions:
+            self.changeOperand(jumpPos, self.currentBytecodePos())
+        self.emit(OPFALSE)
+        self.changeOperand(endJumpPos, self.currentBytecodePos())
+
+    def emitLogicalJump(self, operand):
+        return self.emit(OPJUMPNOTTRUE if isBooleanExpression(operand) else OPBOOLJUMPNOTTRUE, 9999)
+
+    def isMethodCall(self, callExpression):
+        #obj.method(args)
+        function = callExpression.function
+        return self.invokeMethods and function.expressionType == EXPRESSION_TYPE_GET and \
+            function.property.expressionType == EXPRESSION_TYPE_IDENT
+
+    def addInlineCandidate(self, symbol, letStatement):
+        function = letStatement.value
+        if letStatement.identifier.value not in self.constantNames or function.expressionType != EXPRESSION_TYPE_FUNC_LIT:
+            return
+        body = inlinableBody(function)
+        if body is None:
+            return
+        self.inlineCandidates[id(symbol)] = InlineCandidate(function, body, self.symbolTable)
+
+    def canInlineCall(self, callExpression):
+        #the callee must be an inline candidate, called with the right number of
+        #arguments, from a scope where every free name in its body still refers
+        #to what it did where the function was defined
+        function = callExpression.function
+        if not self.inlineCandidates or function.expressionType != EXPRESSION_TYPE_IDENT:
+            return False
+        candidate = self.inlineCandidates.get(id(self.symbolTable.definition(function.value)))
+        if candidate is None or candidate in self.inlining:
+            return False
+        if len(callExpression.arguments) != len(candidate.function.parameters):
+            return False
+        return all(self.symbolTable.definition(name) is symbol for name, symbol in candidate.freeSymbols.items())
+
+    def compileInlineCall(self, callExpression):
+        #arguments are evaluated in the caller's scope and stored in new slots of the
+        #current frame, which the inlined body sees as its parameters
+        candidate = self.inlineCandidates[id(self.symbolTable.definition(callExpression.function.value))]
+        for arg in callExpression.arguments:
+            self.compile(arg)
+        self.symbolTable = SymbolTable(outer=self.symbolTable, isInline=True)
+        symbols = [self.symbolTable.define(param.value) for param in candidate.function.parameters]
+        for symbol in reversed(symbols):
+            self.assignSymbol(symbol)
+        self.inlining.append(candidate)
+        self.compile(candidate.body)
+        self.inlining.pop()
+        self.symbolTable = self.symbolTable.outer
+
+    def compileBranch(self, block, inline=False):
+        #compiles an if branch so that it leaves its value on the stack
+        if self.inlineBranches or inline:
+            self.symbolTable = SymbolTable(outer=self.symbolTable, isInline=True)
+            self.compile(block)
+            if self.lastInstructionIs(OPPOP):
+                self.removeLast()
+            else:
+                self.emit(OPNULL)
+            self.symbolTable = self.symbolTable.outer
+            return
+
+        self.enterScope()
+        self.compile(block)
+        if self.lastInstructionIs(OPPOP):
+            self.removeLast()
+            self.emit(OPBLOCKRETURN)
+
+        if not self.lastInstructionIs(OPBLOCKRETURN):
+            self.emit(OPNULL)
+            self.emit(OPBLOCKRETURN)
+
+        freeSymbols = self.symbolTable.freeSymbols
+        numLocals = self.symbolTable.numDefinitions
+        compiledInstructions = self.optimizedInstructions(self.leaveScope())
+        for freeSymbol in freeSymbols:
+            self.loadSymbol(freeSymbol)
+
+        compiledFn = newCompiledFunction(compiledInstructions, numLocals, 0)
+        self.emit(OPCLOSURE, self.addConstant(compiledFn), len(freeSymbols))
+        self.emit(OPBLOCKCALL)
+
+    def canInlineLoop(self, loopStatement):
+        #with inline branches a break/continue in an if statement needs no frame to unwind,
+        #but one in an if used as a value would leave the operands around it on the stack
+        if not self.inlineLoops:
+            return False
+        if self.inlineBranches and not hasExpressionLoopExit(loopStatement.blockStatement):
+            return True
+        return not hasBranchLoopExit(loopStatement.blockStatement)
+
+    def compileInlineWhile(self, node):
+        startPos = self.currentBytecodePos()
+        self.compile(node.condition)
+        jumpNotTruePos = self.emit(OPJUMPNOTTRUE, 9999)
+
+        loop = self.enterInlineLoop(startPos)
+        self.compile(node.blockStatement)
+        self.emit(OPJUMP, startPos)
+        self.leaveInlineLoop(loop, jumpNotTruePos)
+
+    def compileInlineFor(self, node):
+        self.compile(node.iterable)
+        self.emit(OPITER)
+        tmpIteratorSymbol = self.symbolTable.define("__temp__%02d" % self.symbolTable.slotOwner().numDefinitions)
+        self.assignSymbol(tmpIteratorSymbol)
+
+        startPos = self.currentBytecodePos()
+        self.loadSymbol(tmpIteratorSymbol)
+        self.emit(OPITERHASNEXT)
+        jumpNotTruePos = self.emit(OPJUMPNOTTRUE, 9999)
+
+        loop = self.enterInlineLoop(startPos)
+        iteratorSymbol = self.symbolTable.define(node.iterator.value)
+        self.loadSymbol(tmpIteratorSymbol)
+        self.emit(OPITERNEXT)
+        self.assignSymbol(iteratorSymbol)
+        self.compile(node.blockStatement)
+        self.emit(OPJUMP, startPos)
+        self.leaveInlineLoop(loop, jumpNotTruePos)
+
+    def enterInlineLoop(self, startPos):
+        #the loop body gets its own symbol table for block scoping, but its slots
+        #are allocated in the enclosing frame
+        self.symbolTable = SymbolTable(outer=self.symbolTable, isInline=True)
+        loop = LoopContext(startPos)
+        self.currentScope().loops.append(loop)
+        return loop
+
+    def leaveInlineLoop(self, loop, jumpNotTruePos):
+        self.currentScope().loops.pop()
+        self.symbolTable = self.symbolTable.outer
+        afterLoopPos = self.currentBytecodePos()
+        self.changeOperand(jumpNotTruePos, afterLoopPos)
+        for breakPos in loop.breakPositions:
+            self.changeOperand(breakPos, afterLoopPos)
+
     def compileSetProperty(self, property, val):
         if property.expressionType == EXPRESSION_TYPE_IDENT:
             self.compileSetIdentProperty(property, val)
@@ -502,8 +835,11 @@ class Compiler(object):
             raise BoaCompilerError("Property not settable: %s" % (property))
 
     def compileSetIdentProperty(self, property, val):
-        attributeName = newString(property.value)
-        self.emit(OPCONSTANT, self.addConstant(attributeName))
+        if self.attributeCaches:
+            self.compile(val)
+            self.emit(OPSETNAMEDATTR, self.addName(property.value))
+            return
+        self.emit(OPCONSTANT, self.addName(property.value))
         self.compile(val)
         self.emit(OPSETATTR)
 
@@ -538,8 +874,10 @@ class Compiler(object):
             raise BoaCompilerError("Property not gettable: %s.%s" % (object, property))
 
     def compileGetIdentProperty(self, property):
-        attributeName = newString(property.value)
-        self.emit(OPCONSTANT, self.addConstant(attributeName))
+        if self.attributeCaches:
+            self.emit(OPGETNAMEDATTR, self.addName(property.value))
+            return
+        self.emit(OPCONSTANT, self.addName(property.value))
         self.emit(OPGETATTR)
 
     def compileGetIndexProperty(self, property):
@@ -581,47 +919,52 @@ class Compiler(object):
 
         freeSymbols = self.symbolTable.freeSymbols
         numLocals = self.symbolTable.numDefinitions
-        instructions = self.leaveScope()
+        compiledInstructions = self.optimizedInstructions(self.leaveScope(), isFunctionBody=True)
+        if self.tailCalls:
+            compiledInstructions = b''.join(markTailCalls(compiledInstructions))
         for freeSymbol in freeSymbols:
             self.loadSymbol(freeSymbol)
-        compiledInstructions = b''.join(instructions)
         compiledFn = newCompiledFunction(compiledInstructions, numLocals, len(parameters))
         self.emit(OPCLOSURE, self.addConstant(compiledFn), len(freeSymbols))
 
+    def optimizedInstructions(self, instr, isFunctionBody=False):
+        if self.optimizationLevel >= 2:
+            return b''.join(optimizeInstrs(instr, isFunctionBody))
+        return instr
+
     def enterScope(self, isFunction=False):
-        newScope = CompilationScope([], None, None)
+        newScope = CompilationScope()
         currST = self.symbolTable
         self.symbolTable = SymbolTable(outer=currST, isFunction=isFunction)
         self.scopes.append(newScope)
         self.scopeIndex += 1
 
     def leaveScope(self):
-        instructions = self.currentInstructions()
         currScope = self.scopes.pop()
         self.symbolTable = self.symbolTable.outer
         self.scopeIndex -= 1
-        return instructions
-
-    def addConstant(self, c):
-        self.constants.append(c)
-        return len(self.constants) - 1
+        return currScope.instr
 
     def emit(self, opcode, *operands):
-        instr = makeInstr(opcode, *operands)
-        pos = self.addInstruction(instr)
+        scope = self.currentScope()
+        pos = len(scope.positions)
+        scope.positions.append(len(scope.buffer))
+        encodeInstr(scope.buffer, opcode, operands)
         self.setLastInstruction(opcode, pos)
         return pos
 
-    def currentInstructions(self):
-        return self.scopes[self.scopeIndex].instructions
-
     def currentScope(self):
         return self.scopes[self.scopeIndex]
 
     def getInstrBytecodePos(self, pos):
-        instructionsUpTo = self.currentInstructions()[:pos]
-        instrBytes = b''.join(instructionsUpTo)
-        return len(instrBytes)
+        scope = self.currentScope()
+        if pos == len(scope.positions):
+            return len(scope.buffer)
+        return scope.positions[pos]
+
+    def currentBytecodePos(self):
+        #byte offset the next emitted instruction will have
+        return len(self.currentScope().buffer)
 
     def setLastInstruction(self, opcode, pos):
         prev = self.currentScope().lastInstruction
@@ -629,32 +972,40 @@ class Compiler(object):
         self.currentScope().previousInstruction = prev
         self.currentScope().lastInstruction = last
 
-    def replaceInstruction(self, pos, newInstruction):
-        self.currentInstructions()[pos] = newInstruction
-
     def changeOperand(self, opPos, operand):
-        opcode = self.currentInstructions()[opPos][0:1]
-        newInstr = makeInstr(opcode, operand)
-        self.replaceInstruction(opPos, newInstr)
+        #patches the target of an emitted jump in place. A target too large for the
+        #operand is written as 0 and fixed up when the scope's instructions are read
+        scope = self.currentScope()
+        offset = scope.positions[opPos]
+        wide = scope.buffer[offset] == OPWIDE[0]
+        if wide:
+            offset += 1
+        width = operandWidths(lookupOpcode(bytes(scope.buffer[offset:offset+1])), wide)[0]
+        if operand >= 1 << (8*width):
+            scope.farJumps[opPos] = operand
+            operand = 0
+        scope.buffer[offset+1:offset+1+width] = operand.to_bytes(width, byteorder='big')
 
     def lastInstructionIs(self, opcode):
-        if len(self.currentInstructions()) == 0:
+        if not self.currentScope().positions:
             return False
         return self.currentScope().lastInstruction.opcode == opcode
 
     def removeLast(self):
-        last = self.currentScope().lastInstruction
-        prev = self.currentScope().previousInstruction
-        old = self.currentInstructions()
-        new = old[:last.position]
-
-        self.currentScope().instructions = new
-        self.currentScope().lastInstruction = prev
-
-    def addInstruction(self, instr):
-        posNewInstruction = len(self.currentInstructions())
-        self.currentInstructions().append(instr)
-        return posNewInstruction
+        scope = self.currentScope()
+        last = scope.lastInstruction
+        del scope.buffer[scope.positions[last.position]:]
+        del scope.positions[last.position:]
+        scope.farJumps.pop(last.position, None)
+        scope.lastInstruction = scope.previousInstruction
 
     def bytecode(self):
-        return Bytecode(list(self.currentInstructions()), list(self.constants))
+        scope = self.currentScope()
+        constants = list(self.constants)
+        if self.optimizationLevel >= 2:
+            instructions = optimizeInstrs(scope.instr)
+        else:
+            instructions = scope.instructions
+        if self.superinstructions:
+            instructions, constants, self.fusionCounts = fuseSuperinstructions(instructions, constants)
+        return Bytecode(instructions, constants, self.symbolTable.numDefinitions, self.symbolTable.numClasses)
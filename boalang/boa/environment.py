@@ -1,5 +1,6 @@
 from .parse import Parser
 from .evaluator import boaEval
+from .closureeval import closureEval
 from .ast import EXPRESSION_TYPE_IDENT
 
 class BoaParserError(Exception):
@@ -65,9 +66,12 @@ class Environment(object):
                 raise BoaEnvError('Identifier not declared: %s' % (str(ident)))
         self.store[ident.value] = val #val is BoaObject
 
-    def evaluate(self, code):
+    def evaluate(self, code, compiled=False):
+        #compiled runs the program as closures built from the AST, see closureeval
         p = Parser(code)
         program = p.parseProgram()
         if len(p.errors) > 0:
             raise BoaParserError("Errors during parsing", p.errors)
+        if compiled:
+            return closureEval(program, self)
         return boaEval(program, self)
@@ -448,7 +448,7 @@ def evalGetExpression(objEvaluated, property, env):
             #elif nextIdent.expressionType == EXPRESSION_TYPE_INDEX:
             #    attributeEvaluated = evalGetIndexExpression(objEvaluated, nextIdent, env)
         except Exception as e:
-            return newError("Could not get attribute %s.%s: %s" % (objEvaluated, nextIdent, e.message))
+            return newError("Could not get attribute %s.%s: %s" % (objEvaluated, nextIdent, str(e)))
         return evalGetExpression(attributeEvaluated, property.property, env)
     else:
         return newError("Property not gettable: %s.%s" % (objEvaluated, property))
@@ -457,7 +457,7 @@ def evalGetIdentExpression(objEvaluated, property, env):
     try:
         return objEvaluated.getAttribute(property.value)
     except Exception as e:
-        return newError("Could not get attribute: %s" % e.message)
+        return newError("Could not get attribute: %s" % str(e))
 
 def evalGetIndexExpression(objEvaluated, property, env):
     #if property.left.expressionType != EXPRESSION_TYPE_IDENT:
@@ -477,7 +477,7 @@ def evalGetIndexExpression(objEvaluated, property, env):
             return idxEvaluated
         return evalIndexExpression(leftEvaluated, idxEvaluated)
     except Exception as e:
-        return newError("Could not get attribute: %s" % e.message)
+        return newError("Could not get attribute: %s" % str(e))
 
 def evalGetCallExpression(objEvaluated, property, env):
     try:
@@ -493,7 +493,7 @@ def evalGetCallExpression(objEvaluated, property, env):
 
         return applyFunction(methodEvaluated, args)
     except Exception as e:
-        return newError("Could not get attribute: %s" % e.message)
+        return newError("Could not get attribute: %s" % str(e))
 
 def evalArrayIndexExpression(left, index):
     arr = left.value
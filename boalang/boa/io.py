@@ -36,6 +36,11 @@ DEFFUNC = b'\xA4'
 #DEFSTR 5 x'0011223344'
 #DEFCF 4 4 5 <numLocals> <numParams> <byteinstr>
 
+#section and definition lengths are uint32. Files from before build 2 used uint16
+LENGTH_WIDTH = 4
+LEGACY_LENGTH_WIDTH = 2
+LEGACY_BUILD_NUMBER = 1
+
 class BoaDeflateError(Exception): pass
 
 class BoaInflateError(Exception): pass
@@ -45,6 +50,7 @@ class BoaBytecodeReadError(Exception): pass
 class BytecodeReader(object):
     def __init__(self, instr):
         self.instr = instr
+        self.lengthWidth = LENGTH_WIDTH
 
     def incrPointer(self, n):
         self.pointer += n
@@ -54,6 +60,11 @@ class BytecodeReader(object):
         self.incrPointer(2)
         return operand
 
+    def readLength(self):
+        length = readUint(self.instr[self.pointer:], self.lengthWidth)
+        self.incrPointer(self.lengthWidth)
+        return length
+
     def read(self):
         self.pointer = 0
         while self.pointer < len(self.instr):
@@ -66,10 +77,10 @@ class BytecodeReader(object):
                 self.incrPointer(versionStringLen)
                 self.checkVersion(buildNumber, versionString)
             elif hdr == HDRCONS:
-                constNum = self.readHeaderOperand()
+                constNum = self.readLength()
                 self.readConstants(constNum)
             elif hdr == HDRCODE:
-                codeLen = self.readHeaderOperand()
+                codeLen = self.readLength()
                 self.readCode(codeLen)
 
     def checkVersion(self, buildNumber, versionString):
@@ -77,11 +88,13 @@ class BytecodeReader(object):
         self.readVersionString = versionString.decode('ascii')
         if buildNumber > BUILD_NUMBER:
             raise BoaBytecodeReadError("Incompatible version: %d > mine (%d)" % (buildNumber, BUILD_NUMBER))
+        if buildNumber <= LEGACY_BUILD_NUMBER:
+            self.lengthWidth = LEGACY_LENGTH_WIDTH
 
     def readConstants(self, constNum):
         constants = []
         for i in range(constNum):
-            obj, bytesRead = inflate(self.instr[self.pointer:])
+            obj, bytesRead = inflate(self.instr[self.pointer:], self.lengthWidth)
             constants.append(obj)
             self.incrPointer(bytesRead)
         self.constants = constants
@@ -103,6 +116,9 @@ class BytecodeWriter(object):
     def writeHeaderOperand(self, operand):
         return operand.to_bytes(2, byteorder='big')
 
+    def writeLength(self, length):
+        return length.to_bytes(LENGTH_WIDTH, byteorder='big')
+
     def writeVersion(self):
         bn = self.writeHeaderOperand(BUILD_NUMBER)
         vslen = self.writeHeaderOperand(len(VERSION_STRING))
@@ -114,12 +130,12 @@ class BytecodeWriter(object):
         for constant in self.bytecode.constants:
             b += deflate(constant)
         constNum = len(self.bytecode.constants)
-        return HDRCONS + self.writeHeaderOperand(constNum) + b
+        return HDRCONS + self.writeLength(constNum) + b
 
     def writeCode(self):
         instr = self.bytecode.instr
         codeLen = len(instr)
-        return HDRCODE + self.writeHeaderOperand(codeLen) + instr
+        return HDRCODE + self.writeLength(codeLen) + instr
 
 
 class BoaIntInflater(object):
@@ -198,7 +214,7 @@ class BoaNullInflater(object):
 def makeDef(defcode, operands, dataList):
     byteArr = bytearray(defcode)
     for operand in operands:
-        oBytes = (operand).to_bytes(2, byteorder='big')
+        oBytes = (operand).to_bytes(LENGTH_WIDTH, byteorder='big')
         byteArr += oBytes
     for data in dataList:
         byteArr += data
@@ -216,7 +232,7 @@ def deflate(obj):
     operands = [len(b) for b in bytesList]
     return makeDef(deflater.defcode, operands, bytesList)
 
-def inflate(b):
+def inflate(b, lengthWidth=LENGTH_WIDTH):
     defcode = bytes(b[0:1])
     if defcode not in INFLATERS:
         raise BoaInflateError("Cannot inflate: %s" % defcode)
@@ -224,11 +240,11 @@ def inflate(b):
     inflater = INFLATERS[defcode]
     operands = []
     for i in range(inflater.numOperands):
-        offset = 1 + i*2
-        operand = readUint16(b[offset:])
+        offset = 1 + i*lengthWidth
+        operand = readUint(b[offset:], lengthWidth)
         operands.append(operand)
 
-    dataOffset = 1 + inflater.numOperands*2
+    dataOffset = 1 + inflater.numOperands*lengthWidth
     bytechunks = []
     for i in range(inflater.numOperands):
         to = dataOffset + operands[i]
@@ -0,0 +1,571 @@
+from .code import (
+    OPCONSTANT,
+    OPADD,
+    OPSUB,
+    OPMUL,
+    OPDIV,
+    OPPOP,
+    OPTRUE,
+    OPFALSE,
+    OPNULL,
+    OPEQ,
+    OPNEQ,
+    OPGT,
+    OPGTEQ,
+    OPMINUS,
+    OPNOT,
+    OPJUMP,
+    OPJUMPNOTTRUE,
+    OPBOOLJUMPNOTTRUE,
+    OPGETGLOBAL,
+    OPSETGLOBAL,
+    OPGETLOCAL,
+    OPSETLOCAL,
+    OPGETBLOCK,
+    OPSETBLOCK,
+    OPGETFREE,
+    OPARRAY,
+    OPINDEX,
+    OPSETINDEX,
+    OPCALL,
+    OPGETBUILTIN,
+    OPITERHASNEXT,
+    OPITERNEXT,
+    OPIN,
+    OPNOTIN,
+    OPGETLOCALCONSTADD,
+    OPGETGLOBALCONSTADD,
+    OPGETLOCALCONSTGTJUMP,
+    OPCONSTGETLOCALGTJUMP,
+    OPGETGLOBALCONSTGTJUMP,
+    OPCONSTGETGLOBALGTJUMP,
+    OPGTJUMP,
+    OPEQJUMP,
+)
+from .object import (
+    newInteger,
+    newString,
+    newArray,
+    OBJECT_TYPES,
+    TRUE,
+    FALSE,
+    NULL,
+)
+from .builtins import (
+    getBuiltinByIndex,
+)
+from .evaluator import (
+    isTruthy,
+)
+from .vm import (
+    VM,
+    BoaVMError,
+    MAX_STACK_SIZE,
+    MAX_FRAMES,
+    INT_TYPE,
+    STRING_TYPE,
+    BOOLEAN_TYPE,
+    QOPADDINTINT,
+    QOPSUBINTINT,
+    QOPMULINTINT,
+    QOPADDSTRSTR,
+    QOPGTINTINT,
+    QOPGTEQINTINT,
+    QOPEQINTINT,
+    QOPNEQINTINT,
+)
+
+JIT_THRESHOLD = 16 #back-edges taken before a loop gets traced
+MAX_TRACE_LENGTH = 512 #instructions recorded before a trace is given up on
+MAX_TRACE_ABORTS = 4 #loops whose recordings fail more often than this stay interpreted
+
+BUILTIN_FUNCTION_TYPE = OBJECT_TYPES.OBJECT_TYPE_BUILTIN_FUNCTION
+
+#specialised and generic opcodes that do the same arithmetic or comparison
+BINARY_OPS = {
+    OPADD[0]: OPADD, QOPADDINTINT: OPADD, QOPADDSTRSTR: OPADD,
+    OPSUB[0]: OPSUB, QOPSUBINTINT: OPSUB,
+    OPMUL[0]: OPMUL, QOPMULINTINT: OPMUL,
+    OPDIV[0]: OPDIV,
+}
+COMPARE_OPS = {
+    OPEQ[0]: OPEQ, QOPEQINTINT: OPEQ,
+    OPNEQ[0]: OPNEQ, QOPNEQINTINT: OPNEQ,
+    OPGT[0]: OPGT, QOPGTINTINT: OPGT,
+    OPGTEQ[0]: OPGTEQ, QOPGTEQINTINT: OPGTEQ,
+}
+TYPE_NAMES = {INT_TYPE: 'INT_TYPE', STRING_TYPE: 'STRING_TYPE', BOOLEAN_TYPE: 'BOOLEAN_TYPE'}
+PYTHON_OPERATORS = {OPADD: '+', OPSUB: '-', OPMUL: '*', OPEQ: '==', OPNEQ: '!=', OPGT: '>', OPGTEQ: '>='}
+OP_NAMES = {OPADD: 'OPADD', OPSUB: 'OPSUB', OPMUL: 'OPMUL', OPDIV: 'OPDIV', OPEQ: 'OPEQ', OPNEQ: 'OPNEQ', OPGT: 'OPGT', OPGTEQ: 'OPGTEQ'}
+
+#opcodes a trace can contain. None of them switch frames
+TRACEABLE_OPS = set(BINARY_OPS) | set(COMPARE_OPS) | set(op[0] for op in [
+    OPCONSTANT, OPPOP, OPTRUE, OPFALSE, OPNULL, OPMINUS, OPNOT, OPJUMP, OPJUMPNOTTRUE, OPBOOLJUMPNOTTRUE,
+    OPGETGLOBAL, OPSETGLOBAL, OPGETLOCAL, OPSETLOCAL, OPGETBLOCK, OPSETBLOCK, OPGETFREE,
+    OPARRAY, OPINDEX, OPSETINDEX, OPCALL, OPGETBUILTIN, OPITERHASNEXT, OPITERNEXT, OPIN, OPNOTIN,
+    OPGETLOCALCONSTADD, OPGETGLOBALCONSTADD, OPGETLOCALCONSTGTJUMP, OPCONSTGETLOCALGTJUMP,
+    OPGETGLOBALCONSTGTJUMP, OPCONSTGETGLOBALGTJUMP, OPGTJUMP, OPEQJUMP,
+])
+
+class TraceAbort(Exception): pass
+
+class TracedInstruction(object):
+    __slots__ = ('ip', 'op', 'operands', 'observed', 'nextIp')
+
+    def __init__(self, ip, op, operands, observed, nextIp):
+        self.ip = ip
+        self.op = op
+        self.operands = operands
+        self.observed = observed #what the instruction's inputs were when it was recorded
+        self.nextIp = nextIp #where execution went next, which decides the direction of branches
+
+class TraceValue(object):
+    #a value on the trace's operand stack at compile time. Ints can live as raw Python
+    #ints and conditions as Python bools until something needs the BoaObject
+    __slots__ = ('boxed', 'raw', 'cond', 'objectType', 'constant')
+
+    def __init__(self, boxed=None, raw=None, cond=None, objectType=None, constant=None):
+        self.boxed = boxed #name of the variable holding the BoaObject
+        self.raw = raw #raw int expression of an INT value
+        self.cond = cond #Python bool expression of a BOOLEAN value
+        self.objectType = objectType #type known at this point of the trace, None if not known
+        self.constant = constant #the object itself, if known when compiling
+
+def iterNext(iterator):
+    try:
+        return next(iterator)
+    except StopIteration:
+        raise BoaVMError("Iterator has no more elements")
+
+def indexValue(left, index):
+    if left.objectType == OBJECT_TYPES.OBJECT_TYPE_HASH or (index.objectType == OBJECT_TYPES.OBJECT_TYPE_INT and \
+            left.objectType in [OBJECT_TYPES.OBJECT_TYPE_ARRAY, OBJECT_TYPES.OBJECT_TYPE_STRING]):
+        try:
+            return left[index]
+        except:
+            raise BoaVMError("Index error: %s" % index.inspect())
+    raise BoaVMError("Unsupported for index operation: %s,%s" % (left.objectType, index.objectType))
+
+def negate(operand):
+    if operand.objectType != OBJECT_TYPES.OBJECT_TYPE_INT:
+        raise BoaVMError("Unsupported type for negation: %s" % operand.objectType)
+    return newInteger(-operand.value)
+
+class TraceCompiler(object):
+    #turns a recorded loop iteration into a Python function that runs iterations until
+    #a guard fails. Guards check the types and branch directions the recording saw. A
+    #failed guard writes the trace's operand stack back to the VM and returns the
+    #instruction the interpreter resumes at
+    def __init__(self, constants, trace):
+        self.constants = constants
+        self.trace = trace
+        self.preamble = ['stack = vm.stack', 'sp = vm.sp'] #lines run once when the trace is entered
+        self.lines = [] #lines of one loop iteration
+        self.stack = []
+        self.known = {} #(scopeDiff, slot) or global index -> TraceValue last read or written there
+        self.numVars = 0
+        self.names = set() #preamble variables already defined
+        self.namespace = {
+            'newInteger': newInteger,
+            'newString': newString,
+            'newArray': newArray,
+            'isTruthy': isTruthy,
+            'iterNext': iterNext,
+            'indexValue': indexValue,
+            'negate': negate,
+            'TRUE': TRUE,
+            'FALSE': FALSE,
+            'NULL': NULL,
+            'INT_TYPE': INT_TYPE,
+            'STRING_TYPE': STRING_TYPE,
+            'BOOLEAN_TYPE': BOOLEAN_TYPE,
+        }
+        for op, name in OP_NAMES.items():
+            self.namespace[name] = op
+
+    def compile(self):
+        for instr in self.trace:
+            self.compileInstruction(instr)
+        source = ['def trace(vm, frame):']
+        source += ['    ' + line for line in self.preamble]
+        source.append('    while True:')
+        source += ['        ' + line for line in self.lines or ['pass']]
+        source = '\n'.join(source) + '\n'
+        namespace = dict(self.namespace)
+        exec(compile(source, '<boa trace>', 'exec'), namespace)
+        trace = namespace['trace']
+        trace.source = source
+        return trace
+
+    def emit(self, line):
+        self.lines.append(line)
+
+    def define(self, name, line):
+        #adds a preamble line the first time name is needed
+        if name not in self.names:
+            self.names.add(name)
+            self.preamble.append(line)
+        return name
+
+    def newVar(self, prefix='v'):
+        self.numVars += 1
+        return '%s%d' % (prefix, self.numVars)
+
+    def boxed(self, val):
+        if val.boxed is None:
+            name = self.newVar()
+            if val.raw is not None:
+                self.emit('%s = newInteger(%s)' % (name, val.raw))
+            else:
+                self.emit('%s = TRUE if %s else FALSE' % (name, val.cond))
+            val.boxed = name
+        return val.boxed
+
+    def raw(self, val):
+        if val.raw is None:
+            name = self.newVar('r')
+            self.emit('%s = %s.value' % (name, val.boxed))
+            val.raw = name
+        return val.raw
+
+    def condition(self, val):
+        if val.cond is None:
+            name = self.newVar('c')
+            self.emit('%s = isTruthy(%s)' % (name, val.boxed))
+            val.cond = name
+        return val.cond
+
+    def exit(self, test, ip, stack):
+        #leaves the trace for the interpreter at ip when test holds
+        self.emit('if %s:' % test)
+        for i, val in enumerate(stack):
+            self.emit('    stack[sp+%d] = %s' % (i, self.boxedExpression(val)))
+        if stack:
+            self.emit('    vm.sp = sp + %d' % len(stack))
+        self.emit('    return %d' % ip)
+
+    def boxedExpression(self, val):
+        #boxes val only on the path that needs it
+        if val.boxed is not None:
+            return val.boxed
+        elif val.raw is not None:
+            return 'newInteger(%s)' % val.raw
+        return '(TRUE if %s else FALSE)' % val.cond
+
+    def guardType(self, val, objectType, ip, stack):
+        if val.objectType is objectType:
+            return
+        self.exit('%s.objectType is not %s' % (self.boxed(val), TYPE_NAMES[objectType]), ip, stack)
+        val.objectType = objectType
+
+    def push(self, val):
+        self.stack.append(val)
+
+    def pop(self):
+        if not self.stack:
+            raise TraceAbort("Trace pops below its entry stack")
+        return self.stack.pop()
+
+    def constant(self, constIndex):
+        obj = self.constants[constIndex]
+        self.define('constants', 'constants = vm.constants')
+        name = self.define('k%d' % constIndex, 'k%d = constants[%d]' % (constIndex, constIndex))
+        if obj.objectType is INT_TYPE:
+            return TraceValue(boxed=name, raw=repr(obj.value), objectType=INT_TYPE, constant=obj)
+        return TraceValue(boxed=name, objectType=obj.objectType, constant=obj)
+
+    def slot(self, scopeDiff, localIndex):
+        #name of the stack index of a local scopeDiff frames out
+        if scopeDiff == 0:
+            self.define('bp', 'bp = frame.basePointer')
+            return 'bp+%d' % localIndex
+        name = self.define('bp%d' % scopeDiff, 'bp%d = vm.frames[vm.frameIndex-%d].basePointer' % (scopeDiff, scopeDiff+1))
+        return '%s+%d' % (name, localIndex)
+
+    def getSlot(self, scopeDiff, localIndex):
+        key = (scopeDiff, localIndex)
+        if key not in self.known:
+            name = self.newVar()
+            self.emit('%s = stack[%s]' % (name, self.slot(scopeDiff, localIndex)))
+            self.known[key] = TraceValue(boxed=name)
+        return self.known[key]
+
+    def setSlot(self, scopeDiff, localIndex, val):
+        self.emit('stack[%s] = %s' % (self.slot(scopeDiff, localIndex), self.boxed(val)))
+        self.known[(scopeDiff, localIndex)] = val
+
+    def getGlobal(self, globalIndex):
+        if globalIndex not in self.known:
+            self.define('globals_', 'globals_ = vm.globals')
+            name = self.newVar()
+            self.emit('%s = globals_[%d]' % (name, globalIndex))
+            self.known[globalIndex] = TraceValue(boxed=name)
+        return self.known[globalIndex]
+
+    def setGlobal(self, globalIndex, val):
+        self.define('globals_', 'globals_ = vm.globals')
+        self.emit('globals_[%d] = %s' % (globalIndex, self.boxed(val)))
+        self.known[globalIndex] = val
+
+    def binaryOperation(self, op, left, right, observed, ip, stack):
+        leftType, rightType = observed
+        if op is not OPDIV and leftType is INT_TYPE and rightType is INT_TYPE:
+            self.guardType(left, INT_TYPE, ip, stack)
+            self.guardType(right, INT_TYPE, ip, stack)
+            name = self.newVar('r')
+            self.emit('%s = %s %s %s' % (name, self.raw(left), PYTHON_OPERATORS[op], self.raw(right)))
+            return TraceValue(raw=name, objectType=INT_TYPE)
+        if op is OPADD and leftType is STRING_TYPE and rightType is STRING_TYPE:
+            self.guardType(left, STRING_TYPE, ip, stack)
+            self.guardType(right, STRING_TYPE, ip, stack)
+            name = self.newVar()
+            self.emit('%s = newString(%s.value + %s.value)' % (name, self.boxed(left), self.boxed(right)))
+            return TraceValue(boxed=name, objectType=STRING_TYPE)
+        name = self.newVar()
+        self.emit('%s = vm.binaryOperation(%s, %s, %s)' % (name, OP_NAMES[op], self.boxed(left), self.boxed(right)))
+        return TraceValue(boxed=name)
+
+    def comparison(self, op, left, right, observed, ip, stack):
+        leftType, rightType = observed
+        name = self.newVar('c')
+        if leftType is INT_TYPE and rightType is INT_TYPE:
+            self.guardType(left, INT_TYPE, ip, stack)
+            self.guardType(right, INT_TYPE, ip, stack)
+            self.emit('%s = %s %s %s' % (name, self.raw(left), PYTHON_OPERATORS[op], self.raw(right)))
+        else:
+            self.emit('%s = vm.compare(%s, %s, %s) is TRUE' % (name, OP_NAMES[op], self.boxed(left), self.boxed(right)))
+        return TraceValue(cond=name, objectType=BOOLEAN_TYPE)
+
+    def branch(self, val, instr, pos):
+        #jump to pos unless val is truthy. The trace follows the direction recorded
+        cond = self.condition(val)
+        if instr.nextIp == pos:
+            self.exit(cond, instr.ip + 1, self.stack)
+        else:
+            self.exit('not ' + cond, pos, self.stack)
+
+    def compileInstruction(self, instr):
+        op = instr.op
+        operands = instr.operands
+        ip = instr.ip
+        before = list(self.stack) #the stack to hand back if a guard fails before the instruction runs
+
+        if op in BINARY_OPS:
+            right = self.pop()
+            left = self.pop()
+            self.push(self.binaryOperation(BINARY_OPS[op], left, right, instr.observed, ip, before))
+        elif op in COMPARE_OPS:
+            right = self.pop()
+            left = self.pop()
+            self.push(self.comparison(COMPARE_OPS[op], left, right, instr.observed, ip, before))
+        elif op == OPCONSTANT[0]:
+            self.push(self.constant(operands[0]))
+        elif op == OPTRUE[0]:
+            self.push(TraceValue(boxed='TRUE', cond='True', objectType=BOOLEAN_TYPE))
+        elif op == OPFALSE[0]:
+            self.push(TraceValue(boxed='FALSE', cond='False', objectType=BOOLEAN_TYPE))
+        elif op == OPNULL[0]:
+            self.push(TraceValue(boxed='NULL', cond='False'))
+        elif op == OPPOP[0]:
+            self.pop()
+        elif op == OPGETLOCAL[0]:
+            self.push(self.getSlot(0, operands[0]))
+        elif op == OPSETLOCAL[0]:
+            self.setSlot(0, operands[0], self.pop())
+        elif op == OPGETBLOCK[0]:
+            self.push(self.getSlot(operands[0], operands[1]))
+        elif op == OPSETBLOCK[0]:
+            self.setSlot(operands[0], operands[1], self.pop())
+        elif op == OPGETGLOBAL[0]:
+            self.push(self.getGlobal(operands[0]))
+        elif op == OPSETGLOBAL[0]:
+            self.setGlobal(operands[0], self.pop())
+        elif op == OPGETFREE[0]:
+            self.define('free', 'free = frame.cl.freeVariables')
+            name = self.newVar()
+            self.emit('%s = free[%d]' % (name, operands[0]))
+            self.push(TraceValue(boxed=name))
+        elif op == OPMINUS[0]:
+            operand = self.pop()
+            if instr.observed == (INT_TYPE,):
+                self.guardType(operand, INT_TYPE, ip, before)
+                name = self.newVar('r')
+                self.emit('%s = -%s' % (name, self.raw(operand)))
+                self.push(TraceValue(raw=name, objectType=INT_TYPE))
+            else:
+                name = self.newVar()
+                self.emit('%s = negate(%s)' % (name, self.boxed(operand)))
+                self.push(TraceValue(boxed=name))
+        elif op == OPNOT[0]:
+            cond = self.condition(self.pop())
+            name = self.newVar('c')
+            self.emit('%s = not %s' % (name, cond))
+            self.push(TraceValue(cond=name, objectType=BOOLEAN_TYPE))
+        elif op in [OPIN[0], OPNOTIN[0]]:
+            right = self.pop()
+            left = self.pop()
+            name = self.newVar('c')
+            self.emit('%s = %svm.contains(%s, %s)' % (name, 'not ' if op == OPNOTIN[0] else '', self.boxed(right), self.boxed(left)))
+            self.push(TraceValue(cond=name, objectType=BOOLEAN_TYPE))
+        elif op == OPJUMP[0]:
+            pass #the trace is straight line code
+        elif op == OPJUMPNOTTRUE[0]:
+            self.branch(self.pop(), instr, operands[0])
+        elif op == OPBOOLJUMPNOTTRUE[0]:
+            #anything but a boolean goes back to the VM, which raises the error
+            val = self.pop()
+            self.guardType(val, BOOLEAN_TYPE, ip, before)
+            self.branch(val, instr, operands[0])
+        elif op in [OPGTJUMP[0], OPEQJUMP[0]]:
+            right = self.pop()
+            left = self.pop()
+            result = self.comparison(OPGT if op == OPGTJUMP[0] else OPEQ, left, right, instr.observed, ip, before)
+            self.branch(result, instr, operands[0])
+        elif op in [OPGETLOCALCONSTGTJUMP[0], OPCONSTGETLOCALGTJUMP[0], OPGETGLOBALCONSTGTJUMP[0], OPCONSTGETGLOBALGTJUMP[0]]:
+            first, second, pos = operands
+            if op == OPGETLOCALCONSTGTJUMP[0]:
+                left, right = self.getSlot(0, first), self.constant(second)
+            elif op == OPCONSTGETLOCALGTJUMP[0]:
+                left, right = self.constant(first), self.getSlot(0, second)
+            elif op == OPGETGLOBALCONSTGTJUMP[0]:
+                left, right = self.getGlobal(first), self.constant(second)
+            else:
+                left, right = self.constant(first), self.getGlobal(second)
+            self.branch(self.comparison(OPGT, left, right, instr.observed, ip, before), instr, pos)
+        elif op in [OPGETLOCALCONSTADD[0], OPGETGLOBALCONSTADD[0]]:
+            left = self.getSlot(0, operands[0]) if op == OPGETLOCALCONSTADD[0] else self.getGlobal(operands[0])
+            self.push(self.binaryOperation(OPADD, left, self.constant(operands[1]), instr.observed, ip, before))
+        elif op == OPITERHASNEXT[0]:
+            iterator = self.pop()
+            name = self.newVar('c')
+            self.emit('%s = %s.hasNext()' % (name, self.boxed(iterator)))
+            self.push(TraceValue(cond=name, objectType=BOOLEAN_TYPE))
+        elif op == OPITERNEXT[0]:
+            iterator = self.pop()
+            name = self.newVar()
+            self.emit('%s = iterNext(%s)' % (name, self.boxed(iterator)))
+            self.push(TraceValue(boxed=name))
+        elif op == OPINDEX[0]:
+            index = self.pop()
+            left = self.pop()
+            name = self.newVar()
+            self.emit('%s = indexValue(%s, %s)' % (name, self.boxed(left), self.boxed(index)))
+            self.push(TraceValue(boxed=name))
+        elif op == OPSETINDEX[0]:
+            value = self.pop()
+            index = self.pop()
+            left = self.pop()
+            self.emit('%s[%s] = %s' % (self.boxed(left), self.boxed(index), self.boxed(value)))
+        elif op == OPARRAY[0]:
+            elements = [self.pop() for i in range(operands[0])][::-1]
+            name = self.newVar()
+            self.emit('%s = newArray([%s])' % (name, ', '.join(self.boxed(el) for el in elements)))
+            self.push(TraceValue(boxed=name))
+        elif op == OPGETBUILTIN[0]:
+            name = 'b%d' % operands[0]
+            self.namespace[name] = getBuiltinByIndex(operands[0])
+            self.push(TraceValue(boxed=name, constant=self.namespace[name]))
+        elif op == OPCALL[0]:
+            numArgs = operands[0]
+            args = [self.pop() for i in range(numArgs)][::-1]
+            callee = self.pop()
+            if callee.constant is None or callee.constant.objectType is not BUILTIN_FUNCTION_TYPE:
+                raise TraceAbort("Only builtins are called from traces")
+            name = self.newVar()
+            self.emit('%s = %s.func([%s])' % (name, callee.boxed, ', '.join(self.boxed(arg) for arg in args)))
+            self.push(TraceValue(boxed=name))
+        else:
+            raise TraceAbort("Untraceable instruction: %d" % op)
+
+class TracingVM(VM):
+    #counts back-edges per loop in the operands of the jumping instruction. Once a loop
+    #is hot, one iteration is recorded and compiled to Python with guards, and further
+    #iterations run the compiled trace until a guard sends execution back here
+    def __init__(self, bytecode, symbolTable=None, verify=True, maxStackSize=MAX_STACK_SIZE, maxFrames=MAX_FRAMES):
+        self.traces = [] #compiled traces, for inspection
+        super(TracingVM, self).__init__(bytecode, symbolTable, verify, maxStackSize, maxFrames)
+
+    @staticmethod
+    def newWithGlobalsStore(bytecode, globals):
+        vm = TracingVM(bytecode)
+        vm.globals = globals
+        vm.reserveGlobals()
+        return vm
+
+    def buildDispatchTable(self):
+        table = super(TracingVM, self).buildDispatchTable()
+        table[OPJUMP[0]] = self.opTracedJump
+        return table
+
+    def opTracedJump(self, pos, hits=0, aborts=0, trace=None):
+        frame = self.currentFrame()
+        site = frame.ip - 1
+        frame.ip = pos
+        if pos > site or aborts > MAX_TRACE_ABORTS:
+            return
+        if trace is not None:
+            frame.ip = trace(self, frame)
+            return
+        hits += 1
+        if hits < JIT_THRESHOLD:
+            frame.code[site] = (OPJUMP[0], (pos, hits, aborts))
+            return
+        trace = self.recordTrace(frame, pos, site)
+        if trace is None:
+            frame.code[site] = (OPJUMP[0], (pos, 0, aborts+1))
+        else:
+            self.traces.append(trace)
+            frame.code[site] = (OPJUMP[0], (pos, 0, aborts, trace))
+
+    def recordTrace(self, frame, header, site):
+        #runs one iteration of the loop from header to site, recording what it does.
+        #Instructions that could leave the frame end the recording before they run, so
+        #whatever happens the interpreter carries on from the right place
+        dispatch = self.dispatch
+        code = frame.code
+        startSp = self.sp
+        trace = []
+        while True:
+            ip = frame.ip
+            if ip < header or ip > site or len(trace) >= MAX_TRACE_LENGTH:
+                return None
+            op, operands = code[ip]
+            if op not in TRACEABLE_OPS or (op == OPJUMP[0] and len(operands) > 3):
+                return None #another loop's trace would run many instructions as one
+            observed = self.observeOperands(frame, op, operands)
+            if op == OPCALL[0] and observed[0].objectType is not BUILTIN_FUNCTION_TYPE:
+                return None
+            frame.ip += 1
+            if op == OPJUMP[0]:
+                frame.ip = operands[0] #plain jumps, so back-edges inside the loop don't count while it is recorded
+            else:
+                dispatch[op](*operands)
+            trace.append(TracedInstruction(ip, op, operands, observed, frame.ip))
+            if frame.ip == header and op == OPJUMP[0]:
+                break
+        if self.sp != startSp:
+            return None
+        try:
+            return TraceCompiler(self.constants, trace).compile()
+        except TraceAbort:
+            return None
+
+    def observeOperands(self, frame, op, operands):
+        #the types an instruction's specialisation depends on, read before it runs
+        stack = self.stack
+        sp = self.sp
+        if op in BINARY_OPS or op in COMPARE_OPS or op in [OPGTJUMP[0], OPEQJUMP[0]]:
+            return (stack[sp-2].objectType, stack[sp-1].objectType)
+        elif op in [OPGETLOCALCONSTADD[0], OPGETLOCALCONSTGTJUMP[0]]:
+            return (stack[frame.basePointer+operands[0]].objectType, self.constants[operands[1]].objectType)
+        elif op == OPCONSTGETLOCALGTJUMP[0]:
+            return (self.constants[operands[0]].objectType, stack[frame.basePointer+operands[1]].objectType)
+        elif op in [OPGETGLOBALCONSTADD[0], OPGETGLOBALCONSTGTJUMP[0]]:
+            return (self.globals[operands[0]].objectType, self.constants[operands[1]].objectType)
+        elif op == OPCONSTGETGLOBALGTJUMP[0]:
+            return (self.constants[operands[0]].objectType, self.globals[operands[1]].objectType)
+        elif op == OPMINUS[0]:
+            return (stack[sp-1].objectType,)
+        elif op == OPCALL[0]:
+            return (stack[sp-1-operands[0]],)
+        return ()
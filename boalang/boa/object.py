@@ -1,4 +1,6 @@
 
+from functools import partial
+
 from .util import DictLikeStruct
 
 OBJECT_TYPE_OBJECT = 'OBJECT_TYPE_OBJECT'
@@ -78,7 +80,21 @@ def newObject(typName, *args):
     return OBJECT_CONSTRUCTORS[typName](*args)
 
 def newInteger(i):
-    return newObject(OBJECT_TYPE_INT, i)
+    #integers are immutable so values in the small int range share one preallocated object
+    if type(i) is int and smallIntMin <= i <= smallIntMax:
+        return smallInts[i - smallIntMin]
+    return BoaInteger(i)
+
+def configureSmallIntCache(low, high):
+    global smallIntMin, smallIntMax, smallInts
+    smallInts = [SharedBoaInteger(i) for i in range(low, high+1)]
+    smallIntMin = low
+    smallIntMax = high
+
+def internConstant(obj):
+    #equal constants from any compilation unit can share one object, as long as it
+    #can't be changed: strings that never reach Boa code as values
+    return internedConstants.setdefault((obj.objectType, obj.value), obj)
 
 def newString(s):
     return newObject(OBJECT_TYPE_STRING, s)
@@ -119,12 +135,43 @@ def newBuiltinFunction(name, func):
 def newClosure(compiledFunction, freeVariables, instance=None, isConstructor=False):
     return newObject(OBJECT_TYPE_CLOSURE, compiledFunction, freeVariables, instance, isConstructor)
 
+class Shape(object):
+    #the attribute layout shared by class instances that had the same attributes
+    #added in the same order. Maps attribute names to indexes in the instance's slots
+    __slots__ = ('slotIndexes', 'transitions')
+
+    def __init__(self, slotIndexes):
+        self.slotIndexes = slotIndexes #dict of <name, slot index> entries
+        self.transitions = {} #attribute name -> Shape with that attribute added
+
+    def withAttribute(self, name):
+        shape = self.transitions.get(name)
+        if shape is None:
+            slotIndexes = dict(self.slotIndexes)
+            slotIndexes[name] = len(slotIndexes)
+            shape = Shape(slotIndexes)
+            self.transitions[name] = shape
+        return shape
+
+    def __repr__(self):
+        return '<shape [%s]>' % (', '.join(self.slotIndexes.keys()))
+
+ROOT_SHAPE = Shape({})
+
 class BoaObject(object):
+    __slots__ = ('objectType', '_attributes')
+
+    shape = None #only class instances have shapes
+
+    #per-type tables of builtin attributes, shared by all instances of a type.
+    #getters take the object, setters the object and the new value, methods the object and a list of args
+    builtinAttributeGetters = {}
+    builtinAttributeSetters = {}
+    builtinMethods = {}
+
     def __init__(self, typ):
         self.objectType = typ
-        self.builtinAttributeGetters = {}
-        self.builtinAttributeSetters = {}
-        self.attributes = {}
+        self._attributes = None #created on first use
 
     def inspect(self):
         return '<BoaObject typ=%s>' % (self.objectType)
@@ -132,31 +179,29 @@ class BoaObject(object):
     def __repr__(self):
         return '<BoaObject typ=%s>' % (self.objectType)
 
-    def defineBuiltinAttribute(self, name, getter=None, setter=None):
-        if getter:
-            self.builtinAttributeGetters[name] = getter
-        if setter:
-            self.builtinAttributeSetters[name] = setter
-
-    def defineBuiltinMethod(self, name, func):
-        builtinMethod = BoaBuiltinMethod(name, self, func)
-        self.defineBuiltinAttribute(name, getter=lambda: builtinMethod)
+    @property
+    def attributes(self):
+        if self._attributes is None:
+            self._attributes = {}
+        return self._attributes
 
     def defineAttribute(self, name, val):
         self.attributes[name] = val
 
     def getAttribute(self, name):
-        if name in self.attributes:
-            return self.attributes[name]
+        if self._attributes is not None and name in self._attributes:
+            return self._attributes[name]
         elif name in self.builtinAttributeGetters:
-            return self.builtinAttributeGetters[name]()
+            return self.builtinAttributeGetters[name](self)
+        elif name in self.builtinMethods:
+            return BoaBuiltinMethod(name, self, partial(self.builtinMethods[name], self))
         raise CannotGetAttributeError(name)
 
     def setAttribute(self, name, val):
-        if name in self.attributes:
-            self.attributes[name] = val
+        if self._attributes is not None and name in self._attributes:
+            self._attributes[name] = val
         elif name in self.builtinAttributeSetters:
-            return self.builtinAttributeSetters[name](val)
+            return self.builtinAttributeSetters[name](self, val)
         else:
             self.defineAttribute(name, val)
 
@@ -165,6 +210,8 @@ class BoaObject(object):
         return hash(self.value)
 
 class BoaClass(BoaObject):
+    __slots__ = ('name', 'methods', 'constructor', 'env')
+
     def __init__(self, name, constructor, methods, env):
         super(BoaClass, self).__init__(OBJECT_TYPES.OBJECT_TYPE_CLASS)
         self.name = name
@@ -174,16 +221,20 @@ class BoaClass(BoaObject):
         self.env = env
 
     def createInstance(self):
+        #methods stay on the class and are bound when looked up, see bindMethod
         instance = newClassInstance(self)
-        for methodName, unboundMethod in self.methods.items():
-            boundMethod = newMethod(instance, unboundMethod.parameters, unboundMethod.body, self.env)
-            instance.setAttribute(methodName, boundMethod)
         if self.constructor:
             boundConstructor = newMethod(instance, self.constructor.parameters, self.constructor.body, self.env)
         else:
             boundConstructor = None
         return instance, boundConstructor
 
+    def bindMethod(self, instance, name):
+        method = self.methods.get(name)
+        if method is None:
+            return None
+        return newMethod(instance, method.parameters, method.body, self.env)
+
     def __repr__(self):
         return "<class %s>" % (self.name)
 
@@ -191,6 +242,8 @@ class BoaClass(BoaObject):
         return "<class %s>" % (self.name)
 
 class BoaCompiledClass(BoaObject):
+    __slots__ = ('name', 'methods', 'constructor')
+
     def __init__(self, name, constructor, methods):
         super(BoaCompiledClass, self).__init__(OBJECT_TYPES.OBJECT_TYPE_COMPILED_CLASS)
         self.methods = methods #dict of <name, BoaFunction> entries
@@ -198,16 +251,20 @@ class BoaCompiledClass(BoaObject):
         self.name = name
 
     def createInstance(self):
+        #methods stay on the class and are bound when looked up, see bindMethod
         instance = newClassInstance(self)
-        for methodName, unboundMethod in self.methods.items():
-            boundMethod = newClosure(unboundMethod.compiledFunction, unboundMethod.freeVariables, instance=instance)
-            instance.setAttribute(methodName, boundMethod)
         if self.constructor:
             boundConstructor = newClosure(self.constructor.compiledFunction, self.constructor.freeVariables, instance=instance, isConstructor=True)
         else:
             boundConstructor = None
         return instance, boundConstructor
 
+    def bindMethod(self, instance, name):
+        method = self.methods.get(name)
+        if method is None:
+            return None
+        return newClosure(method.compiledFunction, method.freeVariables, instance=instance)
+
     def __repr__(self):
         return "<class(compiled) %s>" % (self.name)
 
@@ -215,9 +272,39 @@ class BoaCompiledClass(BoaObject):
         return "<class(compiled) %s>" % (self.name)
 
 class BoaClassInstance(BoaObject):
+    #attributes live in a list laid out by the instance's shape rather than in a dict
+    __slots__ = ('clazz', 'shape', 'slots')
+
     def __init__(self, clazz):
         super(BoaClassInstance, self).__init__(OBJECT_TYPES.OBJECT_TYPE_CLASS_INSTANCE)
         self.clazz = clazz
+        self.shape = ROOT_SHAPE
+        self.slots = []
+
+    @property
+    def attributes(self):
+        #a snapshot, writes must go through setAttribute
+        return dict((name, self.slots[i]) for name, i in self.shape.slotIndexes.items())
+
+    def defineAttribute(self, name, val):
+        slot = self.shape.slotIndexes.get(name)
+        if slot is None:
+            self.shape = self.shape.withAttribute(name)
+            self.slots.append(val)
+        else:
+            self.slots[slot] = val
+
+    def getAttribute(self, name):
+        slot = self.shape.slotIndexes.get(name)
+        if slot is not None:
+            return self.slots[slot]
+        method = self.clazz.bindMethod(self, name) #attributes shadow methods of the same name
+        if method is not None:
+            return method
+        return super(BoaClassInstance, self).getAttribute(name)
+
+    def setAttribute(self, name, val):
+        self.defineAttribute(name, val)
 
     def __repr__(self):
         return '<classInstance of %s>' % (self.clazz.name)
@@ -226,6 +313,8 @@ class BoaClassInstance(BoaObject):
         return '<classInstance of %s>' % (self.clazz.name)
 
 class BoaInteger(BoaObject):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         super(BoaInteger, self).__init__(OBJECT_TYPES.OBJECT_TYPE_INT)
         self.value = value
@@ -236,13 +325,20 @@ class BoaInteger(BoaObject):
     def inspect(self):
         return "%d" % (self.value)
 
+class SharedBoaInteger(BoaInteger):
+    #the preallocated small ints every equal value refers to. Attributes set on them would
+    #show up on unrelated values, so they can't have any
+    __slots__ = ()
+
+    def setAttribute(self, name, val):
+        raise CannotSetAttributeError("Cannot set attribute %s of shared int %d" % (name, self.value))
+
 class BoaString(BoaObject):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         super(BoaString, self).__init__(OBJECT_TYPES.OBJECT_TYPE_STRING)
         self.value = value
-        self.defineBuiltinAttribute('length', getter=lambda: newInteger(len(self.value)))
-        self.defineBuiltinMethod('toUpper', self.method_toUpper)
-        self.defineBuiltinMethod('toLower', self.method_toLower)
 
     def method_toUpper(self, args):
         if len(args) > 0:
@@ -254,6 +350,9 @@ class BoaString(BoaObject):
             return newError("Wrong number of arguments to <string>.toLower: got %d, want 0" % (len(args)))
         return newString(self.value.lower())
 
+    builtinAttributeGetters = {'length': lambda self: newInteger(len(self.value))}
+    builtinMethods = {'toUpper': method_toUpper, 'toLower': method_toLower}
+
     def __iter__(self):
         return BoaCountingIterator(self)
 
@@ -273,6 +372,8 @@ class BoaString(BoaObject):
         return '"%s"' % (self.value)
 
 class BoaBoolean(BoaObject):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         super(BoaBoolean, self).__init__(OBJECT_TYPES.OBJECT_TYPE_BOOLEAN)
         self.value = value
@@ -284,6 +385,8 @@ class BoaBoolean(BoaObject):
         return "%s" % ("true" if self.value else "false")
 
 class BoaNull(BoaObject):
+    __slots__ = ('value',)
+
     def __init__(self):
         super(BoaNull, self).__init__(OBJECT_TYPES.OBJECT_TYPE_NULL)
         self.value = None
@@ -295,6 +398,8 @@ class BoaNull(BoaObject):
         return "null"
 
 class BoaReturnValue(BoaObject):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         super(BoaReturnValue, self).__init__(OBJECT_TYPES.OBJECT_TYPE_RETURN_VALUE)
         self.value = value
@@ -306,6 +411,8 @@ class BoaReturnValue(BoaObject):
         return "return %s" % self.value.inspect()
 
 class BoaBreak(BoaObject):
+    __slots__ = ('value',)
+
     def __init__(self):
         super(BoaBreak, self).__init__(OBJECT_TYPES.OBJECT_TYPE_BREAK)
         self.value = None
@@ -317,6 +424,8 @@ class BoaBreak(BoaObject):
         return "break"
 
 class BoaContinue(BoaObject):
+    __slots__ = ('value',)
+
     def __init__(self):
         super(BoaContinue, self).__init__(OBJECT_TYPES.OBJECT_TYPE_CONTINUE)
         self.value = None
@@ -328,6 +437,8 @@ class BoaContinue(BoaObject):
         return "continue"
 
 class BoaFunction(BoaObject):
+    __slots__ = ('parameters', 'body', 'env')
+
     def __init__(self, parameters, body, env):
         super(BoaFunction, self).__init__(OBJECT_TYPES.OBJECT_TYPE_FUNCTION)
         self.parameters = parameters #list of Identifiers
@@ -341,6 +452,8 @@ class BoaFunction(BoaObject):
         return 'fn(%s) {%s}' % ([str(p) for p in self.parameters], str(self.body))
 
 class BoaMethod(BoaObject):
+    __slots__ = ('instance', 'parameters', 'body', 'env')
+
     def __init__(self, instance, parameters, body, env):
         super(BoaMethod, self).__init__(OBJECT_TYPES.OBJECT_TYPE_METHOD)
         self.instance = instance
@@ -355,6 +468,8 @@ class BoaMethod(BoaObject):
         return '<boaMethod of %s (bound)>' % (self.instance.objectType)
 
 class BoaClosure(BoaObject):
+    __slots__ = ('compiledFunction', 'freeVariables', 'instance', 'isConstructor')
+
     def __init__(self, compiledFunction, freeVariables, instance=None, isConstructor=False):
         super(BoaClosure, self).__init__(OBJECT_TYPES.OBJECT_TYPE_CLOSURE)
         self.compiledFunction = compiledFunction
@@ -378,6 +493,8 @@ class BoaClosure(BoaObject):
         )
 
 class BoaBuiltinMethod(BoaObject):
+    __slots__ = ('name', 'instance', 'func', 'takesEnv')
+
     def __init__(self, name, instance, func, takesEnv=False):
         super(BoaBuiltinMethod, self).__init__(OBJECT_TYPES.OBJECT_TYPE_BUILTIN_METHOD)
         self.name = name
@@ -392,12 +509,17 @@ class BoaBuiltinMethod(BoaObject):
         return '<builtinMethod %s of %s (bound)>' % (self.name, self.instance.objectType)
 
 class BoaCompiledFunction(BoaObject):
+    __slots__ = ('instr', 'value', 'numLocals', 'numParameters', 'decoded', 'maxStackDepth', 'requirements')
+
     def __init__(self, instr, numLocals, numParameters):
         super(BoaCompiledFunction, self).__init__(OBJECT_TYPES.OBJECT_TYPE_COMPILED_FUNCTION)
         self.instr = instr
         self.value = instr
         self.numLocals = numLocals
         self.numParameters = numParameters
+        self.decoded = None #cached result of decodeInstrs, filled in on first execution
+        self.maxStackDepth = None #filled in by the verifier
+        self.requirements = None #what it needs from its closures and frames, filled in by the verifier
 
     def __repr__(self):
         return '<compiledFunction (len=%d)>' % (len(self.instr))
@@ -406,6 +528,8 @@ class BoaCompiledFunction(BoaObject):
         return '<compiledFunction (len=%d)>' % (len(self.instr))
 
 class BoaBuiltinFunction(BoaObject):
+    __slots__ = ('name', 'func')
+
     def __init__(self, name, func):
         super(BoaBuiltinFunction, self).__init__(OBJECT_TYPES.OBJECT_TYPE_BUILTIN_FUNCTION)
         self.name = name
@@ -418,10 +542,13 @@ class BoaBuiltinFunction(BoaObject):
         return '[builtin]%s()' % (self.name)
 
 class BoaArray(BoaObject):
+    __slots__ = ('value',)
+
     def __init__(self, elements):
         super(BoaArray, self).__init__(OBJECT_TYPES.OBJECT_TYPE_ARRAY)
         self.value = elements
-        self.defineBuiltinAttribute('length', getter=lambda: newInteger(len(self.value)))
+
+    builtinAttributeGetters = {'length': lambda self: newInteger(len(self.value))}
 
     def __iter__(self):
         return BoaCountingIterator(self)
@@ -448,6 +575,8 @@ class BoaArray(BoaObject):
         return '[%s]' % (', '.join([val.inspect() for val in self.value]))
 
 class BoaCountingIterator(BoaObject):
+    __slots__ = ('iterable', 'counter')
+
     def __init__(self, iterable):
         super(BoaCountingIterator, self).__init__(OBJECT_TYPES.OBJECT_TYPE_ITERATOR)
         self.iterable = iterable
@@ -476,6 +605,8 @@ class BoaCountingIterator(BoaObject):
 
 
 class BoaHashIterator(BoaObject):
+    __slots__ = ('hash', 'counter', 'keySnapshot')
+
     def __init__(self, hash):
         super(BoaHashIterator, self).__init__(OBJECT_TYPES.OBJECT_TYPE_HASH_ITERATOR)
         self.hash = hash
@@ -504,13 +635,16 @@ class BoaHashIterator(BoaObject):
         return '<hashiterator counter=%d>' % (self.counter)
 
 class BoaHash(BoaObject):
+    __slots__ = ('value',)
+
     def __init__(self, pairs):
         super(BoaHash, self).__init__(OBJECT_TYPES.OBJECT_TYPE_HASH)
         self.value = {}
         for k, v in pairs:
             kHash = k.hashcode()
             self.value[kHash] = BoaHashPair(k, v)
-        self.defineBuiltinAttribute('length', getter=lambda: newInteger(len(self.value.keys())))
+
+    builtinAttributeGetters = {'length': lambda self: newInteger(len(self.value.keys()))}
 
     def __iter__(self):
         return BoaHashIterator(self)
@@ -537,6 +671,8 @@ class BoaHash(BoaObject):
         return '{%s}' % (', '.join([hashPair.inspect() for hashPair in self.value.values()]))
 
 class BoaHashPair(BoaObject):
+    __slots__ = ('value', 'key')
+
     def __init__(self, key, val):
         super(BoaHashPair, self).__init__(OBJECT_TYPES.OBJECT_TYPE_HASH_PAIR)
         self.value = val
@@ -549,6 +685,8 @@ class BoaHashPair(BoaObject):
         return '%s: %s' % (self.key.inspect(), self.value.inspect())
 
 class BoaError(BoaObject):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         super(BoaError, self).__init__(OBJECT_TYPES.OBJECT_TYPE_ERROR)
         self.value = value
@@ -563,6 +701,13 @@ class BoaError(BoaObject):
     def inspect(self):
         return 'ERROR: ' + self.value
 
+SMALL_INT_CACHE_MIN = -5
+SMALL_INT_CACHE_MAX = 256
+
+configureSmallIntCache(SMALL_INT_CACHE_MIN, SMALL_INT_CACHE_MAX)
+
+internedConstants = {} #(object type, value) -> the constant shared by every compilation unit
+
 NULL = BoaNull()
 TRUE = BoaBoolean(True)
 FALSE = BoaBoolean(False)
@@ -0,0 +1,554 @@
+from .ast import (
+    Node,
+    Boolean,
+    IntegerLiteral,
+    StringLiteral,
+    NODE_TYPE_STATEMENT,
+    NODE_TYPE_EXPRESSION,
+    STATEMENT_TYPE_EXPRESSION,
+    STATEMENT_TYPE_LET,
+    STATEMENT_TYPE_ASSIGN,
+    STATEMENT_TYPE_RETURN,
+    STATEMENT_TYPE_BLOCK,
+    STATEMENT_TYPE_WHILE,
+    STATEMENT_TYPE_FOR,
+    STATEMENT_TYPE_BREAK,
+    STATEMENT_TYPE_CONTINUE,
+    STATEMENT_TYPE_CLASS,
+    EXPRESSION_TYPE_INT_LIT,
+    EXPRESSION_TYPE_NULL_LIT,
+    EXPRESSION_TYPE_STR_LIT,
+    EXPRESSION_TYPE_ARRAY_LIT,
+    EXPRESSION_TYPE_HASH_LIT,
+    EXPRESSION_TYPE_BOOLEAN,
+    EXPRESSION_TYPE_IDENT,
+    EXPRESSION_TYPE_INFIX,
+    EXPRESSION_TYPE_PREFIX,
+    EXPRESSION_TYPE_INDEX,
+    EXPRESSION_TYPE_GET,
+    EXPRESSION_TYPE_FUNC_LIT,
+    EXPRESSION_TYPE_IF,
+    EXPRESSION_TYPE_CALL,
+    EXPRESSION_TYPE_INSTANCE_REF,
+)
+from .token import (
+    TOKEN_TYPES,
+)
+from .code import (
+    DEFINITIONS,
+    OPCONSTANT,
+    OPADD,
+    OPEQ,
+    OPGT,
+    OPJUMPNOTTRUE,
+    OPGETGLOBAL,
+    OPGETLOCAL,
+    OPGETATTR,
+    OPGETLOCALCONSTADD,
+    OPGETGLOBALCONSTADD,
+    OPGETLOCALCONSTGTJUMP,
+    OPCONSTGETLOCALGTJUMP,
+    OPGETGLOBALCONSTGTJUMP,
+    OPCONSTGETGLOBALGTJUMP,
+    OPCONSTGETATTR,
+    OPGTJUMP,
+    OPEQJUMP,
+    OPCALL,
+    OPJUMP,
+    OPRETURNVALUE,
+    OPTAILCALL,
+    OPINVOKE,
+    OPTAILINVOKE,
+    OPRETURN,
+    OPLOOPCALL,
+    OPBLOCKRETURN,
+    lookupOpcode,
+    decodeInstrs,
+    assembleInstrs,
+)
+from .object import (
+    OBJECT_TYPES,
+    newCompiledFunction,
+)
+
+#opcode sequences and the superinstruction that replaces them, tried in order,
+#so longer sequences must come before any of their prefixes
+SUPERINSTRUCTIONS = [
+    ((OPGETLOCAL, OPCONSTANT, OPGT, OPJUMPNOTTRUE), OPGETLOCALCONSTGTJUMP),
+    ((OPCONSTANT, OPGETLOCAL, OPGT, OPJUMPNOTTRUE), OPCONSTGETLOCALGTJUMP),
+    ((OPGETGLOBAL, OPCONSTANT, OPGT, OPJUMPNOTTRUE), OPGETGLOBALCONSTGTJUMP),
+    ((OPCONSTANT, OPGETGLOBAL, OPGT, OPJUMPNOTTRUE), OPCONSTGETGLOBALGTJUMP),
+    ((OPGETLOCAL, OPCONSTANT, OPADD), OPGETLOCALCONSTADD),
+    ((OPGETGLOBAL, OPCONSTANT, OPADD), OPGETGLOBALCONSTADD),
+    ((OPCONSTANT, OPGETATTR), OPCONSTGETATTR),
+    ((OPGT, OPJUMPNOTTRUE), OPGTJUMP),
+    ((OPEQ, OPJUMPNOTTRUE), OPEQJUMP),
+]
+
+def isJumpOp(op):
+    return lookupOpcode(bytes([op])).isJump
+
+def matchesSequence(decoded, start, sequence, jumpTargets):
+    if start + len(sequence) > len(decoded):
+        return False
+    for i, opcode in enumerate(sequence):
+        if decoded[start+i][0] != opcode[0]:
+            return False
+        if i > 0 and start+i in jumpTargets: #can't fuse over an instruction something jumps into
+            return False
+    return True
+
+def fuseInstrs(instr, counts):
+    decoded = decodeInstrs(instr)
+    jumpTargets = set([operands[-1] for op, operands in decoded if isJumpOp(op)])
+
+    fused = []
+    indexMap = [] #maps indexes in decoded to indexes in fused
+    i = 0
+    while i < len(decoded):
+        for sequence, fusedOpcode in SUPERINSTRUCTIONS:
+            if matchesSequence(decoded, i, sequence, jumpTargets):
+                operands = ()
+                for op, ops in decoded[i:i+len(sequence)]:
+                    operands += ops
+                indexMap.extend([len(fused)]*len(sequence))
+                fused.append((fusedOpcode[0], operands))
+                name = DEFINITIONS[fusedOpcode].name
+                counts[name] = counts.get(name, 0) + 1
+                i += len(sequence)
+                break
+        else:
+            indexMap.append(len(fused))
+            fused.append(decoded[i])
+            i += 1
+    indexMap.append(len(fused))
+
+    remapped = []
+    for op, operands in fused:
+        if isJumpOp(op):
+            operands = operands[:-1] + (indexMap[operands[-1]],)
+        remapped.append((op, operands))
+    return assembleInstrs(remapped)
+
+def fuseSuperinstructions(instructions, constants):
+    #returns fused copies of the main instructions and the constants, plus a
+    #dict counting how many times each superinstruction was emitted
+    counts = {}
+    fusedConstants = []
+    for constant in constants:
+        if constant.objectType == OBJECT_TYPES.OBJECT_TYPE_COMPILED_FUNCTION:
+            instr = b''.join(fuseInstrs(constant.instr, counts))
+            constant = newCompiledFunction(instr, constant.numLocals, constant.numParameters)
+        fusedConstants.append(constant)
+    fusedInstructions = fuseInstrs(b''.join(instructions), counts)
+    return fusedInstructions, fusedConstants, counts
+
+def isTailPosition(decoded, index):
+    #follows unconditional jumps from index and checks if they lead to a return
+    seen = set()
+    while index < len(decoded) and decoded[index][0] == OPJUMP[0] and index not in seen:
+        seen.add(index)
+        index = decoded[index][1][0]
+    return index < len(decoded) and decoded[index][0] == OPRETURNVALUE[0]
+
+def markTailCalls(instr):
+    #rewrites calls whose result is returned straight away into tail calls. Only
+    #valid for the instructions of a function body, where the current frame is the
+    #function's own
+    decoded = decodeInstrs(instr)
+    for i, (op, operands) in enumerate(decoded):
+        if op == OPCALL[0] and isTailPosition(decoded, i+1):
+            decoded[i] = (OPTAILCALL[0], operands)
+        elif op == OPINVOKE[0] and isTailPosition(decoded, i+1):
+            decoded[i] = (OPTAILINVOKE[0], operands)
+    return assembleInstrs(decoded)
+
+#-- AST passes, run before compilation --
+
+LITERAL_TYPES = [EXPRESSION_TYPE_INT_LIT, EXPRESSION_TYPE_STR_LIT, EXPRESSION_TYPE_BOOLEAN, EXPRESSION_TYPE_NULL_LIT]
+
+#folded ints must still fit the 4 byte constants of .boa files
+MIN_FOLDED_INT = -2**31
+MAX_FOLDED_INT = 2**31 - 1
+
+OP_PLUS = TOKEN_TYPES.TOKEN_TYPE_PLUS.value
+OP_MINUS = TOKEN_TYPES.TOKEN_TYPE_MINUS.value
+OP_ASTERISK = TOKEN_TYPES.TOKEN_TYPE_ASTERISK.value
+OP_EQ = TOKEN_TYPES.TOKEN_TYPE_EQ.value
+OP_NEQ = TOKEN_TYPES.TOKEN_TYPE_NEQ.value
+OP_GT = TOKEN_TYPES.TOKEN_TYPE_GT.value
+OP_GTEQ = TOKEN_TYPES.TOKEN_TYPE_GTEQ.value
+OP_LT = TOKEN_TYPES.TOKEN_TYPE_LT.value
+OP_LTEQ = TOKEN_TYPES.TOKEN_TYPE_LTEQ.value
+OP_NOT = TOKEN_TYPES.TOKEN_TYPE_NOT.value
+OP_EXCLAMATION = TOKEN_TYPES.TOKEN_TYPE_EXCLAMATION.value
+OP_AND = TOKEN_TYPES.TOKEN_TYPE_AND.value
+OP_OR = TOKEN_TYPES.TOKEN_TYPE_OR.value
+OP_IN = TOKEN_TYPES.TOKEN_TYPE_IN.value
+OP_NOTIN = TOKEN_TYPES.TOKEN_TYPE_NOTIN.value
+
+#division is left alone: its result type and failure on zero are the VM's business
+INT_OPERATIONS = {
+    OP_PLUS: lambda l, r: l + r,
+    OP_MINUS: lambda l, r: l - r,
+    OP_ASTERISK: lambda l, r: l * r,
+}
+COMPARISONS = {
+    OP_EQ: lambda l, r: l == r,
+    OP_NEQ: lambda l, r: l != r,
+    OP_GT: lambda l, r: l > r,
+    OP_GTEQ: lambda l, r: l >= r,
+    OP_LT: lambda l, r: l < r,
+    OP_LTEQ: lambda l, r: l <= r,
+}
+
+def isLiteral(node):
+    return node.nodeType == NODE_TYPE_EXPRESSION and node.expressionType in LITERAL_TYPES
+
+def isTruthyLiteral(node):
+    #same rules as the VM: only null and false are falsy
+    if node.expressionType == EXPRESSION_TYPE_NULL_LIT:
+        return False
+    if node.expressionType == EXPRESSION_TYPE_BOOLEAN:
+        return node.value
+    return True
+
+def isBooleanExpression(node):
+    #whether node always gives a boolean, so as an operand of and/or it needs no type check
+    if node.expressionType == EXPRESSION_TYPE_BOOLEAN:
+        return True
+    if node.expressionType == EXPRESSION_TYPE_PREFIX:
+        return node.operator in [OP_NOT, OP_EXCLAMATION]
+    if node.expressionType == EXPRESSION_TYPE_INFIX:
+        return node.operator in COMPARISONS or node.operator in [OP_IN, OP_NOTIN, OP_AND, OP_OR]
+    return False
+
+def walkNodes(node):
+    #yields node and every node below it
+    if isinstance(node, (list, tuple)):
+        for n in node:
+            for child in walkNodes(n):
+                yield child
+    elif isinstance(node, Node):
+        yield node
+        for child in vars(node).values():
+            for n in walkNodes(child):
+                yield n
+
+def findConstantNames(program):
+    #names bound exactly once in the program, by a let, and never assigned to
+    bindings = {}
+    assigned = set()
+    for node in walkNodes(program.statements):
+        if hasattr(node, 'parameters'): #function literals and methods
+            for param in node.parameters:
+                bindings[param.value] = bindings.get(param.value, 0) + 1
+        if getattr(node, 'nodeType', None) != NODE_TYPE_STATEMENT:
+            continue
+        if node.statementType == STATEMENT_TYPE_LET:
+            name = node.identifier.value
+        elif node.statementType == STATEMENT_TYPE_FOR:
+            name = node.iterator.value
+        elif node.statementType == STATEMENT_TYPE_CLASS:
+            name = node.name
+        elif node.statementType == STATEMENT_TYPE_ASSIGN and \
+                node.identifier.expressionType == EXPRESSION_TYPE_IDENT:
+            assigned.add(node.identifier.value)
+            continue
+        else:
+            continue
+        bindings[name] = bindings.get(name, 0) + 1
+    return set(name for name, count in bindings.items() if count == 1 and name not in assigned)
+
+class ASTOptimizer(object):
+    #folds constant expressions, prunes branches with constant conditions and drops
+    #statements after a return, break or continue. With propagateConstants, uses of
+    #lets that are bound to a literal and never reassigned are replaced by the literal.
+    #Works in place, on a copy of the program made by the compiler
+    def __init__(self, propagateConstants=False):
+        self.propagateConstants = propagateConstants
+        self.constantNames = set()
+        self.constants = {} #name -> literal node, for constant lets compiled so far
+        self.scopeLets = set() #ids of lets that run before anything after them in their scope
+        self.inFunction = False
+        self.inLoop = False
+
+    def optimizeProgram(self, program):
+        if self.propagateConstants:
+            self.constantNames = findConstantNames(program)
+        #at the top level, returns, breaks and continues are NOPs in the VM, so nothing after them is dead
+        self.addScopeLets(program.statements)
+        program.statements = self.optimizeStatements(program.statements)
+        return program
+
+    def addScopeLets(self, statements):
+        #only lets directly in a program or function body are propagated; one in a
+        #loop or branch might not have run by the time a later use is reached
+        for statement in statements:
+            if getattr(statement, 'statementType', None) == STATEMENT_TYPE_LET:
+                self.scopeLets.add(id(statement))
+
+    def optimizeStatements(self, statements):
+        result = []
+        for statement in statements:
+            statement = self.optimizeStatement(statement)
+            if statement is None:
+                continue
+            result.append(statement)
+            if self.endsBlock(statement):
+                break
+        return result
+
+    def endsBlock(self, statement):
+        if statement.statementType == STATEMENT_TYPE_RETURN:
+            return self.inFunction
+        if statement.statementType in [STATEMENT_TYPE_BREAK, STATEMENT_TYPE_CONTINUE]:
+            return self.inLoop
+        return False
+
+    def optimizeStatement(self, node):
+        stmtType = node.statementType
+        if stmtType == STATEMENT_TYPE_EXPRESSION:
+            node.value = self.optimizeExpression(node.value)
+        elif stmtType == STATEMENT_TYPE_BLOCK:
+            node.value = self.optimizeStatements(node.statements)
+        elif stmtType == STATEMENT_TYPE_LET:
+            node.value = self.optimizeExpression(node.value)
+            if node.identifier.value in self.constantNames and id(node) in self.scopeLets and isLiteral(node.value):
+                self.constants[node.identifier.value] = node.value
+        elif stmtType == STATEMENT_TYPE_ASSIGN:
+            target = node.identifier
+            if target.expressionType == EXPRESSION_TYPE_INDEX:
+                target.left = self.optimizeExpression(target.left)
+                target.index = self.optimizeExpression(target.index)
+            elif target.expressionType == EXPRESSION_TYPE_GET:
+                target.object = self.optimizeExpression(target.object)
+                self.optimizeProperty(target.property)
+            node.value = self.optimizeExpression(node.value)
+        elif stmtType == STATEMENT_TYPE_RETURN:
+            if node.value:
+                node.value = self.optimizeExpression(node.value)
+        elif stmtType == STATEMENT_TYPE_WHILE:
+            node.condition = self.optimizeExpression(node.condition)
+            if isLiteral(node.condition) and not isTruthyLiteral(node.condition):
+                return None
+            self.optimizeLoopBody(node)
+        elif stmtType == STATEMENT_TYPE_FOR:
+            node.iterable = self.optimizeExpression(node.iterable)
+            self.optimizeLoopBody(node)
+        elif stmtType == STATEMENT_TYPE_CLASS:
+            for methodStatement in node.methodStatements:
+                self.optimizeFunctionBody(methodStatement)
+            if node.constructorStatement:
+                self.optimizeFunctionBody(node.constructorStatement)
+        return node
+
+    def optimizeLoopBody(self, loopStatement):
+        inLoop = self.inLoop
+        self.inLoop = True
+        loopStatement.value = self.optimizeStatement(loopStatement.blockStatement)
+        self.inLoop = inLoop
+
+    def optimizeFunctionBody(self, function):
+        inFunction, inLoop = self.inFunction, self.inLoop
+        self.inFunction, self.inLoop = True, False
+        self.addScopeLets(function.body.statements)
+        function.body = self.optimizeStatement(function.body)
+        self.inFunction, self.inLoop = inFunction, inLoop
+
+    def optimizeProperty(self, property):
+        #the identifiers in a property chain are attribute names, not variables
+        exprType = property.expressionType
+        if exprType == EXPRESSION_TYPE_INDEX:
+            self.optimizeProperty(property.left)
+            property.index = self.optimizeExpression(property.index)
+        elif exprType == EXPRESSION_TYPE_CALL:
+            self.optimizeProperty(property.function)
+            property.arguments = [self.optimizeExpression(arg) for arg in property.arguments]
+        elif exprType == EXPRESSION_TYPE_GET:
+            self.optimizeProperty(property.object)
+            self.optimizeProperty(property.property)
+
+    def optimizeExpression(self, node):
+        exprType = node.expressionType
+        if exprType == EXPRESSION_TYPE_IDENT:
+            return self.constants.get(node.value, node)
+        elif exprType == EXPRESSION_TYPE_INFIX:
+            node.left = self.optimizeExpression(node.left)
+            node.right = self.optimizeExpression(node.right)
+            return self.foldInfix(node)
+        elif exprType == EXPRESSION_TYPE_PREFIX:
+            node.right = self.optimizeExpression(node.right)
+            return self.foldPrefix(node)
+        elif exprType == EXPRESSION_TYPE_ARRAY_LIT:
+            node.value = [self.optimizeExpression(el) for el in node.elements]
+        elif exprType == EXPRESSION_TYPE_HASH_LIT:
+            node.value = [(self.optimizeExpression(k), self.optimizeExpression(v)) for k, v in node.elements]
+        elif exprType == EXPRESSION_TYPE_INDEX:
+            node.left = self.optimizeExpression(node.left)
+            node.index = self.optimizeExpression(node.index)
+        elif exprType == EXPRESSION_TYPE_GET:
+            node.object = self.optimizeExpression(node.object)
+            self.optimizeProperty(node.property)
+        elif exprType == EXPRESSION_TYPE_CALL:
+            node.function = self.optimizeExpression(node.function)
+            node.arguments = [self.optimizeExpression(arg) for arg in node.arguments]
+        elif exprType == EXPRESSION_TYPE_FUNC_LIT:
+            self.optimizeFunctionBody(node)
+        elif exprType == EXPRESSION_TYPE_IF:
+            self.pruneIf(node)
+        return node
+
+    def pruneIf(self, node):
+        #branches whose condition is a falsy literal are dropped, and the first one
+        #with a truthy literal becomes the else branch. An if left with no
+        #conditional blocks just runs its else branch
+        conditionalBlocks = []
+        alternative = node.alternative
+        for condition, consequence in node.conditionalBlocks:
+            condition = self.optimizeExpression(condition)
+            if isLiteral(condition):
+                if isTruthyLiteral(condition):
+                    alternative = consequence
+                    break
+                continue
+            conditionalBlocks.append((condition, self.optimizeStatement(consequence)))
+        if alternative is not None:
+            alternative = self.optimizeStatement(alternative)
+        node.conditionalBlocks = conditionalBlocks
+        node.alternative = alternative
+
+    def foldInfix(self, node):
+        left, right = node.left, node.right
+        if not isLiteral(left) or left.expressionType != right.expressionType:
+            return node
+        op = node.operator
+        if left.expressionType == EXPRESSION_TYPE_INT_LIT:
+            if op in INT_OPERATIONS:
+                return self.intLiteral(node, INT_OPERATIONS[op](left.value, right.value))
+            if op in COMPARISONS:
+                return Boolean(node.token, COMPARISONS[op](left.value, right.value))
+        elif left.expressionType == EXPRESSION_TYPE_STR_LIT:
+            if op == OP_PLUS:
+                return StringLiteral(node.token, left.value + right.value)
+            if op in [OP_EQ, OP_NEQ]:
+                return Boolean(node.token, COMPARISONS[op](left.value, right.value))
+        elif left.expressionType == EXPRESSION_TYPE_BOOLEAN:
+            if op in [OP_EQ, OP_NEQ]:
+                return Boolean(node.token, COMPARISONS[op](left.value, right.value))
+            if op == OP_AND:
+                return Boolean(node.token, left.value and right.value)
+            if op == OP_OR:
+                return Boolean(node.token, left.value or right.value)
+        return node
+
+    def foldPrefix(self, node):
+        right = node.right
+        if not isLiteral(right):
+            return node
+        if node.operator == OP_MINUS and right.expressionType == EXPRESSION_TYPE_INT_LIT:
+            return self.intLiteral(node, -right.value)
+        if node.operator in [OP_NOT, OP_EXCLAMATION]:
+            return Boolean(node.token, not isTruthyLiteral(right))
+        return node
+
+    def intLiteral(self, node, value):
+        if not MIN_FOLDED_INT <= value <= MAX_FOLDED_INT:
+            return node
+        return IntegerLiteral(node.token, value)
+
+#-- function inlining --
+
+#largest function body, in AST nodes, that calls are inlined for
+MAX_INLINE_SIZE = 16
+
+#expressions that may not appear in an inlined body: function literals and if
+#branches can hold returns, and this means something else at the call site
+NON_INLINABLE_TYPES = [EXPRESSION_TYPE_FUNC_LIT, EXPRESSION_TYPE_IF, EXPRESSION_TYPE_INSTANCE_REF]
+
+def inlinableBody(function):
+    #the expression a function literal evaluates to, if calls to it can be inlined.
+    #Its body must be a single expression, or a return of one, that does not refer to
+    #the function itself
+    statements = function.body.statements
+    if len(statements) != 1:
+        return None
+    statement = statements[0]
+    if statement.statementType not in [STATEMENT_TYPE_EXPRESSION, STATEMENT_TYPE_RETURN] or not statement.value:
+        return None
+    expression = statement.value
+    nodes = list(walkNodes(expression))
+    if len(nodes) > MAX_INLINE_SIZE:
+        return None
+    for node in nodes:
+        if node.nodeType != NODE_TYPE_EXPRESSION or node.expressionType in NON_INLINABLE_TYPES:
+            return None
+        if node.expressionType == EXPRESSION_TYPE_IDENT and node.value == function.name:
+            return None
+    return expression
+
+def freeNames(function, expression):
+    #names in an inlinable body that are not parameters of its function
+    parameters = set(param.value for param in function.parameters)
+    return set(node.value for node in walkNodes(expression)
+                if node.expressionType == EXPRESSION_TYPE_IDENT and node.value not in parameters)
+
+#-- bytecode passes --
+
+def threadJumps(decoded):
+    #jumps that land on an unconditional jump go straight to its target
+    for i, (op, operands) in enumerate(decoded):
+        if not isJumpOp(op):
+            continue
+        target = operands[-1]
+        seen = set()
+        while target < len(decoded) and decoded[target][0] == OPJUMP[0] and target not in seen:
+            seen.add(target)
+            target = decoded[target][1][0]
+        decoded[i] = (op, operands[:-1] + (target,))
+
+def removeDeadInstrs(decoded, terminators):
+    #drops instructions no path reaches, and unconditional jumps to the next
+    #instruction. Follows the same control flow rules as the verifier
+    reachable = set()
+    worklist = [0]
+    while worklist:
+        index = worklist.pop()
+        if index >= len(decoded) or index in reachable:
+            continue
+        reachable.add(index)
+        op, operands = decoded[index]
+        if op not in terminators:
+            worklist.append(index+1)
+        if isJumpOp(op):
+            worklist.append(operands[-1])
+        if op == OPLOOPCALL[0]:
+            worklist.append(index+2) #a break resumes after the jump back to the loop condition
+
+    kept = []
+    indexMap = [] #maps indexes in decoded to the index of the next kept instruction
+    for i, (op, operands) in enumerate(decoded):
+        indexMap.append(len(kept))
+        if i not in reachable:
+            continue
+        if op == OPJUMP[0] and operands[0] == i+1 and (i == 0 or decoded[i-1][0] != OPLOOPCALL[0]):
+            continue
+        kept.append((op, operands))
+    indexMap.append(len(kept))
+
+    remapped = []
+    for op, operands in kept:
+        if isJumpOp(op):
+            operands = operands[:-1] + (indexMap[operands[-1]],)
+        remapped.append((op, operands))
+    return remapped
+
+def optimizeInstrs(instr, isFunctionBody=False):
+    #bytecode passes run at -O2. In a function body a return always leaves the
+    #function's own frame, so nothing falls through it
+    terminators = [OPJUMP[0], OPBLOCKRETURN[0]]
+    if isFunctionBody:
+        terminators += [OPRETURNVALUE[0], OPRETURN[0]]
+    decoded = decodeInstrs(instr)
+    threadJumps(decoded)
+    return assembleInstrs(removeDeadInstrs(decoded, terminators))
@@ -0,0 +1,299 @@
+from .object import (
+    newInteger,
+    newString,
+    newArray,
+    newHash,
+    BoaObject,
+    BoaClassInstance,
+    CannotSetAttributeError,
+    OBJECT_TYPES,
+    TRUE,
+    FALSE,
+    NULL,
+)
+from .builtins import (
+    BUILTIN_FUNCTION_LIST,
+    getBuiltinByIndex,
+)
+
+#transpiled code keeps ints, booleans and null as raw Python values and Boa functions
+#as Python callables. Everything else is a BoaObject. Values are boxed when they
+#escape to containers, attributes, builtins or the host, and unboxed when they return.
+#Unlike the VM, setting an attribute on an int raises a BoaRuntimeError
+
+INT_TYPE = OBJECT_TYPES.OBJECT_TYPE_INT
+BOOLEAN_TYPE = OBJECT_TYPES.OBJECT_TYPE_BOOLEAN
+NULL_TYPE = OBJECT_TYPES.OBJECT_TYPE_NULL
+STRING_TYPE = OBJECT_TYPES.OBJECT_TYPE_STRING
+ARRAY_TYPE = OBJECT_TYPES.OBJECT_TYPE_ARRAY
+HASH_TYPE = OBJECT_TYPES.OBJECT_TYPE_HASH
+BUILTIN_TYPES = [OBJECT_TYPES.OBJECT_TYPE_BUILTIN_FUNCTION, OBJECT_TYPES.OBJECT_TYPE_BUILTIN_METHOD]
+
+class BoaRuntimeError(Exception): pass
+
+class BoaPythonFunction(BoaObject):
+    #a transpiled function, method or class stored where Boa objects are expected
+    __slots__ = ('function',)
+
+    def __init__(self, function):
+        super(BoaPythonFunction, self).__init__(OBJECT_TYPES.OBJECT_TYPE_FUNCTION)
+        self.function = function
+
+    def __repr__(self):
+        return '<transpiled %s>' % getattr(self.function, '__name__', 'function')
+
+    def inspect(self):
+        return '<transpiled %s>' % getattr(self.function, '__name__', 'function')
+
+class ThisFunction(object):
+    #a function outside a class that uses this. Like a closure set as an attribute in
+    #the VM, it is bound to the object it is stored on
+    __slots__ = ('function', 'instance')
+
+    def __init__(self, function, instance=None):
+        self.function = function #takes the instance as an extra first argument
+        self.instance = instance
+
+    def __call__(self, *args):
+        return self.function(self.instance, *args)
+
+class BuiltinCallable(object):
+    #a builtin function or method called with unboxed arguments
+    __slots__ = ('builtin',)
+
+    def __init__(self, builtin):
+        self.builtin = builtin
+
+    def __call__(self, *args):
+        return unbox(self.builtin.func([box(arg) for arg in args]))
+
+class TranspiledClass(BoaObject):
+    #what instances of a transpiled class have as their clazz
+    __slots__ = ('name', 'pythonClass')
+
+    def __init__(self, name, pythonClass):
+        super(TranspiledClass, self).__init__(OBJECT_TYPES.OBJECT_TYPE_CLASS)
+        self.name = name
+        self.pythonClass = pythonClass
+
+    def bindMethod(self, instance, name):
+        method = getattr(self.pythonClass, 'm_' + name, None)
+        if method is None:
+            return None
+        return BoaPythonFunction(method.__get__(instance))
+
+    def __repr__(self):
+        return "<class(transpiled) %s>" % (self.name)
+
+    def inspect(self):
+        return "<class(transpiled) %s>" % (self.name)
+
+class Instance(BoaClassInstance):
+    #base of the Python classes Boa classes are transpiled to. Methods are defined
+    #as m_<name>, the constructor as __init__
+    boaName = None
+
+    def __init_subclass__(cls):
+        cls.boaClass = TranspiledClass(cls.boaName, cls)
+
+    def __init__(self):
+        super(Instance, self).__init__(self.boaClass)
+
+def box(val):
+    if val is None:
+        return NULL
+    elif val is True:
+        return TRUE
+    elif val is False:
+        return FALSE
+    valType = type(val)
+    if valType is int or valType is float:
+        return newInteger(val)
+    elif valType is str:
+        return newString(val) #strings iterate as raw Python strings
+    elif isinstance(val, BoaObject):
+        return val
+    return BoaPythonFunction(val)
+
+def unbox(obj):
+    if not isinstance(obj, BoaObject):
+        return obj
+    objectType = obj.objectType
+    if objectType is INT_TYPE or objectType is BOOLEAN_TYPE:
+        return obj.value
+    elif objectType is NULL_TYPE:
+        return None
+    elif type(obj) is BoaPythonFunction:
+        return obj.function
+    elif objectType in BUILTIN_TYPES:
+        return BuiltinCallable(obj)
+    return obj
+
+def valueOf(val):
+    return val.value if isinstance(val, BoaObject) else val
+
+def isNumber(val):
+    valType = type(val)
+    return valType is int or valType is float
+
+def truthy(val):
+    return val is not None and val is not False
+
+def checkBool(val):
+    #operands of and/or must be booleans, as in boaEval
+    if type(val) is not bool:
+        raise BoaRuntimeError("Unsupported type for and/or: %s" % typeName(val))
+    return val
+
+def add(left, right):
+    if isNumber(left) and isNumber(right):
+        return left + right
+    if isinstance(left, BoaObject) and isinstance(right, BoaObject) and \
+            left.objectType is STRING_TYPE and right.objectType is STRING_TYPE:
+        return newString(left.value + right.value)
+    raise BoaRuntimeError("Unsupported types for binary operation: %s %s" % (typeName(left), typeName(right)))
+
+def sub(left, right):
+    checkNumbers(left, right)
+    return left - right
+
+def mul(left, right):
+    checkNumbers(left, right)
+    return left * right
+
+def div(left, right):
+    checkNumbers(left, right)
+    return left / right
+
+def gt(left, right):
+    checkNumbers(left, right)
+    return left > right
+
+def gtEq(left, right):
+    checkNumbers(left, right)
+    return left >= right
+
+def lt(left, right):
+    checkNumbers(left, right)
+    return left < right
+
+def ltEq(left, right):
+    checkNumbers(left, right)
+    return left <= right
+
+def eq(left, right):
+    return valueOf(left) == valueOf(right)
+
+def neq(left, right):
+    return valueOf(left) != valueOf(right)
+
+def neg(operand):
+    if not isNumber(operand):
+        raise BoaRuntimeError("Unsupported type for negation: %s" % typeName(operand))
+    return -operand
+
+def checkNumbers(left, right):
+    if not isNumber(left) or not isNumber(right):
+        raise BoaRuntimeError("Unsupported types for binary operation: %s %s" % (typeName(left), typeName(right)))
+
+def typeName(val):
+    return box(val).objectType
+
+def contains(container, member):
+    container = box(container)
+    member = box(member)
+    containerType = container.objectType
+    if containerType is HASH_TYPE:
+        if not member.objectType.isHashable:
+            raise BoaRuntimeError("Unusable as hash key: %s" % member.objectType)
+        return member in container
+    elif containerType is STRING_TYPE:
+        if member.objectType is not STRING_TYPE:
+            raise BoaRuntimeError("Unsupported for string membership: %s" % member.objectType)
+        return member.value in container.value
+    elif containerType is ARRAY_TYPE:
+        return member in container
+    raise BoaRuntimeError("Unsupported for membership: %s in %s" % (member.objectType, containerType))
+
+def isIn(member, container):
+    return contains(container, member)
+
+def notIn(member, container):
+    return not contains(container, member)
+
+def arrayLiteral(elements):
+    return newArray([box(el) for el in elements])
+
+def hashLiteral(pairs):
+    return newHash([(box(key), box(val)) for key, val in pairs])
+
+def index(left, key):
+    left = box(left)
+    key = box(key)
+    leftType = left.objectType
+    if leftType is not HASH_TYPE and (key.objectType is not INT_TYPE or leftType not in [ARRAY_TYPE, STRING_TYPE]):
+        raise BoaRuntimeError("Unsupported for index operation: %s,%s" % (leftType, key.objectType))
+    try:
+        return unbox(left[key])
+    except (IndexError, KeyError, TypeError):
+        raise BoaRuntimeError("Index error: %s" % key.inspect())
+
+def setIndex(left, key, val):
+    box(left)[box(key)] = box(val)
+
+def getAttr(obj, name):
+    return unbox(box(obj).getAttribute(name))
+
+def setAttr(obj, name, val):
+    objType = type(obj)
+    if objType is int or objType is float or objType is str:
+        #boxing would make a fresh object that the variable never sees
+        raise BoaRuntimeError("Cannot set attribute %s of unboxed %s" % (name, box(obj).objectType))
+    if type(val) is ThisFunction:
+        val = ThisFunction(val.function, obj)
+    try:
+        box(obj).setAttribute(name, box(val))
+    except CannotSetAttributeError as e:
+        raise BoaRuntimeError(str(e))
+
+def iterate(iterable):
+    for el in box(iterable):
+        yield unbox(box(el))
+
+def noInstance():
+    raise BoaRuntimeError("this not bound to instance")
+
+def runtimeNamespace():
+    #globals of a transpiled program before it runs
+    namespace = {
+        '_Instance': Instance,
+        '_ThisFunction': ThisFunction,
+        '_newString': newString,
+        '_truthy': truthy,
+        '_checkBool': checkBool,
+        '_add': add,
+        '_sub': sub,
+        '_mul': mul,
+        '_div': div,
+        '_gt': gt,
+        '_gtEq': gtEq,
+        '_lt': lt,
+        '_ltEq': ltEq,
+        '_eq': eq,
+        '_neq': neq,
+        '_neg': neg,
+        '_isIn': isIn,
+        '_notIn': notIn,
+        '_array': arrayLiteral,
+        '_hash': hashLiteral,
+        '_index': index,
+        '_setIndex': setIndex,
+        '_getAttr': getAttr,
+        '_setAttr': setAttr,
+        '_iterate': iterate,
+        '_noInstance': noInstance,
+        '_result': None,
+    }
+    for i, name in enumerate(BUILTIN_FUNCTION_LIST):
+        namespace['_builtin_' + name] = BuiltinCallable(getBuiltinByIndex(i))
+    return namespace
@@ -0,0 +1,660 @@
+import copy
+
+from .ast import (
+    NODE_TYPE_PROGRAM,
+    STATEMENT_TYPE_EXPRESSION,
+    STATEMENT_TYPE_LET,
+    STATEMENT_TYPE_ASSIGN,
+    STATEMENT_TYPE_RETURN,
+    STATEMENT_TYPE_BLOCK,
+    STATEMENT_TYPE_WHILE,
+    STATEMENT_TYPE_FOR,
+    STATEMENT_TYPE_BREAK,
+    STATEMENT_TYPE_CONTINUE,
+    STATEMENT_TYPE_CLASS,
+    EXPRESSION_TYPE_INT_LIT,
+    EXPRESSION_TYPE_NULL_LIT,
+    EXPRESSION_TYPE_STR_LIT,
+    EXPRESSION_TYPE_ARRAY_LIT,
+    EXPRESSION_TYPE_HASH_LIT,
+    EXPRESSION_TYPE_BOOLEAN,
+    EXPRESSION_TYPE_IDENT,
+    EXPRESSION_TYPE_INSTANCE_REF,
+    EXPRESSION_TYPE_INFIX,
+    EXPRESSION_TYPE_PREFIX,
+    EXPRESSION_TYPE_INDEX,
+    EXPRESSION_TYPE_GET,
+    EXPRESSION_TYPE_FUNC_LIT,
+    EXPRESSION_TYPE_IF,
+    EXPRESSION_TYPE_CALL,
+)
+from .token import (
+    TOKEN_TYPES,
+)
+from .object import (
+    newInteger,
+    newString,
+    newCompiledFunction,
+)
+from .code import (
+    ROPMOVE,
+    ROPLOADK,
+    ROPLOADTRUE,
+    ROPLOADFALSE,
+    ROPLOADNULL,
+    ROPGETGLOBAL,
+    ROPSETGLOBAL,
+    ROPGETFREE,
+    ROPGETBUILTIN,
+    ROPGETCLASS,
+    ROPCURRENTCLOSURE,
+    ROPGETINSTANCE,
+    ROPADD,
+    ROPSUB,
+    ROPMUL,
+    ROPDIV,
+    ROPEQ,
+    ROPNEQ,
+    ROPGT,
+    ROPGTEQ,
+    ROPIN,
+    ROPNOTIN,
+    ROPMINUS,
+    ROPNOT,
+    ROPJUMP,
+    ROPJUMPNOTTRUE,
+    ROPBOOLJUMPNOTTRUE,
+    ROPEQJUMP,
+    ROPNEQJUMP,
+    ROPGTJUMP,
+    ROPGTEQJUMP,
+    ROPARRAY,
+    ROPHASH,
+    ROPINDEX,
+    ROPSETINDEX,
+    ROPGETATTR,
+    ROPSETATTR,
+    ROPCLOSURE,
+    ROPCALL,
+    ROPRETURN,
+    ROPITER,
+    ROPITERNEXT,
+    ROPDEFCLASS,
+    assembleInstrs,
+)
+from .symbol import (
+    SymbolTable,
+    SymbolNotFoundError,
+    GLOBAL_SCOPE,
+    LOCAL_SCOPE,
+    BUILTIN_SCOPE,
+    FREE_SCOPE,
+    FUNCTION_SCOPE,
+    CLASS_SCOPE,
+)
+from .builtins import (
+    BUILTIN_FUNCTION_LIST,
+)
+from .compile import (
+    Bytecode,
+    ConstantPool,
+    LoopContext,
+    BoaCompilerError,
+)
+from .optimize import (
+    ASTOptimizer,
+    isBooleanExpression,
+)
+
+RESULT_REGISTER = 0 #main frame register that top level expression statements leave their value in
+TEMP_BASE = 1 << 24 #temporaries are numbered from here until their frame's locals are counted
+
+#positions of the register operands of each opcode, renumbered when a scope is assembled
+REGISTER_OPERANDS = {
+    ROPMOVE: (0, 1),
+    ROPLOADK: (0,),
+    ROPLOADTRUE: (0,),
+    ROPLOADFALSE: (0,),
+    ROPLOADNULL: (0,),
+    ROPGETGLOBAL: (0,),
+    ROPSETGLOBAL: (1,),
+    ROPGETFREE: (0,),
+    ROPGETBUILTIN: (0,),
+    ROPGETCLASS: (0,),
+    ROPCURRENTCLOSURE: (0,),
+    ROPGETINSTANCE: (0,),
+    ROPADD: (0, 1, 2),
+    ROPSUB: (0, 1, 2),
+    ROPMUL: (0, 1, 2),
+    ROPDIV: (0, 1, 2),
+    ROPEQ: (0, 1, 2),
+    ROPNEQ: (0, 1, 2),
+    ROPGT: (0, 1, 2),
+    ROPGTEQ: (0, 1, 2),
+    ROPIN: (0, 1, 2),
+    ROPNOTIN: (0, 1, 2),
+    ROPMINUS: (0, 1),
+    ROPNOT: (0, 1),
+    ROPJUMP: (),
+    ROPJUMPNOTTRUE: (0,),
+    ROPBOOLJUMPNOTTRUE: (0,),
+    ROPEQJUMP: (0, 1),
+    ROPNEQJUMP: (0, 1),
+    ROPGTJUMP: (0, 1),
+    ROPGTEQJUMP: (0, 1),
+    ROPARRAY: (0, 1),
+    ROPHASH: (0, 1),
+    ROPINDEX: (0, 1, 2),
+    ROPSETINDEX: (0, 1, 2),
+    ROPGETATTR: (0, 1),
+    ROPSETATTR: (0, 2),
+    ROPCLOSURE: (0, 2),
+    ROPCALL: (0, 1, 2),
+    ROPRETURN: (0,),
+    ROPITER: (0, 1),
+    ROPITERNEXT: (0, 1),
+    ROPDEFCLASS: (2,),
+}
+
+#infix operator -> (opcode, whether the operands are swapped)
+INFIX_OPCODES = {
+    TOKEN_TYPES.TOKEN_TYPE_PLUS.value: (ROPADD, False),
+    TOKEN_TYPES.TOKEN_TYPE_MINUS.value: (ROPSUB, False),
+    TOKEN_TYPES.TOKEN_TYPE_ASTERISK.value: (ROPMUL, False),
+    TOKEN_TYPES.TOKEN_TYPE_SLASH.value: (ROPDIV, False),
+    TOKEN_TYPES.TOKEN_TYPE_EQ.value: (ROPEQ, False),
+    TOKEN_TYPES.TOKEN_TYPE_NEQ.value: (ROPNEQ, False),
+    TOKEN_TYPES.TOKEN_TYPE_GT.value: (ROPGT, False),
+    TOKEN_TYPES.TOKEN_TYPE_GTEQ.value: (ROPGTEQ, False),
+    TOKEN_TYPES.TOKEN_TYPE_LT.value: (ROPGT, True),
+    TOKEN_TYPES.TOKEN_TYPE_LTEQ.value: (ROPGTEQ, True),
+    TOKEN_TYPES.TOKEN_TYPE_IN.value: (ROPIN, False),
+    TOKEN_TYPES.TOKEN_TYPE_NOTIN.value: (ROPNOTIN, False),
+}
+
+#comparison -> compare-and-branch opcode used for conditions
+COMPARE_JUMPS = {
+    ROPEQ: ROPEQJUMP,
+    ROPNEQ: ROPNEQJUMP,
+    ROPGT: ROPGTJUMP,
+    ROPGTEQ: ROPGTEQJUMP,
+}
+
+class RegisterBytecode(Bytecode):
+    def __init__(self, instructions, constants, numRegisters, numGlobals=None, numClassDefs=None):
+        super(RegisterBytecode, self).__init__(instructions, constants, numGlobals, numClassDefs)
+        self.numRegisters = numRegisters #size of the main frame's register file
+
+class RegisterScope(object):
+    #a function being compiled. Its locals are the first registers of the frame, numbered
+    #by the symbol table. Temporaries are allocated like a stack above TEMP_BASE and moved
+    #after the locals once the function is compiled and the number of locals is known
+    def __init__(self):
+        self.code = [] #(opcode, operand list) pairs, jump targets as instruction indexes
+        self.numTemps = 0 #temporaries in use
+        self.maxTemps = 0
+        self.loops = [] #LoopContexts of the loops being compiled in this scope
+
+class RegisterCompiler(ConstantPool):
+    #compiles the AST to three address code for RegisterVM. Branch and loop bodies
+    #always share their function's frame, so block scoped names become registers or
+    #globals like any other, and break/continue are plain jumps
+    def __init__(self, optimizationLevel=0):
+        self.constants = [] #BoaObjects
+        self.constantIndexes = {} #constantKey -> index in constants
+        self.symbolTable = SymbolTable()
+        self.scopes = [RegisterScope()] #RegisterScopes
+        self.optimizationLevel = optimizationLevel #1: fold constants and drop dead code, 2: also propagate constants
+
+        for index, fname in enumerate(BUILTIN_FUNCTION_LIST):
+            self.symbolTable.defineBuiltin(index, fname)
+
+    def compile(self, node):
+        if node.nodeType != NODE_TYPE_PROGRAM:
+            raise BoaCompilerError("Can only compile programs, got %s" % node.nodeType)
+        if self.optimizationLevel >= 1:
+            optimizer = ASTOptimizer(propagateConstants=self.optimizationLevel >= 2)
+            node = optimizer.optimizeProgram(copy.deepcopy(node))
+        for statement in node.statements:
+            if statement.statementType == STATEMENT_TYPE_CLASS:
+                self.symbolTable.defineClassName(statement.name)
+        for statement in node.statements:
+            self.compileStatement(statement)
+
+    def bytecode(self):
+        instructions, numRegisters = self.assemble(self.scopes[0], RESULT_REGISTER + 1)
+        return RegisterBytecode(instructions, list(self.constants), numRegisters, self.symbolTable.numDefinitions, self.symbolTable.numClasses)
+
+    def assemble(self, scope, numLocals):
+        #returns the scope's encoded instructions and the size of its register file
+        decoded = []
+        for opcode, operands in scope.code:
+            for i in REGISTER_OPERANDS[opcode]:
+                if operands[i] >= TEMP_BASE:
+                    operands[i] = numLocals + operands[i] - TEMP_BASE
+            decoded.append((opcode[0], tuple(operands)))
+        return assembleInstrs(decoded), numLocals + scope.maxTemps
+
+    def currentScope(self):
+        return self.scopes[-1]
+
+    def emit(self, opcode, *operands):
+        code = self.currentScope().code
+        code.append((opcode, list(operands)))
+        return len(code) - 1
+
+    def currentPos(self):
+        return len(self.currentScope().code)
+
+    def changeJumpTarget(self, pos, target):
+        self.currentScope().code[pos][1][-1] = target
+
+    def allocTemps(self, n=1):
+        #returns the first of n consecutive free temporaries
+        scope = self.currentScope()
+        first = TEMP_BASE + scope.numTemps
+        scope.numTemps += n
+        scope.maxTemps = max(scope.maxTemps, scope.numTemps)
+        return first
+
+    def tempMark(self):
+        return self.currentScope().numTemps
+
+    def releaseTemps(self, mark, keep=None):
+        #frees the temporaries allocated since mark, except keep if it is one of them
+        scope = self.currentScope()
+        if keep is not None and keep >= TEMP_BASE + mark:
+            scope.numTemps = keep - TEMP_BASE + 1
+        else:
+            scope.numTemps = mark
+
+    def destination(self, target, mark):
+        #register an expression's result goes to. Its operands have been read by the
+        #time the result is written, so their temporaries can be reused for it
+        if target is not None:
+            return target
+        self.releaseTemps(mark)
+        return self.allocTemps()
+
+    def resolve(self, name):
+        try:
+            return self.symbolTable.resolve(name)
+        except SymbolNotFoundError:
+            raise BoaCompilerError("Identifier not defined: %s" % name)
+
+    def loadSymbol(self, s, target=None):
+        if s.scope == LOCAL_SCOPE:
+            if target is None or target == s.index:
+                return s.index
+            self.emit(ROPMOVE, target, s.index)
+            return target
+        dst = self.allocTemps() if target is None else target
+        if s.scope == GLOBAL_SCOPE:
+            self.emit(ROPGETGLOBAL, dst, s.index)
+        elif s.scope == FREE_SCOPE:
+            self.emit(ROPGETFREE, dst, s.index)
+        elif s.scope == FUNCTION_SCOPE:
+            self.emit(ROPCURRENTCLOSURE, dst)
+        elif s.scope == CLASS_SCOPE:
+            self.emit(ROPGETCLASS, dst, s.index)
+        elif s.scope == BUILTIN_SCOPE:
+            self.emit(ROPGETBUILTIN, dst, s.index)
+        else:
+            raise BoaCompilerError("Symbol with unknown scope: %s" % s.scope)
+        return dst
+
+    def assignSymbol(self, s, value):
+        #compiles value into the symbol's storage
+        mark = self.tempMark()
+        if s.scope == LOCAL_SCOPE:
+            self.compileExpression(value, s.index)
+        elif s.scope == GLOBAL_SCOPE:
+            self.emit(ROPSETGLOBAL, s.index, self.compileExpression(value))
+        else:
+            raise BoaCompilerError("Cannot assign symbol at current scope: %s" % s.name)
+        self.releaseTemps(mark)
+
+    def enterBlock(self):
+        #branch and loop bodies get their own names, stored in the enclosing frame
+        self.symbolTable = SymbolTable(outer=self.symbolTable, isInline=True)
+
+    def leaveBlock(self):
+        self.symbolTable = self.symbolTable.outer
+
+    def compileStatements(self, statements):
+        for statement in statements:
+            self.compileStatement(statement)
+
+    def compileStatement(self, node):
+        stmtType = node.statementType
+        mark = self.tempMark()
+        if stmtType == STATEMENT_TYPE_EXPRESSION:
+            #the main frame keeps the last value for lastPoppedStackEl, functions drop theirs
+            target = RESULT_REGISTER if len(self.scopes) == 1 else None
+            self.compileExpression(node.expression, target)
+        elif stmtType == STATEMENT_TYPE_BLOCK:
+            self.compileStatements(node.statements)
+        elif stmtType == STATEMENT_TYPE_LET:
+            symbol = self.symbolTable.define(node.identifier.value)
+            self.assignSymbol(symbol, node.value)
+        elif stmtType == STATEMENT_TYPE_ASSIGN:
+            self.compileAssign(node.identifier, node.value)
+        elif stmtType == STATEMENT_TYPE_CLASS:
+            self.compileClassStatement(node, self.resolve(node.name).index)
+        elif stmtType == STATEMENT_TYPE_WHILE:
+            self.compileWhile(node)
+        elif stmtType == STATEMENT_TYPE_FOR:
+            self.compileFor(node)
+        elif stmtType == STATEMENT_TYPE_CONTINUE:
+            loops = self.currentScope().loops
+            if not loops:
+                raise BoaCompilerError("continue outside of a loop")
+            self.emit(ROPJUMP, loops[-1].continuePos)
+        elif stmtType == STATEMENT_TYPE_BREAK:
+            loops = self.currentScope().loops
+            if not loops:
+                raise BoaCompilerError("break outside of a loop")
+            loops[-1].breakPositions.append(self.emit(ROPJUMP, 0))
+        elif stmtType == STATEMENT_TYPE_RETURN:
+            if node.value:
+                self.emit(ROPRETURN, self.compileExpression(node.value))
+            else:
+                null = self.allocTemps()
+                self.emit(ROPLOADNULL, null)
+                self.emit(ROPRETURN, null)
+        else:
+            raise BoaCompilerError("Unknown statement type: %s" % stmtType)
+        self.releaseTemps(mark)
+
+    def compileAssign(self, identifier, value):
+        if identifier.expressionType == EXPRESSION_TYPE_INDEX:
+            left = self.compileExpression(identifier.left)
+            index = self.compileExpression(identifier.index)
+            self.emit(ROPSETINDEX, left, index, self.compileExpression(value))
+        elif identifier.expressionType == EXPRESSION_TYPE_GET:
+            obj = self.compileExpression(identifier.object)
+            self.compileSetProperty(obj, identifier.property, value)
+        else:
+            self.assignSymbol(self.resolve(identifier.value), value)
+
+    def compileWhile(self, node):
+        startPos = self.currentPos()
+        exitJumps = self.compileCondition(node.condition)
+        self.compileLoopBody(node.blockStatement, startPos, exitJumps)
+
+    def compileFor(self, node):
+        #the iterator lives in a temporary for the whole loop. ROPITERNEXT stores the
+        #next element or leaves the loop
+        iterable = self.compileExpression(node.iterable)
+        iterator = self.allocTemps()
+        self.emit(ROPITER, iterator, iterable)
+
+        startPos = self.currentPos()
+        self.enterBlock()
+        symbol = self.symbolTable.define(node.iterator.value)
+        if symbol.scope == LOCAL_SCOPE:
+            exitJump = self.emit(ROPITERNEXT, symbol.index, iterator, 0)
+        else:
+            element = self.allocTemps()
+            exitJump = self.emit(ROPITERNEXT, element, iterator, 0)
+            self.emit(ROPSETGLOBAL, symbol.index, element)
+        self.compileLoopBody(node.blockStatement, startPos, [exitJump])
+        self.leaveBlock()
+
+    def compileLoopBody(self, blockStatement, startPos, exitJumps):
+        loop = LoopContext(startPos)
+        scope = self.currentScope()
+        scope.loops.append(loop)
+        self.enterBlock()
+        self.compileStatements(blockStatement.statements)
+        self.leaveBlock()
+        self.emit(ROPJUMP, startPos)
+        scope.loops.pop()
+        afterLoopPos = self.currentPos()
+        for pos in exitJumps + loop.breakPositions:
+            self.changeJumpTarget(pos, afterLoopPos)
+
+    def compileCondition(self, node, logicalOperand=False):
+        #emits a test of node. Returns the positions of the jumps taken when it's false.
+        #An operand of and/or must be a boolean, as in boaEval
+        mark = self.tempMark()
+        if node.expressionType == EXPRESSION_TYPE_INFIX:
+            if node.operator == TOKEN_TYPES.TOKEN_TYPE_AND.value:
+                return self.compileCondition(node.left, True) + self.compileCondition(node.right, True)
+            opcode, swap = INFIX_OPCODES.get(node.operator, (None, False))
+            if opcode in COMPARE_JUMPS:
+                left = self.compileExpression(node.left)
+                right = self.compileExpression(node.right)
+                if swap:
+                    left, right = right, left
+                self.releaseTemps(mark)
+                return [self.emit(COMPARE_JUMPS[opcode], left, right, 0)]
+        condition = self.compileExpression(node)
+        self.releaseTemps(mark)
+        if logicalOperand and not isBooleanExpression(node):
+            return [self.emit(ROPBOOLJUMPNOTTRUE, condition, 0)]
+        return [self.emit(ROPJUMPNOTTRUE, condition, 0)]
+
+    def compileBlockValue(self, blockStatement, target):
+        #compiles a branch so that it leaves its value in target
+        self.enterBlock()
+        statements = blockStatement.statements
+        self.compileStatements(statements[:-1])
+        if statements and statements[-1].statementType == STATEMENT_TYPE_EXPRESSION:
+            mark = self.tempMark()
+            self.compileExpression(statements[-1].expression, target)
+            self.releaseTemps(mark)
+        else:
+            self.compileStatements(statements[-1:])
+            self.emit(ROPLOADNULL, target)
+        self.leaveBlock()
+
+    def compileExpression(self, node, target=None):
+        #compiles node and returns the register holding its value. That is target
+        #if given, otherwise a temporary or the register of a local variable
+        mark = self.tempMark()
+        exprType = node.expressionType
+        if exprType == EXPRESSION_TYPE_IDENT:
+            return self.loadSymbol(self.resolve(node.value), target)
+        elif exprType == EXPRESSION_TYPE_INT_LIT:
+            dst = self.destination(target, mark)
+            self.emit(ROPLOADK, dst, self.addConstant(newInteger(node.value)))
+        elif exprType == EXPRESSION_TYPE_STR_LIT:
+            dst = self.destination(target, mark)
+            self.emit(ROPLOADK, dst, self.addConstant(newString(node.value)))
+        elif exprType == EXPRESSION_TYPE_BOOLEAN:
+            dst = self.destination(target, mark)
+            self.emit(ROPLOADTRUE if node.value else ROPLOADFALSE, dst)
+        elif exprType == EXPRESSION_TYPE_NULL_LIT:
+            dst = self.destination(target, mark)
+            self.emit(ROPLOADNULL, dst)
+        elif exprType == EXPRESSION_TYPE_ARRAY_LIT:
+            first = self.compileConsecutive(node.elements)
+            dst = self.destination(target, mark)
+            self.emit(ROPARRAY, dst, first, len(node.elements))
+        elif exprType == EXPRESSION_TYPE_HASH_LIT:
+            #keys in the same order as the stack compiler puts them
+            pairs = sorted(node.elements, key=lambda e: str(e[0]))
+            first = self.compileConsecutive([e for pair in pairs for e in pair])
+            dst = self.destination(target, mark)
+            self.emit(ROPHASH, dst, first, len(pairs)*2)
+        elif exprType == EXPRESSION_TYPE_FUNC_LIT:
+            dst = self.compileFunction(node.name, node.parameters, node.body, target)
+        elif exprType == EXPRESSION_TYPE_CALL:
+            callee = self.compileExpression(node.function)
+            first = self.compileConsecutive(node.arguments)
+            dst = self.destination(target, mark)
+            self.emit(ROPCALL, dst, callee, first, len(node.arguments))
+        elif exprType == EXPRESSION_TYPE_INSTANCE_REF:
+            dst = self.destination(target, mark)
+            self.emit(ROPGETINSTANCE, dst)
+        elif exprType == EXPRESSION_TYPE_INDEX:
+            left = self.compileExpression(node.left)
+            index = self.compileExpression(node.index)
+            dst = self.destination(target, mark)
+            self.emit(ROPINDEX, dst, left, index)
+        elif exprType == EXPRESSION_TYPE_GET:
+            obj = self.compileExpression(node.object)
+            dst = self.compileGetProperty(obj, node.property, target)
+        elif exprType == EXPRESSION_TYPE_IF:
+            dst = self.compileIf(node, target)
+        elif exprType == EXPRESSION_TYPE_PREFIX:
+            right = self.compileExpression(node.right)
+            dst = self.destination(target, mark)
+            if node.operator == TOKEN_TYPES.TOKEN_TYPE_MINUS.value:
+                self.emit(ROPMINUS, dst, right)
+            elif node.operator in [TOKEN_TYPES.TOKEN_TYPE_NOT.value, TOKEN_TYPES.TOKEN_TYPE_EXCLAMATION.value]:
+                self.emit(ROPNOT, dst, right)
+            else:
+                raise BoaCompilerError("Unknown prefix operator: %s" % node.operator)
+        elif exprType == EXPRESSION_TYPE_INFIX:
+            if node.operator in [TOKEN_TYPES.TOKEN_TYPE_AND.value, TOKEN_TYPES.TOKEN_TYPE_OR.value]:
+                dst = self.compileShortCircuit(node, target)
+            elif node.operator in INFIX_OPCODES:
+                opcode, swap = INFIX_OPCODES[node.operator]
+                left = self.compileExpression(node.left)
+                right = self.compileExpression(node.right)
+                if swap:
+                    left, right = right, left
+                dst = self.destination(target, mark)
+                self.emit(opcode, dst, left, right)
+            else:
+                raise BoaCompilerError("Unknown infix operator: %s" % node.operator)
+        else:
+            raise BoaCompilerError("Unknown expression type: %s" % exprType)
+        self.releaseTemps(mark, dst)
+        return dst
+
+    def compileConsecutive(self, expressions):
+        #compiles expressions into consecutive temporaries, returns the first of them
+        first = self.allocTemps(len(expressions))
+        for i, expression in enumerate(expressions):
+            mark = self.tempMark()
+            self.compileExpression(expression, first + i)
+            self.releaseTemps(mark)
+        return first
+
+    def compileIf(self, node, target):
+        dst = self.allocTemps() if target is None else target
+        endJumps = []
+        for condition, consequence in node.conditionalBlocks:
+            falseJumps = self.compileCondition(condition)
+            self.compileBlockValue(consequence, dst)
+            endJumps.append(self.emit(ROPJUMP, 0))
+            for pos in falseJumps:
+                self.changeJumpTarget(pos, self.currentPos())
+        if node.alternative:
+            self.compileBlockValue(node.alternative, dst)
+        else:
+            self.emit(ROPLOADNULL, dst)
+        for pos in endJumps:
+            self.changeJumpTarget(pos, self.currentPos())
+        return dst
+
+    def compileShortCircuit(self, node, target):
+        #like the stack compiler, leaves a boolean and skips the right operand
+        #when the left one decides the result
+        dst = self.allocTemps() if target is None else target
+        if node.operator == TOKEN_TYPES.TOKEN_TYPE_AND.value:
+            falseJumps = self.compileCondition(node)
+        else:
+            rightJumps = self.compileCondition(node.left, True)
+            trueJump = self.emit(ROPJUMP, 0)
+            for pos in rightJumps:
+                self.changeJumpTarget(pos, self.currentPos())
+            falseJumps = self.compileCondition(node.right, True)
+            self.changeJumpTarget(trueJump, self.currentPos())
+        self.emit(ROPLOADTRUE, dst)
+        endJump = self.emit(ROPJUMP, 0)
+        for pos in falseJumps:
+            self.changeJumpTarget(pos, self.currentPos())
+        self.emit(ROPLOADFALSE, dst)
+        self.changeJumpTarget(endJump, self.currentPos())
+        return dst
+
+    def compileGetProperty(self, obj, property, target=None):
+        #property is looked up on the object in register obj
+        mark = self.tempMark()
+        propType = property.expressionType
+        if propType == EXPRESSION_TYPE_IDENT:
+            dst = self.destination(target, mark)
+            self.emit(ROPGETATTR, dst, obj, self.addName(property.value))
+        elif propType == EXPRESSION_TYPE_INDEX:
+            left = self.compileGetProperty(obj, property.left)
+            index = self.compileExpression(property.index)
+            dst = self.destination(target, mark)
+            self.emit(ROPINDEX, dst, left, index)
+        elif propType == EXPRESSION_TYPE_CALL:
+            callee = self.compileGetProperty(obj, property.function)
+            first = self.compileConsecutive(property.arguments)
+            dst = self.destination(target, mark)
+            self.emit(ROPCALL, dst, callee, first, len(property.arguments))
+        elif propType == EXPRESSION_TYPE_GET:
+            inner = self.compileGetProperty(obj, property.object)
+            dst = self.compileGetProperty(inner, property.property, target)
+        else:
+            raise BoaCompilerError("Property not gettable: %s" % property)
+        self.releaseTemps(mark, dst)
+        return dst
+
+    def compileSetProperty(self, obj, property, value):
+        propType = property.expressionType
+        if propType == EXPRESSION_TYPE_IDENT:
+            self.emit(ROPSETATTR, obj, self.addName(property.value), self.compileExpression(value))
+        elif propType == EXPRESSION_TYPE_INDEX:
+            left = self.compileGetProperty(obj, property.left)
+            index = self.compileExpression(property.index)
+            self.emit(ROPSETINDEX, left, index, self.compileExpression(value))
+        elif propType == EXPRESSION_TYPE_GET:
+            inner = self.compileGetProperty(obj, property.object)
+            self.compileSetProperty(inner, property.property, value)
+        else:
+            raise BoaCompilerError("Property not settable: %s" % property)
+
+    def compileFunction(self, name, parameters, body, target):
+        mark = self.tempMark()
+        self.scopes.append(RegisterScope())
+        self.symbolTable = SymbolTable(outer=self.symbolTable, isFunction=True)
+        if name is not None:
+            self.symbolTable.defineFunctionName(name)
+        for param in parameters:
+            self.symbolTable.define(param.value)
+
+        statements = body.statements
+        self.compileStatements(statements[:-1])
+        if statements and statements[-1].statementType == STATEMENT_TYPE_EXPRESSION:
+            self.emit(ROPRETURN, self.compileExpression(statements[-1].expression))
+        elif statements and statements[-1].statementType == STATEMENT_TYPE_RETURN:
+            self.compileStatement(statements[-1])
+        else:
+            self.compileStatements(statements[-1:])
+            null = self.allocTemps()
+            self.emit(ROPLOADNULL, null)
+            self.emit(ROPRETURN, null)
+
+        freeSymbols = self.symbolTable.freeSymbols
+        numLocals = self.symbolTable.numDefinitions
+        self.symbolTable = self.symbolTable.outer
+        instructions, numRegisters = self.assemble(self.scopes.pop(), numLocals)
+        compiledFn = newCompiledFunction(b''.join(instructions), numRegisters, len(parameters))
+
+        first = self.allocTemps(len(freeSymbols))
+        for i, freeSymbol in enumerate(freeSymbols):
+            self.loadSymbol(freeSymbol, first + i)
+        dst = self.destination(target, mark)
+        self.emit(ROPCLOSURE, dst, self.addConstant(compiledFn), first, len(freeSymbols))
+        return dst
+
+    def compileClassStatement(self, classStatement, classIndex):
+        #the constructor, then name/method pairs, go in consecutive registers
+        methods = classStatement.methodStatements
+        constructor = classStatement.constructorStatement
+        numConstructors = 1 if constructor else 0
+        first = self.allocTemps(numConstructors + 2*len(methods))
+        if constructor:
+            self.compileFunction(None, constructor.parameters, constructor.body, first)
+        for i, methodStatement in enumerate(methods):
+            nameRegister = first + numConstructors + 2*i
+            self.emit(ROPLOADK, nameRegister, self.addName(methodStatement.name))
+            self.compileFunction(None, methodStatement.parameters, methodStatement.body, nameRegister + 1)
+        self.emit(ROPDEFCLASS, classIndex, self.addName(classStatement.name), first, numConstructors, len(methods))
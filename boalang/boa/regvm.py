@@ -0,0 +1,437 @@
+from .code import (
+    ROPMOVE,
+    ROPLOADK,
+    ROPLOADTRUE,
+    ROPLOADFALSE,
+    ROPLOADNULL,
+    ROPGETGLOBAL,
+    ROPSETGLOBAL,
+    ROPGETFREE,
+    ROPGETBUILTIN,
+    ROPGETCLASS,
+    ROPCURRENTCLOSURE,
+    ROPGETINSTANCE,
+    ROPADD,
+    ROPSUB,
+    ROPMUL,
+    ROPDIV,
+    ROPEQ,
+    ROPNEQ,
+    ROPGT,
+    ROPGTEQ,
+    ROPIN,
+    ROPNOTIN,
+    ROPMINUS,
+    ROPNOT,
+    ROPJUMP,
+    ROPJUMPNOTTRUE,
+    ROPBOOLJUMPNOTTRUE,
+    ROPEQJUMP,
+    ROPNEQJUMP,
+    ROPGTJUMP,
+    ROPGTEQJUMP,
+    ROPARRAY,
+    ROPHASH,
+    ROPINDEX,
+    ROPSETINDEX,
+    ROPGETATTR,
+    ROPSETATTR,
+    ROPCLOSURE,
+    ROPCALL,
+    ROPRETURN,
+    ROPITER,
+    ROPITERNEXT,
+    ROPDEFCLASS,
+)
+from .object import (
+    newInteger,
+    newString,
+    newArray,
+    newHash,
+    newCompiledFunction,
+    newCompiledClass,
+    newClosure,
+    OBJECT_TYPES,
+    TRUE,
+    FALSE,
+    NULL,
+)
+from .builtins import (
+    getBuiltinByIndex,
+)
+from .vm import (
+    VM,
+    BoaVMError,
+    MAX_FRAMES,
+    INT_TYPE,
+    STRING_TYPE,
+    CLOSURE_TYPE,
+    decodedInstrs,
+    setObjectAttribute,
+)
+
+OPCODE_HANDLERS = {
+    ROPMOVE: "rOpMove",
+    ROPLOADK: "rOpLoadK",
+    ROPLOADTRUE: "rOpLoadTrue",
+    ROPLOADFALSE: "rOpLoadFalse",
+    ROPLOADNULL: "rOpLoadNull",
+    ROPGETGLOBAL: "rOpGetGlobal",
+    ROPSETGLOBAL: "rOpSetGlobal",
+    ROPGETFREE: "rOpGetFree",
+    ROPGETBUILTIN: "rOpGetBuiltin",
+    ROPGETCLASS: "rOpGetClass",
+    ROPCURRENTCLOSURE: "rOpCurrentClosure",
+    ROPGETINSTANCE: "rOpGetInstance",
+    ROPADD: "rOpAdd",
+    ROPSUB: "rOpSub",
+    ROPMUL: "rOpMul",
+    ROPDIV: "rOpDiv",
+    ROPEQ: "rOpEq",
+    ROPNEQ: "rOpNeq",
+    ROPGT: "rOpGt",
+    ROPGTEQ: "rOpGtEq",
+    ROPIN: "rOpIn",
+    ROPNOTIN: "rOpNotIn",
+    ROPMINUS: "rOpMinus",
+    ROPNOT: "rOpNot",
+    ROPJUMP: "rOpJump",
+    ROPJUMPNOTTRUE: "rOpJumpNotTrue",
+    ROPBOOLJUMPNOTTRUE: "rOpBoolJumpNotTrue",
+    ROPEQJUMP: "rOpEqJump",
+    ROPNEQJUMP: "rOpNeqJump",
+    ROPGTJUMP: "rOpGtJump",
+    ROPGTEQJUMP: "rOpGtEqJump",
+    ROPARRAY: "rOpArray",
+    ROPHASH: "rOpHash",
+    ROPINDEX: "rOpIndex",
+    ROPSETINDEX: "rOpSetIndex",
+    ROPGETATTR: "rOpGetAttr",
+    ROPSETATTR: "rOpSetAttr",
+    ROPCLOSURE: "rOpClosure",
+    ROPCALL: "rOpCall",
+    ROPRETURN: "rOpReturn",
+    ROPITER: "rOpIter",
+    ROPITERNEXT: "rOpIterNext",
+    ROPDEFCLASS: "rOpDefClass",
+}
+
+ITERATION_DONE = object() #what ROPITERNEXT gets from an exhausted iterator, never a Boa value
+
+class RegisterFrame(object):
+    __slots__ = ('cl', 'code', 'ip', 'registers', 'instance', 'resultRegister')
+
+    def __init__(self, cl, instance, resultRegister):
+        self.cl = cl
+        self.code = decodedInstrs(cl.compiledFunction)
+        self.ip = 0 #index into code
+        self.registers = [None]*cl.compiledFunction.numLocals
+        self.instance = instance #what ROPGETINSTANCE loads
+        self.resultRegister = resultRegister #caller's register the return value goes to
+
+class RegisterVM(object):
+    #runs RegisterCompiler output. Every instruction names the registers it reads
+    #and writes, so values move between registers of the current frame instead of
+    #being pushed and popped. Arguments are copied into the callee's first registers
+    def __init__(self, bytecode, symbolTable=None, maxFrames=MAX_FRAMES):
+        self.constants = bytecode.constants
+        self.maxFrames = maxFrames
+        self.globals = [None]*VM.initialGlobalsSize(bytecode, symbolTable)
+        self.classDefs = [None]*(bytecode.numClassDefs or 0)
+        self.globalSymbolTable = symbolTable
+        self.dispatch = self.buildDispatchTable()
+
+        mainFunction = newCompiledFunction(bytecode.instr, bytecode.numRegisters)
+        self.frames = [] #stack of RegisterFrames
+        self.frame = None #current frame
+        self.registers = None #current frame's registers
+        self.pushFrame(RegisterFrame(newClosure(mainFunction, []), None, 0))
+
+    #membership and boolean conversion work the same on both machines
+    contains = VM.contains
+    nativeBooleanToBooleanObject = VM.nativeBooleanToBooleanObject
+
+    def buildDispatchTable(self):
+        table = [self.opUnknown]*256
+        for opcode, handlerName in OPCODE_HANDLERS.items():
+            table[opcode[0]] = getattr(self, handlerName)
+        return table
+
+    @property
+    def frameIndex(self):
+        return len(self.frames)
+
+    def getGlobal(self, identifier):
+        symbol = self.globalSymbolTable.resolve(identifier)
+        return self.globals[symbol.index]
+
+    def lastPoppedStackEl(self):
+        #value of the last top level expression statement
+        return self.frames[0].registers[0]
+
+    def pushFrame(self, frame):
+        if len(self.frames) >= self.maxFrames:
+            raise BoaVMError("Frame stack overflow")
+        self.frames.append(frame)
+        self.frame = frame
+        self.registers = frame.registers
+
+    def popFrame(self):
+        frame = self.frames.pop()
+        self.frame = self.frames[-1]
+        self.registers = self.frame.registers
+        return frame
+
+    def run(self):
+        dispatch = self.dispatch
+        frame = self.frame
+        code = frame.code
+        while frame.ip < len(code):
+            op, operands = code[frame.ip]
+            frame.ip += 1
+            if dispatch[op](*operands):
+                frame = self.frame
+                code = frame.code
+
+    def opUnknown(self, *operands):
+        raise BoaVMError("Unknown opcode")
+
+    def rOpMove(self, dst, src):
+        self.registers[dst] = self.registers[src]
+
+    def rOpLoadK(self, dst, constIndex):
+        self.registers[dst] = self.constants[constIndex]
+
+    def rOpLoadTrue(self, dst):
+        self.registers[dst] = TRUE
+
+    def rOpLoadFalse(self, dst):
+        self.registers[dst] = FALSE
+
+    def rOpLoadNull(self, dst):
+        self.registers[dst] = NULL
+
+    def rOpGetGlobal(self, dst, globalIndex):
+        try:
+            self.registers[dst] = self.globals[globalIndex]
+        except IndexError:
+            raise BoaVMError("Global read before assignment: %d" % globalIndex)
+
+    def rOpSetGlobal(self, globalIndex, src):
+        if globalIndex >= len(self.globals):
+            self.globals.extend([None]*(globalIndex + 1 - len(self.globals)))
+        self.globals[globalIndex] = self.registers[src]
+
+    def rOpGetFree(self, dst, freeIndex):
+        self.registers[dst] = self.frame.cl.freeVariables[freeIndex]
+
+    def rOpGetBuiltin(self, dst, builtinIndex):
+        self.registers[dst] = getBuiltinByIndex(builtinIndex)
+
+    def rOpGetClass(self, dst, classIndex):
+        self.registers[dst] = self.classDefs[classIndex]
+
+    def rOpCurrentClosure(self, dst):
+        self.registers[dst] = self.frame.cl
+
+    def rOpGetInstance(self, dst):
+        instance = self.frame.instance
+        if instance is None:
+            raise BoaVMError("this not bound to instance")
+        self.registers[dst] = instance
+
+    def rOpAdd(self, dst, a, b):
+        registers = self.registers
+        left = registers[a]
+        right = registers[b]
+        if left.objectType is INT_TYPE and right.objectType is INT_TYPE:
+            registers[dst] = newInteger(left.value + right.value)
+        elif left.objectType is STRING_TYPE and right.objectType is STRING_TYPE:
+            registers[dst] = newString(left.value + right.value)
+        else:
+            raise BoaVMError("Unsupported types for binary operation: %s %s" % (left.objectType, right.objectType))
+
+    def rOpSub(self, dst, a, b):
+        left, right = self.intOperands(a, b)
+        self.registers[dst] = newInteger(left - right)
+
+    def rOpMul(self, dst, a, b):
+        left, right = self.intOperands(a, b)
+        self.registers[dst] = newInteger(left * right)
+
+    def rOpDiv(self, dst, a, b):
+        left, right = self.intOperands(a, b)
+        self.registers[dst] = newInteger(left / right)
+
+    def intOperands(self, a, b):
+        left = self.registers[a]
+        right = self.registers[b]
+        if left.objectType is not INT_TYPE or right.objectType is not INT_TYPE:
+            raise BoaVMError("Unsupported types for binary operation: %s %s" % (left.objectType, right.objectType))
+        return left.value, right.value
+
+    def rOpEq(self, dst, a, b):
+        self.registers[dst] = TRUE if self.registers[a].value == self.registers[b].value else FALSE
+
+    def rOpNeq(self, dst, a, b):
+        self.registers[dst] = TRUE if self.registers[a].value != self.registers[b].value else FALSE
+
+    def rOpGt(self, dst, a, b):
+        left, right = self.comparisonOperands(a, b)
+        self.registers[dst] = TRUE if left > right else FALSE
+
+    def rOpGtEq(self, dst, a, b):
+        left, right = self.comparisonOperands(a, b)
+        self.registers[dst] = TRUE if left >= right else FALSE
+
+    def comparisonOperands(self, a, b):
+        left = self.registers[a]
+        right = self.registers[b]
+        if left.objectType is not INT_TYPE or right.objectType is not INT_TYPE:
+            raise BoaVMError("Unsupported types for comparison: %s %s" % (left.objectType, right.objectType))
+        return left.value, right.value
+
+    def rOpIn(self, dst, a, b):
+        self.registers[dst] = self.nativeBooleanToBooleanObject(self.contains(self.registers[b], self.registers[a]))
+
+    def rOpNotIn(self, dst, a, b):
+        self.registers[dst] = self.nativeBooleanToBooleanObject(not self.contains(self.registers[b], self.registers[a]))
+
+    def rOpMinus(self, dst, src):
+        operand = self.registers[src]
+        if operand.objectType is not INT_TYPE:
+            raise BoaVMError("Unsupported type for negation: %s" % operand.objectType)
+        self.registers[dst] = newInteger(-operand.value)
+
+    def rOpNot(self, dst, src):
+        operand = self.registers[src]
+        self.registers[dst] = TRUE if operand is FALSE or operand is NULL else FALSE
+
+    def rOpJump(self, pos):
+        self.frame.ip = pos
+
+    def rOpJumpNotTrue(self, src, pos):
+        condition = self.registers[src]
+        if condition is FALSE or condition is NULL:
+            self.frame.ip = pos
+
+    def rOpBoolJumpNotTrue(self, src, pos):
+        condition = self.registers[src]
+        if condition is FALSE:
+            self.frame.ip = pos
+        elif condition is not TRUE:
+            raise BoaVMError("Unsupported type for and/or: %s" % condition.objectType)
+
+    def rOpEqJump(self, a, b, pos):
+        if self.registers[a].value != self.registers[b].value:
+            self.frame.ip = pos
+
+    def rOpNeqJump(self, a, b, pos):
+        if self.registers[a].value == self.registers[b].value:
+            self.frame.ip = pos
+
+    def rOpGtJump(self, a, b, pos):
+        left, right = self.comparisonOperands(a, b)
+        if not left > right:
+            self.frame.ip = pos
+
+    def rOpGtEqJump(self, a, b, pos):
+        left, right = self.comparisonOperands(a, b)
+        if not left >= right:
+            self.frame.ip = pos
+
+    def rOpArray(self, dst, first, numElements):
+        self.registers[dst] = newArray(self.registers[first:first+numElements])
+
+    def rOpHash(self, dst, first, numElements):
+        registers = self.registers
+        pairs = [(registers[i], registers[i+1]) for i in range(first, first+numElements, 2)]
+        self.registers[dst] = newHash(pairs)
+
+    def rOpIndex(self, dst, a, b):
+        left = self.registers[a]
+        index = self.registers[b]
+        leftType = left.objectType
+        if leftType is not OBJECT_TYPES.OBJECT_TYPE_HASH and \
+                (index.objectType is not INT_TYPE or leftType not in [OBJECT_TYPES.OBJECT_TYPE_ARRAY, STRING_TYPE]):
+            raise BoaVMError("Unsupported for index operation: %s,%s" % (leftType, index.objectType))
+        try:
+            self.registers[dst] = left[index]
+        except:
+            raise BoaVMError("Index error: %s" % index.inspect())
+
+    def rOpSetIndex(self, a, b, src):
+        self.registers[a][self.registers[b]] = self.registers[src]
+
+    def rOpGetAttr(self, dst, src, constIndex):
+        self.registers[dst] = self.registers[src].getAttribute(self.constants[constIndex].value)
+
+    def rOpSetAttr(self, dst, constIndex, src):
+        obj = self.registers[dst]
+        val = self.registers[src]
+        if val.objectType is CLOSURE_TYPE:
+            val = newClosure(val.compiledFunction, val.freeVariables, instance=obj)
+        setObjectAttribute(obj, self.constants[constIndex].value, val)
+
+    def rOpClosure(self, dst, constIndex, first, numFree):
+        self.registers[dst] = newClosure(self.constants[constIndex], self.registers[first:first+numFree])
+
+    def rOpCall(self, dst, src, first, numArgs):
+        callee = self.registers[src]
+        calleeType = callee.objectType
+        if calleeType is CLOSURE_TYPE:
+            return self.callClosure(callee, dst, first, numArgs)
+        elif calleeType in [OBJECT_TYPES.OBJECT_TYPE_BUILTIN_FUNCTION, OBJECT_TYPES.OBJECT_TYPE_BUILTIN_METHOD]:
+            self.registers[dst] = callee.func(self.registers[first:first+numArgs])
+        elif calleeType is OBJECT_TYPES.OBJECT_TYPE_COMPILED_CLASS:
+            instance, constructor = callee.createInstance()
+            if constructor is not None:
+                return self.callClosure(constructor, dst, first, numArgs)
+            if numArgs != 0:
+                raise BoaVMError('Default constructor for %s does not expect arguments. Got %d' % (callee.inspect(), numArgs))
+            self.registers[dst] = instance
+        else:
+            raise BoaVMError("Calling non-function/builtin")
+
+    def callClosure(self, cl, dst, first, numArgs):
+        fn = cl.compiledFunction
+        if numArgs != fn.numParameters:
+            raise BoaVMError("Wrong number of arguments: got %d, wanted %d" % (numArgs, fn.numParameters))
+        instance = cl.instance if cl.instance is not None else self.frame.instance
+        frame = RegisterFrame(cl, instance, dst)
+        frame.registers[:numArgs] = self.registers[first:first+numArgs]
+        self.pushFrame(frame)
+        return True
+
+    def rOpReturn(self, src):
+        value = self.registers[src]
+        if len(self.frames) == 1:
+            #a top level return ends the program with its value
+            self.registers[0] = value
+            self.frame.ip = len(self.frame.code)
+            return False
+        frame = self.popFrame()
+        if frame.cl.isConstructor:
+            value = frame.cl.instance
+        self.registers[frame.resultRegister] = value
+        return True
+
+    def rOpIter(self, dst, src):
+        self.registers[dst] = iter(self.registers[src])
+
+    def rOpIterNext(self, dst, src, pos):
+        val = next(self.registers[src], ITERATION_DONE)
+        if val is ITERATION_DONE:
+            self.frame.ip = pos
+        else:
+            self.registers[dst] = val
+
+    def rOpDefClass(self, classIndex, constIndex, first, numConstructors, numMethods):
+        registers = self.registers
+        constructor = registers[first] if numConstructors else None
+        methods = {}
+        for i in range(first + numConstructors, first + numConstructors + 2*numMethods, 2):
+            methods[registers[i].value] = registers[i+1]
+        if classIndex >= len(self.classDefs):
+            self.classDefs.extend([None]*(classIndex + 1 - len(self.classDefs)))
+        self.classDefs[classIndex] = newCompiledClass(self.constants[constIndex].value, constructor, methods)
@@ -0,0 +1,216 @@
+from .ast import (
+    NODE_TYPE_PROGRAM,
+    NODE_TYPE_STATEMENT,
+    NODE_TYPE_EXPRESSION,
+    STATEMENT_TYPE_EXPRESSION,
+    STATEMENT_TYPE_BLOCK,
+    STATEMENT_TYPE_RETURN,
+    STATEMENT_TYPE_LET,
+    STATEMENT_TYPE_ASSIGN,
+    STATEMENT_TYPE_WHILE,
+    STATEMENT_TYPE_FOR,
+    STATEMENT_TYPE_CLASS,
+    EXPRESSION_TYPE_IDENT,
+    EXPRESSION_TYPE_FUNC_LIT,
+    EXPRESSION_TYPE_ARRAY_LIT,
+    EXPRESSION_TYPE_HASH_LIT,
+    EXPRESSION_TYPE_PREFIX,
+    EXPRESSION_TYPE_INFIX,
+    EXPRESSION_TYPE_INDEX,
+    EXPRESSION_TYPE_GET,
+    EXPRESSION_TYPE_IF,
+    EXPRESSION_TYPE_CALL,
+)
+
+#marks a slot whose name hasn't been declared yet in this run of its scope
+UNSET = object()
+
+class Frame(object):
+    #a list-backed environment for a resolved scope, chained like Environment through outer
+    __slots__ = ('slots', 'outer', 'instance')
+
+    def __init__(self, outer, size):
+        self.slots = [UNSET] * size
+        self.outer = outer
+        self.instance = None
+
+class Scope(object):
+    def __init__(self, outer, names):
+        self.store = {} #maps names to slots
+        self.outer = outer #enclosing Scope, None outside the outermost local scope
+        for name in names:
+            self.define(name)
+
+    def define(self, name):
+        if name not in self.store:
+            self.store[name] = len(self.store)
+        return self.store[name]
+
+    @property
+    def size(self):
+        return len(self.store)
+
+class Resolver(object):
+    '''
+    Annotates an AST for the closure engine. Scopes match the environments boaEval creates:
+    function calls, if branches and loop bodies, under the dict backed Environment the tree
+    runs in. Every scope's names get slots in a Frame, block scopes declaring nothing get no
+    Frame at all.
+
+    Identifiers get candidates, the (depth, slot)s of all enclosing scopes declaring the name,
+    innermost first, and globalDepth, the number of frames above the Environment. The first
+    candidate set at runtime wins and the Environment is searched by name after them, which is
+    exactly the order boaEval walks its dicts in.
+    '''
+    def __init__(self):
+        self.scope = None
+
+    def resolve(self, node):
+        nodeType = node.nodeType
+        if nodeType == NODE_TYPE_PROGRAM:
+            for statement in node.statements:
+                self.resolve(statement)
+        elif nodeType == NODE_TYPE_STATEMENT:
+            self.resolveStatement(node)
+        elif nodeType == NODE_TYPE_EXPRESSION:
+            self.resolveExpression(node)
+
+    def enterScope(self, names):
+        self.scope = Scope(self.scope, names)
+        return self.scope
+
+    def leaveScope(self):
+        self.scope = self.scope.outer
+
+    def declaredNames(self, block):
+        #the names let declares directly in a block, so a scope knows its size before resolving it
+        names = []
+        for statement in block.statements:
+            if statement.statementType == STATEMENT_TYPE_LET:
+                names.append(statement.identifier.value)
+            elif statement.statementType == STATEMENT_TYPE_BLOCK:
+                names.extend(self.declaredNames(statement))
+        return names
+
+    def resolveFunction(self, parameters, body):
+        scope = self.enterScope([p.value for p in parameters] + self.declaredNames(body))
+        body.paramSlots = [scope.store[p.value] for p in parameters]
+        self.resolveBlock(body)
+        body.slotCount = scope.size
+        self.leaveScope()
+
+    def resolveBlockScope(self, block, names=()):
+        names = list(names) + self.declaredNames(block)
+        block.slotCount = len(set(names))
+        if not names:
+            self.resolveBlock(block)
+            return
+        self.enterScope(names)
+        self.resolveBlock(block)
+        self.leaveScope()
+
+    def resolveBlock(self, block):
+        for statement in block.statements:
+            self.resolveStatement(statement)
+
+    def resolveIdentifier(self, ident):
+        candidates = []
+        depth = 0
+        scope = self.scope
+        while scope is not None:
+            if ident.value in scope.store:
+                candidates.append((depth, scope.store[ident.value]))
+            depth += 1
+            scope = scope.outer
+        ident.candidates = candidates
+        ident.globalDepth = depth
+
+    def resolveStatement(self, node):
+        stmtType = node.statementType
+        if stmtType == STATEMENT_TYPE_EXPRESSION:
+            self.resolveExpression(node.expression)
+        elif stmtType == STATEMENT_TYPE_BLOCK:
+            self.resolveBlock(node)
+        elif stmtType == STATEMENT_TYPE_RETURN:
+            if node.value is not None:
+                self.resolveExpression(node.value)
+        elif stmtType == STATEMENT_TYPE_LET:
+            self.resolveExpression(node.value)
+            node.identifier.slot = self.scope.store[node.identifier.value] if self.scope is not None else None
+        elif stmtType == STATEMENT_TYPE_ASSIGN:
+            self.resolveExpression(node.identifier)
+            self.resolveExpression(node.value)
+        elif stmtType == STATEMENT_TYPE_WHILE:
+            self.resolveExpression(node.condition)
+            self.resolveBlockScope(node.blockStatement)
+            node.blockStatement.captures = capturesEnvironment(node.blockStatement)
+        elif stmtType == STATEMENT_TYPE_FOR:
+            self.resolveExpression(node.iterable)
+            self.resolveBlockScope(node.blockStatement, [node.iterator.value])
+            node.blockStatement.captures = capturesEnvironment(node.blockStatement)
+        elif stmtType == STATEMENT_TYPE_CLASS:
+            if node.constructorStatement:
+                self.resolveFunction(node.constructorStatement.parameters, node.constructorStatement.body)
+            for methodStatement in node.methodStatements:
+                self.resolveFunction(methodStatement.parameters, methodStatement.body)
+
+    def resolveExpression(self, node):
+        exprType = node.expressionType
+        if exprType == EXPRESSION_TYPE_IDENT:
+            self.resolveIdentifier(node)
+        elif exprType == EXPRESSION_TYPE_ARRAY_LIT:
+            for element in node.elements:
+                self.resolveExpression(element)
+        elif exprType == EXPRESSION_TYPE_HASH_LIT:
+            for key, val in node.elements:
+                self.resolveExpression(key)
+                self.resolveExpression(val)
+        elif exprType == EXPRESSION_TYPE_PREFIX:
+            self.resolveExpression(node.right)
+        elif exprType == EXPRESSION_TYPE_INFIX:
+            self.resolveExpression(node.left)
+            self.resolveExpression(node.right)
+        elif exprType == EXPRESSION_TYPE_INDEX:
+            self.resolveExpression(node.left)
+            self.resolveExpression(node.index)
+        elif exprType == EXPRESSION_TYPE_GET:
+            self.resolveExpression(node.object)
+            self.resolveProperty(node.property)
+        elif exprType == EXPRESSION_TYPE_IF:
+            for condition, consequence in node.conditionalBlocks:
+                self.resolveExpression(condition)
+                self.resolveBlockScope(consequence)
+            if node.alternative is not None:
+                self.resolveBlockScope(node.alternative)
+        elif exprType == EXPRESSION_TYPE_FUNC_LIT:
+            self.resolveFunction(node.parameters, node.body)
+        elif exprType == EXPRESSION_TYPE_CALL:
+            self.resolveExpression(node.function)
+            for argument in node.arguments:
+                self.resolveExpression(argument)
+
+    def resolveProperty(self, property):
+        #attribute names aren't variables, only the indexes and arguments along the path are
+        propType = property.expressionType
+        if propType == EXPRESSION_TYPE_INDEX:
+            self.resolveProperty(property.left)
+            self.resolveExpression(property.index)
+        elif propType == EXPRESSION_TYPE_CALL:
+            self.resolveProperty(property.function)
+            for argument in property.arguments:
+                self.resolveExpression(argument)
+        elif propType == EXPRESSION_TYPE_GET:
+            self.resolveProperty(property.object)
+            self.resolveProperty(property.property)
+
+def capturesEnvironment(node):
+    #whether anything in node can keep the environment it runs in, a function literal or a class
+    if isinstance(node, (list, tuple)):
+        return any(capturesEnvironment(child) for child in node)
+    if not hasattr(node, 'nodeType'):
+        return False
+    if node.nodeType == NODE_TYPE_EXPRESSION and node.expressionType == EXPRESSION_TYPE_FUNC_LIT:
+        return True
+    if node.nodeType == NODE_TYPE_STATEMENT and node.statementType == STATEMENT_TYPE_CLASS:
+        return True
+    return any(capturesEnvironment(child) for key, child in vars(node).items() if key != 'token')
@@ -17,22 +17,31 @@ class Symbol(object):
         self.index = index
 
 class SymbolTable(object):
-    def __init__(self, outer=None, isFunction=False):
+    def __init__(self, outer=None, isFunction=False, isInline=False):
         self.store = {} #maps strings to Symbols
         self.freeSymbols = [] #list of Symbols
         self.numClasses = 0
         self.numDefinitions = 0
         self.outer = outer #Enclosing SymbolTable
         self.isFunction = isFunction
+        self.isInline = isInline #scope compiled into its enclosing frame, e.g. an inlined loop body
+
+    def slotOwner(self):
+        #the table whose frame holds this table's slots
+        table = self
+        while table.isInline:
+            table = table.outer
+        return table
 
     def define(self, name): #accepts string, returns Symbols
-        symbol = Symbol(name, GLOBAL_SCOPE, self.numDefinitions)
-        if self.outer is None:
+        owner = self.slotOwner()
+        symbol = Symbol(name, GLOBAL_SCOPE, owner.numDefinitions)
+        if owner.outer is None:
             symbol.scope = GLOBAL_SCOPE
         else:
             symbol.scope = LOCAL_SCOPE
         self.store[name] = symbol
-        self.numDefinitions += 1
+        owner.numDefinitions += 1
         return symbol
 
     def defineClassName(self, name):
@@ -62,6 +71,9 @@ class SymbolTable(object):
             return self, self.store[name], scopeDiff, False
         if self.outer is None:
             raise SymbolNotFoundError(name)
+        if self.isInline:
+            #inline scopes share their owner's frame, so no frame boundary is crossed
+            return self.outer.innerResolve(name, scopeDiff, fnScopeInbtwn)
         scope, sym, sd, isF = self.outer.innerResolve(name, scopeDiff+1, self.isFunction or fnScopeInbtwn)
         if sym.scope in [GLOBAL_SCOPE, BUILTIN_SCOPE, CLASS_SCOPE]:
             return scope, sym, sd, isF
@@ -71,12 +83,21 @@ class SymbolTable(object):
                 return scope, blockSymbol, sd, isF
         elif sym.scope == BLOCK_SCOPE:
             if not self.isFunction and not fnScopeInbtwn:
-                blockSymbol.scopeDiff = sd
-                return scope, blockSymbol, sd, isF
+                return scope, sym, sd, isF
 
         sym = self.defineFree(sym)
         return scope, sym, sd, isF
 
+    def definition(self, name):
+        #the symbol a name refers to in the table that defines it, without capturing
+        #it as a free symbol along the way. None if the name is not defined
+        table = self
+        while table is not None:
+            if name in table.store:
+                return table.store[name]
+            table = table.outer
+        return None
+
     def resolve(self, name):
         scope, symbol, scopeDiff, fnScopeInbtwn = self.innerResolve(name, 0, self.isFunction)
         return symbol
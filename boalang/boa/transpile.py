@@ -0,0 +1,633 @@
+import copy
+import hashlib
+
+from .ast import (
+    Node,
+    NODE_TYPE_PROGRAM,
+    NODE_TYPE_STATEMENT,
+    NODE_TYPE_EXPRESSION,
+    STATEMENT_TYPE_EXPRESSION,
+    STATEMENT_TYPE_LET,
+    STATEMENT_TYPE_ASSIGN,
+    STATEMENT_TYPE_RETURN,
+    STATEMENT_TYPE_BLOCK,
+    STATEMENT_TYPE_WHILE,
+    STATEMENT_TYPE_FOR,
+    STATEMENT_TYPE_BREAK,
+    STATEMENT_TYPE_CONTINUE,
+    STATEMENT_TYPE_CLASS,
+    EXPRESSION_TYPE_INT_LIT,
+    EXPRESSION_TYPE_NULL_LIT,
+    EXPRESSION_TYPE_STR_LIT,
+    EXPRESSION_TYPE_ARRAY_LIT,
+    EXPRESSION_TYPE_HASH_LIT,
+    EXPRESSION_TYPE_BOOLEAN,
+    EXPRESSION_TYPE_IDENT,
+    EXPRESSION_TYPE_INSTANCE_REF,
+    EXPRESSION_TYPE_INFIX,
+    EXPRESSION_TYPE_PREFIX,
+    EXPRESSION_TYPE_INDEX,
+    EXPRESSION_TYPE_GET,
+    EXPRESSION_TYPE_FUNC_LIT,
+    EXPRESSION_TYPE_IF,
+    EXPRESSION_TYPE_CALL,
+)
+from .token import (
+    TOKEN_TYPES,
+)
+from .builtins import (
+    BUILTIN_FUNCTION_LIST,
+)
+from .optimize import (
+    ASTOptimizer,
+    isBooleanExpression,
+)
+from .pyruntime import (
+    runtimeNamespace,
+    box,
+)
+
+class BoaTranspilerError(Exception): pass
+
+INDENT = '    '
+RESULT_NAME = '_result' #global holding the value of the last top level expression statement
+RETURN_VALUE = object() #block value target of a function body: the value is returned
+
+#infix operator -> runtime helper. Helpers take their operands left to right
+INFIX_HELPERS = {
+    TOKEN_TYPES.TOKEN_TYPE_PLUS.value: '_add',
+    TOKEN_TYPES.TOKEN_TYPE_MINUS.value: '_sub',
+    TOKEN_TYPES.TOKEN_TYPE_ASTERISK.value: '_mul',
+    TOKEN_TYPES.TOKEN_TYPE_SLASH.value: '_div',
+    TOKEN_TYPES.TOKEN_TYPE_EQ.value: '_eq',
+    TOKEN_TYPES.TOKEN_TYPE_NEQ.value: '_neq',
+    TOKEN_TYPES.TOKEN_TYPE_GT.value: '_gt',
+    TOKEN_TYPES.TOKEN_TYPE_GTEQ.value: '_gtEq',
+    TOKEN_TYPES.TOKEN_TYPE_LT.value: '_lt',
+    TOKEN_TYPES.TOKEN_TYPE_LTEQ.value: '_ltEq',
+    TOKEN_TYPES.TOKEN_TYPE_IN.value: '_isIn',
+    TOKEN_TYPES.TOKEN_TYPE_NOTIN.value: '_notIn',
+}
+
+LOGICAL_OPERATORS = [TOKEN_TYPES.TOKEN_TYPE_AND.value, TOKEN_TYPES.TOKEN_TYPE_OR.value]
+NOT_OPERATORS = [TOKEN_TYPES.TOKEN_TYPE_NOT.value, TOKEN_TYPES.TOKEN_TYPE_EXCLAMATION.value]
+
+codeCache = {} #sha256 of Python source -> code object, shared by all TranspiledPrograms
+
+def compileSource(source):
+    key = hashlib.sha256(source.encode('utf-8')).hexdigest()
+    code = codeCache.get(key)
+    if code is None:
+        code = codeCache[key] = compile(source, '<boa %s>' % key[:12], 'exec')
+    return code
+
+class TranspiledProgram(object):
+    #a transpiled program, run by executing its Python code
+    def __init__(self, source, globalNames):
+        self.source = source
+        self.globalNames = globalNames #Boa name -> Python name of the top level bindings
+        self.code = compileSource(source)
+        self.namespace = runtimeNamespace()
+
+    def run(self):
+        exec(self.code, self.namespace)
+        self.namespace['_main']()
+
+    def getGlobal(self, identifier):
+        return box(self.namespace[self.globalNames[identifier]])
+
+    def lastValue(self):
+        return box(self.namespace[RESULT_NAME])
+
+class FunctionContext(object):
+    #a Python function being generated. Its body is kept apart so the declarations
+    #it turns out to need can be put in front of it
+    def __init__(self, outer, thisName=None, isConstructor=False):
+        self.outer = outer
+        self.lines = []
+        self.indent = 1
+        self.globals = set() #names assigned here that live in the module
+        self.nonlocals = set() #names assigned here that live in an enclosing function
+        self.numTemps = 0
+        self.loopDepth = 0
+        self.thisName = thisName #Python name this refers to, None outside methods
+        self.isConstructor = isConstructor
+
+class Scope(object):
+    def __init__(self, function, outer=None):
+        self.function = function #FunctionContext whose frame holds the names
+        self.outer = outer
+        self.names = {} #Boa name -> Python name
+
+class Transpiler(object):
+    #translates a Boa AST into Python source over the runtime in boa.pyruntime. Every
+    #Boa binding gets its own Python name, so block scoping survives the move to
+    #Python's function scopes. Boa functions become nested defs, classes subclasses
+    #of pyruntime.Instance and loops Python loops
+    def __init__(self, optimizationLevel=0):
+        self.optimizationLevel = optimizationLevel #1: fold constants and drop dead code, 2: also propagate constants
+        self.usedNames = set() #Python names given to Boa bindings so far
+        self.constants = [] #lines creating the string constants
+        self.numFunctions = 0
+        self.main = FunctionContext(None)
+        self.function = self.main
+        self.scope = Scope(self.main)
+        self.globalNames = {} #Boa name -> Python name of the top level bindings
+
+    def transpile(self, node):
+        #returns the Python source of the program
+        if node.nodeType != NODE_TYPE_PROGRAM:
+            raise BoaTranspilerError("Can only transpile programs, got %s" % node.nodeType)
+        if self.optimizationLevel >= 1:
+            optimizer = ASTOptimizer(propagateConstants=self.optimizationLevel >= 2)
+            node = optimizer.optimizeProgram(copy.deepcopy(node))
+        for statement in node.statements:
+            if statement.statementType == STATEMENT_TYPE_CLASS:
+                self.define(statement.name)
+        self.main.globals.add(RESULT_NAME)
+        self.compileStatements(node.statements)
+        lines = self.constants + self.functionLines('_main', [], self.main)
+        return '\n'.join(lines) + '\n'
+
+    def program(self, node):
+        return TranspiledProgram(self.transpile(node), dict(self.globalNames))
+
+    def emit(self, line):
+        self.function.lines.append(INDENT*self.function.indent + line)
+
+    def newTemp(self):
+        self.function.numTemps += 1
+        return '_t%d' % self.function.numTemps
+
+    def spill(self, pyExpr):
+        #evaluates pyExpr now, for when code emitted next could change its value
+        if pyExpr.startswith('_t') or pyExpr.startswith('_k') or pyExpr in ['None', 'True', 'False'] or pyExpr.lstrip('-').isdigit():
+            return pyExpr
+        temp = self.newTemp()
+        self.emit('%s = %s' % (temp, pyExpr))
+        return temp
+
+    def newName(self, name):
+        pyName = 'b_' + name
+        i = 1
+        while pyName in self.usedNames:
+            pyName = 'b_%s_%d' % (name, i)
+            i += 1
+        self.usedNames.add(pyName)
+        return pyName
+
+    def define(self, name, pyName=None):
+        if pyName is None:
+            pyName = self.newName(name)
+        self.scope.names[name] = pyName
+        if self.scope.function is self.main:
+            self.main.globals.add(pyName)
+            if self.scope.outer is None:
+                self.globalNames[name] = pyName
+        return pyName
+
+    def resolve(self, name):
+        #returns the Python name and the FunctionContext that holds it
+        scope = self.scope
+        while scope is not None:
+            if name in scope.names:
+                return scope.names[name], scope.function
+            scope = scope.outer
+        if name in BUILTIN_FUNCTION_LIST:
+            return '_builtin_' + name, None
+        raise BoaTranspilerError("Identifier not defined: %s" % name)
+
+    def assignable(self, name):
+        #Python name to assign to, declared in the current function if it lives elsewhere
+        pyName, owner = self.resolve(name)
+        if owner is None:
+            raise BoaTranspilerError("Cannot assign symbol at current scope: %s" % name)
+        if owner is self.main:
+            self.function.globals.add(pyName)
+        elif owner is not self.function:
+            self.function.nonlocals.add(pyName)
+        return pyName
+
+    def enterScope(self):
+        self.scope = Scope(self.function, self.scope)
+
+    def leaveScope(self):
+        self.scope = self.scope.outer
+
+    def indented(self, compileBody):
+        #runs compileBody one level deeper, making sure the Python block isn't empty
+        self.function.indent += 1
+        numLines = len(self.function.lines)
+        compileBody()
+        if len(self.function.lines) == numLines:
+            self.emit('pass')
+        self.function.indent -= 1
+
+    def compileStatements(self, statements):
+        for statement in statements:
+            self.compileStatement(statement)
+
+    def compileBlock(self, blockStatement, target=None):
+        #compiles a branch or loop body in its own scope. If target is given the value
+        #of the block is stored there
+        self.enterScope()
+        statements = blockStatement.statements
+        self.compileStatements(statements[:-1])
+        if statements and statements[-1].statementType == STATEMENT_TYPE_EXPRESSION and target is not None:
+            self.compileValue(statements[-1].expression, target)
+        else:
+            self.compileStatements(statements[-1:])
+            if target is not None and not (statements and self.endsFlow(statements[-1])):
+                self.storeValue(target, 'None')
+        self.leaveScope()
+
+    def endsFlow(self, statement):
+        return statement.statementType in [STATEMENT_TYPE_RETURN, STATEMENT_TYPE_BREAK, STATEMENT_TYPE_CONTINUE]
+
+    def storeValue(self, target, pyExpr):
+        if target is not RETURN_VALUE:
+            self.emit('%s = %s' % (target, pyExpr))
+        elif self.function.isConstructor:
+            #constructors evaluate to the new instance whatever they return
+            if pyExpr != 'None':
+                self.emit(pyExpr)
+            self.emit('return')
+        else:
+            self.emit('return %s' % pyExpr)
+
+    def compileValue(self, node, target):
+        if node.expressionType == EXPRESSION_TYPE_IF and self.needsStatements(node):
+            self.compileIf(node, target)
+        else:
+            self.storeValue(target, self.expression(node))
+
+    def compileStatement(self, node):
+        stmtType = node.statementType
+        if stmtType == STATEMENT_TYPE_EXPRESSION:
+            expression = node.expression
+            if self.function is self.main:
+                self.compileValue(expression, RESULT_NAME)
+            elif expression.expressionType == EXPRESSION_TYPE_IF:
+                self.compileIf(expression, None)
+            else:
+                self.emit(self.expression(expression))
+        elif stmtType == STATEMENT_TYPE_BLOCK:
+            self.compileStatements(node.statements)
+        elif stmtType == STATEMENT_TYPE_LET:
+            name = node.identifier.value
+            if node.value.expressionType == EXPRESSION_TYPE_FUNC_LIT:
+                #defined first so the function can call itself by name
+                pyName = self.define(name)
+                self.compileFunctionLiteral(node.value, pyName)
+            else:
+                pyName = self.newName(name)
+                self.compileValue(node.value, pyName)
+                self.define(name, pyName)
+        elif stmtType == STATEMENT_TYPE_ASSIGN:
+            self.compileAssign(node.identifier, node.value)
+        elif stmtType == STATEMENT_TYPE_CLASS:
+            self.compileClass(node)
+        elif stmtType == STATEMENT_TYPE_WHILE:
+            self.compileWhile(node)
+        elif stmtType == STATEMENT_TYPE_FOR:
+            self.compileFor(node)
+        elif stmtType in [STATEMENT_TYPE_BREAK, STATEMENT_TYPE_CONTINUE]:
+            if self.function.loopDepth == 0:
+                raise BoaTranspilerError("%s outside of a loop" % ('break' if stmtType == STATEMENT_TYPE_BREAK else 'continue'))
+            self.emit('break' if stmtType == STATEMENT_TYPE_BREAK else 'continue')
+        elif stmtType == STATEMENT_TYPE_RETURN:
+            value = self.expression(node.value) if node.value else 'None'
+            if self.function is self.main:
+                #a top level return ends the program
+                self.emit('%s = %s' % (RESULT_NAME, value))
+                self.emit('return')
+            else:
+                self.storeValue(RETURN_VALUE, value)
+        else:
+            raise BoaTranspilerError("Unknown statement type: %s" % stmtType)
+
+    def compileAssign(self, identifier, value):
+        if identifier.expressionType == EXPRESSION_TYPE_INDEX:
+            left, index, val = self.operands([identifier.left, identifier.index, value])
+            self.emit('_setIndex(%s, %s, %s)' % (left, index, val))
+        elif identifier.expressionType == EXPRESSION_TYPE_GET:
+            obj = self.expression(identifier.object)
+            if self.needsStatements([identifier.property, value]):
+                obj = self.spill(obj)
+            self.compileSetProperty(obj, identifier.property, value)
+        else:
+            pyName = self.assignable(identifier.value)
+            self.compileValue(value, pyName)
+
+    def compileSetProperty(self, obj, property, value):
+        propType = property.expressionType
+        if propType == EXPRESSION_TYPE_IDENT:
+            self.emit('_setAttr(%s, %r, %s)' % (obj, property.value, self.expression(value)))
+        elif propType == EXPRESSION_TYPE_INDEX:
+            left = self.getProperty(obj, property.left)
+            if self.needsStatements([property.index, value]):
+                left = self.spill(left)
+            index, val = self.operands([property.index, value])
+            self.emit('_setIndex(%s, %s, %s)' % (left, index, val))
+        elif propType == EXPRESSION_TYPE_GET:
+            inner = self.getProperty(obj, property.object)
+            if self.needsStatements([property.property, value]):
+                inner = self.spill(inner)
+            self.compileSetProperty(inner, property.property, value)
+        else:
+            raise BoaTranspilerError("Property not settable: %s" % property)
+
+    def compileWhile(self, node):
+        if self.needsStatements(node.condition):
+            #the condition's statements run at the top of every iteration
+            self.emit('while True:')
+            def compileBody():
+                self.emit('if not %s:' % self.condition(node.condition))
+                self.indented(lambda: self.emit('break'))
+                self.compileLoopBody(node.blockStatement)
+            self.indented(compileBody)
+        else:
+            self.emit('while %s:' % self.condition(node.condition))
+            self.indented(lambda: self.compileLoopBody(node.blockStatement))
+
+    def compileFor(self, node):
+        iterable = self.expression(node.iterable)
+        self.enterScope()
+        self.emit('for %s in _iterate(%s):' % (self.define(node.iterator.value), iterable))
+        self.indented(lambda: self.compileLoopBody(node.blockStatement))
+        self.leaveScope()
+
+    def compileLoopBody(self, blockStatement):
+        self.function.loopDepth += 1
+        self.compileBlock(blockStatement)
+        self.function.loopDepth -= 1
+
+    def compileIf(self, node, target):
+        #an if whose conditions were all folded away always runs its else branch
+        if not node.conditionalBlocks:
+            if node.alternative:
+                self.compileBlock(node.alternative, target)
+            elif target is not None:
+                self.storeValue(target, 'None')
+            return
+        keyword = 'if'
+        for i, (condition, consequence) in enumerate(node.conditionalBlocks):
+            if i > 0 and self.needsStatements(condition):
+                #the condition's statements go in the else branch of the conditions before it
+                rest = copy.copy(node)
+                rest.conditionalBlocks = node.conditionalBlocks[i:]
+                self.emit('else:')
+                self.indented(lambda: self.compileIf(rest, target))
+                return
+            self.emit('%s %s:' % (keyword, self.condition(condition)))
+            self.indented(lambda: self.compileBlock(consequence, target))
+            keyword = 'elif'
+        if node.alternative:
+            self.emit('else:')
+            self.indented(lambda: self.compileBlock(node.alternative, target))
+        elif target is not None:
+            self.emit('else:')
+            self.indented(lambda: self.storeValue(target, 'None'))
+
+    def needsStatements(self, node):
+        #True if node can't be written as a single Python expression, because it holds
+        #an if with statements in its branches. Function literals are defined up front
+        #but that has no effects, so they don't count
+        if isinstance(node, (list, tuple)):
+            return any(self.needsStatements(n) for n in node)
+        if not isinstance(node, Node):
+            return False
+        if node.nodeType == NODE_TYPE_EXPRESSION:
+            if node.expressionType == EXPRESSION_TYPE_FUNC_LIT:
+                return False
+            if node.expressionType == EXPRESSION_TYPE_IF:
+                blocks = [block for condition, block in node.conditionalBlocks]
+                if node.alternative:
+                    blocks.append(node.alternative)
+                for block in blocks:
+                    statements = block.statements
+                    if len(statements) > 1 or (statements and statements[0].statementType != STATEMENT_TYPE_EXPRESSION):
+                        return True
+        elif node.nodeType == NODE_TYPE_STATEMENT and node.statementType != STATEMENT_TYPE_EXPRESSION \
+                and node.statementType != STATEMENT_TYPE_BLOCK:
+            return True
+        return any(self.needsStatements(child) for child in vars(node).values())
+
+    def operands(self, nodes):
+        #compiles nodes to Python expressions evaluated left to right
+        results = []
+        for node in nodes:
+            if self.needsStatements(node):
+                results = [self.spill(result) for result in results]
+            results.append(self.expression(node))
+        return results
+
+    def condition(self, node):
+        #a Python expression that is true when node's value is truthy
+        if node.expressionType == EXPRESSION_TYPE_BOOLEAN:
+            return 'True' if node.value else 'False'
+        if node.expressionType == EXPRESSION_TYPE_INFIX and node.operator in list(INFIX_HELPERS.keys()) + LOGICAL_OPERATORS \
+                and node.operator not in [TOKEN_TYPES.TOKEN_TYPE_PLUS.value, TOKEN_TYPES.TOKEN_TYPE_MINUS.value,
+                                          TOKEN_TYPES.TOKEN_TYPE_ASTERISK.value, TOKEN_TYPES.TOKEN_TYPE_SLASH.value]:
+            return self.expression(node) #comparisons already give Python booleans
+        if node.expressionType == EXPRESSION_TYPE_PREFIX and node.operator in NOT_OPERATORS:
+            return self.expression(node)
+        return '_truthy(%s)' % self.expression(node)
+
+    def expression(self, node):
+        #returns a Python expression for node, emitting any statements it needs first
+        exprType = node.expressionType
+        if exprType == EXPRESSION_TYPE_IDENT:
+            return self.resolve(node.value)[0]
+        elif exprType == EXPRESSION_TYPE_INT_LIT:
+            return repr(node.value)
+        elif exprType == EXPRESSION_TYPE_STR_LIT:
+            #one string object per literal, like a constant in compiled code
+            name = '_k%d' % len(self.constants)
+            self.constants.append('%s = _newString(%r)' % (name, node.value))
+            return name
+        elif exprType == EXPRESSION_TYPE_BOOLEAN:
+            return 'True' if node.value else 'False'
+        elif exprType == EXPRESSION_TYPE_NULL_LIT:
+            return 'None'
+        elif exprType == EXPRESSION_TYPE_INSTANCE_REF:
+            return self.function.thisName or '_noInstance()'
+        elif exprType == EXPRESSION_TYPE_ARRAY_LIT:
+            return '_array([%s])' % ', '.join(self.operands(node.elements))
+        elif exprType == EXPRESSION_TYPE_HASH_LIT:
+            #keys in the same order as the compiler puts them
+            pairs = sorted(node.elements, key=lambda e: str(e[0]))
+            values = self.operands([e for pair in pairs for e in pair])
+            return '_hash([%s])' % ', '.join('(%s, %s)' % (values[i], values[i+1]) for i in range(0, len(values), 2))
+        elif exprType == EXPRESSION_TYPE_FUNC_LIT:
+            return self.compileFunctionLiteral(node)
+        elif exprType == EXPRESSION_TYPE_CALL:
+            values = self.operands([node.function] + node.arguments)
+            return '%s(%s)' % (values[0], ', '.join(values[1:]))
+        elif exprType == EXPRESSION_TYPE_INDEX:
+            return '_index(%s, %s)' % tuple(self.operands([node.left, node.index]))
+        elif exprType == EXPRESSION_TYPE_GET:
+            obj = self.expression(node.object)
+            if self.needsStatements(node.property):
+                obj = self.spill(obj)
+            return self.getProperty(obj, node.property)
+        elif exprType == EXPRESSION_TYPE_IF:
+            return self.ifExpression(node)
+        elif exprType == EXPRESSION_TYPE_PREFIX:
+            if node.operator == TOKEN_TYPES.TOKEN_TYPE_MINUS.value:
+                return '_neg(%s)' % self.expression(node.right)
+            elif node.operator in NOT_OPERATORS:
+                return '(not %s)' % self.condition(node.right)
+            raise BoaTranspilerError("Unknown prefix operator: %s" % node.operator)
+        elif exprType == EXPRESSION_TYPE_INFIX:
+            if node.operator in LOGICAL_OPERATORS:
+                return self.logicalExpression(node)
+            elif node.operator in INFIX_HELPERS:
+                return '%s(%s, %s)' % ((INFIX_HELPERS[node.operator],) + tuple(self.operands([node.left, node.right])))
+            raise BoaTranspilerError("Unknown infix operator: %s" % node.operator)
+        raise BoaTranspilerError("Unknown expression type: %s" % exprType)
+
+    def ifExpression(self, node):
+        if self.needsStatements(node):
+            temp = self.newTemp()
+            self.compileIf(node, temp)
+            return temp
+        #every branch is a single expression, so the if is a chain of conditional expressions
+        result = 'None'
+        if node.alternative and node.alternative.statements:
+            result = self.blockExpression(node.alternative)
+        for condition, consequence in reversed(node.conditionalBlocks):
+            result = '(%s if %s else %s)' % (self.blockExpression(consequence), self.condition(condition), result)
+        return result
+
+    def blockExpression(self, blockStatement):
+        if not blockStatement.statements:
+            return 'None'
+        self.enterScope()
+        result = self.expression(blockStatement.statements[0].expression)
+        self.leaveScope()
+        return result
+
+    def logicalExpression(self, node):
+        #like the compilers, and/or give a boolean and skip the right operand when
+        #the left one decides the result
+        isAnd = node.operator == TOKEN_TYPES.TOKEN_TYPE_AND.value
+        if not self.needsStatements(node.right):
+            return '(%s %s %s)' % (self.logicalOperand(node.left), 'and' if isAnd else 'or', self.logicalOperand(node.right))
+        temp = self.newTemp()
+        self.emit('%s = %s' % (temp, self.logicalOperand(node.left)))
+        self.emit(('if %s:' if isAnd else 'if not %s:') % temp)
+        self.indented(lambda: self.emit('%s = %s' % (temp, self.logicalOperand(node.right))))
+        return temp
+
+    def logicalOperand(self, node):
+        #operands of and/or must be booleans, as in boaEval
+        if isBooleanExpression(node):
+            return self.condition(node)
+        return '_checkBool(%s)' % self.expression(node)
+
+    def getProperty(self, obj, property):
+        #Python expression for property looked up on the object obj evaluates to
+        propType = property.expressionType
+        if propType == EXPRESSION_TYPE_IDENT:
+            return '_getAttr(%s, %r)' % (obj, property.value)
+        elif propType == EXPRESSION_TYPE_INDEX:
+            left = self.getProperty(obj, property.left)
+            if self.needsStatements(property.index):
+                left = self.spill(left)
+            return '_index(%s, %s)' % (left, self.expression(property.index))
+        elif propType == EXPRESSION_TYPE_CALL:
+            callee = self.getProperty(obj, property.function)
+            if self.needsStatements(property.arguments):
+                callee = self.spill(callee)
+            return '%s(%s)' % (callee, ', '.join(self.operands(property.arguments)))
+        elif propType == EXPRESSION_TYPE_GET:
+            inner = self.getProperty(obj, property.object)
+            if self.needsStatements(property.property):
+                inner = self.spill(inner)
+            return self.getProperty(inner, property.property)
+        raise BoaTranspilerError("Property not gettable: %s" % property)
+
+    def usesThis(self, node):
+        #True if node refers to this outside of any function literal nested in it
+        if isinstance(node, (list, tuple)):
+            return any(self.usesThis(n) for n in node)
+        if not isinstance(node, Node):
+            return False
+        if node.nodeType == NODE_TYPE_EXPRESSION:
+            if node.expressionType == EXPRESSION_TYPE_INSTANCE_REF:
+                return True
+            if node.expressionType == EXPRESSION_TYPE_FUNC_LIT:
+                return False
+        return any(self.usesThis(child) for child in vars(node).values())
+
+    def compileFunctionLiteral(self, node, pyName=None):
+        #defines the function and returns the expression for its value. If pyName is
+        #given the value is stored there
+        thisName = self.function.thisName
+        #outside methods a function that uses this gets the object it is stored on
+        bindsThis = thisName is None and self.usesThis(node.body)
+        if bindsThis:
+            thisName = 'this'
+        self.numFunctions += 1
+        defName = pyName if pyName is not None and not bindsThis else '_fn%d' % self.numFunctions
+        params = ['this'] if bindsThis else []
+        lines = self.compileFunction(defName, params, node.parameters, node.body, thisName)
+        for line in lines:
+            self.emit(line)
+        value = '_ThisFunction(%s)' % defName if bindsThis else defName
+        if pyName is not None:
+            if pyName != defName:
+                self.emit('%s = %s' % (pyName, value))
+            return pyName
+        return value
+
+    def compileFunction(self, defName, extraParams, parameters, body, thisName, isConstructor=False):
+        #returns the lines of a def for a Boa function, not yet indented for where it goes
+        outerFunction = self.function
+        outerScope = self.scope
+        self.function = FunctionContext(outerFunction, thisName, isConstructor)
+        self.scope = Scope(self.function, outerScope)
+        params = extraParams + [self.define(param.value) for param in parameters]
+        if isConstructor:
+            self.emit('_Instance.__init__(this)')
+
+        statements = body.statements
+        self.compileStatements(statements[:-1])
+        if statements and statements[-1].statementType == STATEMENT_TYPE_EXPRESSION:
+            self.compileValue(statements[-1].expression, RETURN_VALUE)
+        else:
+            self.compileStatements(statements[-1:])
+            if not (statements and statements[-1].statementType == STATEMENT_TYPE_RETURN):
+                self.storeValue(RETURN_VALUE, 'None')
+
+        function = self.function
+        self.function = outerFunction
+        self.scope = outerScope
+        return self.functionLines(defName, params, function)
+
+    def functionLines(self, defName, params, function):
+        lines = ['def %s(%s):' % (defName, ', '.join(params))]
+        if function.globals:
+            lines.append(INDENT + 'global ' + ', '.join(sorted(function.globals)))
+        if function.nonlocals:
+            lines.append(INDENT + 'nonlocal ' + ', '.join(sorted(function.nonlocals)))
+        return lines + (function.lines or [INDENT + 'pass'])
+
+    def compileClass(self, classStatement):
+        #a Python class over pyruntime.Instance: the constructor becomes __init__ and
+        #methods are prefixed with m_ so they can't clash with Python's own attributes
+        name = classStatement.name
+        if name in self.scope.names and self.scope.outer is None:
+            pyName = self.scope.names[name] #top level class names are defined up front
+        else:
+            pyName = self.define(name)
+        lines = ['class %s(_Instance):' % pyName, 'boaName = %r' % name]
+        constructor = classStatement.constructorStatement
+        if constructor:
+            lines += self.compileFunction('__init__', ['this'], constructor.parameters, constructor.body, 'this', isConstructor=True)
+        for methodStatement in classStatement.methodStatements:
+            lines += self.compileFunction('m_' + methodStatement.name, ['this'], methodStatement.parameters, methodStatement.body, 'this')
+        self.emit(lines[0])
+        for line in lines[1:]:
+            self.emit(INDENT + line)
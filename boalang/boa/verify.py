@@ -0,0 +1,394 @@
+from .code import (
+    OPCONSTANT,
+    OPADD,
+    OPSUB,
+    OPMUL,
+    OPDIV,
+    OPPOP,
+    OPTRUE,
+    OPFALSE,
+    OPEQ,
+    OPNEQ,
+    OPGT,
+    OPGTEQ,
+    OPMINUS,
+    OPNOT,
+    OPJUMP,
+    OPJUMPNOTTRUE,
+    OPNULL,
+    OPSETGLOBAL,
+    OPGETGLOBAL,
+    OPARRAY,
+    OPHASH,
+    OPINDEX,
+    OPCALL,
+    OPRETURNVALUE,
+    OPRETURN,
+    OPSETLOCAL,
+    OPGETLOCAL,
+    OPSETINDEX,
+    OPBLOCKCALL,
+    OPBLOCKRETURN,
+    OPLOOPCALL,
+    OPBREAK,
+    OPCONTINUE,
+    OPITER,
+    OPITERHASNEXT,
+    OPITERNEXT,
+    OPGETBUILTIN,
+    OPCLOSURE,
+    OPGETFREE,
+    OPGETBLOCK,
+    OPSETBLOCK,
+    OPCURRENTCLOSURE,
+    OPGETATTR,
+    OPSETATTR,
+    OPGETINSTANCE,
+    OPDEFCLASS,
+    OPGETCLASS,
+    OPGETLOCALCONSTADD,
+    OPGETGLOBALCONSTADD,
+    OPGETLOCALCONSTGTJUMP,
+    OPCONSTGETLOCALGTJUMP,
+    OPGETGLOBALCONSTGTJUMP,
+    OPCONSTGETGLOBALGTJUMP,
+    OPCONSTGETATTR,
+    OPGTJUMP,
+    OPEQJUMP,
+    OPTAILCALL,
+    OPGETNAMEDATTR,
+    OPSETNAMEDATTR,
+    OPINVOKE,
+    OPWIDE,
+    OPIN,
+    OPNOTIN,
+    OPTAILINVOKE,
+    OPBOOLJUMPNOTTRUE,
+    BoaNoSuchOpcodeError,
+    BoaOperandError,
+    lookupOpcode,
+    readInstr,
+    decodeInstrs,
+)
+from .object import (
+    OBJECT_TYPES,
+)
+from .builtins import (
+    BUILTIN_FUNCTION_LIST,
+)
+
+class BoaVerifyError(Exception): pass
+
+#(values popped, values pushed) for each opcode, as a function of its operands
+STACK_EFFECTS = {
+    OPCONSTANT: lambda constIndex: (0, 1),
+    OPADD: lambda: (2, 1),
+    OPSUB: lambda: (2, 1),
+    OPMUL: lambda: (2, 1),
+    OPDIV: lambda: (2, 1),
+    OPPOP: lambda: (1, 0),
+    OPTRUE: lambda: (0, 1),
+    OPFALSE: lambda: (0, 1),
+    OPEQ: lambda: (2, 1),
+    OPNEQ: lambda: (2, 1),
+    OPGT: lambda: (2, 1),
+    OPGTEQ: lambda: (2, 1),
+    OPIN: lambda: (2, 1),
+    OPNOTIN: lambda: (2, 1),
+    OPMINUS: lambda: (1, 1),
+    OPNOT: lambda: (1, 1),
+    OPJUMP: lambda pos: (0, 0),
+    OPJUMPNOTTRUE: lambda pos: (1, 0),
+    OPBOOLJUMPNOTTRUE: lambda pos: (1, 0),
+    OPNULL: lambda: (0, 1),
+    OPSETGLOBAL: lambda globalIndex: (1, 0),
+    OPGETGLOBAL: lambda globalIndex: (0, 1),
+    OPARRAY: lambda numElements: (numElements, 1),
+    OPHASH: lambda numElements: (numElements, 1),
+    OPINDEX: lambda: (2, 1),
+    OPCALL: lambda numArgs: (numArgs+1, 1),
+    OPRETURNVALUE: lambda: (1, 0),
+    OPRETURN: lambda: (0, 0),
+    OPSETLOCAL: lambda localIndex: (1, 0),
+    OPGETLOCAL: lambda localIndex: (0, 1),
+    OPSETINDEX: lambda: (3, 0),
+    OPBLOCKCALL: lambda: (1, 1),
+    OPBLOCKRETURN: lambda: (1, 0),
+    OPLOOPCALL: lambda numArgs: (numArgs+1, 0),
+    OPBREAK: lambda: (0, 0),
+    OPCONTINUE: lambda: (0, 0),
+    OPITER: lambda: (1, 1),
+    OPITERHASNEXT: lambda: (1, 1),
+    OPITERNEXT: lambda: (1, 1),
+    OPGETBUILTIN: lambda builtinIndex: (0, 1),
+    OPCLOSURE: lambda constIndex, numFree: (numFree, 1),
+    OPGETFREE: lambda freeIndex: (0, 1),
+    OPGETBLOCK: lambda scopeDiff, localIndex: (0, 1),
+    OPSETBLOCK: lambda scopeDiff, localIndex: (1, 0),
+    OPCURRENTCLOSURE: lambda: (0, 1),
+    OPGETATTR: lambda: (2, 1),
+    OPSETATTR: lambda: (3, 0),
+    OPGETINSTANCE: lambda: (0, 1),
+    OPDEFCLASS: lambda classIndex, numConstructors, numMethods: (1+numConstructors+numMethods, 0),
+    OPGETCLASS: lambda classIndex: (0, 1),
+    OPGETLOCALCONSTADD: lambda localIndex, constIndex: (0, 1),
+    OPGETGLOBALCONSTADD: lambda globalIndex, constIndex: (0, 1),
+    OPGETLOCALCONSTGTJUMP: lambda localIndex, constIndex, pos: (0, 0),
+    OPCONSTGETLOCALGTJUMP: lambda constIndex, localIndex, pos: (0, 0),
+    OPGETGLOBALCONSTGTJUMP: lambda globalIndex, constIndex, pos: (0, 0),
+    OPCONSTGETGLOBALGTJUMP: lambda constIndex, globalIndex, pos: (0, 0),
+    OPCONSTGETATTR: lambda constIndex: (1, 1),
+    OPGTJUMP: lambda pos: (2, 0),
+    OPEQJUMP: lambda pos: (2, 0),
+    OPTAILCALL: lambda numArgs: (numArgs+1, 1),
+    OPGETNAMEDATTR: lambda constIndex: (1, 1),
+    OPSETNAMEDATTR: lambda constIndex: (2, 0),
+    OPINVOKE: lambda constIndex, numArgs: (numArgs+1, 1),
+    OPTAILINVOKE: lambda constIndex, numArgs: (numArgs+1, 1),
+}
+
+OPERAND_CONST = 'const'
+OPERAND_FUNCTION = 'function' #index of a compiled function in the constants
+OPERAND_LOCAL = 'local'
+OPERAND_GLOBAL = 'global'
+OPERAND_BUILTIN = 'builtin'
+OPERAND_CLASS = 'class'
+
+#kinds of the operands that index into something, by position. None for other operands
+OPERAND_KINDS = {
+    OPCONSTANT: [OPERAND_CONST],
+    OPSETGLOBAL: [OPERAND_GLOBAL],
+    OPGETGLOBAL: [OPERAND_GLOBAL],
+    OPSETLOCAL: [OPERAND_LOCAL],
+    OPGETLOCAL: [OPERAND_LOCAL],
+    OPGETBUILTIN: [OPERAND_BUILTIN],
+    OPCLOSURE: [OPERAND_FUNCTION, None],
+    OPDEFCLASS: [OPERAND_CLASS, None, None],
+    OPGETCLASS: [OPERAND_CLASS],
+    OPGETLOCALCONSTADD: [OPERAND_LOCAL, OPERAND_CONST],
+    OPGETGLOBALCONSTADD: [OPERAND_GLOBAL, OPERAND_CONST],
+    OPGETLOCALCONSTGTJUMP: [OPERAND_LOCAL, OPERAND_CONST, None],
+    OPCONSTGETLOCALGTJUMP: [OPERAND_CONST, OPERAND_LOCAL, None],
+    OPGETGLOBALCONSTGTJUMP: [OPERAND_GLOBAL, OPERAND_CONST, None],
+    OPCONSTGETGLOBALGTJUMP: [OPERAND_CONST, OPERAND_GLOBAL, None],
+    OPCONSTGETATTR: [OPERAND_CONST],
+    OPGETNAMEDATTR: [OPERAND_CONST],
+    OPSETNAMEDATTR: [OPERAND_CONST],
+    OPINVOKE: [OPERAND_CONST, None],
+    OPTAILINVOKE: [OPERAND_CONST, None],
+}
+
+#instructions after which execution never continues with the next one. Returns,
+#breaks and continues are not among them: with no enclosing function or loop
+#frame the VM treats them as a NOP
+TERMINATORS = [OPJUMP[0], OPBLOCKRETURN[0]]
+
+class Requirements(object):
+    #what a verified function needs from the closures, frames and tables it runs with
+    __slots__ = ('numFree', 'blockLocals', 'numGlobals', 'numClassDefs')
+
+    def __init__(self):
+        self.numFree = 0 #free variables its closures must carry
+        self.blockLocals = {} #maps scopeDiff to the locals that enclosing frame must have
+        self.numGlobals = 0 #one past the highest global index it uses
+        self.numClassDefs = 0 #one past the highest class index it uses
+
+class Verifier(object):
+    def __init__(self, constants, maxGlobals, maxClassDefs):
+        self.constants = constants
+        self.limits = {
+            OPERAND_CONST: len(constants),
+            OPERAND_FUNCTION: len(constants),
+            OPERAND_GLOBAL: maxGlobals,
+            OPERAND_BUILTIN: len(BUILTIN_FUNCTION_LIST),
+            OPERAND_CLASS: maxClassDefs,
+        }
+
+    def verifyBytecode(self, mainFunction):
+        #verifies every compiled function in the constants and then the main program.
+        #Functions that were already verified, e.g. by an earlier VM sharing them, are skipped.
+        #Returns the sizes the globals and class tables need for every index the code uses
+        functions = [c for c in self.constants if c.objectType == OBJECT_TYPES.OBJECT_TYPE_COMPILED_FUNCTION]
+        pending = [f for f in functions + [mainFunction] if f.maxStackDepth is None]
+        results = {}
+        for compiledFunction in pending:
+            results[id(compiledFunction)] = self.checkFunction(compiledFunction)
+        resolved = set()
+        for compiledFunction in pending:
+            self.resolveBlockLocals(compiledFunction, results, resolved, [])
+        for compiledFunction in pending:
+            self.checkClosureSites(results[id(compiledFunction)], results)
+        mainRequirements = results[id(mainFunction)][3]
+        if mainRequirements.numFree or mainRequirements.blockLocals:
+            raise BoaVerifyError("Main program reads variables of enclosing scopes")
+
+        for compiledFunction in pending:
+            decoded, maxDepth, requirements = results[id(compiledFunction)][1:4]
+            compiledFunction.requirements = requirements
+            compiledFunction.maxStackDepth = maxDepth
+            compiledFunction.decoded = decoded
+        allRequirements = [f.requirements for f in functions + [mainFunction]]
+        return max(r.numGlobals for r in allRequirements), max(r.numClassDefs for r in allRequirements)
+
+    def checkFunction(self, compiledFunction):
+        #checks the function's own code. Returns the function, its decoded instructions,
+        #maximum stack depth, requirements and closure sites as (instruction index, paired)
+        decoded = self.decode(compiledFunction.instr)
+        requirements = Requirements()
+        for op, operands in decoded:
+            if bytes([op]) not in STACK_EFFECTS:
+                #e.g. register machine code handed to the stack VM
+                raise BoaVerifyError("Not a stack machine opcode: %d" % op)
+            self.checkOperands(op, operands, compiledFunction.numLocals, requirements)
+        depths, maxDepth = self.stackDepths(decoded)
+        jumpTargets = self.jumpTargets(decoded)
+        sites = [(i, self.isBlockCallee(decoded, depths, jumpTargets, i)) for i, (op, operands) in enumerate(decoded)
+                 if op == OPCLOSURE[0] and depths[i] is not None]
+        return compiledFunction, decoded, maxDepth, requirements, sites
+
+    def decode(self, instr):
+        i = 0
+        while i < len(instr):
+            opIndex = i+1 if instr[i] == OPWIDE[0] else i
+            try:
+                definition, operands, i = readInstr(instr, i)
+            except BoaNoSuchOpcodeError:
+                raise BoaVerifyError("Invalid opcode %d at %d" % (instr[opIndex], opIndex))
+            except BoaOperandError as e:
+                raise BoaVerifyError("Invalid instruction at %d: %s" % (opIndex, e))
+        if i > len(instr):
+            raise BoaVerifyError("Truncated instruction at end of code")
+        try:
+            return decodeInstrs(instr)
+        except BoaOperandError as e:
+            raise BoaVerifyError("Invalid jump target: %s" % e)
+
+    def checkOperands(self, op, operands, numLocals, requirements):
+        opcode = bytes([op])
+        for operand, kind in zip(operands, OPERAND_KINDS.get(opcode, [])):
+            if kind is None:
+                continue
+            limit = numLocals if kind == OPERAND_LOCAL else self.limits[kind]
+            if operand >= limit:
+                raise BoaVerifyError("%s operand out of range: %d >= %d" % (kind, operand, limit))
+            if kind == OPERAND_FUNCTION and \
+                    self.constants[operand].objectType != OBJECT_TYPES.OBJECT_TYPE_COMPILED_FUNCTION:
+                raise BoaVerifyError("Constant %d is not a compiled function" % operand)
+            if kind == OPERAND_GLOBAL:
+                requirements.numGlobals = max(requirements.numGlobals, operand+1)
+            elif kind == OPERAND_CLASS:
+                requirements.numClassDefs = max(requirements.numClassDefs, operand+1)
+
+        #free variables and enclosing block frames depend on how the function is called,
+        #so they are checked against its closure sites once every function is decoded
+        if op == OPGETFREE[0]:
+            requirements.numFree = max(requirements.numFree, operands[0]+1)
+        elif op in (OPGETBLOCK[0], OPSETBLOCK[0]):
+            scopeDiff, localIndex = operands
+            if scopeDiff == 0 and localIndex >= numLocals:
+                raise BoaVerifyError("local operand out of range: %d >= %d" % (localIndex, numLocals))
+            if scopeDiff > 0:
+                requirements.blockLocals[scopeDiff] = max(requirements.blockLocals.get(scopeDiff, 0), localIndex+1)
+
+    def isBlockCallee(self, decoded, depths, jumpTargets, closureIndex):
+        #whether the closure made at closureIndex is only ever called as a block or loop body by the
+        #next block or loop call, so it runs in a frame right above this one. Everything in between
+        #must be reached straight from the instruction before it and leave the closure on the stack
+        closureSlot = depths[closureIndex] - decoded[closureIndex][1][1]
+        for i in range(closureIndex+1, len(decoded)):
+            op, operands = decoded[i]
+            if i in jumpTargets or decoded[i-1][0] in TERMINATORS:
+                return False
+            pops, pushes = STACK_EFFECTS[bytes([op])](*operands)
+            if depths[i] - pops <= closureSlot:
+                if op == OPBLOCKCALL[0] or op == OPLOOPCALL[0]:
+                    return depths[i] - pops == closureSlot
+                return False
+        return False
+
+    def jumpTargets(self, decoded):
+        targets = set()
+        for index, (op, operands) in enumerate(decoded):
+            if lookupOpcode(bytes([op])).isJump:
+                targets.add(operands[-1])
+            if op == OPLOOPCALL[0]:
+                targets.add(index+2)
+        return targets
+
+    def resolveBlockLocals(self, compiledFunction, results, resolved, resolving):
+        #adds the needs of the blocks a function calls to its own: a block's first enclosing
+        #frame is this function's, the ones further out are this function's enclosing frames
+        result = results.get(id(compiledFunction))
+        if result is None:
+            return compiledFunction.requirements.blockLocals
+        function, decoded, maxDepth, requirements, sites = result
+        if id(compiledFunction) in resolved:
+            return requirements.blockLocals
+        if id(compiledFunction) in resolving:
+            raise BoaVerifyError("Block calls itself as its own body")
+        resolving.append(id(compiledFunction))
+        for index, paired in sites:
+            if not paired:
+                continue
+            callee = self.constants[decoded[index][1][0]]
+            for scopeDiff, numLocals in list(self.resolveBlockLocals(callee, results, resolved, resolving).items()):
+                if scopeDiff == 1 and numLocals > compiledFunction.numLocals:
+                    raise BoaVerifyError("local operand out of range: %d >= %d" % (numLocals-1, compiledFunction.numLocals))
+                if scopeDiff > 1:
+                    requirements.blockLocals[scopeDiff-1] = max(requirements.blockLocals.get(scopeDiff-1, 0), numLocals)
+        resolving.pop()
+        resolved.add(id(compiledFunction))
+        if requirements.blockLocals and any(op == OPCURRENTCLOSURE[0] for op, operands in decoded):
+            #the closure could escape and be called somewhere its enclosing frames aren't
+            raise BoaVerifyError("Block reading enclosing frames cannot take its own closure")
+        return requirements.blockLocals
+
+    def checkClosureSites(self, result, results):
+        function, decoded, maxDepth, requirements, sites = result
+        for index, paired in sites:
+            constIndex, numFree = decoded[index][1]
+            callee = self.constants[constIndex]
+            calleeResult = results.get(id(callee))
+            calleeRequirements = calleeResult[3] if calleeResult is not None else callee.requirements
+            if numFree < calleeRequirements.numFree:
+                raise BoaVerifyError("Closure of constant %d needs %d free variables, got %d" % (constIndex, calleeRequirements.numFree, numFree))
+            if calleeRequirements.blockLocals and not paired:
+                raise BoaVerifyError("Closure of constant %d reads enclosing frames but is not called as a block" % constIndex)
+
+    def stackDepths(self, decoded):
+        #walks every path through the code, checking that each instruction is
+        #always reached with the same stack depth and that nothing pops below the frame.
+        #Returns the depth before each instruction, None where it is unreachable, and the maximum
+        depths = [None]*(len(decoded)+1)
+        depths[0] = 0
+        maxDepth = 0
+        worklist = [0]
+        while worklist:
+            index = worklist.pop()
+            if index == len(decoded):
+                continue #ran off the end
+            op, operands = decoded[index]
+            opcode = bytes([op])
+            pops, pushes = STACK_EFFECTS[opcode](*operands)
+            depth = depths[index]
+            if pops > depth:
+                raise BoaVerifyError("Stack underflow at instruction %d" % index)
+            depth = depth - pops + pushes
+            maxDepth = max(maxDepth, depth)
+
+            successors = []
+            if op not in TERMINATORS:
+                successors.append(index+1)
+            if lookupOpcode(opcode).isJump:
+                successors.append(operands[-1])
+            if op == OPLOOPCALL[0]:
+                successors.append(index+2) #a break resumes after the jump back to the loop condition
+            for successor in successors:
+                if successor > len(decoded):
+                    raise BoaVerifyError("Jump out of code at instruction %d" % index)
+                if depths[successor] is None:
+                    depths[successor] = depth
+                    worklist.append(successor)
+                elif depths[successor] != depth:
+                    raise BoaVerifyError("Stack depth mismatch at instruction %d: %d != %d" % (successor, depths[successor], depth))
+        return depths, maxDepth
@@ -1,2 +1,2 @@
 VERSION_STRING = '1.0.0-beta'
-BUILD_NUMBER = 1
+BUILD_NUMBER = 2
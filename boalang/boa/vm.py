@@ -17,6 +17,7 @@ from .code import (
     OPNOT,
     OPJUMP,
     OPJUMPNOTTRUE,
+    OPBOOLJUMPNOTTRUE,
     OPNULL,
     OPSETGLOBAL,
     OPGETGLOBAL,
@@ -48,8 +49,23 @@ from .code import (
     OPGETINSTANCE,
     OPDEFCLASS,
     OPGETCLASS,
-    readUint16,
-    readUint8,
+    OPGETLOCALCONSTADD,
+    OPGETGLOBALCONSTADD,
+    OPGETLOCALCONSTGTJUMP,
+    OPCONSTGETLOCALGTJUMP,
+    OPGETGLOBALCONSTGTJUMP,
+    OPCONSTGETGLOBALGTJUMP,
+    OPCONSTGETATTR,
+    OPGTJUMP,
+    OPEQJUMP,
+    OPTAILCALL,
+    OPGETNAMEDATTR,
+    OPSETNAMEDATTR,
+    OPINVOKE,
+    OPIN,
+    OPNOTIN,
+    OPTAILINVOKE,
+    decodeInstrs,
 )
 from .object import (
     newInteger,
@@ -59,6 +75,8 @@ from .object import (
     newCompiledFunction,
     newCompiledClass,
     newClosure,
+    BoaObject,
+    CannotSetAttributeError,
     OBJECT_TYPES,
     TRUE,
     FALSE,
@@ -70,50 +88,232 @@ from .builtins import (
 from .evaluator import (
     isTruthy,
 )
+from .verify import (
+    Verifier,
+)
 
-STACK_SIZE = 2048
-GLOBALS_SIZE = 65536
+#default ceilings. Storage starts small and grows in chunks up to these
+MAX_STACK_SIZE = 2048
+MAX_GLOBALS = 1048576
 MAX_FRAMES = 1024
 MAX_CLASS_DEFS = 1024
 
+INITIAL_STACK_SIZE = 64
+STACK_CHUNK = 256
+INITIAL_FRAMES = 8
+FRAME_CHUNK = 32
+GLOBALS_CHUNK = 64
+
+QUICKEN_THRESHOLD = 8 #consecutive executions with the same operand types before a site is specialised
+MAX_DEOPTS = 4 #sites whose guards fail more often than this stay generic
+
+INT_TYPE = OBJECT_TYPES.OBJECT_TYPE_INT
+STRING_TYPE = OBJECT_TYPES.OBJECT_TYPE_STRING
+HASH_TYPE = OBJECT_TYPES.OBJECT_TYPE_HASH
+ARRAY_TYPE = OBJECT_TYPES.OBJECT_TYPE_ARRAY
+BOOLEAN_TYPE = OBJECT_TYPES.OBJECT_TYPE_BOOLEAN
+NULL_TYPE = OBJECT_TYPES.OBJECT_TYPE_NULL
+CLOSURE_TYPE = OBJECT_TYPES.OBJECT_TYPE_CLOSURE
+
+EMPTY_CACHE = object() #shape operand of an attribute site with nothing cached, never an object's shape
+
+#VM-internal opcodes that quickening rewrites generic instructions into. They
+#never appear in bytecode, so their indexes start above the single byte range
+QOPADDINTINT = 256
+QOPSUBINTINT = 257
+QOPMULINTINT = 258
+QOPADDSTRSTR = 259
+QOPGTINTINT = 260
+QOPGTEQINTINT = 261
+QOPEQINTINT = 262
+QOPNEQINTINT = 263
+
 FRAME_TYPE_FUNCTION = "FUNCTION_FRAME"
 FRAME_TYPE_BLOCK = "BLOCK_FRAME"
 FRAME_TYPE_LOOP = "LOOP_FRAME"
 
 class BoaVMError(Exception): pass
 
+def setObjectAttribute(obj, name, val):
+    try:
+        obj.setAttribute(name, val)
+    except CannotSetAttributeError as e:
+        raise BoaVMError(str(e))
+
+def decodedInstrs(compiledFunction):
+    if compiledFunction.decoded is None:
+        compiledFunction.decoded = decodeInstrs(compiledFunction.instr)
+    return compiledFunction.decoded
+
 class Frame(object):
-    def __init__(self, frameType, cl, basePointer):
+    #frames are preallocated by the VM and reset on every push
+    __slots__ = ('frameType', 'cl', 'ip', 'basePointer', 'code', 'instance', 'functionFrameIndex', 'loopFrameIndex')
+
+    def __init__(self):
+        self.frameType = None
+        self.cl = None
+        self.ip = 0 #index into code, not a byte offset
+        self.basePointer = 0
+        self.code = None
+        self.instance = None #innermost bound instance, what OPGETINSTANCE pushes
+        self.functionFrameIndex = -1 #index of the innermost function frame, this one included
+        self.loopFrameIndex = -1 #same for loop frames
+
+    def reset(self, frameType, cl, basePointer, instance, functionFrameIndex, loopFrameIndex):
         self.frameType = frameType
-        #self.compiledFunction = compiledFunction
         self.cl = cl
         self.ip = 0
         self.basePointer = basePointer
+        self.code = decodedInstrs(cl.compiledFunction)
+        self.instance = instance
+        self.functionFrameIndex = functionFrameIndex
+        self.loopFrameIndex = loopFrameIndex
 
     @property
     def instr(self):
         return self.cl.compiledFunction.value
 
+OPCODE_HANDLERS = {
+    OPCONSTANT: 'opConstant',
+    OPADD: 'opAdd',
+    OPSUB: 'opSub',
+    OPMUL: 'opMul',
+    OPDIV: 'opDiv',
+    OPPOP: 'opPop',
+    OPTRUE: 'opTrue',
+    OPFALSE: 'opFalse',
+    OPEQ: 'opEq',
+    OPNEQ: 'opNeq',
+    OPGT: 'opGt',
+    OPGTEQ: 'opGtEq',
+    OPMINUS: 'opMinus',
+    OPNOT: 'opNot',
+    OPJUMP: 'opJump',
+    OPJUMPNOTTRUE: 'opJumpNotTrue',
+    OPBOOLJUMPNOTTRUE: 'opBoolJumpNotTrue',
+    OPNULL: 'opNull',
+    OPSETGLOBAL: 'opSetGlobal',
+    OPGETGLOBAL: 'opGetGlobal',
+    OPARRAY: 'opArray',
+    OPHASH: 'opHash',
+    OPINDEX: 'opIndex',
+    OPCALL: 'opCall',
+    OPRETURNVALUE: 'opReturnValue',
+    OPRETURN: 'opReturn',
+    OPSETLOCAL: 'opSetLocal',
+    OPGETLOCAL: 'opGetLocal',
+    OPSETINDEX: 'opSetIndex',
+    OPBLOCKCALL: 'opBlockCall',
+    OPBLOCKRETURN: 'opBlockReturn',
+    OPLOOPCALL: 'opLoopCall',
+    OPBREAK: 'opBreak',
+    OPCONTINUE: 'opContinue',
+    OPITER: 'opIter',
+    OPITERHASNEXT: 'opIterHasNext',
+    OPITERNEXT: 'opIterNext',
+    OPGETBUILTIN: 'opGetBuiltin',
+    OPCLOSURE: 'opClosure',
+    OPGETFREE: 'opGetFree',
+    OPGETBLOCK: 'opGetBlock',
+    OPSETBLOCK: 'opSetBlock',
+    OPCURRENTCLOSURE: 'opCurrentClosure',
+    OPGETATTR: 'opGetAttr',
+    OPSETATTR: 'opSetAttr',
+    OPGETINSTANCE: 'opGetInstance',
+    OPDEFCLASS: 'opDefClass',
+    OPGETCLASS: 'opGetClass',
+    OPGETLOCALCONSTADD: 'opGetLocalConstAdd',
+    OPGETGLOBALCONSTADD: 'opGetGlobalConstAdd',
+    OPGETLOCALCONSTGTJUMP: 'opGetLocalConstGtJump',
+    OPCONSTGETLOCALGTJUMP: 'opConstGetLocalGtJump',
+    OPGETGLOBALCONSTGTJUMP: 'opGetGlobalConstGtJump',
+    OPCONSTGETGLOBALGTJUMP: 'opConstGetGlobalGtJump',
+    OPCONSTGETATTR: 'opConstGetAttr',
+    OPGTJUMP: 'opGtJump',
+    OPEQJUMP: 'opEqJump',
+    OPTAILCALL: 'opTailCall',
+    OPGETNAMEDATTR: 'opGetNamedAttr',
+    OPSETNAMEDATTR: 'opSetNamedAttr',
+    OPINVOKE: 'opInvoke',
+    OPIN: 'opIn',
+    OPNOTIN: 'opNotIn',
+    OPTAILINVOKE: 'opTailInvoke',
+    QOPADDINTINT: 'opAddIntInt',
+    QOPSUBINTINT: 'opSubIntInt',
+    QOPMULINTINT: 'opMulIntInt',
+    QOPADDSTRSTR: 'opAddStrStr',
+    QOPGTINTINT: 'opGtIntInt',
+    QOPGTEQINTINT: 'opGtEqIntInt',
+    QOPEQINTINT: 'opEqIntInt',
+    QOPNEQINTINT: 'opNeqIntInt',
+}
+
+#(generic opcode, operand type) -> specialised opcode
+QUICKENED_OPS = {
+    (OPADD, INT_TYPE): QOPADDINTINT,
+    (OPSUB, INT_TYPE): QOPSUBINTINT,
+    (OPMUL, INT_TYPE): QOPMULINTINT,
+    (OPADD, STRING_TYPE): QOPADDSTRSTR,
+    (OPGT, INT_TYPE): QOPGTINTINT,
+    (OPGTEQ, INT_TYPE): QOPGTEQINTINT,
+    (OPEQ, INT_TYPE): QOPEQINTINT,
+    (OPNEQ, INT_TYPE): QOPNEQINTINT,
+}
+
 class VM(object):
-    def __init__(self, bytecode, symbolTable=None):
+    def __init__(self, bytecode, symbolTable=None, verify=True, maxStackSize=MAX_STACK_SIZE, maxFrames=MAX_FRAMES):
         self.constants = bytecode.constants
-        self.stack = [None]*STACK_SIZE #stack of BoaObjects
-        self.globals = [None]*GLOBALS_SIZE
-        self.classDefs = [None]*MAX_CLASS_DEFS
+        self.maxStackSize = maxStackSize
+        self.maxFrames = maxFrames
+        self.stack = [None]*INITIAL_STACK_SIZE #stack of BoaObjects, grown by growStack
+        self.globals = [None]*self.initialGlobalsSize(bytecode, symbolTable)
+        self.classDefs = [None]*(bytecode.numClassDefs or 0)
         self.sp = 0
-        self.frames = [None]*MAX_FRAMES #stack of Frames
+        self.frames = [Frame() for i in range(INITIAL_FRAMES)] #stack of Frames, reused across calls
         self.frameIndex = 0
         self.globalSymbolTable = symbolTable
+        self.dispatch = self.buildDispatchTable()
+
+        mainFunction = newCompiledFunction(bytecode.instr)
+        self.verified = verify
+        self.numGlobalsUsed = 0
+        if verify:
+            #verified code can't push past what pushFrame reserves for it, so pushes go unchecked
+            self.numGlobalsUsed, numClassDefs = Verifier(self.constants, MAX_GLOBALS, MAX_CLASS_DEFS).verifyBytecode(mainFunction)
+            self.push = self.pushUnchecked
+            #and every global and class it reads has a slot, so reads don't check their index
+            self.reserveGlobals()
+            if numClassDefs > len(self.classDefs):
+                self.classDefs.extend([None]*(numClassDefs - len(self.classDefs)))
+        self.pushFrame(FRAME_TYPE_BLOCK, newClosure(mainFunction, []), 0)
 
-        mainFrame = Frame(FRAME_TYPE_BLOCK, newClosure(newCompiledFunction(bytecode.instr), []), 0)
-        self.pushFrame(mainFrame)
+    @staticmethod
+    def initialGlobalsSize(bytecode, symbolTable):
+        #the compiler knows how many globals the program defines. Bytecode read from
+        #a file doesn't, so its globals grow on first assignment instead
+        if bytecode.numGlobals is not None:
+            return bytecode.numGlobals
+        if symbolTable is not None:
+            return symbolTable.numDefinitions
+        return 0
 
     @staticmethod
     def newWithGlobalsStore(bytecode, globals):
         vm = VM(bytecode)
         vm.globals = globals
+        vm.reserveGlobals()
         return vm
 
+    def buildDispatchTable(self):
+        #maps opcode indexes (as produced by decodeInstrs) to bound handler methods.
+        #handlers take the decoded operands as arguments and return True if they
+        #switched the current frame
+        table = [self.opUnknown]*(QOPNEQINTINT+1)
+        for opcode, handlerName in OPCODE_HANDLERS.items():
+            index = opcode if isinstance(opcode, int) else opcode[0]
+            table[index] = getattr(self, handlerName)
+        return table
+
     def getGlobal(self, identifier):
         symbol = self.globalSymbolTable.resolve(identifier)
         return self.globals[symbol.index]
@@ -136,31 +336,81 @@ class VM(object):
     def setCurrentFrameIp(self, val):
         self.currentFrame().ip = val
 
-    def pushFrame(self, frame):
-        self.frames[self.frameIndex] = frame
-        self.frameIndex += 1
-
-    def lastFrameByCondition(self, fn):
-        i = self.frameIndex-1
-        fr = self.frames[i]
-        while i > 0 and not fn(fr):
-            i -= 1
-            fr = self.frames[i]
-        if not fn(fr):
-            return None
-        return fr
+    def pushFrame(self, frameType, cl, basePointer, receiver=None):
+        #receiver is the instance an unbound method is invoked on
+        index = self.frameIndex
+        if index >= len(self.frames):
+            self.growFrames()
+        if index > 0:
+            parent = self.frames[index-1]
+            instance = cl.instance if cl.instance is not None else parent.instance
+            functionFrameIndex = parent.functionFrameIndex
+            loopFrameIndex = parent.loopFrameIndex
+        else:
+            instance = cl.instance
+            functionFrameIndex = -1
+            loopFrameIndex = -1
+        if receiver is not None:
+            instance = receiver
+        if frameType == FRAME_TYPE_FUNCTION:
+            functionFrameIndex = index
+        elif frameType == FRAME_TYPE_LOOP:
+            loopFrameIndex = index
+        self.reserveStack(cl.compiledFunction, basePointer)
+        frame = self.frames[index]
+        frame.reset(frameType, cl, basePointer, instance, functionFrameIndex, loopFrameIndex)
+        self.frameIndex = index + 1
+        return frame
+
+    def growFrames(self):
+        if len(self.frames) >= self.maxFrames:
+            raise BoaVMError("Frame stack overflow")
+        numNew = min(FRAME_CHUNK, self.maxFrames - len(self.frames))
+        self.frames.extend([Frame() for i in range(numNew)])
+
+    def reserveStack(self, compiledFunction, basePointer):
+        #makes room for the function's locals once per frame. Verified functions also
+        #get their deepest operand stack reserved, so their pushes need no checks
+        if self.verified:
+            if compiledFunction.maxStackDepth is None:
+                raise BoaVMError("Cannot run unverified function")
+            needed = basePointer + compiledFunction.numLocals + compiledFunction.maxStackDepth
+        else:
+            needed = basePointer + compiledFunction.numLocals
+        if needed > len(self.stack):
+            self.growStack(needed)
+
+    def growStack(self, needed):
+        #grows the stack in whole chunks to hold at least needed slots
+        if needed > self.maxStackSize:
+            raise BoaVMError("Stack overflow")
+        newSize = min(self.maxStackSize, needed + STACK_CHUNK - needed % STACK_CHUNK)
+        self.stack.extend([None]*(newSize - len(self.stack)))
+
+    def reserveGlobals(self):
+        if self.numGlobalsUsed > len(self.globals):
+            self.growGlobals(self.numGlobalsUsed - 1)
+
+    def growGlobals(self, globalIndex):
+        if globalIndex >= MAX_GLOBALS:
+            raise BoaVMError("Global index out of range: %d" % globalIndex)
+        newSize = min(MAX_GLOBALS, globalIndex + GLOBALS_CHUNK - globalIndex % GLOBALS_CHUNK)
+        self.globals.extend([None]*(newSize - len(self.globals)))
 
     def popLastFrameOfType(self, frameType):
-        i = self.frameIndex-1
-        currFrameType = self.frames[i].frameType
-        while i > 0 and currFrameType != frameType:
-            i -= 1
-            currFrameType = self.frames[i].frameType
-        if currFrameType != frameType:
+        #every frame knows the index of its innermost function and loop frame, so
+        #returns and breaks don't have to search for their target
+        currentFrame = self.currentFrame()
+        if frameType == FRAME_TYPE_FUNCTION:
+            i = currentFrame.functionFrameIndex
+        elif frameType == FRAME_TYPE_LOOP:
+            i = currentFrame.loopFrameIndex
+        else:
+            raise BoaVMError("Cannot pop to frame of type %s" % frameType)
+        if i < 1:
             return None
-        frame = self.frames[i]
         self.frameIndex = i
-        return frame
+        return self.frames[i]
 
     def popFrame(self):
         self.frameIndex -= 1
@@ -180,9 +430,13 @@ class VM(object):
         return list(self.stack[0:self.sp])
 
     def push(self, obj):
-        if self.sp >= STACK_SIZE:
-            raise BoaVMError("Stack overflow")
+        if self.sp >= len(self.stack):
+            self.growStack(self.sp + 1)
+
+        self.stack[self.sp] = obj
+        self.sp += 1
 
+    def pushUnchecked(self, obj):
         self.stack[self.sp] = obj
         self.sp += 1
 
@@ -192,202 +446,531 @@ class VM(object):
         return obj
 
     def run(self):
-        #ip = 0
-        while self.currentFrameIp() < len(self.currentInstr()):
-            incrFrameIp = True
-            op = self.currentInstr()[self.currentFrameIp():self.currentFrameIp()+1]
-            if op == OPCONSTANT:
-                constIndex = readUint16(self.currentInstr()[self.currentFrameIp()+1:])
-                self.incrCurrentFrameIp(2)
-                #print(constIndex, self.constants, len(self.constants))
-                #print(instr[self.currentFrameIp():])
-                #print(self.constants)
-                self.push(self.constants[constIndex])
-            elif op in (OPEQ, OPNEQ, OPGT, OPGTEQ):
-                self.executeComparison(op)
-            elif op in (OPADD, OPSUB, OPMUL, OPDIV):
-                self.executeBinaryOperation(op)
-            elif op == OPNOT:
-                self.executeNotOperator()
-            elif op == OPMINUS:
-                self.executeMinusOperator()
-            elif op == OPTRUE:
-                self.push(TRUE)
-            elif op == OPFALSE:
-                self.push(FALSE)
-            elif op == OPNULL:
-                self.push(NULL)
-            elif op == OPDEFCLASS:
-                classIndex = readUint16(self.currentInstr()[self.currentFrameIp()+1:])
-                numConstructors = readUint16(self.currentInstr()[self.currentFrameIp()+3:])
-                numMethods = readUint16(self.currentInstr()[self.currentFrameIp()+5:])
-                self.incrCurrentFrameIp(6)
-                className = self.pop()
-                clazz = self.buildClass(
-                            className,
-                            self.sp-numConstructors, self.sp, #constructor indexes
-                            self.sp-numConstructors-numMethods, self.sp-numConstructors #method indexes
-                )
-                self.classDefs[classIndex] = clazz
-                self.sp = self.sp-numConstructors-numMethods
-            elif op == OPGETCLASS:
-                classIndex = readUint16(self.currentInstr()[self.currentFrameIp()+1:])
-                self.incrCurrentFrameIp(2)
-                self.push(self.classDefs[classIndex])
-            elif op == OPARRAY:
-                numElements = readUint16(self.currentInstr()[self.currentFrameIp()+1:])
-                self.incrCurrentFrameIp(2)
-                arr = self.buildArray(self.sp-numElements, self.sp)
-                self.sp = self.sp - numElements
-                self.push(arr)
-            elif op == OPHASH:
-                numElements = readUint16(self.currentInstr()[self.currentFrameIp()+1:])
-                self.incrCurrentFrameIp(2)
-                hash = self.buildHash(self.sp-numElements, self.sp)
-                self.sp = self.sp - numElements
-                self.push(hash)
-            elif op == OPINDEX:
-                index = self.pop()
-                left = self.pop()
-                self.executeIndexOperation(left, index)
-            elif op == OPGETATTR:
-                attrName = self.pop()
-                obj = self.pop()
-                val = obj.getAttribute(attrName.value)
-                self.push(val)
-            elif op == OPSETATTR:
-                val = self.pop()
-                attrName = self.pop()
-                obj = self.pop()
-                if val.objectType == OBJECT_TYPES.OBJECT_TYPE_CLOSURE:
-                    closure = newClosure(val.compiledFunction, val.freeVariables, instance=obj)
-                    obj.setAttribute(attrName.value, closure)
-                else:
-                    obj.setAttribute(attrName.value, val)
-            elif op == OPPOP:
-                self.pop()
-            elif op == OPSETGLOBAL:
-                globalIndex = readUint16(self.currentInstr()[self.currentFrameIp()+1:])
-                self.incrCurrentFrameIp(2)
-                self.globals[globalIndex] = self.pop()
-            elif op == OPGETGLOBAL:
-                globalIndex = readUint16(self.currentInstr()[self.currentFrameIp()+1:])
-                self.incrCurrentFrameIp(2)
-                self.push(self.globals[globalIndex])
-            elif op == OPGETBUILTIN:
-                builtinIndex = readUint8(self.currentInstr()[self.currentFrameIp()+1:])
-                self.incrCurrentFrameIp(1)
-                self.push(getBuiltinByIndex(builtinIndex))
-            elif op == OPGETINSTANCE:
-                frame = self.lastFrameByCondition(lambda fr: fr.cl is not None and fr.cl.instance is not None)
-                if frame is None:
-                    raise BoaVMError("this not bound to instance")
-                currentClosure = frame.cl
-                self.push(currentClosure.instance)
-            elif op == OPGETFREE:
-                freeIndex = readUint8(self.currentInstr()[self.currentFrameIp()+1:])
-                self.incrCurrentFrameIp(1)
-                currentClosure = self.currentFrame().cl
-                self.push(currentClosure.freeVariables[freeIndex])
-            elif op == OPSETINDEX:
-                value = self.pop()
-                index = self.pop()
-                left = self.pop()
-                left[index] = value
-            elif op == OPJUMP:
-                pos = readUint16(self.currentInstr()[self.currentFrameIp()+1:])
-                self.setCurrentFrameIp(pos - 1)
-            elif op == OPJUMPNOTTRUE:
-                pos = readUint16(self.currentInstr()[self.currentFrameIp()+1:])
-                self.incrCurrentFrameIp(2)
-                condition = self.pop()
-                if not isTruthy(condition):
-                    self.setCurrentFrameIp(pos - 1)
-            elif op == OPCLOSURE:
-                constIndex = readUint16(self.currentInstr()[self.currentFrameIp()+1:])
-                numFree = readUint8(self.currentInstr()[self.currentFrameIp()+3:])
-                self.incrCurrentFrameIp(3)
-                self.pushClosure(constIndex, numFree)
-            elif op == OPCURRENTCLOSURE:
-                currentClosure = self.currentFrame().cl
-                self.push(currentClosure)
-            elif op == OPCALL:
-                numArgs = readUint8(self.currentInstr()[self.currentFrameIp()+1:])
-                self.incrCurrentFrameIp(1)
-                self.executeCall(numArgs)
-                incrFrameIp = False
-            elif op == OPBLOCKCALL:
-                self.callBlock()
-                incrFrameIp = False
-            elif op == OPLOOPCALL:
-                numArgs = readUint8(self.currentInstr()[self.currentFrameIp()+1:])
-                self.incrCurrentFrameIp(1)
-                self.callLoop(numArgs)
-                incrFrameIp = False
-            elif op == OPSETLOCAL:
-                localIndex = readUint8(self.currentInstr()[self.currentFrameIp()+1:])
-                self.incrCurrentFrameIp(1)
+        dispatch = self.dispatch
+        frame = self.currentFrame()
+        code = frame.code
+        while frame.ip < len(code):
+            op, operands = code[frame.ip]
+            frame.ip += 1
+            if dispatch[op](*operands):
                 frame = self.currentFrame()
-                self.stack[frame.basePointer+localIndex] = self.pop()
-            elif op == OPGETLOCAL:
-                localIndex = readUint8(self.currentInstr()[self.currentFrameIp()+1:])
-                self.incrCurrentFrameIp(1)
+                code = frame.code
+
+    def opUnknown(self, *operands):
+        raise BoaVMError("Unknown opcode")
+
+    def opConstant(self, constIndex):
+        self.push(self.constants[constIndex])
+
+    def opEq(self, kind=None, hits=0, deopts=0):
+        self.executeQuickenableComparison(OPEQ, kind, hits, deopts)
+
+    def opNeq(self, kind=None, hits=0, deopts=0):
+        self.executeQuickenableComparison(OPNEQ, kind, hits, deopts)
+
+    def opGt(self, kind=None, hits=0, deopts=0):
+        self.executeQuickenableComparison(OPGT, kind, hits, deopts)
+
+    def opGtEq(self, kind=None, hits=0, deopts=0):
+        self.executeQuickenableComparison(OPGTEQ, kind, hits, deopts)
+
+    def opAdd(self, kind=None, hits=0, deopts=0):
+        self.executeQuickenableBinaryOperation(OPADD, kind, hits, deopts)
+
+    def opSub(self, kind=None, hits=0, deopts=0):
+        self.executeQuickenableBinaryOperation(OPSUB, kind, hits, deopts)
+
+    def opMul(self, kind=None, hits=0, deopts=0):
+        self.executeQuickenableBinaryOperation(OPMUL, kind, hits, deopts)
+
+    def opDiv(self):
+        self.executeBinaryOperation(OPDIV)
+
+    def opAddIntInt(self, deopts):
+        stack = self.stack
+        right = stack[self.sp-1]
+        left = stack[self.sp-2]
+        if left.objectType is not INT_TYPE or right.objectType is not INT_TYPE:
+            return self.deoptimize(OPADD, deopts)
+        self.sp -= 1
+        stack[self.sp-1] = newInteger(left.value + right.value)
+
+    def opSubIntInt(self, deopts):
+        stack = self.stack
+        right = stack[self.sp-1]
+        left = stack[self.sp-2]
+        if left.objectType is not INT_TYPE or right.objectType is not INT_TYPE:
+            return self.deoptimize(OPSUB, deopts)
+        self.sp -= 1
+        stack[self.sp-1] = newInteger(left.value - right.value)
+
+    def opMulIntInt(self, deopts):
+        stack = self.stack
+        right = stack[self.sp-1]
+        left = stack[self.sp-2]
+        if left.objectType is not INT_TYPE or right.objectType is not INT_TYPE:
+            return self.deoptimize(OPMUL, deopts)
+        self.sp -= 1
+        stack[self.sp-1] = newInteger(left.value * right.value)
+
+    def opAddStrStr(self, deopts):
+        stack = self.stack
+        right = stack[self.sp-1]
+        left = stack[self.sp-2]
+        if left.objectType is not STRING_TYPE or right.objectType is not STRING_TYPE:
+            return self.deoptimize(OPADD, deopts)
+        self.sp -= 1
+        stack[self.sp-1] = newString(left.value + right.value)
+
+    def opGtIntInt(self, deopts):
+        stack = self.stack
+        right = stack[self.sp-1]
+        left = stack[self.sp-2]
+        if left.objectType is not INT_TYPE or right.objectType is not INT_TYPE:
+            return self.deoptimize(OPGT, deopts)
+        self.sp -= 1
+        stack[self.sp-1] = TRUE if left.value > right.value else FALSE
+
+    def opGtEqIntInt(self, deopts):
+        stack = self.stack
+        right = stack[self.sp-1]
+        left = stack[self.sp-2]
+        if left.objectType is not INT_TYPE or right.objectType is not INT_TYPE:
+            return self.deoptimize(OPGTEQ, deopts)
+        self.sp -= 1
+        stack[self.sp-1] = TRUE if left.value >= right.value else FALSE
+
+    def opEqIntInt(self, deopts):
+        stack = self.stack
+        right = stack[self.sp-1]
+        left = stack[self.sp-2]
+        if left.objectType is not INT_TYPE or right.objectType is not INT_TYPE:
+            return self.deoptimize(OPEQ, deopts)
+        self.sp -= 1
+        stack[self.sp-1] = TRUE if left.value == right.value else FALSE
+
+    def opNeqIntInt(self, deopts):
+        stack = self.stack
+        right = stack[self.sp-1]
+        left = stack[self.sp-2]
+        if left.objectType is not INT_TYPE or right.objectType is not INT_TYPE:
+            return self.deoptimize(OPNEQ, deopts)
+        self.sp -= 1
+        stack[self.sp-1] = TRUE if left.value != right.value else FALSE
+
+    def executeQuickenableComparison(self, op, kind, hits, deopts):
+        right = self.pop()
+        left = self.pop()
+        self.push(self.compare(op, left, right))
+        if deopts <= MAX_DEOPTS:
+            self.profileSite(op, left, right, kind, hits, deopts)
+
+    def executeQuickenableBinaryOperation(self, op, kind, hits, deopts):
+        right = self.pop()
+        left = self.pop()
+        self.push(self.binaryOperation(op, left, right))
+        if deopts <= MAX_DEOPTS:
+            self.profileSite(op, left, right, kind, hits, deopts)
+
+    def profileSite(self, op, left, right, kind, hits, deopts):
+        #the profile (operand type seen, consecutive hits, deopts) lives in the
+        #operands of the instruction itself; once warm the instruction is
+        #rewritten in place to its specialised form
+        observed = left.objectType if left.objectType is right.objectType else None
+        frame = self.currentFrame()
+        site = frame.ip - 1
+        quickOp = QUICKENED_OPS.get((op, observed))
+        if quickOp is None:
+            if hits:
+                frame.code[site] = (op[0], (None, 0, deopts))
+            return
+        hits = hits + 1 if observed is kind else 1
+        if hits >= QUICKEN_THRESHOLD:
+            frame.code[site] = (quickOp, (deopts,))
+        else:
+            frame.code[site] = (op[0], (observed, hits, deopts))
+
+    def deoptimize(self, op, deopts):
+        #a specialised instruction's guard failed: put the generic instruction back and run it
+        frame = self.currentFrame()
+        frame.code[frame.ip-1] = (op[0], (None, 0, deopts+1))
+        return self.dispatch[op[0]](None, 0, deopts+1)
+
+    def opNot(self):
+        self.executeNotOperator()
+
+    def opIn(self):
+        right = self.pop()
+        left = self.pop()
+        self.push(self.nativeBooleanToBooleanObject(self.contains(right, left)))
+
+    def opNotIn(self):
+        right = self.pop()
+        left = self.pop()
+        self.push(self.nativeBooleanToBooleanObject(not self.contains(right, left)))
+
+    def opMinus(self):
+        self.executeMinusOperator()
+
+    def opTrue(self):
+        self.push(TRUE)
+
+    def opFalse(self):
+        self.push(FALSE)
+
+    def opNull(self):
+        self.push(NULL)
+
+    def opDefClass(self, classIndex, numConstructors, numMethods):
+        className = self.pop()
+        clazz = self.buildClass(
+                    className,
+                    self.sp-numConstructors, self.sp, #constructor indexes
+                    self.sp-numConstructors-numMethods, self.sp-numConstructors #method indexes
+        )
+        if classIndex >= len(self.classDefs):
+            self.classDefs.extend([None]*(classIndex + 1 - len(self.classDefs)))
+        self.classDefs[classIndex] = clazz
+        self.sp = self.sp-numConstructors-numMethods
+
+    def opGetClass(self, classIndex):
+        self.push(self.classDefs[classIndex])
+
+    def opArray(self, numElements):
+        arr = self.buildArray(self.sp-numElements, self.sp)
+        self.sp = self.sp - numElements
+        self.push(arr)
+
+    def opHash(self, numElements):
+        hash = self.buildHash(self.sp-numElements, self.sp)
+        self.sp = self.sp - numElements
+        self.push(hash)
+
+    def opIndex(self):
+        index = self.pop()
+        left = self.pop()
+        self.executeIndexOperation(left, index)
+
+    def opGetAttr(self):
+        attrName = self.pop()
+        obj = self.pop()
+        val = obj.getAttribute(attrName.value)
+        self.push(val)
+
+    def opSetAttr(self):
+        val = self.pop()
+        attrName = self.pop()
+        obj = self.pop()
+        if val.objectType == OBJECT_TYPES.OBJECT_TYPE_CLOSURE:
+            closure = newClosure(val.compiledFunction, val.freeVariables, instance=obj)
+            setObjectAttribute(obj, attrName.value, closure)
+        else:
+            setObjectAttribute(obj, attrName.value, val)
+
+    def opPop(self):
+        self.sp -= 1
+
+    def opSetGlobal(self, globalIndex):
+        val = self.pop()
+        try:
+            self.globals[globalIndex] = val
+        except IndexError:
+            self.growGlobals(globalIndex)
+            self.globals[globalIndex] = val
+
+    def opGetGlobal(self, globalIndex):
+        try:
+            self.push(self.globals[globalIndex])
+        except IndexError:
+            raise BoaVMError("Global read before assignment: %d" % globalIndex)
+
+    def opGetBuiltin(self, builtinIndex):
+        self.push(getBuiltinByIndex(builtinIndex))
+
+    def opGetInstance(self):
+        instance = self.currentFrame().instance
+        if instance is None:
+            raise BoaVMError("this not bound to instance")
+        self.push(instance)
+
+    def opGetFree(self, freeIndex):
+        currentClosure = self.currentFrame().cl
+        self.push(currentClosure.freeVariables[freeIndex])
+
+    def opSetIndex(self):
+        value = self.pop()
+        index = self.pop()
+        left = self.pop()
+        left[index] = value
+
+    def opJump(self, pos, *profile):
+        #profile is what a TracingVM keeps on back-edges of code it shares with this VM
+        self.currentFrame().ip = pos
+
+    def opJumpNotTrue(self, pos):
+        condition = self.pop()
+        if not isTruthy(condition):
+            self.currentFrame().ip = pos
+
+    def opBoolJumpNotTrue(self, pos):
+        condition = self.pop()
+        if condition is FALSE:
+            self.currentFrame().ip = pos
+        elif condition is not TRUE:
+            raise BoaVMError("Unsupported type for and/or: %s" % condition.objectType)
+
+    def opClosure(self, constIndex, numFree):
+        self.pushClosure(constIndex, numFree)
+
+    def opCurrentClosure(self):
+        currentClosure = self.currentFrame().cl
+        self.push(currentClosure)
+
+    def opCall(self, numArgs):
+        self.executeCall(numArgs)
+        return True
+
+    def opTailCall(self, numArgs):
+        frame = self.currentFrame()
+        callee = self.stack[self.sp-1-numArgs]
+        if not self.canTailCall(frame, callee):
+            #the following return instruction takes care of returning the result
+            return self.opCall(numArgs)
+        instance = callee.instance if callee.instance is not None else frame.instance
+        self.replaceFrame(frame, callee, numArgs, instance)
+        return True
+
+    def replaceFrame(self, frame, callee, numArgs, instance):
+        if numArgs != callee.compiledFunction.numParameters:
+            raise BoaVMError("Wrong number of arguments: got %d, wanted %d" % (numArgs, callee.compiledFunction.numParameters))
+        #move the callee and its arguments into the current frame's stack window and restart the frame
+        basePointer = frame.basePointer
+        self.reserveStack(callee.compiledFunction, basePointer)
+        self.stack[basePointer-1:basePointer+numArgs] = self.stack[self.sp-1-numArgs:self.sp]
+        frame.cl = callee
+        frame.code = decodedInstrs(callee.compiledFunction)
+        frame.ip = 0
+        frame.instance = instance
+        self.sp = basePointer + callee.compiledFunction.numLocals
+
+    def opInvoke(self, constIndex, numArgs, shape=EMPTY_CACHE, clazz=None, method=None):
+        #calls a method on the receiver below the arguments. The receiver's stack slot
+        #takes the callee's place, and the method runs unbound with the receiver in its
+        #frame. The site caches the method for the receiver shape and class it last saw
+        receiver = self.stack[self.sp-1-numArgs]
+        if receiver.shape is shape and receiver.clazz is clazz:
+            self.callClosure(method, numArgs, receiver)
+            return True
+        name = self.constants[constIndex].value
+        method = self.lookupMethod(receiver, name)
+        if method is None:
+            #not a class method, or shadowed by an attribute: call whatever the attribute holds
+            self.stack[self.sp-1-numArgs] = receiver.getAttribute(name)
+            self.executeCall(numArgs)
+            return True
+        frame = self.currentFrame()
+        frame.code[frame.ip-1] = (OPINVOKE[0], (constIndex, numArgs, receiver.shape, receiver.clazz, method))
+        self.callClosure(method, numArgs, receiver)
+        return True
+
+    def opTailInvoke(self, constIndex, numArgs, shape=EMPTY_CACHE, clazz=None, method=None):
+        #OPINVOKE reusing the current frame for the method, like OPTAILCALL
+        receiver = self.stack[self.sp-1-numArgs]
+        frame = self.currentFrame()
+        if receiver.shape is not shape or receiver.clazz is not clazz:
+            name = self.constants[constIndex].value
+            method = self.lookupMethod(receiver, name)
+            if method is None:
+                self.stack[self.sp-1-numArgs] = receiver.getAttribute(name)
+                return self.opTailCall(numArgs)
+            frame.code[frame.ip-1] = (OPTAILINVOKE[0], (constIndex, numArgs, receiver.shape, receiver.clazz, method))
+        if not self.canTailCall(frame, method):
+            self.callClosure(method, numArgs, receiver)
+            return True
+        self.replaceFrame(frame, method, numArgs, receiver)
+        return True
+
+    def lookupMethod(self, receiver, name):
+        if receiver.shape is None or name in receiver.shape.slotIndexes:
+            return None
+        method = receiver.clazz.methods.get(name)
+        if method is None or method.objectType is not CLOSURE_TYPE:
+            return None
+        return method
+
+    def canTailCall(self, frame, callee):
+        #constructors return their instance rather than the call's result, so they can't be replaced
+        return frame.frameType == FRAME_TYPE_FUNCTION and not frame.cl.isConstructor and \
+            callee.objectType == OBJECT_TYPES.OBJECT_TYPE_CLOSURE
+
+    def opBlockCall(self):
+        self.callBlock()
+        return True
+
+    def opLoopCall(self, numArgs):
+        self.callLoop(numArgs)
+        return True
+
+    def opSetLocal(self, localIndex):
+        frame = self.currentFrame()
+        self.stack[frame.basePointer+localIndex] = self.pop()
+
+    def opGetLocal(self, localIndex):
+        frame = self.currentFrame()
+        self.push(self.stack[frame.basePointer+localIndex])
+
+    def opSetBlock(self, scopeDiff, localIndex):
+        self.stack[self.frames[self.frameIndex-1-scopeDiff].basePointer + localIndex] = self.pop()
+
+    def opGetBlock(self, scopeDiff, localIndex):
+        self.push(self.stack[self.frames[self.frameIndex-1-scopeDiff].basePointer + localIndex])
+
+    def opIter(self):
+        iterable = self.pop()
+        iterator = iter(iterable)
+        self.push(iterator)
+
+    def opIterHasNext(self):
+        iterator = self.pop()
+        self.push(TRUE if iterator.hasNext() else FALSE)
+
+    def opIterNext(self):
+        iterator = self.pop()
+        try:
+            val = next(iterator)
+            self.push(val)
+        except StopIteration:
+            raise BoaVMError("Iterator has no more elements")
+
+    def opReturn(self):
+        frame = self.popLastFrameOfType(FRAME_TYPE_FUNCTION)
+        if frame is not None: #if frame is None then the effect is the same as a NOP
+            self.sp = frame.basePointer - 1
+        return True
+
+    def opReturnValue(self):
+        returnValue = self.pop()
+        frame = self.popLastFrameOfType(FRAME_TYPE_FUNCTION)
+        if frame is not None: #if frame is None then the effect is the same as a NOP
+            isConstructor = frame.cl.isConstructor
+            self.sp = frame.basePointer - 1
+            if not isConstructor:
+                self.push(returnValue) #returned values from a constructor don't get pushed back on the stack
+            else:
+                self.push(frame.cl.instance)
+        return True
+
+    def opBlockReturn(self):
+        returnValue = self.pop()
+        frame = self.popFrame()
+        self.sp = frame.basePointer - 1
+        self.push(returnValue)
+        return True
+
+    def opContinue(self):
+        frame = self.popLastFrameOfType(FRAME_TYPE_LOOP)
+        if frame is not None:
+            self.sp = frame.basePointer - 1
+        return True
+
+    def opBreak(self):
+        frame = self.popLastFrameOfType(FRAME_TYPE_LOOP)
+        if frame is not None:
+            self.sp = frame.basePointer - 1
+            self.currentFrame().ip += 1 #to go past the jump to start of loop
+        return True
+
+    def opGetLocalConstAdd(self, localIndex, constIndex):
+        left = self.stack[self.currentFrame().basePointer+localIndex]
+        self.push(self.binaryOperation(OPADD, left, self.constants[constIndex]))
+
+    def opGetGlobalConstAdd(self, globalIndex, constIndex):
+        self.push(self.binaryOperation(OPADD, self.globals[globalIndex], self.constants[constIndex]))
+
+    def opGetLocalConstGtJump(self, localIndex, constIndex, pos):
+        frame = self.currentFrame()
+        if self.compare(OPGT, self.stack[frame.basePointer+localIndex], self.constants[constIndex]) is not TRUE:
+            frame.ip = pos
+
+    def opConstGetLocalGtJump(self, constIndex, localIndex, pos):
+        frame = self.currentFrame()
+        if self.compare(OPGT, self.constants[constIndex], self.stack[frame.basePointer+localIndex]) is not TRUE:
+            frame.ip = pos
+
+    def opGetGlobalConstGtJump(self, globalIndex, constIndex, pos):
+        if self.compare(OPGT, self.globals[globalIndex], self.constants[constIndex]) is not TRUE:
+            self.currentFrame().ip = pos
+
+    def opConstGetGlobalGtJump(self, constIndex, globalIndex, pos):
+        if self.compare(OPGT, self.constants[constIndex], self.globals[globalIndex]) is not TRUE:
+            self.currentFrame().ip = pos
+
+    def opConstGetAttr(self, constIndex, shape=EMPTY_CACHE, slot=0):
+        obj = self.stack[self.sp-1]
+        if obj.shape is shape:
+            self.stack[self.sp-1] = obj.slots[slot]
+        else:
+            self.stack[self.sp-1] = self.lookupNamedAttr(OPCONSTGETATTR, obj, constIndex)
+
+    def opGetNamedAttr(self, constIndex, shape=EMPTY_CACHE, slot=0):
+        #the site's inline cache is the shape and slot it last saw, kept in its operands
+        obj = self.stack[self.sp-1]
+        if obj.shape is shape:
+            self.stack[self.sp-1] = obj.slots[slot]
+        else:
+            self.stack[self.sp-1] = self.lookupNamedAttr(OPGETNAMEDATTR, obj, constIndex)
+
+    def opSetNamedAttr(self, constIndex, shape=EMPTY_CACHE, slot=0, newShape=None):
+        val = self.stack[self.sp-1]
+        obj = self.stack[self.sp-2]
+        self.sp -= 2
+        if val.objectType is CLOSURE_TYPE:
+            val = newClosure(val.compiledFunction, val.freeVariables, instance=obj)
+        if obj.shape is not shape:
+            return self.storeNamedAttr(obj, constIndex, val)
+        if newShape is None:
+            obj.slots[slot] = val
+        else:
+            obj.slots.append(val)
+            obj.shape = newShape
+
+    def lookupNamedAttr(self, op, obj, constIndex):
+        #inline cache miss. Attributes found in the object's shape get cached
+        name = self.constants[constIndex].value
+        shape = obj.shape
+        if shape is not None:
+            slot = shape.slotIndexes.get(name)
+            if slot is not None:
                 frame = self.currentFrame()
-                self.push(self.stack[frame.basePointer+localIndex])
-            elif op == OPSETBLOCK:
-                scopeDiff = readUint16(self.currentInstr()[self.currentFrameIp()+1:])
-                localIndex = readUint16(self.currentInstr()[self.currentFrameIp()+3:])
-                self.incrCurrentFrameIp(4)
-                self.stack[self.frames[self.frameIndex-1-scopeDiff].basePointer + localIndex] = self.pop()
-            elif op == OPGETBLOCK:
-                scopeDiff = readUint16(self.currentInstr()[self.currentFrameIp()+1:])
-                localIndex = readUint16(self.currentInstr()[self.currentFrameIp()+3:])
-                self.incrCurrentFrameIp(4)
-                self.push(self.stack[self.frames[self.frameIndex-1-scopeDiff].basePointer + localIndex])
-            elif op == OPITER:
-                iterable = self.pop()
-                iterator = iter(iterable)
-                self.push(iterator)
-            elif op == OPITERHASNEXT:
-                iterator = self.pop()
-                self.push(TRUE if iterator.hasNext() else FALSE)
-            elif op == OPITERNEXT:
-                iterator = self.pop()
-                try:
-                    val = next(iterator)
-                    self.push(val)
-                except StopIteration:
-                    raise BoaVMError("Iterator has no more elements")
-            elif op == OPRETURN:
-                frame = self.popLastFrameOfType(FRAME_TYPE_FUNCTION)
-                if frame is not None: #if frame is None then the effect is the same as a NOP
-                    self.sp = frame.basePointer - 1
-            elif op == OPRETURNVALUE:
-                returnValue = self.pop()
-                frame = self.popLastFrameOfType(FRAME_TYPE_FUNCTION)
-                if frame is not None: #if frame is None then the effect is the same as a NOP
-                    isConstructor = frame.cl.isConstructor
-                    self.sp = frame.basePointer - 1
-                    if not isConstructor:
-                        self.push(returnValue) #returned values from a constructor don't get pushed back on the stack
-                    else:
-                        self.push(frame.cl.instance)
-            elif op == OPBLOCKRETURN:
-                returnValue = self.pop()
-                frame = self.popFrame()
-                self.sp = frame.basePointer - 1
-                self.push(returnValue)
-            elif op == OPCONTINUE:
-                frame = self.popLastFrameOfType(FRAME_TYPE_LOOP)
-                if frame is not None:
-                    self.sp = frame.basePointer - 1
-            elif op == OPBREAK:
-                frame = self.popLastFrameOfType(FRAME_TYPE_LOOP)
-                if frame is not None:
-                    self.sp = frame.basePointer - 1
-                    self.incrCurrentFrameIp(3) #to go past the jump to start of loop
-            if incrFrameIp:
-                self.incrCurrentFrameIp(1)
+                frame.code[frame.ip-1] = (op[0], (constIndex, shape, slot))
+                return obj.slots[slot]
+        return obj.getAttribute(name)
+
+    def storeNamedAttr(self, obj, constIndex, val):
+        #caches either the slot written or, if the attribute was added, the shape transition
+        name = self.constants[constIndex].value
+        shape = obj.shape
+        setObjectAttribute(obj, name, val)
+        if shape is not None:
+            slot = shape.slotIndexes.get(name)
+            if slot is None:
+                cache = (constIndex, shape, len(shape.slotIndexes), obj.shape)
+            else:
+                cache = (constIndex, shape, slot, None)
+            frame = self.currentFrame()
+            frame.code[frame.ip-1] = (OPSETNAMEDATTR[0], cache)
+
+    def opGtJump(self, pos):
+        right = self.pop()
+        left = self.pop()
+        if self.compare(OPGT, left, right) is not TRUE:
+            self.currentFrame().ip = pos
+
+    def opEqJump(self, pos):
+        right = self.pop()
+        left = self.pop()
+        if self.compare(OPEQ, left, right) is not TRUE:
+            self.currentFrame().ip = pos
 
     def pushClosure(self, constIndex, numFree):
         fn = self.constants[constIndex]
@@ -409,11 +992,10 @@ class VM(object):
         else:
             raise BoaVMError("Calling non-function/builtin")
 
-    def callClosure(self, cl, numArgs):
+    def callClosure(self, cl, numArgs, receiver=None):
         if numArgs != cl.compiledFunction.numParameters:
             raise BoaVMError("Wrong number of arguments: got %d, wanted %d" % (numArgs, cl.compiledFunction.numParameters))
-        frame = Frame(FRAME_TYPE_FUNCTION, cl, self.sp-numArgs)
-        self.pushFrame(frame)
+        frame = self.pushFrame(FRAME_TYPE_FUNCTION, cl, self.sp-numArgs, receiver)
         self.sp = frame.basePointer + cl.compiledFunction.numLocals
 
     def callBuiltin(self, fn, numArgs):
@@ -421,14 +1003,12 @@ class VM(object):
         result = fn.func(args)
         self.sp = self.sp - 1 - numArgs
         self.push(result)
-        self.incrCurrentFrameIp(1) #increment needs to happen here because the ip is not updated in the outer while loop
 
     def callBuiltinMethod(self, fn, numArgs):
         args = self.stack[self.sp-numArgs:self.sp]
         result = fn.func(args)
         self.sp = self.sp - 1 - numArgs
         self.push(result)
-        self.incrCurrentFrameIp(1) #increment needs to happen here because the ip is not updated in the outer while loop
 
     def callCompiledClass(self, clazz, numArgs):
         instance, constructor = clazz.createInstance()
@@ -437,22 +1017,19 @@ class VM(object):
                 raise BoaVMError('Default constructor for %s does not expect arguments. Got %d' % (clazz.inspect(), numArgs))
             self.sp = self.sp - 1
             self.push(instance)
-            self.incrCurrentFrameIp(1)
         else:
             self.callClosure(constructor, numArgs)
 
     def callBlock(self):
         cl = self.stack[self.sp-1]
-        frame = Frame(FRAME_TYPE_BLOCK, cl, self.sp)
-        self.pushFrame(frame)
+        frame = self.pushFrame(FRAME_TYPE_BLOCK, cl, self.sp)
         self.sp = frame.basePointer + cl.compiledFunction.numLocals
 
     def callLoop(self, numArgs):
         cl = self.stack[self.sp-1-numArgs]
         if numArgs != cl.compiledFunction.numParameters:
             raise BoaVMError("Wrong number of arguments: got %d, wanted %d" % (numArgs, cl.compiledFunction.numParameters))
-        frame = Frame(FRAME_TYPE_LOOP, cl, self.sp-numArgs)
-        self.pushFrame(frame)
+        frame = self.pushFrame(FRAME_TYPE_LOOP, cl, self.sp-numArgs)
         self.sp = frame.basePointer + cl.compiledFunction.numLocals
 
     def buildArray(self, startIndex, endIndex):
@@ -513,17 +1090,34 @@ class VM(object):
             raise BoaVMError("Hash index error: %d" % index.inspect())
 
 
+    def contains(self, container, member):
+        #returns a raw bool. Hashes look the key up, strings search for a substring
+        containerType = container.objectType
+        if containerType is HASH_TYPE:
+            if not member.objectType.isHashable:
+                raise BoaVMError("Unusable as hash key: %s" % member.objectType)
+            return member in container
+        elif containerType is STRING_TYPE:
+            if member.objectType is not STRING_TYPE:
+                raise BoaVMError("Unsupported for string membership: %s" % member.objectType)
+            return member.value in container.value
+        elif containerType is ARRAY_TYPE:
+            return member in container
+        raise BoaVMError("Unsupported for membership: %s in %s" % (member.objectType, containerType))
+
     def executeComparison(self, op):
         right = self.pop()
         left = self.pop()
+        self.push(self.compare(op, left, right))
 
+    def compare(self, op, left, right):
         if left.objectType == OBJECT_TYPES.OBJECT_TYPE_INT and \
                 right.objectType == OBJECT_TYPES.OBJECT_TYPE_INT:
             return self.executeIntegerComparison(op, left, right)
         if op == OPEQ:
-            return self.push(self.nativeBooleanToBooleanObject(right.value == left.value))
+            return self.nativeBooleanToBooleanObject(right.value == left.value)
         elif op == OPNEQ:
-            return self.push(self.nativeBooleanToBooleanObject(right.value != left.value))
+            return self.nativeBooleanToBooleanObject(right.value != left.value)
         else:
             raise BoaVMError("Unsupported for boolean comparison: %d" % (op))
 
@@ -532,13 +1126,13 @@ class VM(object):
         rightValue = right.value
 
         if op == OPEQ:
-            return self.push(self.nativeBooleanToBooleanObject(leftValue == rightValue))
+            return self.nativeBooleanToBooleanObject(leftValue == rightValue)
         elif op == OPNEQ:
-            return self.push(self.nativeBooleanToBooleanObject(leftValue != rightValue))
+            return self.nativeBooleanToBooleanObject(leftValue != rightValue)
         elif op == OPGT:
-            return self.push(self.nativeBooleanToBooleanObject(leftValue > rightValue))
+            return self.nativeBooleanToBooleanObject(leftValue > rightValue)
         elif op == OPGTEQ:
-            return self.push(self.nativeBooleanToBooleanObject(leftValue >= rightValue))
+            return self.nativeBooleanToBooleanObject(leftValue >= rightValue)
         else:
             raise BoaVMError("Unsupported for integer comparison: %d" % (op))
 
@@ -568,7 +1162,9 @@ class VM(object):
     def executeBinaryOperation(self, op):
         right = self.pop()
         left = self.pop()
+        self.push(self.binaryOperation(op, left, right))
 
+    def binaryOperation(self, op, left, right):
         if left.objectType == OBJECT_TYPES.OBJECT_TYPE_INT and \
                 right.objectType == OBJECT_TYPES.OBJECT_TYPE_INT:
             return self.executeBinaryIntegerOperation(op, left, right)
@@ -590,7 +1186,7 @@ class VM(object):
             result = leftValue / rightValue
         else:
             raise BoaVMError("Unknown integer operator: %d" % op)
-        self.push(newInteger(result))
+        return newInteger(result)
 
     def executeBinaryStringOperation(self, op, left, right):
         leftValue = left.value
@@ -599,4 +1195,333 @@ class VM(object):
             result = leftValue + rightValue
         else:
             raise BoaVMError("Unknown integer operator: %d" % op)
-        self.push(newString(result))
+        return newString(result)
+
+def box(val):
+    if val is None:
+        return NULL
+    elif val is True:
+        return TRUE
+    elif val is False:
+        return FALSE
+    elif type(val) is int or type(val) is float:
+        return newInteger(val)
+    return val
+
+def unbox(obj):
+    objectType = obj.objectType
+    if objectType is INT_TYPE or objectType is BOOLEAN_TYPE:
+        return obj.value
+    elif objectType is NULL_TYPE:
+        return None
+    return obj
+
+def isRawNumber(val):
+    return type(val) is int or type(val) is float
+
+class UnboxedVM(VM):
+    #keeps ints, booleans and null as raw Python int/float, bool and None on the stack
+    #and in locals and globals. Values are boxed into BoaObjects only when they escape
+    #to attributes, containers, builtins or the host API, and unboxed when they come back.
+    #Unlike the boxed VM, setting an attribute on an int raises a BoaVMError
+    def __init__(self, bytecode, symbolTable=None, verify=True, maxStackSize=MAX_STACK_SIZE, maxFrames=MAX_FRAMES):
+        super(UnboxedVM, self).__init__(bytecode, symbolTable, verify, maxStackSize, maxFrames)
+        self.constants = [unbox(c) for c in bytecode.constants]
+
+    @staticmethod
+    def newWithGlobalsStore(bytecode, globals):
+        vm = UnboxedVM(bytecode)
+        vm.globals = globals
+        vm.reserveGlobals()
+        return vm
+
+    def buildDispatchTable(self):
+        table = super(UnboxedVM, self).buildDispatchTable()
+        #code quickened by a boxed VM may be shared with this one: run it generically
+        for (op, objectType), quickOp in QUICKENED_OPS.items():
+            table[quickOp] = table[op[0]]
+        return table
+
+    def getGlobal(self, identifier):
+        return box(super(UnboxedVM, self).getGlobal(identifier))
+
+    def stackTop(self):
+        if self.sp == 0:
+            return None
+        return box(self.stack[self.sp-1])
+
+    def lastPoppedStackEl(self):
+        return box(self.stack[self.sp])
+
+    def inspectStack(self):
+        return [box(val) for val in super(UnboxedVM, self).inspectStack()]
+
+    def opEq(self, *profile):
+        right = self.pop()
+        left = self.pop()
+        self.push(self.compare(OPEQ, left, right))
+
+    def opNeq(self, *profile):
+        right = self.pop()
+        left = self.pop()
+        self.push(self.compare(OPNEQ, left, right))
+
+    def opIn(self):
+        right = box(self.pop())
+        left = box(self.pop())
+        self.push(self.contains(right, left))
+
+    def opNotIn(self):
+        right = box(self.pop())
+        left = box(self.pop())
+        self.push(not self.contains(right, left))
+
+    def opGt(self, *profile):
+        right = self.pop()
+        left = self.pop()
+        if type(left) is int and type(right) is int:
+            self.push(left > right)
+        else:
+            self.push(self.compare(OPGT, left, right))
+
+    def opGtEq(self, *profile):
+        right = self.pop()
+        left = self.pop()
+        if type(left) is int and type(right) is int:
+            self.push(left >= right)
+        else:
+            self.push(self.compare(OPGTEQ, left, right))
+
+    def opAdd(self, *profile):
+        right = self.pop()
+        left = self.pop()
+        if type(left) is int and type(right) is int:
+            self.push(left + right)
+        else:
+            self.push(self.binaryOperation(OPADD, left, right))
+
+    def opSub(self, *profile):
+        right = self.pop()
+        left = self.pop()
+        if type(left) is int and type(right) is int:
+            self.push(left - right)
+        else:
+            self.push(self.binaryOperation(OPSUB, left, right))
+
+    def opMul(self, *profile):
+        right = self.pop()
+        left = self.pop()
+        if type(left) is int and type(right) is int:
+            self.push(left * right)
+        else:
+            self.push(self.binaryOperation(OPMUL, left, right))
+
+    def opTrue(self):
+        self.push(True)
+
+    def opFalse(self):
+        self.push(False)
+
+    def opNull(self):
+        self.push(None)
+
+    def opArray(self, numElements):
+        arr = newArray([box(val) for val in self.stack[self.sp-numElements:self.sp]])
+        self.sp = self.sp - numElements
+        self.push(arr)
+
+    def opHash(self, numElements):
+        hash = newHash([(box(self.stack[i]), box(self.stack[i+1])) for i in range(self.sp-numElements, self.sp, 2)])
+        self.sp = self.sp - numElements
+        self.push(hash)
+
+    def opIndex(self):
+        index = box(self.pop())
+        left = box(self.pop())
+        self.executeIndexOperation(left, index)
+        self.stack[self.sp-1] = unbox(self.stack[self.sp-1])
+
+    def opSetIndex(self):
+        value = self.pop()
+        index = self.pop()
+        left = self.pop()
+        left[box(index)] = box(value)
+
+    def opGetAttr(self):
+        attrName = self.pop()
+        obj = box(self.pop())
+        self.push(unbox(obj.getAttribute(attrName.value)))
+
+    def opConstGetAttr(self, constIndex, shape=EMPTY_CACHE, slot=0):
+        obj = box(self.stack[self.sp-1])
+        if obj.shape is shape:
+            self.stack[self.sp-1] = unbox(obj.slots[slot])
+        else:
+            self.stack[self.sp-1] = unbox(self.lookupNamedAttr(OPCONSTGETATTR, obj, constIndex))
+
+    def opGetNamedAttr(self, constIndex, shape=EMPTY_CACHE, slot=0):
+        obj = box(self.stack[self.sp-1])
+        if obj.shape is shape:
+            self.stack[self.sp-1] = unbox(obj.slots[slot])
+        else:
+            self.stack[self.sp-1] = unbox(self.lookupNamedAttr(OPGETNAMEDATTR, obj, constIndex))
+
+    def opSetNamedAttr(self, constIndex, shape=EMPTY_CACHE, slot=0, newShape=None):
+        self.stack[self.sp-1] = box(self.stack[self.sp-1])
+        self.stack[self.sp-2] = self.boxReceiver(self.stack[self.sp-2], self.constants[constIndex].value)
+        super(UnboxedVM, self).opSetNamedAttr(constIndex, shape, slot, newShape)
+
+    def opSetAttr(self):
+        val = box(self.pop())
+        attrName = self.pop()
+        obj = self.boxReceiver(self.pop(), attrName.value)
+        if val.objectType == OBJECT_TYPES.OBJECT_TYPE_CLOSURE:
+            val = newClosure(val.compiledFunction, val.freeVariables, instance=obj)
+        setObjectAttribute(obj, attrName.value, val)
+
+    def boxReceiver(self, obj, name):
+        #a boxed raw number would be a fresh object that the variable never sees
+        if isRawNumber(obj):
+            raise BoaVMError("Cannot set attribute %s of unboxed int %s" % (name, obj))
+        return box(obj)
+
+    def opJumpNotTrue(self, pos):
+        condition = self.pop()
+        if condition is None or condition is False:
+            self.currentFrame().ip = pos
+
+    def opBoolJumpNotTrue(self, pos):
+        condition = self.pop()
+        if condition is False:
+            self.currentFrame().ip = pos
+        elif condition is not True:
+            raise BoaVMError("Unsupported type for and/or: %s" % box(condition).objectType)
+
+    def opIterHasNext(self):
+        iterator = self.pop()
+        self.push(iterator.hasNext())
+
+    def opIterNext(self):
+        super(UnboxedVM, self).opIterNext()
+        self.stack[self.sp-1] = unbox(self.stack[self.sp-1])
+
+    def opGetLocalConstAdd(self, localIndex, constIndex):
+        left = self.stack[self.currentFrame().basePointer+localIndex]
+        right = self.constants[constIndex]
+        if type(left) is int and type(right) is int:
+            self.push(left + right)
+        else:
+            self.push(self.binaryOperation(OPADD, left, right))
+
+    def opGetGlobalConstAdd(self, globalIndex, constIndex):
+        left = self.globals[globalIndex]
+        right = self.constants[constIndex]
+        if type(left) is int and type(right) is int:
+            self.push(left + right)
+        else:
+            self.push(self.binaryOperation(OPADD, left, right))
+
+    def opGetLocalConstGtJump(self, localIndex, constIndex, pos):
+        frame = self.currentFrame()
+        if not self.compare(OPGT, self.stack[frame.basePointer+localIndex], self.constants[constIndex]):
+            frame.ip = pos
+
+    def opConstGetLocalGtJump(self, constIndex, localIndex, pos):
+        frame = self.currentFrame()
+        if not self.compare(OPGT, self.constants[constIndex], self.stack[frame.basePointer+localIndex]):
+            frame.ip = pos
+
+    def opGetGlobalConstGtJump(self, globalIndex, constIndex, pos):
+        if not self.compare(OPGT, self.globals[globalIndex], self.constants[constIndex]):
+            self.currentFrame().ip = pos
+
+    def opConstGetGlobalGtJump(self, constIndex, globalIndex, pos):
+        if not self.compare(OPGT, self.constants[constIndex], self.globals[globalIndex]):
+            self.currentFrame().ip = pos
+
+    def opGtJump(self, pos):
+        right = self.pop()
+        left = self.pop()
+        if not self.compare(OPGT, left, right):
+            self.currentFrame().ip = pos
+
+    def opEqJump(self, pos):
+        right = self.pop()
+        left = self.pop()
+        if not self.compare(OPEQ, left, right):
+            self.currentFrame().ip = pos
+
+    def executeCall(self, numArgs):
+        callee = self.stack[self.sp-1-numArgs]
+        if not isinstance(callee, BoaObject):
+            raise BoaVMError("Calling non-function/builtin")
+        super(UnboxedVM, self).executeCall(numArgs)
+
+    def opInvoke(self, constIndex, numArgs, *cache):
+        self.stack[self.sp-1-numArgs] = box(self.stack[self.sp-1-numArgs])
+        return super(UnboxedVM, self).opInvoke(constIndex, numArgs, *cache)
+
+    def opTailInvoke(self, constIndex, numArgs, *cache):
+        self.stack[self.sp-1-numArgs] = box(self.stack[self.sp-1-numArgs])
+        return super(UnboxedVM, self).opTailInvoke(constIndex, numArgs, *cache)
+
+    def canTailCall(self, frame, callee):
+        return isinstance(callee, BoaObject) and super(UnboxedVM, self).canTailCall(frame, callee)
+
+    def callBuiltin(self, fn, numArgs):
+        args = [box(arg) for arg in self.stack[self.sp-numArgs:self.sp]]
+        result = fn.func(args)
+        self.sp = self.sp - 1 - numArgs
+        self.push(unbox(result))
+
+    def callBuiltinMethod(self, fn, numArgs):
+        self.callBuiltin(fn, numArgs)
+
+    def compare(self, op, left, right):
+        #returns a raw bool
+        if isRawNumber(left) and isRawNumber(right):
+            if op == OPEQ:
+                return left == right
+            elif op == OPNEQ:
+                return left != right
+            elif op == OPGT:
+                return left > right
+            elif op == OPGTEQ:
+                return left >= right
+            raise BoaVMError("Unsupported for integer comparison: %d" % (op))
+        leftValue = left.value if isinstance(left, BoaObject) else left
+        rightValue = right.value if isinstance(right, BoaObject) else right
+        if op == OPEQ:
+            return rightValue == leftValue
+        elif op == OPNEQ:
+            return rightValue != leftValue
+        raise BoaVMError("Unsupported for boolean comparison: %d" % (op))
+
+    def executeNotOperator(self):
+        operand = self.pop()
+        self.push(operand is None or operand is False)
+
+    def executeMinusOperator(self):
+        operand = self.pop()
+        if not isRawNumber(operand):
+            raise BoaVMError("Unsupported type for negation: %s" % box(operand).objectType)
+        self.push(-operand)
+
+    def binaryOperation(self, op, left, right):
+        #returns a raw number for numeric operands, a BoaString for string concatenation
+        if isRawNumber(left) and isRawNumber(right):
+            if op == OPADD:
+                return left + right
+            elif op == OPSUB:
+                return left - right
+            elif op == OPMUL:
+                return left * right
+            elif op == OPDIV:
+                return left / right
+            raise BoaVMError("Unknown integer operator: %d" % op)
+        left = box(left)
+        right = box(right)
+        if left.objectType == OBJECT_TYPES.OBJECT_TYPE_STRING and \
+                right.objectType == OBJECT_TYPES.OBJECT_TYPE_STRING:
+            return self.executeBinaryStringOperation(op, left, right)
+        raise BoaVMError("Unsupported types for binary operation: %s %s" % (left.objectType, right.objectType))
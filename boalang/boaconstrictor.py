@@ -5,6 +5,7 @@ from boa.object import OBJECT_TYPES
 if __name__ == '__main__':
     argParser = argparse.ArgumentParser(description='Boa language interpreter')
     argParser.add_argument('scripts', metavar='SCRIPT', type=str, nargs='*', help='scripts to execute sequentially')
+    argParser.add_argument('--compiled', action='store_true', help='compile scripts into closures before running them')
 
     args = argParser.parse_args()
     if len(args.scripts) > 0:
@@ -12,7 +13,7 @@ if __name__ == '__main__':
             with open(script, 'r') as f:
                 code = f.read()
             env = Environment()
-            result = env.evaluate(code)
+            result = env.evaluate(code, compiled=args.compiled)
             if result is not None and result.objectType == OBJECT_TYPES.OBJECT_TYPE_ERROR:
                 print(result.value)
     else:
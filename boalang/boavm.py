@@ -1,30 +1,107 @@
 import argparse
-from boa import VM, Compiler, Parser
+from boa import VM, UnboxedVM, Compiler, Parser, RegisterCompiler, RegisterVM, Transpiler, TracingVM
+from boa.vm import MAX_STACK_SIZE, MAX_FRAMES
 
 if __name__ == '__main__':
     argParser = argparse.ArgumentParser(description='Boa language interpreter')
     argParser.add_argument('scripts', metavar='SCRIPT', type=str, nargs='+', help='scripts to execute sequentially')
+    argParser.add_argument('--superinstructions', action='store_true', help='fuse common opcode sequences into superinstructions')
+    argParser.add_argument('--inline-loops', action='store_true', help='compile loop bodies inline instead of as closures')
+    argParser.add_argument('--inline-branches', action='store_true', help='compile if branches inline instead of as closures')
+    argParser.add_argument('--tail-calls', action='store_true', help='reuse the current frame for calls in tail position')
+    argParser.add_argument('--attribute-caches', action='store_true', help='cache attribute lookups per site by object shape')
+    argParser.add_argument('--invoke-methods', action='store_true', help='call methods with a fused invoke opcode instead of binding them first')
+    argParser.add_argument('--inline-functions', action='store_true', help='inline calls to small non-recursive functions')
+    argParser.add_argument('-O', dest='optimizationLevel', type=int, choices=[0, 1, 2], default=0, help='0: no optimization, 1: fold constants and drop dead code, 2: also propagate constants and clean up jumps')
+    argParser.add_argument('--unboxed', action='store_true', help='keep ints, booleans and null unboxed on the VM stack')
+    argParser.add_argument('--jit', action='store_true', help='compile hot loops to Python through traces (best with --inline-loops)')
+    argParser.add_argument('--register', action='store_true', help='compile to register code and run it on the register VM')
+    argParser.add_argument('--transpile', action='store_true', help='transpile to Python source and run it with CPython')
+    argParser.add_argument('--no-verify', action='store_true', help='run bytecode without verifying it first, with checked stack pushes')
+    argParser.add_argument('--max-stack', type=int, default=MAX_STACK_SIZE, help='maximum number of VM stack slots')
+    argParser.add_argument('--max-frames', type=int, default=MAX_FRAMES, help='maximum call/block nesting depth')
+    argParser.add_argument('--fusion-report', action='store_true', help='print how often each superinstruction was fused')
 
     args = argParser.parse_args()
+    if args.unboxed and args.jit:
+        #traces are recorded and run on the boxed VM's values
+        argParser.error('--unboxed and --jit cannot be combined')
+    #options of the stack compiler and VM that the other backends have no equivalent for
+    stackVMOptions = [
+        ('--superinstructions', args.superinstructions),
+        ('--inline-loops', args.inline_loops),
+        ('--inline-branches', args.inline_branches),
+        ('--tail-calls', args.tail_calls),
+        ('--attribute-caches', args.attribute_caches),
+        ('--invoke-methods', args.invoke_methods),
+        ('--inline-functions', args.inline_functions),
+        ('--unboxed', args.unboxed),
+        ('--jit', args.jit),
+        ('--no-verify', args.no_verify),
+        ('--max-stack', args.max_stack != MAX_STACK_SIZE),
+        ('--fusion-report', args.fusion_report),
+    ]
+    if args.transpile:
+        #transpiled code runs on CPython, with none of the VMs' options
+        for option, given in stackVMOptions + [('--register', args.register), ('--max-frames', args.max_frames != MAX_FRAMES)]:
+            if given:
+                argParser.error('--transpile and %s cannot be combined' % option)
+    elif args.register:
+        for option, given in stackVMOptions:
+            if given:
+                argParser.error('--register and %s cannot be combined' % option)
     for script in args.scripts:
         with open(script, 'r') as f:
             code = f.read()
         parser = Parser(code)
-        compiler = Compiler()
+        if args.register:
+            compiler = RegisterCompiler(optimizationLevel=args.optimizationLevel)
+        else:
+            compiler = Compiler(
+                superinstructions=args.superinstructions or args.fusion_report,
+                inlineLoops=args.inline_loops,
+                inlineBranches=args.inline_branches,
+                tailCalls=args.tail_calls,
+                attributeCaches=args.attribute_caches,
+                invokeMethods=args.invoke_methods,
+                optimizationLevel=args.optimizationLevel,
+                inlineFunctions=args.inline_functions,
+            )
         try:
             program = parser.parseProgram()
         except Exception as e:
             print('Error during parsing: ' + e.message)
             continue
 
+        if args.transpile:
+            try:
+                transpiled = Transpiler(optimizationLevel=args.optimizationLevel).program(program)
+            except Exception as e:
+                print('Error during transpilation: ' + str(e))
+                continue
+            try:
+                transpiled.run()
+            except Exception as e:
+                print('Error during execution: ' + str(e))
+            continue
+
         try:
             compiler.compile(program)
         except Exception as e:
             print('Error during compilation: ' + e.message)
             continue
 
+        bytecode = compiler.bytecode()
+        if args.fusion_report:
+            for name, count in sorted(compiler.fusionCounts.items(), key=lambda e: -e[1]):
+                print('%s: %d' % (name, count))
+
         try:
-            vm = VM(compiler.bytecode())
+            if args.register:
+                vm = RegisterVM(bytecode, maxFrames=args.max_frames)
+            else:
+                vmClass = UnboxedVM if args.unboxed else TracingVM if args.jit else VM
+                vm = vmClass(bytecode, verify=not args.no_verify, maxStackSize=args.max_stack, maxFrames=args.max_frames)
             vm.run()
         except Exception as e:
             print('Error during execution: ' + e.message)
@@ -6,8 +6,13 @@ from test_eval import TestEval
 from test_code import TestCode
 from test_compile import TestCompilation
 from test_vm import TestVM
+from test_regvm import TestRegisterVM
+from test_jit import TestJIT
+from test_transpile import TestTranspile
+from test_closureeval import TestClosureEval
 from test_equiv import TestEquivEvalVM
 from test_io import TestIO
+from test_verify import TestVerify
 
 def suite():
     #all test cases imported into the main variable get auto added to the suite it seems
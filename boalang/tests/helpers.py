@@ -1,17 +1,20 @@
 from boa.parse import Parser
 from boa.compile import Compiler
 from boa.vm import VM
+from boa.regcompile import RegisterCompiler
+from boa.regvm import RegisterVM
+from boa.transpile import Transpiler
 from boa.environment import Environment
 
 class CompileHelper(object):
-    def __init__(self, testCase, code):
+    def __init__(self, testCase, code, **compilerOptions):
         self.code = code
         self.testCase = testCase
 
         self.parser = Parser(code)
         program = self.parser.parseProgram()
 
-        self.compiler = Compiler()
+        self.compiler = Compiler(**compilerOptions)
         self.compiler.compile(program)
         self.bytecode = self.compiler.bytecode()
 
@@ -25,18 +28,20 @@ class CompileHelper(object):
             self.testCase.assertEqual(c, expectedC)
 
 class VMHelper(object):
-    def __init__(self, testCase, code):
+    compilerClass = Compiler
+
+    def __init__(self, testCase, code, vmClass=VM, **compilerOptions):
         self.code = code
         self.testCase = testCase
 
         self.parser = Parser(code)
         program = self.parser.parseProgram()
 
-        self.compiler = Compiler()
+        self.compiler = self.compilerClass(**compilerOptions)
         self.compiler.compile(program)
         self.bytecode = self.compiler.bytecode()
 
-        self.vm = VM(self.bytecode, self.compiler.symbolTable)
+        self.vm = vmClass(self.bytecode, self.compiler.symbolTable)
         self.vm.run()
 
         self.checkSanity()
@@ -63,13 +68,49 @@ class VMHelper(object):
         self.testCase.assertEqual(self.vm.getGlobal(identifier).objectType, typ)
         self.testCase.assertEqual(self.vm.getGlobal(identifier).inspect(), value)
 
+class RegisterVMHelper(VMHelper):
+    compilerClass = RegisterCompiler
+
+    def __init__(self, testCase, code, vmClass=RegisterVM, **compilerOptions):
+        super(RegisterVMHelper, self).__init__(testCase, code, vmClass, **compilerOptions)
+
+    def checkSanity(self):
+        #registers don't leak like a stack can, only the frames need to unwind
+        self.testCase.assertEqual(self.vm.frameIndex, 1)
+
+class TranspileHelper(object):
+    def __init__(self, testCase, code, **transpilerOptions):
+        self.code = code
+        self.testCase = testCase
+
+        self.parser = Parser(code)
+        program = self.parser.parseProgram()
+
+        self.transpiler = Transpiler(**transpilerOptions)
+        #named vm so the equivalence tests can treat it like the other backends
+        self.vm = self.transpiler.program(program)
+        self.vm.run()
+
+    def checkLastValueExpected(self, expectedType, expectedValue):
+        obj = self.vm.lastValue()
+        self.testCase.assertEqual(obj.objectType, expectedType)
+        self.testCase.assertEqual(obj.inspect(), expectedValue)
+
+    def checkGlobalExpected(self, identifier, typ, value):
+        self.testCase.assertEqual(self.vm.getGlobal(identifier).objectType, typ)
+        self.testCase.assertEqual(self.vm.getGlobal(identifier).inspect(), value)
+
 class EnvHelper(object):
-    def __init__(self, testCase, code):
+    def __init__(self, testCase, code, compiled=False):
         self.code = code
         self.testCase = testCase
 
         self.env = Environment()
-        self.env.evaluate(code)
+        self.result = self.env.evaluate(code, compiled=compiled)
+
+    def checkResultExpected(self, expectedType, expectedValue):
+        self.testCase.assertEqual(self.result.objectType, expectedType)
+        self.testCase.assertEqual(self.result.inspect(), expectedValue)
 
     def checkGlobalExpected(self, identifier, typ, value):
         self.testCase.assertEqual(self.env.getGlobal(identifier).objectType, typ)
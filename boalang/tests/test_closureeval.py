@@ -0,0 +1,167 @@
+import unittest
+
+import sys, os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from boa.object import OBJECT_TYPES
+from boa.parse import Parser
+from boa.environment import Environment
+from boa.closureeval import compileNode, closureEval
+from boa.resolve import Resolver
+
+from helpers import EnvHelper
+
+class TestClosureEval(unittest.TestCase):
+    def test_expressions(self):
+        tests = [
+            ('1 + 2 * 3', OBJECT_TYPES.OBJECT_TYPE_INT, '7'),
+            ('(1 - 5) * -2', OBJECT_TYPES.OBJECT_TYPE_INT, '8'),
+            ('"ab" + "cd"', OBJECT_TYPES.OBJECT_TYPE_STRING, '"abcd"'),
+            ('1 < 2', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'true'),
+            ('!(1 == 2)', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'true'),
+            ('not 5', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'false'),
+            ('true and 1 > 2', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'false'),
+            ('2 in [1, 2]', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'true'),
+            ('[1, 2] + [3]', OBJECT_TYPES.OBJECT_TYPE_ARRAY, '[1, 2, 3]'),
+            ('{"a": 1, "b": 2}["b"]', OBJECT_TYPES.OBJECT_TYPE_INT, '2'),
+            ('"abc"[1]', OBJECT_TYPES.OBJECT_TYPE_STRING, '"b"'),
+            ('if (false) { 10 } elif (true) { 20 } else { 30 }', OBJECT_TYPES.OBJECT_TYPE_INT, '20'),
+            ('if (false) { 10 }', OBJECT_TYPES.OBJECT_TYPE_NULL, 'null'),
+            ('len(rest(push([1], 2)))', OBJECT_TYPES.OBJECT_TYPE_INT, '1'),
+        ]
+        for code, expectedType, expectedValue in tests:
+            helper = EnvHelper(self, code, compiled=True)
+            helper.checkResultExpected(expectedType, expectedValue)
+
+    def test_functions(self):
+        code = '''
+        let fib = fn(n) { if (n < 2) { return n; } fib(n - 1) + fib(n - 2) };
+        let adder = fn(x) { fn(y) { x + y } };
+        let a = fib(10);
+        let b = adder(2)(3);
+        let counter = fn() { let n = 0; fn() { n = n + 1; n } };
+        let next = counter();
+        next();
+        let c = next();
+        '''
+        helper = EnvHelper(self, code, compiled=True)
+        helper.checkGlobalExpected('a', OBJECT_TYPES.OBJECT_TYPE_INT, '55')
+        helper.checkGlobalExpected('b', OBJECT_TYPES.OBJECT_TYPE_INT, '5')
+        helper.checkGlobalExpected('c', OBJECT_TYPES.OBJECT_TYPE_INT, '2')
+
+    def test_loops(self):
+        code = '''
+        let total = 0;
+        let i = 0;
+        while (true) {
+            i = i + 1;
+            if (i > 4) { break; }
+            if (i == 2) { continue; }
+            for (j in [i, i]) { total = total + j; }
+        }
+        let f = fn() { for (x in [1, 2, 3]) { if (x == 2) { return x * 10; } } };
+        let a = f();
+        '''
+        helper = EnvHelper(self, code, compiled=True)
+        helper.checkGlobalExpected('total', OBJECT_TYPES.OBJECT_TYPE_INT, '16')
+        helper.checkGlobalExpected('a', OBJECT_TYPES.OBJECT_TYPE_INT, '20')
+
+    def test_classes(self):
+        code = '''
+        class Counter {
+            constructor(start) { this.n = start; this.items = [0, 0]; }
+            incr(by) { this.n = this.n + by; this }
+        };
+        let c = Counter(1);
+        c.incr(2).incr(3);
+        c.items[1] = c.n;
+        let a = c.n;
+        let b = c.items[1];
+        let o = object();
+        o.x = 4;
+        o.getX = fn() { this.x };
+        let d = o.getX();
+        '''
+        helper = EnvHelper(self, code, compiled=True)
+        helper.checkGlobalExpected('a', OBJECT_TYPES.OBJECT_TYPE_INT, '6')
+        helper.checkGlobalExpected('b', OBJECT_TYPES.OBJECT_TYPE_INT, '6')
+        helper.checkGlobalExpected('d', OBJECT_TYPES.OBJECT_TYPE_INT, '4')
+
+    def test_scopes(self):
+        #resolved slots see exactly what boaEval's dict lookups see
+        tests = [
+            'let x = 1; let f = fn() { if (true) { let y = x; let x = 2; y } }; f()',
+            'let fs = []; for (x in [1, 2, 3]) { fs = push(fs, fn() { x }); } fs[0]() + fs[2]() * 10',
+            'let x = 0; let r = []; let i = 0; while (i < 2) { r = push(r, x); let x = 5; i = i + 1; } r',
+            'let f = fn() { let g = fn() { h() }; let h = fn() { 3 }; g() }; f()',
+            'let a = 7; fn(a, b) { b }(1)',
+            'fn(a, a) { a }(1, 2)',
+            'let x = 1; let f = fn() { x = x + 1; let x = 10; x = x + 1; x }; [f(), x]',
+            'let t = 0; for (i in [1, 2, 3]) { for (j in [1, 2]) { let k = i * j; t = t + k; } } t',
+            'class A { constructor(x) { this.x = x; } add(y) { let z = y * 2; this.x + z } }; let f = fn(k) { A(k).add(k) }; f(3)',
+        ]
+        for code in tests:
+            self.assertEqual(Environment().evaluate(code, compiled=True).inspect(), Environment().evaluate(code).inspect())
+
+    def test_resolver(self):
+        program = Parser('''
+        let g = 1;
+        let f = fn(a) {
+            let b = a;
+            while (b > 0) { let c = b; b = c - g; }
+            for (x in [a]) { b = x; }
+            for (x in [a]) { let h = fn() { x }; }
+            b
+        };
+        ''').parseProgram()
+        Resolver().resolve(program)
+        fn = program.statements[1].value
+        whileStatement, forStatement, capturingFor = fn.body.statements[1:4]
+        self.assertEqual(fn.body.paramSlots, [0])
+        self.assertEqual(fn.body.slotCount, 2)
+        self.assertIsNone(program.statements[0].identifier.slot)
+
+        #b is read from the function's frame, g from the environment above it
+        assign = whileStatement.blockStatement.statements[1]
+        self.assertEqual(assign.identifier.candidates, [(1, 1)])
+        self.assertEqual(assign.value.right.candidates, [])
+        self.assertEqual(assign.value.right.globalDepth, 2)
+
+        #loop bodies share a frame unless something in them can keep it
+        self.assertFalse(whileStatement.blockStatement.captures)
+        self.assertEqual(forStatement.blockStatement.slotCount, 1)
+        self.assertFalse(forStatement.blockStatement.captures)
+        self.assertTrue(capturingFor.blockStatement.captures)
+
+    def test_errors(self):
+        #errors are the evaluator's error objects, with the same messages
+        for code in ['1 + "a"', 'a + 1', 'b = 1;', '-"a"', '[1][5]', 'let f = fn() { 1 + true }; f()', 'this']:
+            compiled = Environment().evaluate(code, compiled=True)
+            evaluated = Environment().evaluate(code)
+            self.assertEqual(compiled.objectType, OBJECT_TYPES.OBJECT_TYPE_ERROR)
+            self.assertEqual(compiled.value, evaluated.value)
+
+    def test_intLiterals(self):
+        #each evaluation of a non-small int literal makes a new object, as in the evaluator
+        code = 'let f = fn() { 1000 }; let a = f(); a.foo = 1; let r = f().foo; r'
+        compiled = Environment().evaluate(code, compiled=True)
+        evaluated = Environment().evaluate(code)
+        self.assertEqual(compiled.objectType, OBJECT_TYPES.OBJECT_TYPE_ERROR)
+        self.assertEqual(compiled.value, evaluated.value)
+        envHelper = EnvHelper(self, 'let f = fn() { 1000 }; let a = f(); a.foo = 1; let r = a.foo;', compiled=True)
+        envHelper.checkGlobalExpected('r', OBJECT_TYPES.OBJECT_TYPE_INT, '1')
+
+    def test_compileOnce(self):
+        #a program compiles once and runs in any environment, function bodies are compiled when first called
+        program = Parser('let f = fn(x) { x * 2 }; f(a)').parseProgram()
+        closure = compileNode(program)
+        body = program.statements[0].value.body
+        self.assertFalse(hasattr(body, 'compiledClosure'))
+        for a in [1, 2]:
+            env = Environment()
+            closureEval(Parser('let a = %d;' % a).parseProgram(), env)
+            self.assertEqual(closure(env).inspect(), str(a * 2))
+        self.assertTrue(hasattr(body, 'compiledClosure'))
+
+if __name__ == '__main__':
+    unittest.main()
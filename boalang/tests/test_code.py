@@ -6,8 +6,17 @@ sys.path.insert(1, os.path.join(sys.path[0], '..'))
 from boa.code import (
     OPCONSTANT,
     OPADD,
+    OPJUMP,
+    OPJUMPNOTTRUE,
+    OPTRUE,
+    OPGETLOCAL,
+    OPCLOSURE,
+    OPWIDE,
     makeInstr,
+    encodeInstr,
     formatInstrs,
+    decodeInstrs,
+    assembleInstrs,
 )
 
 class TestCode(unittest.TestCase):
@@ -27,5 +36,56 @@ class TestCode(unittest.TestCase):
         instr = makeInstr(OPCONSTANT, 65534)
         self.assertEqual(instr, OPCONSTANT + b'\xff\xfe')
 
+    def test_encodeInstr(self):
+        buffer = bytearray()
+        encodeInstr(buffer, OPCONSTANT, (1,))
+        encodeInstr(buffer, OPADD, ())
+        self.assertEqual(bytes(buffer), makeInstr(OPCONSTANT, 1) + makeInstr(OPADD))
+
+    def test_decodeInstrs(self):
+        instructions = [
+            makeInstr(OPTRUE), #0000
+            makeInstr(OPJUMPNOTTRUE, 10), #0001
+            makeInstr(OPCONSTANT, 1), #0004
+            makeInstr(OPJUMP, 0), #0007
+            makeInstr(OPADD), #0010
+        ]
+
+        decoded = decodeInstrs(b''.join(instructions))
+        self.assertEqual(decoded, [
+            (OPTRUE[0], ()),
+            (OPJUMPNOTTRUE[0], (4,)),
+            (OPCONSTANT[0], (1,)),
+            (OPJUMP[0], (0,)),
+            (OPADD[0], ()),
+        ])
+
+    def test_wideOperands(self):
+        self.assertEqual(makeInstr(OPCONSTANT, 65536), OPWIDE + OPCONSTANT + b'\x00\x01\x00\x00')
+        self.assertEqual(makeInstr(OPGETLOCAL, 256), OPWIDE + OPGETLOCAL + b'\x01\x00')
+        #one operand too large widens all of them
+        self.assertEqual(makeInstr(OPCLOSURE, 1, 300), OPWIDE + OPCLOSURE + b'\x00\x00\x00\x01\x01\x2c')
+
+        instructions = [
+            makeInstr(OPCONSTANT, 70000), #0000
+            makeInstr(OPJUMP, 0), #0006
+            makeInstr(OPGETLOCAL, 1), #0009
+        ]
+        instr = b''.join(instructions)
+        self.assertEqual(decodeInstrs(instr), [
+            (OPCONSTANT[0], (70000,)),
+            (OPJUMP[0], (0,)),
+            (OPGETLOCAL[0], (1,)),
+        ])
+        self.assertEqual(formatInstrs(instr), "0000 OpConstant 70000\n0006 OpJump 0\n0009 OpGetLocal 1\n")
+        self.assertEqual(assembleInstrs(decodeInstrs(instr)), instructions)
+
+    def test_assembleFarJumps(self):
+        #the jump's target moves past 65535 only once the jump itself is widened
+        decoded = [(OPJUMP[0], (21846,))] + [(OPCONSTANT[0], (1,))]*21845 + [(OPADD[0], ())]
+        instructions = assembleInstrs(decoded)
+        self.assertEqual(instructions[0], makeInstr(OPJUMP, 2 + 4 + 21845*3))
+        self.assertEqual(decodeInstrs(b''.join(instructions)), decoded)
+
 if __name__ == '__main__':
     unittest.main()
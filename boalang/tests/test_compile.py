@@ -3,7 +3,9 @@ import unittest
 import sys, os
 sys.path.insert(1, os.path.join(sys.path[0], '..'))
 
+from boa.object import OBJECT_TYPES
 from boa.code import (
+    decodeInstrs,
     OPCONSTANT,
     OPADD,
     OPMUL,
@@ -15,6 +17,7 @@ from boa.code import (
     OPNOT,
     OPJUMP,
     OPJUMPNOTTRUE,
+    OPBOOLJUMPNOTTRUE,
     OPNULL,
     OPGETGLOBAL,
     OPSETGLOBAL,
@@ -24,6 +27,8 @@ from boa.code import (
     OPRETURNVALUE,
     OPSETLOCAL,
     OPGETLOCAL,
+    OPIN,
+    OPNOTIN,
     OPSETINDEX,
     OPBLOCKCALL,
     OPBLOCKRETURN,
@@ -38,6 +43,16 @@ from boa.code import (
     OPSETATTR,
     OPDEFCLASS,
     OPGETCLASS,
+    OPGETGLOBALCONSTADD,
+    OPCONSTGETGLOBALGTJUMP,
+    OPCONSTGETATTR,
+    OPCALL,
+    OPTAILCALL,
+    OPCURRENTCLOSURE,
+    OPGETBUILTIN,
+    OPGETNAMEDATTR,
+    OPSETNAMEDATTR,
+    OPINVOKE,
     makeInstr,
     formatInstrs,
 )
@@ -188,6 +203,29 @@ class TestCompilation(unittest.TestCase):
             makeInstr(OPPOP), #0026
         ])
 
+    def test_inlineBranches(self):
+        helper = CompileHelper(self, 'if (true) { 10 } else { let a = 2; a }', inlineBranches=True)
+        helper.checkInstructionsExpected([
+            makeInstr(OPTRUE), #0000
+            makeInstr(OPJUMPNOTTRUE, 10), #0001
+            makeInstr(OPCONSTANT, 0), #0004
+            makeInstr(OPJUMP, 19), #0007
+            makeInstr(OPCONSTANT, 1), #0010
+            makeInstr(OPSETGLOBAL, 0), #0013
+            makeInstr(OPGETGLOBAL, 0), #0016
+            makeInstr(OPPOP), #0019
+        ])
+
+        helper = CompileHelper(self, 'if (true) { } ', inlineBranches=True)
+        helper.checkInstructionsExpected([
+            makeInstr(OPTRUE), #0000
+            makeInstr(OPJUMPNOTTRUE, 8), #0001
+            makeInstr(OPNULL), #0004
+            makeInstr(OPJUMP, 9), #0005
+            makeInstr(OPNULL), #0008
+            makeInstr(OPPOP), #0009
+        ])
+
     def test_loops(self):
         helper = CompileHelper(self, 'let a = 1; while (a < 10) { a = a + 1; }; a')
         helper.checkInstructionsExpected([
@@ -197,7 +235,7 @@ class TestCompilation(unittest.TestCase):
             makeInstr(OPGETGLOBAL, 0), #0009
             makeInstr(OPGT), #0012
             makeInstr(OPJUMPNOTTRUE, 25), #0013
-            makeInstr(OPCLOSURE, 3, 0), #0016
+            makeInstr(OPCLOSURE, 2, 0), #0016
             makeInstr(OPLOOPCALL, 0), #0019
             makeInstr(OPJUMP, 6), #0021
             makeInstr(OPGETGLOBAL, 0), #0024
@@ -206,10 +244,9 @@ class TestCompilation(unittest.TestCase):
         helper.checkConstantsExpected([
             1,
             10,
-            1,
             b''.join([
                 makeInstr(OPGETGLOBAL, 0), #0009
-                makeInstr(OPCONSTANT, 2), #0016
+                makeInstr(OPCONSTANT, 0), #0016
                 makeInstr(OPADD), #0016
                 makeInstr(OPSETGLOBAL, 0), #0016
                 makeInstr(OPCONTINUE), #0000
@@ -239,6 +276,57 @@ class TestCompilation(unittest.TestCase):
         ])
 
 
+    def test_inlineLoops(self):
+        helper = CompileHelper(self, 'let a = 1; while (a < 10) { let b = a; a = b + 1; if (a > 5) { continue; } }', inlineLoops=True)
+        #continue inside an if branch keeps the loop as a closure
+        self.assertIn(makeInstr(OPLOOPCALL, 0), helper.bytecode.instructions)
+
+        helper = CompileHelper(self, 'let a = 1; while (a < 10) { let b = a; a = b + 1; break; continue; }; a', inlineLoops=True)
+        helper.checkInstructionsExpected([
+            makeInstr(OPCONSTANT, 0), #0000
+            makeInstr(OPSETGLOBAL, 0), #0003
+            makeInstr(OPCONSTANT, 1), #0006
+            makeInstr(OPGETGLOBAL, 0), #0009
+            makeInstr(OPGT), #0012
+            makeInstr(OPJUMPNOTTRUE, 41), #0013
+            makeInstr(OPGETGLOBAL, 0), #0016 let b = a
+            makeInstr(OPSETGLOBAL, 1), #0019
+            makeInstr(OPGETGLOBAL, 1), #0022 a = b + 1
+            makeInstr(OPCONSTANT, 0), #0025
+            makeInstr(OPADD), #0028
+            makeInstr(OPSETGLOBAL, 0), #0029
+            makeInstr(OPJUMP, 41), #0032 break
+            makeInstr(OPJUMP, 6), #0035 continue
+            makeInstr(OPJUMP, 6), #0038
+            makeInstr(OPGETGLOBAL, 0), #0041
+            makeInstr(OPPOP),
+        ])
+
+        helper = CompileHelper(self, 'let f = fn(a) { let c = 0; for (i in a) { let d = i; c = c + d; }; c }', inlineLoops=True)
+        self.assertEqual(helper.bytecode.constants[-1].value, b''.join([
+            makeInstr(OPCONSTANT, 0), #0000 let c = 0
+            makeInstr(OPSETLOCAL, 1), #0003
+            makeInstr(OPGETLOCAL, 0), #0005 let <iter> = iter(a)
+            makeInstr(OPITER), #0007
+            makeInstr(OPSETLOCAL, 2), #0008
+            makeInstr(OPGETLOCAL, 2), #0010 if <iter>.hasNext()
+            makeInstr(OPITERHASNEXT), #0012
+            makeInstr(OPJUMPNOTTRUE, 35), #0013
+            makeInstr(OPGETLOCAL, 2), #0016 i = <iter>.next()
+            makeInstr(OPITERNEXT), #0018
+            makeInstr(OPSETLOCAL, 3), #0019
+            makeInstr(OPGETLOCAL, 3), #0021 let d = i
+            makeInstr(OPSETLOCAL, 4), #0023
+            makeInstr(OPGETLOCAL, 1), #0025 c = c + d
+            makeInstr(OPGETLOCAL, 4), #0027
+            makeInstr(OPADD), #0029
+            makeInstr(OPSETLOCAL, 1), #0030
+            makeInstr(OPJUMP, 10), #0032
+            makeInstr(OPGETLOCAL, 1), #0035 c
+            makeInstr(OPRETURNVALUE), #0037
+        ]))
+        self.assertEqual(helper.bytecode.constants[-1].numLocals, 5)
+
     def test_letsAndIdents(self):
         helper = CompileHelper(self, 'let a = 1; let b = 2;')
         helper.checkInstructionsExpected([
@@ -253,7 +341,7 @@ class TestCompilation(unittest.TestCase):
             makeInstr(OPCONSTANT, 0), #0000
             makeInstr(OPSETGLOBAL, 0), #0003
             makeInstr(OPGETGLOBAL, 0), #0006
-            makeInstr(OPCONSTANT, 1), #0009
+            makeInstr(OPCONSTANT, 0), #0009
             makeInstr(OPADD), #0012
             makeInstr(OPPOP), #0013
         ])
@@ -265,7 +353,7 @@ class TestCompilation(unittest.TestCase):
             makeInstr(OPGETGLOBAL, 0), #0006
             makeInstr(OPSETGLOBAL, 1), #0003
             makeInstr(OPGETGLOBAL, 0), #0006
-            makeInstr(OPCONSTANT, 1), #0000
+            makeInstr(OPCONSTANT, 0), #0000
             makeInstr(OPADD), #0012
             makeInstr(OPSETGLOBAL, 1), #0003
         ])
@@ -289,8 +377,8 @@ class TestCompilation(unittest.TestCase):
         helper = CompileHelper(self, '[1, 1 + 2]')
         helper.checkInstructionsExpected([
             makeInstr(OPCONSTANT, 0), #0000
-            makeInstr(OPCONSTANT, 1), #0003
-            makeInstr(OPCONSTANT, 2), #0006
+            makeInstr(OPCONSTANT, 0), #0003
+            makeInstr(OPCONSTANT, 1), #0006
             makeInstr(OPADD),
             makeInstr(OPARRAY, 2), #0009
             makeInstr(OPPOP), #0012
@@ -299,11 +387,11 @@ class TestCompilation(unittest.TestCase):
         helper = CompileHelper(self, '[1, 1 + 2][0]')
         helper.checkInstructionsExpected([
             makeInstr(OPCONSTANT, 0), #0000
-            makeInstr(OPCONSTANT, 1), #0003
-            makeInstr(OPCONSTANT, 2), #0006
+            makeInstr(OPCONSTANT, 0), #0003
+            makeInstr(OPCONSTANT, 1), #0006
             makeInstr(OPADD),
             makeInstr(OPARRAY, 2), #0009
-            makeInstr(OPCONSTANT, 3),
+            makeInstr(OPCONSTANT, 2),
             makeInstr(OPINDEX),
             makeInstr(OPPOP), #0012
         ])
@@ -355,7 +443,7 @@ class TestCompilation(unittest.TestCase):
             makeInstr(OPGETGLOBAL, 0),
             makeInstr(OPCONSTANT, 1),
             makeInstr(OPGETATTR),
-            makeInstr(OPCONSTANT, 2),
+            makeInstr(OPCONSTANT, 1),
             makeInstr(OPGETATTR),
             makeInstr(OPPOP),
         ])
@@ -369,11 +457,42 @@ class TestCompilation(unittest.TestCase):
             makeInstr(OPINDEX),
             makeInstr(OPCONSTANT, 2),
             makeInstr(OPGETATTR),
-            makeInstr(OPCONSTANT, 3),
+            makeInstr(OPCONSTANT, 1),
             makeInstr(OPINDEX),
             makeInstr(OPPOP),
         ])
 
+        helper = CompileHelper(self, 'let a = object(); a.b = 1; a.b.length', attributeCaches=True)
+        helper.checkInstructionsExpected([
+            makeInstr(OPGETBUILTIN, 8),
+            makeInstr(OPCALL, 0),
+            makeInstr(OPSETGLOBAL, 0),
+            makeInstr(OPGETGLOBAL, 0),
+            makeInstr(OPCONSTANT, 0),
+            makeInstr(OPSETNAMEDATTR, 1),
+            makeInstr(OPGETGLOBAL, 0),
+            makeInstr(OPGETNAMEDATTR, 1),
+            makeInstr(OPGETNAMEDATTR, 2),
+            makeInstr(OPPOP),
+        ])
+
+    def test_invoke(self):
+        helper = CompileHelper(self, 'let a = "abc"; a.toUpper(); a.b.c(1, 2)', invokeMethods=True)
+        helper.checkInstructionsExpected([
+            makeInstr(OPCONSTANT, 0),
+            makeInstr(OPSETGLOBAL, 0),
+            makeInstr(OPGETGLOBAL, 0),
+            makeInstr(OPINVOKE, 1, 0),
+            makeInstr(OPPOP),
+            makeInstr(OPGETGLOBAL, 0),
+            makeInstr(OPCONSTANT, 2),
+            makeInstr(OPGETATTR),
+            makeInstr(OPCONSTANT, 3),
+            makeInstr(OPCONSTANT, 4),
+            makeInstr(OPINVOKE, 5, 2),
+            makeInstr(OPPOP),
+        ])
+
     def test_functions(self):
         helper = CompileHelper(self, 'fn() { return 5 + 10 }')
         helper.checkConstantsExpected([
@@ -443,6 +562,32 @@ class TestCompilation(unittest.TestCase):
             ])
         ])
 
+    def test_tailCalls(self):
+        helper = CompileHelper(self, 'let f = fn(n) { if (n > 0) { f(n) } else { n } }', inlineBranches=True, tailCalls=True)
+        self.assertEqual(helper.bytecode.constants[-1].value, b''.join([
+            makeInstr(OPGETLOCAL, 0), #0000
+            makeInstr(OPCONSTANT, 0), #0002
+            makeInstr(OPGT), #0005
+            makeInstr(OPJUMPNOTTRUE, 17), #0006
+            makeInstr(OPCURRENTCLOSURE), #0009
+            makeInstr(OPGETLOCAL, 0), #0010
+            makeInstr(OPTAILCALL, 1), #0012 reaches OPRETURNVALUE through the jump
+            makeInstr(OPJUMP, 19), #0014
+            makeInstr(OPGETLOCAL, 0), #0017
+            makeInstr(OPRETURNVALUE), #0019
+        ]))
+
+        #the call's result is used, so it isn't in tail position
+        helper = CompileHelper(self, 'let f = fn(n) { f(n) + 1 }', tailCalls=True)
+        self.assertEqual(helper.bytecode.constants[-1].value, b''.join([
+            makeInstr(OPCURRENTCLOSURE),
+            makeInstr(OPGETLOCAL, 0),
+            makeInstr(OPCALL, 1),
+            makeInstr(OPCONSTANT, 0),
+            makeInstr(OPADD),
+            makeInstr(OPRETURNVALUE),
+        ]))
+
     def test_classes(self):
         helper = CompileHelper(self, 'class A {}')
         helper.checkInstructionsExpected([
@@ -457,12 +602,278 @@ class TestCompilation(unittest.TestCase):
             makeInstr(OPCONSTANT, 2),
             makeInstr(OPCLOSURE, 3, 0),
             makeInstr(OPCONSTANT, 4),
-            makeInstr(OPCLOSURE, 5, 0),
-            makeInstr(OPCONSTANT, 6),
+            makeInstr(OPCLOSURE, 1, 0), #m1 and m3 compile to the same function
+            makeInstr(OPCONSTANT, 5),
             makeInstr(OPDEFCLASS, 0, 0, 6),
         ])
 
         #helper = CompileHelper(self, 'class A { m1(x) {}; m2(y, z) {}; m3(a) {} }; let a = A()')
 
+    def test_superinstructions(self):
+        helper = CompileHelper(self, 'let a = 1; while (a < 10) { a = a + 1; }; a.b', superinstructions=True)
+        helper.checkInstructionsExpected([
+            makeInstr(OPCONSTANT, 0), #0000
+            makeInstr(OPSETGLOBAL, 0), #0003
+            makeInstr(OPCONSTGETGLOBALGTJUMP, 1, 0, 22), #0006
+            makeInstr(OPCLOSURE, 2, 0), #0013
+            makeInstr(OPLOOPCALL, 0), #0017
+            makeInstr(OPJUMP, 6), #0019
+            makeInstr(OPGETGLOBAL, 0), #0022
+            makeInstr(OPCONSTGETATTR, 3), #0025
+            makeInstr(OPPOP), #0028
+        ])
+        helper.checkConstantsExpected([
+            1,
+            10,
+            b''.join([
+                makeInstr(OPGETGLOBALCONSTADD, 0, 0),
+                makeInstr(OPSETGLOBAL, 0),
+                makeInstr(OPCONTINUE),
+            ]),
+            'b',
+        ])
+        self.assertEqual(helper.compiler.fusionCounts, {
+            'OpConstGetGlobalGtJump': 1,
+            'OpGetGlobalConstAdd': 1,
+            'OpConstGetAttr': 1,
+        })
+
+        #jump targets inside a candidate sequence prevent fusion
+        helper = CompileHelper(self, 'let a = if (true) { 1 } else { 2 } + 3', superinstructions=True)
+        self.assertEqual(helper.compiler.fusionCounts, {})
+
+    def test_optimizationLevels(self):
+        helper = CompileHelper(self, '1 + 2 * 3; "a" + "b"; -5; !true; 1 + "a"', optimizationLevel=1)
+        helper.checkInstructionsExpected([
+            makeInstr(OPCONSTANT, 0),
+            makeInstr(OPPOP),
+            makeInstr(OPCONSTANT, 1),
+            makeInstr(OPPOP),
+            makeInstr(OPCONSTANT, 2),
+            makeInstr(OPPOP),
+            makeInstr(OPFALSE),
+            makeInstr(OPPOP),
+            makeInstr(OPCONSTANT, 3),
+            makeInstr(OPCONSTANT, 4),
+            makeInstr(OPADD),
+            makeInstr(OPPOP),
+        ])
+        helper.checkConstantsExpected([7, 'ab', -5, 1, 'a'])
+
+        #branches with constant conditions and while(false) loops are dropped
+        helper = CompileHelper(self, 'if (false) { 1 } else { 2 }; while (false) { 3 }', optimizationLevel=1)
+        helper.checkInstructionsExpected([
+            makeInstr(OPCONSTANT, 0),
+            makeInstr(OPPOP),
+        ])
+        helper.checkConstantsExpected([2])
+
+        helper = CompileHelper(self, 'fn() { return 1; 2 }', optimizationLevel=1)
+        helper.checkConstantsExpected([
+            1,
+            b''.join([
+                makeInstr(OPCONSTANT, 0),
+                makeInstr(OPRETURNVALUE),
+            ])
+        ])
+
+        #lets bound to a constant are only propagated at -O2, and only if never reassigned
+        helper = CompileHelper(self, 'let a = 2; let b = a * 3; b', optimizationLevel=2)
+        helper.checkInstructionsExpected([
+            makeInstr(OPCONSTANT, 0),
+            makeInstr(OPSETGLOBAL, 0),
+            makeInstr(OPCONSTANT, 1),
+            makeInstr(OPSETGLOBAL, 1),
+            makeInstr(OPCONSTANT, 1),
+            makeInstr(OPPOP),
+        ])
+        helper.checkConstantsExpected([2, 6])
+
+        helper = CompileHelper(self, 'let a = 2; a = 3; a', optimizationLevel=2)
+        helper.checkInstructionsExpected([
+            makeInstr(OPCONSTANT, 0),
+            makeInstr(OPSETGLOBAL, 0),
+            makeInstr(OPCONSTANT, 1),
+            makeInstr(OPSETGLOBAL, 0),
+            makeInstr(OPGETGLOBAL, 0),
+            makeInstr(OPPOP),
+        ])
+
+        #unreachable instructions after returns are removed at -O2
+        helper = CompileHelper(self, 'fn(x) { if (x) { return 1 } else { return 2 } }', optimizationLevel=2, inlineBranches=True)
+        helper.checkConstantsExpected([
+            1,
+            2,
+            b''.join([
+                makeInstr(OPGETLOCAL, 0), #0000
+                makeInstr(OPJUMPNOTTRUE, 9), #0002
+                makeInstr(OPCONSTANT, 0), #0005
+                makeInstr(OPRETURNVALUE), #0008
+                makeInstr(OPCONSTANT, 1), #0009
+                makeInstr(OPRETURNVALUE), #0012
+            ])
+        ])
+
+        #jumps to jumps go straight to the final target
+        helper = CompileHelper(self, 'fn(x) { if (x) { if (x) { 1 } else { 2 } } else { 3 } }', optimizationLevel=2, inlineBranches=True)
+        helper.checkConstantsExpected([
+            1,
+            2,
+            3,
+            b''.join([
+                makeInstr(OPGETLOCAL, 0), #0000
+                makeInstr(OPJUMPNOTTRUE, 22), #0002
+                makeInstr(OPGETLOCAL, 0), #0005
+                makeInstr(OPJUMPNOTTRUE, 16), #0007
+                makeInstr(OPCONSTANT, 0), #0010
+                makeInstr(OPJUMP, 25), #0013
+                makeInstr(OPCONSTANT, 1), #0016
+                makeInstr(OPJUMP, 25), #0019
+                makeInstr(OPCONSTANT, 2), #0022
+                makeInstr(OPRETURNVALUE), #0025
+            ])
+        ])
+
+    def test_inlineFunctions(self):
+        helper = CompileHelper(self, 'let double = fn(x) { x * 2 }; double(3)', inlineFunctions=True)
+        helper.checkInstructionsExpected([
+            makeInstr(OPCLOSURE, 1, 0),
+            makeInstr(OPSETGLOBAL, 0),
+            makeInstr(OPCONSTANT, 2),
+            makeInstr(OPSETGLOBAL, 1),
+            makeInstr(OPGETGLOBAL, 1),
+            makeInstr(OPCONSTANT, 0),
+            makeInstr(OPMUL),
+            makeInstr(OPPOP),
+        ])
+
+        #recursive functions, reassigned names, wrong arities and shadowed free names are called normally
+        for code in [
+            'let f = fn(x) { f(x) }; f(1)',
+            'let f = fn(x) { x }; f = fn(x) { 1 }; f(1)',
+            'let f = fn(x) { x }; f(1, 2)',
+            'let k = 1; let f = fn(x) { x + k }; let g = fn(k) { f(k) }',
+            'let f = fn(x) { let y = x; y }; f(1)',
+        ]:
+            helper = CompileHelper(self, code, inlineFunctions=True)
+            instructions = [c.value for c in helper.bytecode.constants if c.objectType == OBJECT_TYPES.OBJECT_TYPE_COMPILED_FUNCTION]
+            instructions.append(b''.join(helper.bytecode.instructions))
+            ops = [op for instr in instructions for op, operands in decodeInstrs(instr)]
+            self.assertIn(OPCALL[0], ops, code)
+
+    def test_emission(self):
+        #instructions go into one buffer, with jumps patched in place
+        code = '; '.join(['let a%d = if (%d > 1) { %d } else { 0 }' % (i, i, i) for i in range(200)])
+        helper = CompileHelper(self, code)
+        scope = helper.compiler.currentScope()
+        self.assertEqual(len(scope.positions), len(helper.bytecode.instructions))
+        self.assertEqual(b''.join(helper.bytecode.instructions), bytes(scope.buffer))
+        decoded = decodeInstrs(helper.bytecode.instr)
+        self.assertEqual(len(decoded), len(scope.positions))
+
+        helper = CompileHelper(self, 'if (true) { 1 }; 2')
+        self.assertEqual(helper.compiler.getInstrBytecodePos(2), 4)
+        self.assertEqual(helper.compiler.currentBytecodePos(), len(helper.bytecode.instr))
+
+    def test_constantDedup(self):
+        helper = CompileHelper(self, 'let a = object(); a.x = 100; a.x = a.x + 100; a.x + 1000 + 1000; "s"; "s"; let f = fn(n) { n }; let g = fn(m) { m }')
+        helper.checkConstantsExpected([
+            'x',
+            100,
+            1000,
+            1000, #so can ints outside the small int cache
+            's',
+            's', #string literals can carry attributes, so each gets its own constant
+            b''.join([
+                makeInstr(OPGETLOCAL, 0),
+                makeInstr(OPRETURNVALUE),
+            ]),
+        ])
+
+        #names are interned across compilation units, small ints are shared anyway
+        other = CompileHelper(self, 'let b = object(); b.x = 100; 1000')
+        self.assertIs(other.bytecode.constants[0], helper.bytecode.constants[0])
+        self.assertIs(other.bytecode.constants[1], helper.bytecode.constants[1])
+        self.assertIsNot(other.bytecode.constants[2], helper.bytecode.constants[2])
+
+    def test_farJumps(self):
+        #a forward jump whose target lands past 64K is widened when the scope is laid out
+        helper = CompileHelper(self, '1')
+        compiler = helper.compiler
+        jumpPos = compiler.emit(OPJUMPNOTTRUE, 9999)
+        for i in range(22000):
+            compiler.emit(OPCONSTANT, 0)
+        compiler.changeOperand(jumpPos, compiler.currentBytecodePos())
+        compiler.emit(OPPOP)
+        self.assertIn(jumpPos, compiler.currentScope().farJumps)
+
+        decoded = decodeInstrs(compiler.bytecode().instr)
+        self.assertEqual(decoded[jumpPos], (OPJUMPNOTTRUE[0], (jumpPos + 22001,)))
+        self.assertEqual(decoded[jumpPos + 22001], (OPPOP[0], ()))
+
+    def test_logicalOperators(self):
+        helper = CompileHelper(self, 'true and false')
+        helper.checkInstructionsExpected([
+            makeInstr(OPTRUE), #0000
+            makeInstr(OPJUMPNOTTRUE, 12), #0001
+            makeInstr(OPFALSE), #0004
+            makeInstr(OPJUMPNOTTRUE, 12), #0005
+            makeInstr(OPTRUE), #0008
+            makeInstr(OPJUMP, 13), #0009
+            makeInstr(OPFALSE), #0012
+            makeInstr(OPPOP), #0013
+        ])
+
+        helper = CompileHelper(self, 'false or true')
+        helper.checkInstructionsExpected([
+            makeInstr(OPFALSE), #0000
+            makeInstr(OPJUMPNOTTRUE, 7), #0001
+            makeInstr(OPJUMP, 11), #0004
+            makeInstr(OPTRUE), #0007
+            makeInstr(OPJUMPNOTTRUE, 15), #0008
+            makeInstr(OPTRUE), #0011
+            makeInstr(OPJUMP, 16), #0012
+            makeInstr(OPFALSE), #0015
+            makeInstr(OPPOP), #0016
+        ])
+
+        #operands that aren't always booleans are checked when they are tested
+        helper = CompileHelper(self, 'let a = 1; a and 2 > 1')
+        helper.checkInstructionsExpected([
+            makeInstr(OPCONSTANT, 0), #0000
+            makeInstr(OPSETGLOBAL, 0), #0003
+            makeInstr(OPGETGLOBAL, 0), #0006
+            makeInstr(OPBOOLJUMPNOTTRUE, 26), #0009
+            makeInstr(OPCONSTANT, 1), #0012
+            makeInstr(OPCONSTANT, 0), #0015
+            makeInstr(OPGT), #0018
+            makeInstr(OPJUMPNOTTRUE, 26), #0019
+            makeInstr(OPTRUE), #0022
+            makeInstr(OPJUMP, 27), #0023
+            makeInstr(OPFALSE), #0026
+            makeInstr(OPPOP), #0027
+        ])
+
+        #literal operands fold away
+        helper = CompileHelper(self, 'true and false', optimizationLevel=1)
+        helper.checkInstructionsExpected([
+            makeInstr(OPFALSE),
+            makeInstr(OPPOP),
+        ])
+
+    def test_membership(self):
+        helper = CompileHelper(self, '1 in [1]; 2 notin "a"')
+        helper.checkInstructionsExpected([
+            makeInstr(OPCONSTANT, 0),
+            makeInstr(OPCONSTANT, 0),
+            makeInstr(OPARRAY, 1),
+            makeInstr(OPIN),
+            makeInstr(OPPOP),
+            makeInstr(OPCONSTANT, 1),
+            makeInstr(OPCONSTANT, 2),
+            makeInstr(OPNOTIN),
+            makeInstr(OPPOP),
+        ])
+
 if __name__ == '__main__':
     unittest.main()
@@ -4,8 +4,11 @@ import sys, os
 sys.path.insert(1, os.path.join(sys.path[0], '..'))
 
 from boa.object import OBJECT_TYPES
+from boa.vm import UnboxedVM, BoaVMError
+from boa.jit import TracingVM
+from boa.pyruntime import BoaRuntimeError
 
-from helpers import VMHelper, EnvHelper
+from helpers import VMHelper, RegisterVMHelper, TranspileHelper, EnvHelper
 
 SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__)) + '/scripts'
 
@@ -57,14 +60,25 @@ SCRIPTS = [
         ('johnGreeting', OBJECT_TYPES.OBJECT_TYPE_STRING, '"Greetings Jack, my name is John and I am a programmer."'),
         ('jackGreeting', OBJECT_TYPES.OBJECT_TYPE_STRING, '"Greetings John, my name is Jack and I am a manager."'),
     ]),
+    Script('10_logic.boa', [
+        ('a', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'true'),
+        ('b', OBJECT_TYPES.OBJECT_TYPE_INT, '11'),
+        ('c', OBJECT_TYPES.OBJECT_TYPE_STRING, '"plum"'),
+        ('d', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'true'),
+        ('e', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'true'),
+    ]),
+    Script('11_loopexits.boa', [
+        ('u', OBJECT_TYPES.OBJECT_TYPE_ARRAY, '[1, 2]'),
+    ]),
 ]
 
 class TestEquivEvalVM(unittest.TestCase):
-    def runScriptAndAsserts(self, script, asserts):
+    def runScriptAndAsserts(self, script, asserts, helperClass=VMHelper, **vmOptions):
         with open(script, 'r') as f:
             code = f.read()
-        vmHelper = VMHelper(self, code)
+        vmHelper = helperClass(self, code, **vmOptions)
         envHelper = EnvHelper(self, code)
+        self.assertNotEqual(envHelper.result.objectType, OBJECT_TYPES.OBJECT_TYPE_ERROR, envHelper.result.inspect())
 
         for identifier, expectedType, expectedValue in asserts:
             self.assertEqual(
@@ -78,5 +92,117 @@ class TestEquivEvalVM(unittest.TestCase):
         for script in SCRIPTS:
             self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts)
 
+    def test_allScriptsSuperinstructions(self):
+        for script in SCRIPTS:
+            self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, superinstructions=True)
+
+    def test_allScriptsInlineLoops(self):
+        for script in SCRIPTS:
+            self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, inlineLoops=True)
+
+    def test_allScriptsInlineBranches(self):
+        for script in SCRIPTS:
+            self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, inlineBranches=True)
+            self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, inlineBranches=True, inlineLoops=True)
+
+    def test_allScriptsTailCalls(self):
+        for script in SCRIPTS:
+            self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, tailCalls=True)
+            self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, tailCalls=True, inlineBranches=True)
+
+    def test_allScriptsAttributeCaches(self):
+        for script in SCRIPTS:
+            self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, attributeCaches=True)
+            self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, vmClass=UnboxedVM, attributeCaches=True)
+
+    def test_allScriptsInvokeMethods(self):
+        for script in SCRIPTS:
+            self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, invokeMethods=True)
+            self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, invokeMethods=True, attributeCaches=True, tailCalls=True)
+
+    def test_allScriptsOptimized(self):
+        for script in SCRIPTS:
+            for level in [1, 2]:
+                self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, optimizationLevel=level)
+                self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, optimizationLevel=level, inlineLoops=True, inlineBranches=True, tailCalls=True, superinstructions=True)
+
+    def test_allScriptsInlineFunctions(self):
+        for script in SCRIPTS:
+            self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, inlineFunctions=True)
+            self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, inlineFunctions=True, inlineLoops=True, inlineBranches=True, optimizationLevel=2)
+
+    def test_allScriptsUnboxed(self):
+        for script in SCRIPTS:
+            self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, vmClass=UnboxedVM)
+            self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, vmClass=UnboxedVM, superinstructions=True)
+
+    def test_allScriptsCompiledEval(self):
+        for script in SCRIPTS:
+            with open(SCRIPT_DIR + '/' + script.scriptName, 'r') as f:
+                code = f.read()
+            compiledHelper = EnvHelper(self, code, compiled=True)
+            envHelper = EnvHelper(self, code)
+            self.assertNotEqual(envHelper.result.objectType, OBJECT_TYPES.OBJECT_TYPE_ERROR, envHelper.result.inspect())
+            self.assertNotEqual(compiledHelper.result.objectType, OBJECT_TYPES.OBJECT_TYPE_ERROR, compiledHelper.result.inspect())
+            for identifier, expectedType, expectedValue in script.asserts:
+                self.assertEqual(
+                    compiledHelper.env.getGlobal(identifier).inspect(),
+                    envHelper.env.getGlobal(identifier).inspect()
+                )
+                compiledHelper.checkGlobalExpected(identifier, expectedType, expectedValue)
+
+    def test_allScriptsTraced(self):
+        for script in SCRIPTS:
+            self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, vmClass=TracingVM)
+            self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, vmClass=TracingVM, inlineLoops=True, inlineBranches=True)
+            self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, vmClass=TracingVM, inlineLoops=True, inlineBranches=True, superinstructions=True, optimizationLevel=2)
+
+    def test_allScriptsRegister(self):
+        for script in SCRIPTS:
+            for level in [0, 1, 2]:
+                self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, helperClass=RegisterVMHelper, optimizationLevel=level)
+
+    def test_allScriptsTranspiled(self):
+        for script in SCRIPTS:
+            for level in [0, 1, 2]:
+                self.runScriptAndAsserts(SCRIPT_DIR + '/' + script.scriptName, script.asserts, helperClass=TranspileHelper, optimizationLevel=level)
+
+    def test_logicalOperandErrors(self):
+        #and/or only take booleans. The compiled backends skip the right operand when the
+        #left one decides the result, so these only use operands that get evaluated
+        tests = [
+            'let a = 1 and 0;',
+            'let a = true and 1;',
+            'let a = false or "a";',
+            'let a = null or true;',
+            'let x = 5; let a = if (x and true) { 1 } else { 2 };',
+            'let f = fn(x) { x > 0 or x }; let a = f(-1);',
+        ]
+        for code in tests:
+            envHelper = EnvHelper(self, code)
+            self.assertEqual(envHelper.result.objectType, OBJECT_TYPES.OBJECT_TYPE_ERROR)
+            for vmOptions in [{}, dict(vmClass=UnboxedVM), dict(vmClass=TracingVM, inlineLoops=True, inlineBranches=True), dict(superinstructions=True, optimizationLevel=2)]:
+                with self.assertRaises(BoaVMError):
+                    VMHelper(self, code, **vmOptions)
+            with self.assertRaises(BoaVMError):
+                RegisterVMHelper(self, code)
+            with self.assertRaises(BoaRuntimeError):
+                TranspileHelper(self, code)
+
+    def test_intAttributes(self):
+        #non-small ints are distinct objects that can take attributes, but the unboxed
+        #backends keep them as raw numbers and reject the store instead of losing it
+        code = 'let a = 1000; a.foo = 1; let c = a.foo;'
+        envHelper = EnvHelper(self, code)
+        envHelper.checkGlobalExpected('c', OBJECT_TYPES.OBJECT_TYPE_INT, '1')
+        for vmOptions in [{}, dict(vmClass=TracingVM), dict(attributeCaches=True)]:
+            VMHelper(self, code, **vmOptions).checkGlobalExpected('c', OBJECT_TYPES.OBJECT_TYPE_INT, '1')
+        RegisterVMHelper(self, code).checkGlobalExpected('c', OBJECT_TYPES.OBJECT_TYPE_INT, '1')
+        for vmOptions in [{}, dict(attributeCaches=True), dict(superinstructions=True)]:
+            with self.assertRaises(BoaVMError):
+                VMHelper(self, code, vmClass=UnboxedVM, **vmOptions)
+        with self.assertRaises(BoaRuntimeError):
+            TranspileHelper(self, code)
+
 if __name__ == '__main__':
     unittest.main()
@@ -6,7 +6,7 @@ sys.path.insert(1, os.path.join(sys.path[0], '..'))
 from boa.parse import Parser
 from boa.evaluator import boaEval
 from boa.environment import Environment
-from boa.object import OBJECT_TYPES
+from boa.object import OBJECT_TYPES, newInteger, configureSmallIntCache, SMALL_INT_CACHE_MIN, SMALL_INT_CACHE_MAX
 
 class TestEval(unittest.TestCase):
     def test_intLiteral(self):
@@ -183,6 +183,8 @@ class TestEval(unittest.TestCase):
             ("let a = object(); a.b = object(); a.getB = fn() { return this.b; }; a.b.name = 'ABC'; a.getB().name", OBJECT_TYPES.OBJECT_TYPE_STRING, "ABC"),
             ("let a = object(); a.b = '123456'; a.isLong = fn() { if (this.b.length > 4) { true } else { false } }; a.isLong()", OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, True),
             ("let a = object(); a.string = '123456'; a.number = 123456; a.get = fn(x) { if (x) { this.string } else { this.number} }; a.get(true)", OBJECT_TYPES.OBJECT_TYPE_STRING, "123456"),
+            ("let a = 'abc'; a.length = 2; a.toUpper() + 'abc'.toUpper() + str(a.length)", OBJECT_TYPES.OBJECT_TYPE_STRING, "ABCABC2"),
+            ("let a = {1: 2}; a.length + [1, 2].length", OBJECT_TYPES.OBJECT_TYPE_INT, 3),
         ]
 
         for code, expectedType, expectedValue in exprs:
@@ -196,6 +198,7 @@ class TestEval(unittest.TestCase):
             ("class A { size() { return this.numItems; } }; let a = A(); a.numItems = 4; a.size()", OBJECT_TYPES.OBJECT_TYPE_INT, 4),
             ("class Point { constructor(x, y) { this.x = x; this.y = y; } }; let p = Point(1, 2); p.x + p.y", OBJECT_TYPES.OBJECT_TYPE_INT, 3),
             ("class Person { constructor(name) { this.setName(name); } setName(name) { this.name = name; } getName() { return this.name;} }; let p = Person('Jekyll'); p.getName()", OBJECT_TYPES.OBJECT_TYPE_STRING, "Jekyll"),
+            ("class A { get() { 1 } }; let a = A(); a.get = fn() { 2 }; a.get()", OBJECT_TYPES.OBJECT_TYPE_INT, 2),
         ]
 
         for code, expectedType, expectedValue in exprs:
@@ -204,9 +207,15 @@ class TestEval(unittest.TestCase):
             self.assertEqual(result.objectType, expectedType)
             self.assertEqual(result.value, expectedValue)
 
+        #methods are looked up on the class, not copied onto each instance
+        env = Environment()
+        env.evaluate("class A { m1() { 1 } m2() { 2 } }; let a = A(); a.x = 3")
+        self.assertEqual(list(env.getGlobal('a').attributes.keys()), ['x'])
+
     def test_evalErrors(self):
         exprs = [
             ("true + false", OBJECT_TYPES.OBJECT_TYPE_ERROR),
+            ("let a = 1; a.b = 2", OBJECT_TYPES.OBJECT_TYPE_ERROR),
         ]
 
         for code, expectedType in exprs:
@@ -214,5 +223,22 @@ class TestEval(unittest.TestCase):
             result = env.evaluate(code)
             self.assertEqual(result.objectType, expectedType)
 
+    def test_smallIntCache(self):
+        self.assertIs(newInteger(7), newInteger(7))
+        self.assertIsNot(newInteger(SMALL_INT_CACHE_MAX+1), newInteger(SMALL_INT_CACHE_MAX+1))
+        configureSmallIntCache(0, 1024)
+        try:
+            self.assertIs(newInteger(1000), newInteger(1000))
+            self.assertIsNot(newInteger(-1), newInteger(-1))
+        finally:
+            configureSmallIntCache(SMALL_INT_CACHE_MIN, SMALL_INT_CACHE_MAX)
+
+        #attributes are refused only on the shared ints
+        env = Environment()
+        result = env.evaluate('let a = %d; a.x = 1; a.x' % (SMALL_INT_CACHE_MAX+1))
+        self.assertEqual(result.inspect(), '1')
+        result = env.evaluate('let b = 7; b.x = 1;')
+        self.assertEqual(result.objectType, OBJECT_TYPES.OBJECT_TYPE_ERROR)
+
 if __name__ == '__main__':
     unittest.main()
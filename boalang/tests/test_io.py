@@ -8,8 +8,14 @@ from boa.io import (
     deflate,
     BytecodeReader,
     BytecodeWriter,
+    HDRVERS,
+    HDRCONS,
+    HDRCODE,
+    DEFINT,
+    LEGACY_BUILD_NUMBER,
 )
 from boa.code import (
+    OPCONSTANT,
     makeInstr,
 )
 from boa.object import (
@@ -101,7 +107,43 @@ class TestIO(unittest.TestCase):
                 self.assertEqual(origConstant.inspect(), inflatedConstant.inspect())
             self.assertEqual(helper.bytecode.instr, reader.codeInstr)
 
+    def test_largeCodeIO(self):
+        #lengths past 64K need the wide length fields
+        helper = CompileHelper(self, '1')
+        bytecode = helper.bytecode
+        bytecode._instr = makeInstr(OPCONSTANT, 0)*30000
+        reader = BytecodeReader(BytecodeWriter(bytecode).write())
+        reader.read()
+        self.assertEqual(bytecode.instr, reader.codeInstr)
 
+        string = newString('x'*70000)
+        inflated, bytesRead = inflate(deflate(string))
+        self.assertEqual(bytesRead, 1 + 4 + 70000)
+        self.assertEqual(string.value, inflated.value)
+
+    def test_legacyIO(self):
+        #files written before build 2 used 2 byte lengths
+        versionString = b'old'
+        instr = makeInstr(OPCONSTANT, 0)
+        legacy = b''.join([
+            HDRVERS,
+            LEGACY_BUILD_NUMBER.to_bytes(2, byteorder='big'),
+            len(versionString).to_bytes(2, byteorder='big'),
+            versionString,
+            HDRCONS,
+            (1).to_bytes(2, byteorder='big'),
+            DEFINT,
+            (4).to_bytes(2, byteorder='big'),
+            (7).to_bytes(4, byteorder='big'),
+            HDRCODE,
+            len(instr).to_bytes(2, byteorder='big'),
+            instr,
+        ])
+        reader = BytecodeReader(legacy)
+        reader.read()
+        self.assertEqual(reader.readBuildNumber, LEGACY_BUILD_NUMBER)
+        self.assertEqual(reader.constants[0].value, 7)
+        self.assertEqual(reader.codeInstr, instr)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+
+import sys, os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from boa.code import OPJUMP
+from boa.compile import Compiler
+from boa.object import OBJECT_TYPES
+from boa.parse import Parser
+from boa.vm import VM, BoaVMError
+from boa.jit import TracingVM, JIT_THRESHOLD
+
+from helpers import VMHelper
+
+INLINE = dict(inlineLoops=True, inlineBranches=True)
+
+class TestJIT(unittest.TestCase):
+    def test_hotLoops(self):
+        code = '''
+        let total = 0;
+        let i = 0;
+        let low = [];
+        while (i < 100) {
+            if (i > 49) { total = total - 1; } else { push(low, i); }
+            total = total + i * 2;
+            i = i + 1;
+        }
+        let s = 0;
+        for (x in low) { s = s + x; }
+        let f = fn(n) { let a = 0; let j = 0; while (j < n) { a = a + j; j = j + 1; } a };
+        let r = f(100);
+        '''
+        for options in [INLINE, dict(superinstructions=True, optimizationLevel=2, **INLINE)]:
+            helper = VMHelper(self, code, vmClass=TracingVM, **options)
+            self.assertEqual(len(helper.vm.traces), 3)
+            helper.checkGlobalExpected('total', OBJECT_TYPES.OBJECT_TYPE_INT, '9850')
+            helper.checkGlobalExpected('i', OBJECT_TYPES.OBJECT_TYPE_INT, '100')
+            helper.checkGlobalExpected('s', OBJECT_TYPES.OBJECT_TYPE_INT, '1225')
+            helper.checkGlobalExpected('r', OBJECT_TYPES.OBJECT_TYPE_INT, '4950')
+
+    def test_guards(self):
+        #acc turns into a string after the loop was traced, so the type guards fail
+        code = '''
+        let acc = 0;
+        let i = 0;
+        while (i < 40) {
+            if (i == 30) { acc = "s"; }
+            if (i < 30) { acc = acc + 1; } else { acc = acc + "t"; }
+            i = i + 1;
+        }
+        '''
+        helper = VMHelper(self, code, vmClass=TracingVM, **INLINE)
+        self.assertTrue(helper.vm.traces)
+        helper.checkGlobalExpected('acc', OBJECT_TYPES.OBJECT_TYPE_STRING, '"s' + 't'*10 + '"')
+
+        #errors after a guard fails are the interpreter's
+        compiler = Compiler(**INLINE)
+        compiler.compile(Parser('let i = 0; while (i < 40) { i = i + 1; if (i == 35) { i = i + "a"; } }').parseProgram())
+        with self.assertRaises(BoaVMError):
+            TracingVM(compiler.bytecode(), compiler.symbolTable).run()
+
+    def test_untraceable(self):
+        #calls leave the frame, so loops making them stay interpreted
+        code = '''
+        let g = fn(x) { x + 1 };
+        let i = 0;
+        while (i < 200) { i = g(i); }
+        '''
+        helper = VMHelper(self, code, vmClass=TracingVM, **INLINE)
+        self.assertEqual(helper.vm.traces, [])
+        helper.checkGlobalExpected('i', OBJECT_TYPES.OBJECT_TYPE_INT, '200')
+
+        #loops that don't get hot are never traced
+        helper = VMHelper(self, 'let i = 0; while (i < %d) { i = i + 1; }' % (JIT_THRESHOLD - 1), vmClass=TracingVM, **INLINE)
+        self.assertEqual(helper.vm.traces, [])
+
+    def test_sharedCode(self):
+        #a function's code is decoded once, so a plain VM may run code with traces in it
+        compiler = Compiler(**INLINE)
+        compiler.compile(Parser('let f = fn(n) { let j = 0; while (j < n) { j = j + 1; } j }; let r = f(50);').parseProgram())
+        bytecode = compiler.bytecode()
+        vm = TracingVM(bytecode, compiler.symbolTable)
+        vm.run()
+        fn = [c for c in bytecode.constants if c.objectType == OBJECT_TYPES.OBJECT_TYPE_COMPILED_FUNCTION][0]
+        self.assertTrue([operands for op, operands in fn.decoded if op == OPJUMP[0] and len(operands) == 4])
+        vm = VM(bytecode, compiler.symbolTable)
+        vm.run()
+        self.assertEqual(vm.getGlobal('r').inspect(), '50')
+
+if __name__ == '__main__':
+    unittest.main()
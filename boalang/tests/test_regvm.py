@@ -0,0 +1,132 @@
+import unittest
+
+import sys, os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from boa.code import (
+    ROPADD,
+    ROPLOADK,
+    ROPGTJUMP,
+    ROPRETURN,
+    ROPITERNEXT,
+    makeInstr,
+)
+from boa.compile import BoaCompilerError
+from boa.object import OBJECT_TYPES
+from boa.parse import Parser
+from boa.regcompile import RegisterCompiler
+from boa.regvm import RegisterVM
+from boa.vm import BoaVMError
+
+from helpers import RegisterVMHelper
+
+class TestRegisterVM(unittest.TestCase):
+    def test_expressions(self):
+        tests = [
+            ('1 + 2 * 3', OBJECT_TYPES.OBJECT_TYPE_INT, '7'),
+            ('(1 - 5) * -2', OBJECT_TYPES.OBJECT_TYPE_INT, '8'),
+            ('"ab" + "cd"', OBJECT_TYPES.OBJECT_TYPE_STRING, '"abcd"'),
+            ('1 < 2', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'true'),
+            ('2 <= 1', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'false'),
+            ('!(1 == 2)', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'true'),
+            ('true and 1 > 2', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'false'),
+            ('1 > 2 or 2 in [1, 2]', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'true'),
+            ('"x" notin {"y": 1}', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'true'),
+            ('[1, 2, 3][1]', OBJECT_TYPES.OBJECT_TYPE_INT, '2'),
+            ('{"a": 1, "b": 2}["b"]', OBJECT_TYPES.OBJECT_TYPE_INT, '2'),
+            ('if (1 > 2) { 10 } else { 20 }', OBJECT_TYPES.OBJECT_TYPE_INT, '20'),
+            ('if (false) { 10 }', OBJECT_TYPES.OBJECT_TYPE_NULL, 'null'),
+            ('len([1, 2])', OBJECT_TYPES.OBJECT_TYPE_INT, '2'),
+        ]
+        for code, expectedType, expectedValue in tests:
+            helper = RegisterVMHelper(self, code)
+            helper.checkLastPoppedExpected(expectedType, expectedValue)
+
+    def test_functions(self):
+        code = '''
+        let fib = fn(n) { if (n < 2) { return n; } fib(n - 1) + fib(n - 2) };
+        let adder = fn(x) { fn(y) { x + y } };
+        let add2 = adder(2);
+        let a = fib(10);
+        let b = add2(3);
+        let c = fn() { let t = 4; }();
+        '''
+        helper = RegisterVMHelper(self, code)
+        helper.checkGlobalExpected('a', OBJECT_TYPES.OBJECT_TYPE_INT, '55')
+        helper.checkGlobalExpected('b', OBJECT_TYPES.OBJECT_TYPE_INT, '5')
+        helper.checkGlobalExpected('c', OBJECT_TYPES.OBJECT_TYPE_NULL, 'null')
+
+    def test_loops(self):
+        code = '''
+        let f = fn(n) {
+            let total = 0;
+            let i = 0;
+            while (true) {
+                i = i + 1;
+                if (i > n) { break; }
+                if (i == 2) { continue; }
+                for (j in [i, i]) { total = total + j; }
+            }
+            total
+        };
+        let a = f(4);
+        let b = 0;
+        for (x in [1, 2, 3]) { let y = x * x; b = b + y; }
+        '''
+        helper = RegisterVMHelper(self, code)
+        helper.checkGlobalExpected('a', OBJECT_TYPES.OBJECT_TYPE_INT, '16')
+        helper.checkGlobalExpected('b', OBJECT_TYPES.OBJECT_TYPE_INT, '14')
+
+    def test_classes(self):
+        code = '''
+        class Counter {
+            constructor(start) { this.n = start; }
+            incr(by) { this.n = this.n + by; this }
+        };
+        class Empty { };
+        let c = Counter(1);
+        c.incr(2).incr(3);
+        let a = c.n;
+        let e = Empty();
+        e.items = [1, 2];
+        e.items[0] = 5;
+        let b = e.items[0];
+        '''
+        helper = RegisterVMHelper(self, code)
+        helper.checkGlobalExpected('a', OBJECT_TYPES.OBJECT_TYPE_INT, '6')
+        helper.checkGlobalExpected('b', OBJECT_TYPES.OBJECT_TYPE_INT, '5')
+
+    def test_registerCode(self):
+        #locals are read where they live, so a + b is a single instruction
+        compiler = RegisterCompiler()
+        compiler.compile(Parser('let f = fn(a, b) { a + b };').parseProgram())
+        fn = [c for c in compiler.bytecode().constants if c.objectType == OBJECT_TYPES.OBJECT_TYPE_COMPILED_FUNCTION][0]
+        self.assertEqual(fn.instr, makeInstr(ROPADD, 2, 0, 1) + makeInstr(ROPRETURN, 2))
+        self.assertEqual(fn.numLocals, 3)
+
+        #conditions branch on the comparison itself
+        compiler = RegisterCompiler()
+        compiler.compile(Parser('let f = fn(a) { if (a > 1) { 2 } else { 3 } };').parseProgram())
+        fn = [c for c in compiler.bytecode().constants if c.objectType == OBJECT_TYPES.OBJECT_TYPE_COMPILED_FUNCTION][0]
+        self.assertEqual(fn.instr[:1], ROPLOADK)
+        self.assertIn(ROPGTJUMP, fn.instr)
+
+        compiler = RegisterCompiler()
+        compiler.compile(Parser('let s = 0; for (x in [1]) { s = s + x; }').parseProgram())
+        self.assertIn(ROPITERNEXT, compiler.bytecode().instr)
+
+    def test_errors(self):
+        for code in ['break;', 'fn() { continue; }', 'a + 1']:
+            compiler = RegisterCompiler()
+            with self.assertRaises(BoaCompilerError):
+                compiler.compile(Parser(code).parseProgram())
+
+        for code in ['1 + "a"', '"a" > "b"', 'let f = fn(x) { x }; f(1, 2)', 'let f = fn() { f() }; f()']:
+            compiler = RegisterCompiler()
+            compiler.compile(Parser(code).parseProgram())
+            vm = RegisterVM(compiler.bytecode(), compiler.symbolTable)
+            with self.assertRaises(BoaVMError):
+                vm.run()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+
+import sys, os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from boa.object import OBJECT_TYPES
+from boa.parse import Parser
+from boa.pyruntime import BoaRuntimeError
+from boa.transpile import Transpiler, BoaTranspilerError
+
+from helpers import TranspileHelper
+
+class TestTranspile(unittest.TestCase):
+    def test_expressions(self):
+        tests = [
+            ('1 + 2 * 3', OBJECT_TYPES.OBJECT_TYPE_INT, '7'),
+            ('(1 - 5) * -2', OBJECT_TYPES.OBJECT_TYPE_INT, '8'),
+            ('"ab" + "cd"', OBJECT_TYPES.OBJECT_TYPE_STRING, '"abcd"'),
+            ('1 < 2', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'true'),
+            ('2 <= 1', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'false'),
+            ('!(1 == 2)', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'true'),
+            ('true and 1 > 2', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'false'),
+            ('1 > 2 or 2 in [1, 2]', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'true'),
+            ('"x" notin {"y": 1}', OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'true'),
+            ('[1, 2, 3][1]', OBJECT_TYPES.OBJECT_TYPE_INT, '2'),
+            ('{"a": 1, "b": 2}["b"]', OBJECT_TYPES.OBJECT_TYPE_INT, '2'),
+            ('if (1 > 2) { 10 } else { 20 }', OBJECT_TYPES.OBJECT_TYPE_INT, '20'),
+            ('if (false) { 10 }', OBJECT_TYPES.OBJECT_TYPE_NULL, 'null'),
+            ('if (true) { let x = 3; x * 2 } else { 0 }', OBJECT_TYPES.OBJECT_TYPE_INT, '6'),
+            ('1 + if (false) { 1 } elif (true) { let y = 2; y } else { 3 }', OBJECT_TYPES.OBJECT_TYPE_INT, '3'),
+            ('len([1, 2])', OBJECT_TYPES.OBJECT_TYPE_INT, '2'),
+            ('rest(push([1], 2))', OBJECT_TYPES.OBJECT_TYPE_ARRAY, '[2]'),
+        ]
+        for code, expectedType, expectedValue in tests:
+            helper = TranspileHelper(self, code)
+            helper.checkLastValueExpected(expectedType, expectedValue)
+
+    def test_functions(self):
+        code = '''
+        let fib = fn(n) { if (n < 2) { return n; } fib(n - 1) + fib(n - 2) };
+        let adder = fn(x) { fn(y) { x + y } };
+        let add2 = adder(2);
+        let a = fib(10);
+        let b = add2(3);
+        let c = fn() { let t = 4; }();
+        let counter = fn() { let n = 0; fn() { n = n + 1; n } };
+        let next = counter();
+        next();
+        let d = next();
+        let e = 0;
+        let bump = fn() { e = e + 10; };
+        bump();
+        '''
+        helper = TranspileHelper(self, code)
+        helper.checkGlobalExpected('a', OBJECT_TYPES.OBJECT_TYPE_INT, '55')
+        helper.checkGlobalExpected('b', OBJECT_TYPES.OBJECT_TYPE_INT, '5')
+        helper.checkGlobalExpected('c', OBJECT_TYPES.OBJECT_TYPE_NULL, 'null')
+        helper.checkGlobalExpected('d', OBJECT_TYPES.OBJECT_TYPE_INT, '2')
+        helper.checkGlobalExpected('e', OBJECT_TYPES.OBJECT_TYPE_INT, '10')
+
+    def test_scopes(self):
+        #a let in a block shadows the outer binding only inside the block
+        code = '''
+        let a = 1;
+        let b = 0;
+        if (true) { let a = 5; b = a; }
+        let f = fn(a) { let g = fn() { a }; g() };
+        let c = f(7);
+        '''
+        helper = TranspileHelper(self, code)
+        helper.checkGlobalExpected('a', OBJECT_TYPES.OBJECT_TYPE_INT, '1')
+        helper.checkGlobalExpected('b', OBJECT_TYPES.OBJECT_TYPE_INT, '5')
+        helper.checkGlobalExpected('c', OBJECT_TYPES.OBJECT_TYPE_INT, '7')
+
+    def test_loops(self):
+        code = '''
+        let f = fn(n) {
+            let total = 0;
+            let i = 0;
+            while (true) {
+                i = i + 1;
+                if (i > n) { break; }
+                if (i == 2) { continue; }
+                for (j in [i, i]) { total = total + j; }
+            }
+            total
+        };
+        let a = f(4);
+        let b = 0;
+        for (x in [1, 2, 3]) { let y = x * x; b = b + y; }
+        '''
+        helper = TranspileHelper(self, code)
+        helper.checkGlobalExpected('a', OBJECT_TYPES.OBJECT_TYPE_INT, '16')
+        helper.checkGlobalExpected('b', OBJECT_TYPES.OBJECT_TYPE_INT, '14')
+
+    def test_classes(self):
+        code = '''
+        class Counter {
+            constructor(start) { this.n = start; }
+            incr(by) { this.n = this.n + by; this }
+        };
+        class Empty { };
+        let c = Counter(1);
+        c.incr(2).incr(3);
+        let a = c.n;
+        let e = Empty();
+        e.items = [1, 2];
+        e.items[0] = 5;
+        let b = e.items[0];
+        let o = object();
+        o.x = 4;
+        o.getX = fn() { this.x };
+        let d = o.getX();
+        '''
+        helper = TranspileHelper(self, code)
+        helper.checkGlobalExpected('a', OBJECT_TYPES.OBJECT_TYPE_INT, '6')
+        helper.checkGlobalExpected('b', OBJECT_TYPES.OBJECT_TYPE_INT, '5')
+        helper.checkGlobalExpected('d', OBJECT_TYPES.OBJECT_TYPE_INT, '4')
+
+    def test_codeCache(self):
+        #the same program compiles to the same source, which is only compiled once
+        program = Parser('let a = 1 + 2;').parseProgram()
+        first = Transpiler().program(program)
+        second = Transpiler().program(program)
+        self.assertEqual(first.source, second.source)
+        self.assertIs(first.code, second.code)
+
+    def test_errors(self):
+        for code in ['break;', 'fn() { continue; }', 'a + 1', 'len = 1;']:
+            with self.assertRaises(BoaTranspilerError):
+                Transpiler().transpile(Parser(code).parseProgram())
+
+        for code in ['1 + "a"', '"a" > "b"', '[1][5]', 'this']:
+            program = Transpiler().program(Parser(code).parseProgram())
+            with self.assertRaises(BoaRuntimeError):
+                program.run()
+
+if __name__ == '__main__':
+    unittest.main()
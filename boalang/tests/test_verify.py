@@ -0,0 +1,153 @@
+import unittest
+
+import sys, os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from boa.code import (
+    OPCONSTANT,
+    OPADD,
+    OPPOP,
+    OPJUMP,
+    OPGETLOCAL,
+    OPGETGLOBAL,
+    OPGETCLASS,
+    OPGETFREE,
+    OPGETBLOCK,
+    OPCLOSURE,
+    OPCALL,
+    OPBLOCKCALL,
+    OPBLOCKRETURN,
+    OPRETURNVALUE,
+    makeInstr,
+)
+from boa.compile import Bytecode
+from boa.parse import Parser
+from boa.regcompile import RegisterCompiler
+from boa.io import (
+    BytecodeReader,
+    BytecodeWriter,
+)
+from boa.object import (
+    OBJECT_TYPES,
+    newInteger,
+    newCompiledFunction,
+)
+from boa.verify import BoaVerifyError
+from boa.vm import VM, BoaVMError
+
+from helpers import CompileHelper, VMHelper
+
+class TestVerify(unittest.TestCase):
+    def test_maxStackDepth(self):
+        tests = [
+            ('1', 1),
+            ('1 + 2', 2),
+            ('[1, 2, 3]', 3),
+            ('1 + (2 + (3 + 4))', 4),
+            ('let a = fn(x, y) { x + y }; a(1, 2)', 3),
+        ]
+
+        for code, expectedDepth in tests:
+            helper = VMHelper(self, code)
+            self.assertEqual(helper.vm.currentFrame().cl.compiledFunction.maxStackDepth, expectedDepth)
+
+        helper = VMHelper(self, 'let a = fn(x) { let b = [x, x, x, x]; b }; a(1)')
+        fn = [c for c in helper.bytecode.constants if c.objectType == OBJECT_TYPES.OBJECT_TYPE_COMPILED_FUNCTION][0]
+        self.assertEqual(fn.maxStackDepth, 4)
+
+    def test_invalidBytecode(self):
+        tests = [
+            ([b'\xfe'], []), #unknown opcode
+            ([makeInstr(OPCONSTANT, 0)[:2]], [newInteger(1)]), #truncated operand
+            ([makeInstr(OPCONSTANT, 1)], [newInteger(1)]), #constant out of range
+            ([makeInstr(OPJUMP, 2)], []), #jump into the middle of an instruction
+            ([makeInstr(OPCONSTANT, 0), makeInstr(OPADD)], [newInteger(1)]), #stack underflow
+            ([makeInstr(OPPOP)], []),
+            ([makeInstr(OPGETLOCAL, 0)], []), #main program has no locals
+        ]
+
+        for instructions, constants in tests:
+            with self.assertRaises(BoaVerifyError):
+                VM(Bytecode(instructions, constants))
+
+    def test_invalidFunction(self):
+        fn = newCompiledFunction(makeInstr(OPGETLOCAL, 2), numLocals=2)
+        with self.assertRaises(BoaVerifyError):
+            VM(Bytecode([makeInstr(OPCONSTANT, 0)], [fn]))
+
+    def test_enclosingScopes(self):
+        #free variables must be carried by every closure, and enclosing frames read by a block
+        #must exist and have the locals, so the handlers can index them unchecked
+        getFree = newCompiledFunction(makeInstr(OPGETFREE, 1) + makeInstr(OPRETURNVALUE))
+        readsParent = newCompiledFunction(makeInstr(OPGETBLOCK, 1, 0) + makeInstr(OPBLOCKRETURN))
+        readsGrandparent = newCompiledFunction(makeInstr(OPGETBLOCK, 2, 0) + makeInstr(OPBLOCKRETURN))
+        callsBlock = newCompiledFunction(makeInstr(OPCLOSURE, 1, 0) + makeInstr(OPBLOCKCALL) + makeInstr(OPRETURNVALUE), numLocals=1)
+        tests = [
+            ([makeInstr(OPCONSTANT, 0), makeInstr(OPCONSTANT, 0), makeInstr(OPCLOSURE, 1, 1)], [newInteger(1), getFree]),
+            ([makeInstr(OPGETFREE, 0)], []), #main program has no free variables
+            ([makeInstr(OPCLOSURE, 0, 0), makeInstr(OPBLOCKCALL)], [readsParent]), #main program has no locals
+            ([makeInstr(OPCLOSURE, 0, 0), makeInstr(OPCALL, 0)], [readsParent]), #called as a function
+            ([makeInstr(OPCLOSURE, 2, 0), makeInstr(OPCALL, 0)], [newInteger(1), readsGrandparent, callsBlock]), #no frame two up
+        ]
+        for instructions, constants in tests:
+            with self.assertRaises(BoaVerifyError):
+                VM(Bytecode(instructions, constants))
+
+        #a block in a block in a function reaches the function's locals
+        helper = VMHelper(self, 'let f = fn() { let a = 1; if (true) { while (a < 3) { a = a + 1; } } a }; f()')
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '3')
+
+    def test_tableSizes(self):
+        #bytecode that doesn't say how many globals and classes it has gets a slot for each it uses
+        vm = VM(Bytecode([makeInstr(OPGETGLOBAL, 70000), makeInstr(OPGETCLASS, 5)], []))
+        self.assertGreater(len(vm.globals), 70000)
+        self.assertEqual(len(vm.classDefs), 6)
+
+    def test_registerCode(self):
+        #register code uses opcodes the stack machine doesn't have
+        compiler = RegisterCompiler()
+        compiler.compile(Parser('let a = 1; a + 2').parseProgram())
+        with self.assertRaises(BoaVerifyError):
+            VM(compiler.bytecode())
+
+    def test_stackDepthMismatch(self):
+        #the jump skips a push that the fall-through path makes
+        instructions = [
+            makeInstr(OPCONSTANT, 0),
+            makeInstr(OPJUMP, 7),
+            makeInstr(OPCONSTANT, 0),
+            makeInstr(OPPOP),
+        ]
+        with self.assertRaises(BoaVerifyError):
+            VM(Bytecode(instructions, [newInteger(1)]))
+
+    def test_readBytecode(self):
+        code = 'let f = fn(n) { if (n > 0) { f(n - 1) + 1 } else { 0 } }; let c = 0; for (i in [1, 2, 3]) { c = c + f(i); }; c'
+        helper = CompileHelper(self, code)
+        reader = BytecodeReader(BytecodeWriter(helper.bytecode).write())
+        reader.read()
+
+        vm = VM(Bytecode([reader.codeInstr], reader.constants), helper.compiler.symbolTable)
+        vm.run()
+        self.assertEqual(vm.getGlobal('c').value, 6)
+
+        corrupted = bytearray(reader.codeInstr)
+        corrupted[0] = 0xfe
+        with self.assertRaises(BoaVerifyError):
+            VM(Bytecode([bytes(corrupted)], reader.constants))
+
+    def test_stackOverflow(self):
+        #the function's stack reservation doesn't fit, so the call fails before anything is pushed
+        code = 'let f = fn() { [%s] }; f()' % ', '.join(['1']*3000)
+        helper = CompileHelper(self, code)
+        vm = VM(helper.bytecode)
+        with self.assertRaisesRegex(BoaVMError, 'Stack overflow'):
+            vm.run()
+        self.assertEqual(vm.frameIndex, 1)
+
+        vm = VM(helper.bytecode, verify=False)
+        with self.assertRaisesRegex(BoaVMError, 'Stack overflow'):
+            vm.run()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,10 +3,12 @@ import unittest
 import sys, os
 sys.path.insert(1, os.path.join(sys.path[0], '..'))
 
-from boa.code import OPCONSTANT, makeInstr
-from boa.object import OBJECT_TYPES
+from boa.code import OPCONSTANT, OPADD, OPGETNAMEDATTR, OPSETNAMEDATTR, OPINVOKE, makeInstr
+from boa.object import OBJECT_TYPES, ROOT_SHAPE, CannotGetAttributeError
+from boa.vm import QOPADDINTINT, QOPGTINTINT, INITIAL_STACK_SIZE, INITIAL_FRAMES, VM, UnboxedVM, BoaVMError
+from boa.jit import TracingVM
 
-from helpers import VMHelper
+from helpers import VMHelper, RegisterVMHelper, CompileHelper
 
 class TestVM(unittest.TestCase):
     def test_infixOperations(self):
@@ -170,6 +172,212 @@ class TestVM(unittest.TestCase):
         helper = VMHelper(self, 'let c = 0; let a  = [1, 2, 3, 4, 5]; for (i in a) { c = c + i; if (i > 3) { break;} }; c')
         helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '10')
 
+    def test_inlineLoops(self):
+        helper = VMHelper(self, 'let a = 1; while (a < 10) { a = a + 1; }; a', inlineLoops=True)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '10')
+
+        helper = VMHelper(self, 'let a = 1; while (a < 10) { a = a + 1; if (a > 5) { break;} }; a', inlineLoops=True)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '6')
+
+        helper = VMHelper(self, 'let c = 0; let a  = [1, 2, 3, 4, 5]; for (i in a) { let d = i * 2; c = c + d; }; c', inlineLoops=True)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '30')
+
+        helper = VMHelper(self, """
+            let f = fn(n) {
+                let c = 0;
+                let i = 0;
+                while (true) {
+                    i = i + 1;
+                    if (i > n) { return c; };
+                    let tenfold = fn() { i * 10 };
+                    for (j in [1, 2]) {
+                        let k = j * i;
+                        c = c + k;
+                    };
+                    c = c + tenfold();
+                }
+            };
+            f(3)
+        """, inlineLoops=True)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '78')
+
+        helper = VMHelper(self, """
+            let c = 0;
+            for (i in [1, 2, 3, 4]) {
+                let j = 0;
+                while (j < i) {
+                    j = j + 1;
+                    continue;
+                    c = 1000;
+                };
+                c = c + j;
+            };
+            c
+        """, inlineLoops=True)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '10')
+
+    def test_inlineBranches(self):
+        helper = VMHelper(self, 'if (1 > 2) { 10 } else { let a = 2; a * 3 }', inlineBranches=True)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '6')
+
+        helper = VMHelper(self, 'let a = if (false) { 1 }; a', inlineBranches=True)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_NULL, 'null')
+
+        helper = VMHelper(self, """
+            let classify = fn(n) {
+                let x = 5;
+                if (n > x) {
+                    let big = "big";
+                    if (n > 10) { big + "ger" } else { big }
+                } else {
+                    let x = n * 2;
+                    if (x > 5) { return "middle"; };
+                    "small"
+                }
+            };
+            classify(20) + classify(7) + classify(3) + classify(1)
+        """, inlineBranches=True)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_STRING, '"biggerbigmiddlesmall"')
+
+        for options in [{'inlineBranches': True}, {'inlineBranches': True, 'inlineLoops': True}]:
+            helper = VMHelper(self, """
+                let c = 0;
+                for (i in [1, 2, 3, 4, 5, 6]) {
+                    if (i == 2) { continue; };
+                    if (i > 4) { break; } else { let d = i; c = c + d; };
+                };
+                c
+            """, **options)
+            helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '8')
+
+        #a loop exit inside an operand leaves the pending operand on the stack, so such
+        #loops are not inlined. The evaluator only honours break and continue as statements
+        for options in [{'inlineBranches': True}, {'inlineBranches': True, 'inlineLoops': True}, {'inlineBranches': True, 'vmClass': TracingVM}]:
+            helper = VMHelper(self, """
+                let i = 0;
+                let s = 0;
+                while (i < 5) {
+                    let y = 1 + if (i > 2) { break; } else { 2 };
+                    s = s + y;
+                    i = i + 1;
+                }
+            """, **options)
+            helper.checkGlobalExpected('i', OBJECT_TYPES.OBJECT_TYPE_INT, '3')
+            helper.checkGlobalExpected('s', OBJECT_TYPES.OBJECT_TYPE_INT, '9')
+
+    def test_tailCalls(self):
+        #deeper than MAX_FRAMES allows without frame reuse
+        helper = VMHelper(self, """
+            let count = fn(n, acc) { if (n == 0) { acc } else { count(n - 1, acc + 1) } };
+            count(5000, 0)
+        """, inlineBranches=True, tailCalls=True)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '5000')
+
+        helper = VMHelper(self, """
+            let down = fn(n) { if (n == 0) { return "done"; }; return down(n - 1); };
+            down(3001)
+        """, tailCalls=True)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_STRING, '"done"')
+
+        #calls to builtins and from constructors in tail position are ordinary calls
+        helper = VMHelper(self, """
+            class Box { constructor(items) { this.items = items; push(items, 4) } size() { len(this.items) } };
+            let b = Box([1, 2, 3]);
+            b.size()
+        """, tailCalls=True)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '4')
+
+        helper = VMHelper(self, """
+            let count = fn(n, acc) { if (n == 0) { acc } else { count(n - 1, acc + 1) } };
+            count(2000, 0)
+        """, vmClass=UnboxedVM, inlineBranches=True, tailCalls=True)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '2000')
+
+        #method calls compiled to OPINVOKE are tail calls too, whatever the receiver holds
+        code = """
+            class Counter {
+                constructor(n) { this.total = this.count(n, 0); }
+                count(n, acc) { if (n == 0) { return acc; } return this.count(n - 1, acc + 1); }
+            };
+            let c = Counter(10);
+            let o = object();
+            o.down = fn(n) { if (n == 0) { return "done"; } return o.down(n - 1); };
+            [c.count(6000, 0), c.total, o.down(4000)]
+        """
+        for vmClass in [VM, UnboxedVM]:
+            helper = VMHelper(self, code, vmClass=vmClass, invokeMethods=True, attributeCaches=True, tailCalls=True)
+            helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_ARRAY, '[6000, 10, "done"]')
+
+        #a function tail called from a method sees the method's this, as when called normally
+        for body in ['return g();', 'g()']:
+            code = 'class C { constructor() { this.x = 5; } m() { let g = fn() { this.x }; %s } } let r = C().m(); r' % body
+            for vmClass in [VM, UnboxedVM, TracingVM]:
+                helper = VMHelper(self, code, vmClass=vmClass, tailCalls=True)
+                helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '5')
+
+    def test_frames(self):
+        helper = VMHelper(self, """
+            let f = fn(n) {
+                let i = 0;
+                while (true) {
+                    if (i > 1) { if (n > 0) { if (true) { return i * n; } } };
+                    i = i + 1;
+                    if (i > 10) { break; };
+                };
+                -1
+            };
+            f(3) + f(0)
+        """)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '5')
+
+        helper = VMHelper(self, """
+            class Counter {
+                constructor(n) { this.n = n; }
+                total() {
+                    let t = 0;
+                    for (i in [1, 2, 3]) { if (i > 1) { let add = fn(x) { this.n + x }; t = t + add(i); } };
+                    t
+                }
+            };
+            Counter(10).total()
+        """)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '25')
+
+    def test_storageGrowth(self):
+        code = 'let a = 1; let b = 2; let depth = fn(n) { if (n == 0) { 0 } else { 1 + depth(n - 1) } };'
+        helper = CompileHelper(self, code + 'a + b')
+        vm = VM(helper.bytecode, helper.compiler.symbolTable)
+        self.assertEqual(len(vm.globals), 3)
+        self.assertEqual(len(vm.stack), INITIAL_STACK_SIZE)
+        self.assertEqual(len(vm.classDefs), 0)
+
+        #stack and frames grow on demand
+        helper = VMHelper(self, code + 'depth(300)')
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '300')
+        self.assertGreater(len(helper.vm.stack), INITIAL_STACK_SIZE)
+        self.assertGreater(len(helper.vm.frames), INITIAL_FRAMES)
+
+        #up to a configurable ceiling
+        helper = CompileHelper(self, code + 'depth(300)')
+        for vmOptions in [{'maxFrames': 100}, {'maxStackSize': 500}, {'maxStackSize': 500, 'verify': False}]:
+            vm = VM(helper.bytecode, **vmOptions)
+            with self.assertRaisesRegex(BoaVMError, 'overflow'):
+                vm.run()
+
+        helper = CompileHelper(self, code + 'depth(2000)')
+        vm = UnboxedVM(helper.bytecode, helper.compiler.symbolTable, maxStackSize=20000, maxFrames=5000)
+        vm.run()
+        self.assertEqual(vm.lastPoppedStackEl().value, 2000)
+
+        #without symbol counts, globals and class slots grow on first assignment
+        helper = CompileHelper(self, 'class A {}; let a = A(); let b = 5; b')
+        helper.bytecode.numGlobals = None
+        helper.bytecode.numClassDefs = None
+        vm = VM(helper.bytecode)
+        vm.run()
+        self.assertEqual(vm.lastPoppedStackEl().value, 5)
+        self.assertEqual(vm.classDefs[0].name, 'A')
+
     def test_builtins(self):
         helper = VMHelper(self, 'len([1, 2, 3])')
         helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '3')
@@ -190,6 +398,112 @@ class TestVM(unittest.TestCase):
         helper = VMHelper(self, "let a = object(); a.string = '123456'; a.number = 123456; a.get = fn(x) { if (x) { this.string } else { this.number} }; a.get(true)")
         helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_STRING, '"123456"')
 
+    def test_attributeCaches(self):
+        code = """
+            class P { constructor(x, y) { this.x = x; this.y = y; } sum() { this.x + this.y } };
+            let total = 0;
+            for (i in [1, 2, 3]) { let p = P(i, i * 10); p.x = p.x + 1; total = total + p.sum(); };
+            total
+        """
+        for vmClass in [VM, UnboxedVM]:
+            helper = VMHelper(self, code, vmClass=vmClass, attributeCaches=True)
+            helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '69')
+
+        #instances that got the same attributes in the same order share a shape
+        helper = VMHelper(self, 'class A {}; let a = A(); a.i = 1; a.j = 2; let b = A(); b.i = 3; b.j = 4; b.i', attributeCaches=True)
+        a, b = helper.vm.getGlobal('a'), helper.vm.getGlobal('b')
+        self.assertIs(a.shape, b.shape)
+        self.assertIs(a.shape, ROOT_SHAPE.withAttribute('i').withAttribute('j'))
+        self.assertEqual(b.slots, [b.attributes['i'], b.attributes['j']])
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '3')
+
+        #sites cache the shape they last saw: the attribute's slot, or the shape transition for stores that add one
+        helper = VMHelper(self, 'class A {}; let f = fn(o) { o.i = 1; o.i }; f(A()); let b = A(); b.j = 2; f(b)', attributeCaches=True)
+        f = [c for c in helper.vm.constants if c.objectType == OBJECT_TYPES.OBJECT_TYPE_COMPILED_FUNCTION][0]
+        getSite = [operands for op, operands in f.decoded if op == OPGETNAMEDATTR[0]][0]
+        setSite = [operands for op, operands in f.decoded if op == OPSETNAMEDATTR[0]][0]
+        jShape = ROOT_SHAPE.withAttribute('j')
+        self.assertEqual(getSite[1:], (jShape.withAttribute('i'), 1))
+        self.assertEqual(setSite[1:], (jShape, 1, jShape.withAttribute('i')))
+
+        #objects without shapes go through the generic lookup
+        helper = VMHelper(self, 'let o = object(); o.s = "abc"; let f = fn(x) { x.length }; f(o.s) + f([1])', attributeCaches=True)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '4')
+
+    def test_optimizationLevels(self):
+        code = """
+            let limit = 3 * 2;
+            let f = fn(n) {
+                let total = 0;
+                while (true) {
+                    if (n > limit) { break; }
+                    if (false) { total = total - 100; } else { total = total + n; }
+                    n = n + 1;
+                };
+                return total;
+                total = 0;
+            };
+            f(1) + f(-limit)
+        """
+        for level in [0, 1, 2]:
+            for options in [{}, {'inlineLoops': True, 'inlineBranches': True}]:
+                helper = VMHelper(self, code, optimizationLevel=level, **options)
+                helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '21')
+
+    def test_inlineFunctions(self):
+        code = """
+            let k = 3;
+            let double = fn(x) { x * 2 };
+            let addk = fn(a, b) { return a + b + k };
+            let y = double(5) + addk(double(1), 4);
+            let g = fn(k) { addk(k, 1) };
+            let h = fn(n) { let total = 0; for (i in [n, n]) { total = total + double(i) + addk(i, i) }; total };
+            k = 4;
+            g(10) + y + h(2)
+        """
+        for vmClass in [VM, UnboxedVM]:
+            for options in [{}, {'inlineLoops': True, 'inlineBranches': True, 'optimizationLevel': 2}]:
+                helper = VMHelper(self, code, vmClass=vmClass, inlineFunctions=True, **options)
+                helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '58')
+
+    def test_invoke(self):
+        code = """
+            class Counter {
+                constructor(n) { this.n = n; }
+                add(x) { this.n = this.n + x; this }
+                get() { this.n }
+            };
+            let c = Counter(1);
+            for (i in [1, 2, 3]) { c.add(i).add(1); };
+            c.get()
+        """
+        for vmClass in [VM, UnboxedVM]:
+            helper = VMHelper(self, code, vmClass=vmClass, invokeMethods=True)
+            helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '10')
+
+        #the method is called unbound, and cached per shape and class
+        helper = VMHelper(self, 'class A { f() { this.x } }; let g = fn(o) { o.f() }; let a = A(); a.x = 1; g(a); g(a)', invokeMethods=True)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '1')
+        g = [c for c in helper.vm.constants if c.objectType == OBJECT_TYPES.OBJECT_TYPE_COMPILED_FUNCTION][1]
+        site = [operands for op, operands in g.decoded if op == OPINVOKE[0]][0]
+        a = helper.vm.getGlobal('a')
+        self.assertEqual(site[2:4], (a.shape, a.clazz))
+        self.assertIs(site[4], a.clazz.methods['f'])
+        self.assertIsNone(site[4].instance)
+
+        #attributes that shadow methods, attributes holding functions and builtin methods are plain calls
+        helper = VMHelper(self, """
+            class A { f() { 1 } };
+            let g = fn(o) { o.f() };
+            let a = A();
+            let b = A();
+            b.f = fn() { 2 };
+            let o = object();
+            o.f = fn() { 3 };
+            [g(a), g(b), g(a), g(o), "x".toUpper()]
+        """, invokeMethods=True)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_ARRAY, '[1, 2, 1, 3, "X"]')
+
     def test_attributes(self):
         helper = VMHelper(self, '[1, 2, 3].length == "123".length')
         helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'true')
@@ -197,6 +511,22 @@ class TestVM(unittest.TestCase):
         helper = VMHelper(self, 'let a = ["one", "two", "three", "four"]; a[0].length')
         helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '3')
 
+        #only the shared small ints can't have attributes, and setting one is a VM error
+        for options in [{}, dict(attributeCaches=True)]:
+            helper = VMHelper(self, 'let a = 100000 * 3; a.x = 1; a.x', **options)
+            helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '1')
+        for options in [{}, dict(attributeCaches=True), dict(vmClass=UnboxedVM)]:
+            with self.assertRaises(BoaVMError):
+                VMHelper(self, 'let b = 7; b.x = 1;', **options)
+
+        #an attribute on one int literal doesn't show up on an equal literal elsewhere
+        VMHelper(self, 'let a = 1000; a.foo = 1;')
+        for helperClass in [VMHelper, RegisterVMHelper]:
+            with self.assertRaises(CannotGetAttributeError):
+                helperClass(self, 'let b = 1000; let c = b.foo;')
+            with self.assertRaises(CannotGetAttributeError):
+                helperClass(self, 'let a = 1000; a.foo = 1; let b = 1000; let c = b.foo;')
+
     def test_closures(self):
         helper = VMHelper(self, 'let newAdder = fn(a, b) { fn(c) {a + b + c};} let a = newAdder(1, 2); a(8)')
         helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '11')
@@ -214,6 +544,74 @@ class TestVM(unittest.TestCase):
         helper = VMHelper(self, 'let w = fn() { let c = fn(x) { if (x == 0) { 0 } else { c(x-1) } }; c(1) }; w()')
         helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '0')
 
+    def test_superinstructions(self):
+        helper = VMHelper(self, 'let a = 1; while (a < 10) { a = a + 1; }; a', superinstructions=True)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '10')
+
+        helper = VMHelper(self, 'let f = fn(x) { let y = x + 1; if (y > 5) { y } else { 0 } }; f(5) + f(1)', superinstructions=True)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '6')
+
+        helper = VMHelper(self, 'let f = fn(x) { if (5 > x) { 1 } elif (x == 7) { 2 } else { 3 } }; [f(1), f(7), f(9)]', superinstructions=True)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_ARRAY, '[1, 2, 3]')
+
+        helper = VMHelper(self, 'let o = object(); o.s = "ab"; o.s.length', superinstructions=True)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '2')
+
+    def test_quickening(self):
+        helper = VMHelper(self, 'let a = 0; let s = 0; while (a < 20) { a = a + 1; s = s + a; }; s')
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '210')
+        loopBody = helper.vm.constants[-1]
+        self.assertEqual([op for op, operands in loopBody.decoded].count(QOPADDINTINT), 2)
+        mainCode = helper.vm.frames[0].code
+        self.assertIn(QOPGTINTINT, [op for op, operands in mainCode])
+
+        #a specialised site falls back to the generic instruction when its guard fails
+        helper = VMHelper(self, """
+            let add = fn(a, b) { a + b };
+            let i = 0;
+            while (i < 20) { add(i, i); i = i + 1; };
+            add("con", "cat")
+        """)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_STRING, '"concat"')
+        add = helper.vm.constants[0]
+        self.assertEqual(add.decoded[2], (OPADD[0], (OBJECT_TYPES.OBJECT_TYPE_STRING, 1, 1)))
+
+        #sites that keep changing types stay generic
+        helper = VMHelper(self, """
+            let add = fn(a, b) { a + b };
+            let i = 0;
+            while (i < 20) { add(i, i); add("a", "b"); i = i + 1; };
+            add(1, 2)
+        """)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '3')
+        add = helper.vm.constants[0]
+        self.assertEqual(add.decoded[2][0], OPADD[0])
+
+    def test_unboxed(self):
+        helper = VMHelper(self, 'let a = 0; let s = 0; while (a < 20) { a = a + 1; s = s + a; }; s', vmClass=UnboxedVM)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '210')
+        self.assertIs(type(helper.vm.globals[1]), int)
+
+        helper = VMHelper(self, '!(1 > 2) == true', vmClass=UnboxedVM)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'true')
+
+        helper = VMHelper(self, 'if (null) { 1 } else { -2 * 3 }', vmClass=UnboxedVM)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '-6')
+
+        helper = VMHelper(self, 'let b = ["mon"+"key", "boa", true]; (b[0] + b[1] == "monkeyboa") == b[2]', vmClass=UnboxedVM)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, 'true')
+
+        helper = VMHelper(self, 'let a = {1:1, 2:2}; a[3] = 3; a[2] = 2*2; a[1]+a[2]+a[3]+len([1, 2])', vmClass=UnboxedVM)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '10')
+
+        #values are boxed when stored as attributes or in containers
+        helper = VMHelper(self, 'let o = object(); o.i = 1; o.arr = [o.i, 2]; o.arr[1] = o.arr.length + o.i; o.arr', vmClass=UnboxedVM)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_ARRAY, '[1, 3]')
+        self.assertEqual(helper.vm.getGlobal('o').attributes['i'].objectType, OBJECT_TYPES.OBJECT_TYPE_INT)
+
+        helper = VMHelper(self, 'let s = 0; for (x in [1, 2, 3]) { s = s + x; }; s', vmClass=UnboxedVM)
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '6')
+
     def test_classes(self):
         helper = VMHelper(self, 'class A {}; let a = A(); a.i = 1+1; a.i')
         helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '2')
@@ -239,5 +637,47 @@ class TestVM(unittest.TestCase):
         """)
         helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_STRING, '"Jekyll"')
 
+        #methods stay on the class: instances only hold their own attributes, which shadow methods
+        helper = VMHelper(self, 'class A { m1() { 1 } m2() { this.m1() + 1 } }; let a = A(); let b = a.m2(); a.m1 = fn() { 10 }; a.m2() + b')
+        helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_INT, '13')
+        self.assertEqual(list(helper.vm.getGlobal('a').attributes.keys()), ['m1'])
+
+    def test_logicalOperators(self):
+        tests = [
+            ('true and false', 'false'),
+            ('true and 1 > 0', 'true'),
+            ('false or 2 > 1', 'true'),
+            ('false or false', 'false'),
+            ('1 > 2 or 2 > 1 and 3 > 4', 'false'),
+            #the right operand is skipped once the left one decides the result
+            ('false and 1 / 0 == 0', 'false'),
+            ('true or 1 / 0 == 0', 'true'),
+            ('let c = 0; let f = fn() { c = c + 1; true }; f() and f(); false and f(); true or f(); c == 2', 'true'),
+        ]
+        for code, expected in tests:
+            for vmClass in [VM, UnboxedVM]:
+                helper = VMHelper(self, code, vmClass=vmClass)
+                helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, expected)
+
+    def test_membership(self):
+        tests = [
+            ('2 in [1, 2, 3]', 'true'),
+            ('4 notin [1, 2, 3]', 'true'),
+            ('"a" in {"a": 1, 2: "b"}', 'true'),
+            ('"b" in {"a": 1, 2: "b"}', 'false'),
+            ('2 notin {"a": 1, 2: "b"}', 'false'),
+            ('"oa" in "boa"', 'true'),
+            ('"ab" notin "boa"', 'true'),
+        ]
+        for code, expected in tests:
+            for vmClass in [VM, UnboxedVM]:
+                helper = VMHelper(self, code, vmClass=vmClass)
+                helper.checkLastPoppedExpected(OBJECT_TYPES.OBJECT_TYPE_BOOLEAN, expected)
+
+        with self.assertRaises(BoaVMError):
+            VMHelper(self, '1 in "boa"')
+        with self.assertRaises(BoaVMError):
+            VMHelper(self, '1 in 2')
+
 if __name__ == '__main__':
     unittest.main()